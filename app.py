@@ -1,18 +1,35 @@
-from flask import Flask, request, jsonify, render_template, redirect, url_for, session, flash, abort
+from flask import Flask, request, jsonify, render_template, redirect, url_for, session, flash, abort, Response, g, has_request_context
+import click
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
 from sqlalchemy import or_ as db_or
+from sqlalchemy.exc import IntegrityError
 import os
 from dotenv import load_dotenv
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Any
 from werkzeug.utils import secure_filename
+from markupsafe import Markup, escape
+import itertools
 import json
+import operator
+import math
 from difflib import SequenceMatcher
 from flask_migrate import Migrate
 from functools import wraps
+import atexit
+import hashlib
+import re
+import zlib
+import queue
+from collections import OrderedDict, namedtuple
+import sqlite3
+import threading
+import time
+import numpy as np
+from scipy import sparse
 # 新增邮件相关导入
 from flask_mail import Mail, Message as FlaskMailMessage
 from email.header import Header
@@ -88,8 +105,8 @@ app.config['MAIL_TIMEOUT'] = int(os.getenv('MAIL_TIMEOUT', 10))
 app.config['MAIL_DEFAULT_SENDER'] = ('校园活动平台', app.config['MAIL_USERNAME'] if app.config['MAIL_USERNAME'] else 'noreply@example.com')
 
 
-# MySQL数据库配置
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///campus_social.db'
+# MySQL数据库配置（可通过环境变量 DATABASE_URL 覆盖，便于压测/测试使用独立数据库）
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///campus_social.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # 添加配置文件上传
@@ -99,6 +116,108 @@ app.config['UPLOAD_FOLDER'] = 'static/uploads'
 # 扩展允许类型：图片/视频/文档/压缩包
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mov', 'pdf', 'docx', 'pptx', 'xlsx', 'zip'}
 
+# 活动列表分页配置（每页条数 / 单页上限 / 参与者预览人数）
+app.config['ACTIVITY_PAGE_SIZE'] = int(os.getenv('ACTIVITY_PAGE_SIZE', 20))
+app.config['ACTIVITY_PAGE_SIZE_MAX'] = 100
+app.config['ACTIVITY_PARTICIPANT_PREVIEW'] = 5
+
+# 会话列表分页配置与最后一条消息摘要长度
+app.config['CONVERSATION_PAGE_SIZE'] = 50
+app.config['CONVERSATION_SNIPPET_LENGTH'] = 100
+app.config['MESSAGE_PAGE_SIZE'] = 50  # 聊天记录每页条数
+
+# 好友列表 / 好友请求列表分页配置（每页条数 / 单页上限），用户搜索返回条数
+app.config['FRIEND_PAGE_SIZE'] = 50
+app.config['FRIEND_PAGE_SIZE_MAX'] = 200
+app.config['USER_SEARCH_LIMIT'] = 20
+# 进程内好友关系图：多 worker 部署时其他进程的好友变更最多延迟这么久（秒）后由后台线程重新加载体现，0 表示不重新加载
+app.config['SOCIAL_GRAPH_RELOAD_SECONDS'] = int(os.getenv('SOCIAL_GRAPH_RELOAD_SECONDS', 600))
+
+# 徽章计数（未读消息/未读通知/好友请求）进程内缓存：容量与有效期（秒），多 worker 部署时其他进程的更新最多延迟这么久
+app.config['BADGE_CACHE_SIZE'] = 10000
+app.config['BADGE_CACHE_TTL'] = 30
+# 用户资料快照（用户名/身份/头像/姓名）进程内缓存：容量为 0 表示不缓存；其他 worker 的资料修改最多延迟 TTL 秒可见
+app.config['USER_CACHE_SIZE'] = int(os.getenv('USER_CACHE_SIZE', 10000))
+app.config['USER_CACHE_TTL'] = 60
+
+# 实时推送（SSE）配置：memory=单进程内存广播；sqlite=多 worker 共享的本地 SQLite 事件表（Redis 等的本地替身）
+app.config['EVENT_BROKER_BACKEND'] = os.getenv('EVENT_BROKER_BACKEND', 'memory')
+app.config['EVENT_BROKER_SQLITE_PATH'] = os.getenv('EVENT_BROKER_SQLITE_PATH', os.path.join(app.instance_path, 'events.db'))
+app.config['SSE_HEARTBEAT_SECONDS'] = 15
+app.config['SSE_QUEUE_SIZE'] = 100  # 单个连接最多积压的事件数，超出丢弃（客户端重连后会重新拉取）
+
+# 帖子列表接口（GET /api/posts）分页与摘要配置
+app.config['POST_PAGE_SIZE'] = 20
+app.config['POST_PAGE_SIZE_MAX'] = 100
+app.config['POST_EXCERPT_LENGTH'] = 100  # view=summary 时返回的正文摘要长度
+
+# 活动推荐：返回条数、单用户缓存有效期与容量，以及各项打分权重
+app.config['ACTIVITY_RECOMMEND_TOP_K'] = 20
+app.config['ACTIVITY_RECOMMEND_CACHE_TTL'] = 300  # 秒；报名人数等热度变化最多延迟这么久反映到推荐结果
+app.config['ACTIVITY_RECOMMEND_CACHE_SIZE'] = 2048
+app.config['ACTIVITY_RECOMMEND_WEIGHTS'] = {'hobby': 3.0, 'history': 2.0, 'popularity': 1.0, 'recency': 1.0}
+app.config['ACTIVITY_RECENCY_DAYS'] = 14  # 新鲜度按发布时间指数衰减的时间常数
+
+# 通知批量分发：后台 worker 数、待处理任务队列上限（满了之后调用方最多等待 ENQUEUE_TIMEOUT 秒，仍满则在当前线程直接执行）
+app.config['NOTIFICATION_FANOUT_WORKERS'] = int(os.getenv('NOTIFICATION_FANOUT_WORKERS', 2))
+app.config['NOTIFICATION_FANOUT_QUEUE_SIZE'] = 1000
+app.config['NOTIFICATION_FANOUT_CHUNK_SIZE'] = 500  # 每批插入/提交的通知条数
+app.config['NOTIFICATION_ENQUEUE_TIMEOUT'] = 2.0
+app.config['NOTIFICATION_FANOUT_RETRIES'] = 3  # 一批通知写库失败（如数据库被锁）时的重试次数，间隔按 0.05s 起倍增
+# 通知合并：同一用户、同类型、同对象的未读通知在窗口期内合并为一条（只保留最近几位触发者）；已读通知超过保留天数后由 compact-notifications 归档
+app.config['NOTIFICATION_COALESCE_WINDOW'] = 6 * 3600  # 秒
+app.config['NOTIFICATION_RECENT_ACTORS'] = 3
+app.config['NOTIFICATION_RETENTION_DAYS'] = int(os.getenv('NOTIFICATION_RETENTION_DAYS', 30))
+
+# 抢报名：开启后报名请求先进进程内队列并立即返回排队号，由后台 worker 按批放号；队列满时调用方最多等待 ENQUEUE_TIMEOUT 秒，仍满则返回 503 请用户稍后重试
+app.config['ACTIVITY_ADMISSION_QUEUE_SIZE'] = 20000
+app.config['ACTIVITY_ADMISSION_BATCH_SIZE'] = 500  # 每批最多处理的报名请求数（同一活动一批只加一次锁、写一次人数）
+app.config['ACTIVITY_ADMISSION_ENQUEUE_TIMEOUT'] = 0.5
+app.config['ACTIVITY_ADMISSION_RETRIES'] = 3  # 一批放号写库失败（如数据库被锁）时的重试次数，间隔按 0.05s 起倍增
+
+# 帖子互动计数写回配置
+app.config['REACTION_FLUSH_INTERVAL'] = float(os.getenv('REACTION_FLUSH_INTERVAL', 2.0))  # 秒；计数增量攒批写回 post_stats 的间隔
+app.config['REACTION_FLUSH_BATCH'] = 5000  # 每次最多回放的增量日志条数
+
+# 热门标签配置
+app.config['TRENDING_TAG_CAPACITY'] = 200  # 每小时 Space-Saving 摘要最多跟踪的标签数
+app.config['TRENDING_WINDOW_HOURS'] = 168  # 默认统计最近一周
+app.config['TRENDING_RETENTION_HOURS'] = 720  # 超过 30 天的小时桶在写回时清理
+app.config['TRENDING_FLUSH_INTERVAL'] = float(os.getenv('TRENDING_FLUSH_INTERVAL', 10.0))  # 秒
+app.config['TRENDING_CACHE_SECONDS'] = 30  # 接口结果缓存时间
+app.config['TRENDING_CREATE_WEIGHT'] = 5  # 发帖（审核通过）/发起活动/发布组队时每个标签的分数；互动按 POST_ENGAGEMENT_WEIGHTS 计分
+
+# 浏览计数配置
+app.config['VIEW_FLUSH_INTERVAL'] = float(os.getenv('VIEW_FLUSH_INTERVAL', 5.0))  # 秒；内存中的浏览计数写回数据库的间隔
+app.config['VIEW_COUNTER_STRIPES'] = 16  # 计数分段数，不同帖子/活动的浏览落在不同的锁上
+app.config['VIEW_HLL_PRECISION'] = 10  # 独立访客 HyperLogLog 精度：2^10 个寄存器（每天每个对象 1KB），标准误差约 3.3%
+app.config['VIEW_REPORT_DAYS_MAX'] = 90
+
+# 评论分页配置
+app.config['COMMENT_PAGE_SIZE'] = 20  # 每页顶层评论数
+app.config['COMMENT_PAGE_SIZE_MAX'] = 100
+app.config['COMMENT_REPLY_PAGE_SIZE'] = 50  # 展开回复时每页条数
+app.config['COMMENT_REPLY_DEPTH'] = 3  # 展开回复时默认取几层，更深的由客户端继续展开
+app.config['COMMENT_MAX_DEPTH'] = 50  # 回复嵌套上限（受 path 列长度限制）
+
+# 帖子审核队列配置
+app.config['REVIEW_PAGE_SIZE'] = 20
+app.config['REVIEW_PAGE_SIZE_MAX'] = 100
+app.config['REVIEW_LEASE_SECONDS'] = int(os.getenv('REVIEW_LEASE_SECONDS', 300))  # 教师领取的一批帖子独占多久，过期自动回到队列
+app.config['REVIEW_CLAIM_MAX'] = 100  # 每次最多领取的帖子数
+app.config['REVIEW_BULK_MAX'] = 200  # 批量审核一次最多处理的帖子数
+
+# 好友推荐（可能认识的人）：每个用户保存的候选数与各项匹配信号的权重
+app.config['USER_SUGGESTION_TOP_K'] = 20
+app.config['USER_SUGGESTION_BLOCK_SIZE'] = 2000  # 批量计算时每批参与稀疏矩阵乘法的用户数
+app.config['USER_MATCH_WEIGHTS'] = {'hobby': 2.0, 'major': 1.0, 'classmate': 1.0,
+                                    'mutual_friend': 1.5, 'activity': 1.0, 'group': 1.0}
+
+# 帖子热度：互动加权分取 log10 后加上发布时间项，发布时间每晚 POST_HOT_GRAVITY_SECONDS 秒，需要多 10 倍互动才能排在同一位置
+app.config['POST_HOT_GRAVITY_SECONDS'] = 45000
+app.config['POST_ENGAGEMENT_WEIGHTS'] = {'like_count': 1, 'favorite_count': 2, 'repost_count': 3,
+                                         'useful_count': 2, 'comment_count': 2}
+
 # 初始化数据库
 db = SQLAlchemy(app)
 migrate = Migrate(app, db)  # 绑定app和db
@@ -129,6 +248,18 @@ class User(db.Model):
     verification_code = db.Column(db.String(6), default='')  # 存储6位验证码
     code_expire = db.Column(db.String(50), default='')  # 验证码过期时间（格式：YYYY-MM-DD HH:MM:SS）
 
+# 用户搜索表（SQLite FTS5 trigram 虚拟表，不属于 db.metadata，由 init_user_search_index 用原生 SQL 创建）
+# 各字段存放 user_search_text 处理后的文本，rowid 由 user_search_rowid 从用户 ID 换算，user_id 仅用于回表
+user_search = db.Table(
+    'user_search', db.MetaData(),
+    db.Column('rowid', db.Integer, primary_key=True),
+    db.Column('user_id', db.String(8)),
+    db.Column('username', db.Text),
+    db.Column('real_name', db.Text),
+    db.Column('student_id', db.Text),
+    db.Column('email_local', db.Text)
+)
+
 class Activity(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     title = db.Column(db.String(120), nullable=False)
@@ -156,9 +287,18 @@ class Activity(db.Model):
 activity_participants = db.Table(
     'activity_participants',
     db.Column('user_id', db.String(8), db.ForeignKey('user.id'), primary_key=True),
-    db.Column('activity_id', db.Integer, db.ForeignKey('activity.id'), primary_key=True)
+    db.Column('activity_id', db.Integer, db.ForeignKey('activity.id'), primary_key=True),
+    # 主键以 user_id 开头，按活动查参与者走这个索引
+    db.Index('ix_activity_participants_activity', 'activity_id', 'user_id')
 )
 
+# 活动标签倒排索引（标签 -> 活动），推荐时按兴趣标签直接取候选活动
+class ActivityTag(db.Model):
+    tag = db.Column(db.String(50), primary_key=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity.id'), primary_key=True, autoincrement=False, index=True)
+
+Activity.tag_index = db.relationship('ActivityTag', cascade='all, delete-orphan')
+
 # 收藏关系表
 activity_favorites = db.Table(
     'activity_favorites',
@@ -169,6 +309,24 @@ activity_favorites = db.Table(
 # 给User添加收藏关联
 User.favorite_activities = db.relationship('Activity', secondary=activity_favorites, backref=db.backref('favorited_by'))
 
+# 抢报名设置：有这一行的活动报名走排队放号（SignupAdmission）；waitlist_limit 为候补人数上限，空表示不限
+class ActivityAdmission(db.Model):
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity.id'), primary_key=True, autoincrement=False)
+    waitlist_limit = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.String(50), default=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+# 抢报名结果：admitted（已放号）/ waitlisted（候补中）；自增 ID 即放号先后，候补按它依次递补
+class ActivitySignup(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    activity_id = db.Column(db.Integer, db.ForeignKey('activity.id'), nullable=False)
+    user_id = db.Column(db.String(8), db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.String(50), default=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    __table_args__ = (
+        db.UniqueConstraint('activity_id', 'user_id', name='uq_activity_signup_user'),
+        db.Index('ix_activity_signup_queue', 'activity_id', 'status', 'id'),
+    )
+
 # 关注关系表
 class Follow(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -185,7 +343,25 @@ class Friendship(db.Model):
     requester_id = db.Column(db.String(8), db.ForeignKey('user.id'), nullable=False)  # 发起请求的用户ID
     created_at = db.Column(db.String(50), default=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
     updated_at = db.Column(db.String(50), default=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-    __table_args__ = (db.UniqueConstraint('user1_id', 'user2_id', name='_user1_user2_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('user1_id', 'user2_id', name='_user1_user2_uc'),
+        # 按用户查好友关系是 user1_id = ? OR user2_id = ?，前一半走唯一约束的索引，后一半走这个
+        db.Index('ix_friendship_user2', 'user2_id', 'status'),
+    )
+
+# 好友推荐结果（批量任务预计算每个用户的前 K 个候选，好友/报名变化时增量修正）
+class UserSuggestion(db.Model):
+    user_id = db.Column(db.String(8), db.ForeignKey('user.id'), primary_key=True)
+    candidate_id = db.Column(db.String(8), db.ForeignKey('user.id'), primary_key=True)
+    score = db.Column(db.Float, default=0.0, nullable=False)
+    mutual_friends = db.Column(db.Integer, default=0, nullable=False)
+    shared_hobbies = db.Column(db.Integer, default=0, nullable=False)
+    shared_activities = db.Column(db.Integer, default=0, nullable=False)
+    shared_groups = db.Column(db.Integer, default=0, nullable=False)
+    same_major = db.Column(db.Boolean, default=False, nullable=False)
+    same_grade = db.Column(db.Boolean, default=False, nullable=False)
+    updated_at = db.Column(db.String(50), default=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    __table_args__ = (db.Index('ix_user_suggestion_user_score', 'user_id', 'score'),)
 
 # 消息表
 class Message(db.Model):
@@ -195,6 +371,32 @@ class Message(db.Model):
     content = db.Column(db.Text, nullable=False)
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.String(50), default=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    __table_args__ = (
+        db.Index('ix_message_receiver_read', 'receiver_id', 'is_read'),  # 未读消息数
+        db.Index('ix_message_conversation', 'sender_id', 'receiver_id', 'id'),  # 两人聊天记录按 ID 翻页、标记已读
+    )
+
+# 会话索引表（每个用户与每个聊天对象一行，发送/阅读消息时同步维护）
+class Conversation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(8), db.ForeignKey('user.id'), nullable=False)
+    peer_id = db.Column(db.String(8), db.ForeignKey('user.id'), nullable=False)  # 聊天对象
+    last_message_id = db.Column(db.Integer, nullable=False, default=0)
+    last_message = db.Column(db.String(200), default='')  # 最后一条消息摘要
+    last_message_time = db.Column(db.String(50), default='')
+    last_sender_id = db.Column(db.String(8), default='')
+    unread_count = db.Column(db.Integer, nullable=False, default=0)  # 对方发来的未读消息数
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'peer_id', name='_conversation_user_peer_uc'),
+        db.Index('ix_conversation_user_last_message', 'user_id', 'last_message_id'),
+    )
+
+# 徽章计数表（每个用户一行，发消息/读消息、发通知/读通知、好友请求时增量维护）
+class UserBadge(db.Model):
+    user_id = db.Column(db.String(8), db.ForeignKey('user.id'), primary_key=True)
+    unread_messages = db.Column(db.Integer, nullable=False, default=0)
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0)
+    friend_requests = db.Column(db.Integer, nullable=False, default=0)  # 收到的待处理好友请求
 
 # ---------------------------- 帖子与审核相关模型 ----------------------------
 
@@ -272,6 +474,10 @@ class Post(db.Model):
     org_name = db.Column(db.String(120), default='')
     review_status = db.Column(db.String(20), default='pending')  # 审核状态（pending/approved/rejected）
     created_at = db.Column(db.String(50), default=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    __table_args__ = (
+        db.Index('ix_post_review_category', 'review_status', 'category', 'id'),  # 帖子列表按状态、栏目过滤后按 ID 翻页
+        db.Index('ix_post_author', 'author_id', 'id'),  # 我的帖子；列表里“审核通过 或 自己发布”的后一半
+    )
 
 # 帖子审核记录表
 class PostReview(db.Model):
@@ -282,9 +488,61 @@ class PostReview(db.Model):
     comment = db.Column(db.String(200), default='')
     created_at = db.Column(db.String(50), default=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
+# 审核领取租约：教师领取一批待审核帖子后在 expires_at 之前独占，其他教师领取时跳过；审核完或过期即释放
+class PostReviewLease(db.Model):
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True, autoincrement=False)
+    teacher_id = db.Column(db.String(8), db.ForeignKey('user.id'), nullable=False, index=True)
+    expires_at = db.Column(db.String(50), nullable=False)
+
 # 给Post添加审核关联
 Post.reviews = db.relationship('PostReview', backref='post', cascade='all, delete-orphan')
 
+# 帖子互动统计（冗余计数，随互动增量维护；flask reconcile-post-stats 可从原始表重算）
+class PostStats(db.Model):
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True, autoincrement=False)
+    like_count = db.Column(db.Integer, default=0, nullable=False)
+    favorite_count = db.Column(db.Integer, default=0, nullable=False)
+    repost_count = db.Column(db.Integer, default=0, nullable=False)
+    useful_count = db.Column(db.Integer, default=0, nullable=False)
+    comment_count = db.Column(db.Integer, default=0, nullable=False)
+    view_count = db.Column(db.Integer, default=0, nullable=False)
+    hot_score = db.Column(db.Float, default=0.0, nullable=False)
+    __table_args__ = (
+        # 论坛“最热”“最多回复”排序直接按索引顺序分页
+        db.Index('ix_post_stats_hot', 'hot_score', 'post_id'),
+        db.Index('ix_post_stats_comments', 'comment_count', 'post_id'),
+    )
+
+Post.stats = db.relationship('PostStats', uselist=False, cascade='all, delete-orphan')
+
+# 帖子标签索引（Post.tags 逗号分隔字符串的规范化拆分，按标签查帖子走主键索引）
+class PostTag(db.Model):
+    tag = db.Column(db.String(50), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True, autoincrement=False, index=True)
+
+Post.tag_index = db.relationship('PostTag', cascade='all, delete-orphan')
+
+# 帖子全文检索表（SQLite FTS5 虚拟表，不属于 db.metadata，由 init_post_search_index 用原生 SQL 创建）
+# title/content 存放的是 fts_tokens 切分后的词（中文二元组），review_status/category 仅用于过滤
+post_fts = db.Table(
+    'post_fts', db.MetaData(),
+    db.Column('rowid', db.Integer, primary_key=True),
+    db.Column('title', db.Text),
+    db.Column('content', db.Text),
+    db.Column('review_status', db.String(20)),
+    db.Column('category', db.String(50))
+)
+
+# 帖子相似度索引：MinHash 签名按 LSH 分段后得到的桶，用于近似重复检测
+class PostSimilarityBucket(db.Model):
+    bucket = db.Column(db.BigInteger, primary_key=True, autoincrement=False)  # 分段哈希（已混入分段序号）
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True, index=True)
+
+# 相似度索引的签名格式（只有一行）：与当前 SIMILARITY_* 参数不一致时，启动时重建索引
+class PostSimilarityMeta(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    format = db.Column(db.String(50), nullable=False)
+
 class Group(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     name = db.Column(db.String(120), unique=True, nullable=False)
@@ -319,6 +577,21 @@ class Comment(db.Model):
     parent_id = db.Column(db.Integer, db.ForeignKey('comment.id'), nullable=True)
     is_pinned = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.String(50), default=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    __table_args__ = (db.Index('ix_comment_post', 'post_id', 'id'),)
+
+# 评论树的物化路径：path 由祖先到自身的评论 ID（8 位定长 36 进制，以 / 结尾）拼成，按 path 排序即为先序遍历，
+# 某条评论的整棵回复子树是以其 path 为前缀的一段连续区间；pin_rank 0 为置顶、1 为普通，用于顶层评论排序
+class CommentPath(db.Model):
+    comment_id = db.Column(db.Integer, db.ForeignKey('comment.id'), primary_key=True, autoincrement=False)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    path = db.Column(db.String(500), nullable=False)
+    depth = db.Column(db.Integer, default=0, nullable=False)
+    pin_rank = db.Column(db.Integer, default=1, nullable=False)
+    reply_count = db.Column(db.Integer, default=0, nullable=False)  # 子树中的回复总数（不含自身）
+    __table_args__ = (
+        db.Index('ix_comment_path_roots', 'post_id', 'depth', 'pin_rank', 'comment_id'),
+        db.Index('ix_comment_path_tree', 'post_id', 'path'),
+    )
 
 # 反应/互动（点赞/收藏/转发/有用/打赏等）
 class Reaction(db.Model):
@@ -329,6 +602,37 @@ class Reaction(db.Model):
     type = db.Column(db.String(30), nullable=False)  # like, favorite, repost, useful, unuseful, reward
     metadata_json = db.Column(db.String(200), default='')
     created_at = db.Column(db.String(50), default=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    __table_args__ = (db.Index('ix_reaction_post_type', 'post_id', 'type'),)
+
+# 用户对帖子的互动状态（点赞/收藏/转发/有用/无用）：主键去重，同一用户同一类型只有一条，重复点击即取消
+class PostReaction(db.Model):
+    user_id = db.Column(db.String(8), db.ForeignKey('user.id'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True, autoincrement=False)
+    type = db.Column(db.String(30), primary_key=True)
+    created_at = db.Column(db.String(50), default=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    __table_args__ = (db.Index('ix_post_reaction_post', 'post_id', 'type'),)
+
+# 互动计数增量日志：与互动状态在同一事务写入，后台按批汇总到 post_stats 后删除；
+# 进程崩溃时尚未回放的增量留在表里，下次启动或下一轮写回时继续回放
+class PostReactionDelta(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
+    type = db.Column(db.String(30), nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+
+# 帖子/活动按天的浏览统计：浏览次数 + 独立访客 HyperLogLog 寄存器（visitors，每个寄存器 1 字节）
+# 帖子的累计浏览数同时写入 post_stats.view_count
+class ContentViewDaily(db.Model):
+    target_type = db.Column(db.String(20), primary_key=True)  # post / activity
+    target_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    day = db.Column(db.String(10), primary_key=True)  # YYYY-MM-DD
+    view_count = db.Column(db.Integer, default=0, nullable=False)
+    visitors = db.Column(db.LargeBinary, nullable=True)
+
+# 热门标签小时桶：每小时一份 Space-Saving 摘要，sketch 为 JSON {标签: [计数, 误差上界]}
+class TagTrendHour(db.Model):
+    hour = db.Column(db.String(13), primary_key=True)  # YYYY-MM-DD HH
+    sketch = db.Column(db.Text, nullable=False, default='{}')
 
 # 组队招募
 class TeamRecruit(db.Model):
@@ -365,6 +669,21 @@ class Notification(db.Model):
     related_id = db.Column(db.String(50), default='')  # 相关对象的ID，如帖子ID、用户ID等
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.String(50), default=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    __table_args__ = (
+        db.Index('ix_notification_user_created', 'user_id', 'created_at'),
+        db.Index('ix_notification_user_read', 'user_id', 'is_read', 'id'),  # 未读通知、全部标为已读
+    )
+
+class NotificationAggregate(db.Model):
+    """可合并通知的合并键与最近触发者（归档摘要行的 actor_count 记录被归档的通知条数）"""
+    notification_id = db.Column(db.Integer, db.ForeignKey('notification.id'), primary_key=True)
+    user_id = db.Column(db.String(8), nullable=False)
+    type = db.Column(db.String(50), nullable=False)
+    related_id = db.Column(db.String(50), nullable=False, default='')
+    actor_count = db.Column(db.Integer, nullable=False, default=1)
+    actors = db.Column(db.Text, nullable=False, default='[]')  # JSON：[{"id": .., "name": ..}]，最新的在前
+    window_start = db.Column(db.String(50), nullable=False)  # 合并窗口起点（第一条事件的时间）
+    __table_args__ = (db.Index('ix_notification_aggregate_key', 'user_id', 'type', 'related_id', 'window_start'),)
 
 # 给 User 添加常用关系属性
 User.groups = db.relationship('Group', secondary=group_members, backref=db.backref('members'))
@@ -379,6 +698,84 @@ def find_user_by_id(user_id):
     """根据ID查找用户"""
     return User.query.get(user_id)
 
+class LRUCache:
+    """进程内按键缓存（LRU + TTL，线程安全）；max_size 为 0 时不缓存"""
+
+    def __init__(self, max_size=10000, ttl=30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl, value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def invalidate(self, keys=None):
+        """keys 为 None 时清空全部缓存"""
+        with self._lock:
+            if keys is None:
+                self._cache.clear()
+            for key in keys or ():
+                self._cache.pop(key, None)
+
+# 用户资料只读快照：身份判断、作者展示等只读场景使用，避免每次都加载整行 User
+UserSnapshot = namedtuple('UserSnapshot', ['id', 'username', 'role', 'avatar', 'real_name'])
+
+user_cache = LRUCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
+@db.event.listens_for(db.session, 'after_commit')
+def invalidate_user_snapshots_after_commit(session):
+    user_cache.invalidate(session.info.pop('user_snapshot_users', ()))
+
+@db.event.listens_for(db.session, 'after_soft_rollback')
+def discard_user_snapshots_after_rollback(session, previous_transaction):
+    session.info.pop('user_snapshot_users', None)
+
+def load_current_user():
+    """当前登录用户（ORM 对象，同一请求内只查询一次）；未登录或用户不存在时返回 None"""
+    if not has_request_context():
+        return None
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = db.session.get(User, user_id) if user_id else None
+    return g.current_user
+
+def get_user_snapshot(user_id) -> Optional[UserSnapshot]:
+    """读取用户资料快照：先查进程内缓存，未命中时查询（当前用户复用本请求已加载的对象）"""
+    if not user_id:
+        return None
+    snapshot = user_cache.get(user_id)
+    if snapshot is None:
+        if has_request_context() and user_id == session.get('user_id'):
+            user = load_current_user()
+        else:
+            user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        snapshot = UserSnapshot(user.id, user.username, user.role, user.avatar, user.real_name)
+        user_cache.put(user_id, snapshot)
+    return snapshot
+
+def invalidate_user_snapshot(user_id):
+    """资料、头像或密码修改后调用，事务提交后清除该用户的缓存快照（由调用方提交事务）"""
+    db.session.info.setdefault('user_snapshot_users', set()).add(user_id)
+
 def is_logged_in():
     """检查用户是否已登录"""
     return "user_id" in session
@@ -387,6 +784,28 @@ def find_activity(activity_id: int) -> Optional[Activity]:
     """根据ID查找活动"""
     return Activity.query.get(activity_id)
 
+def get_participant_previews(activity_ids, per_activity):
+    """批量获取多个活动的参与者预览（每个活动最多 per_activity 人，一条SQL）"""
+    ranked = db.select(
+        activity_participants.c.activity_id,
+        User.id,
+        User.username,
+        db.func.row_number().over(
+            partition_by=activity_participants.c.activity_id,
+            order_by=User.id
+        ).label('rn')
+    ).join(User, User.id == activity_participants.c.user_id).where(
+        activity_participants.c.activity_id.in_(activity_ids)
+    ).subquery()
+    
+    previews = {}
+    rows = db.session.execute(
+        db.select(ranked.c.activity_id, ranked.c.id, ranked.c.username).where(ranked.c.rn <= per_activity)
+    )
+    for activity_id, user_id, username in rows:
+        previews.setdefault(activity_id, []).append({"id": user_id, "name": username})
+    return previews
+
 def get_next_activity_id():
     """获取下一个活动ID"""
     max_id = db.session.query(db.func.max(Activity.id)).scalar()
@@ -399,46 +818,2086 @@ def allowed_file(filename):
 def similar_ratio(a: str, b: str) -> float:
     return SequenceMatcher(None, a or '', b or '').ratio()
 
+# ---------------------------- 相似帖子检测（MinHash + LSH） ----------------------------
+# 文本按字符 k-gram 切片（兼容中文，无需分词），计算 MinHash 签名后分成若干段，
+# 任意一段完全相同的帖子才作为候选，再用 SequenceMatcher 精确打分，保持原有的分数与阈值语义。
+# 参数按 ratio >= 0.75 的零散改字来定：此时二元组的 Jaccard 相似度不低于约 0.37（三元组可低到 0.2），
+# 每段 3 个哈希值、共 96 段时命中至少一段的概率在 99% 以上，而无关帖子成为候选的比例约千分之五。
+# 很短的文本 MinHash 估计不稳定，另按长度分桶，查询时把长度可能达到阈值的短帖子全部取出精确比较。
+# 参数组合记为 SIMILARITY_INDEX_FORMAT 存入 PostSimilarityMeta，修改参数后下次启动会自动重建索引。
+
+SIMILARITY_SHINGLE_SIZE = 2
+SIMILARITY_NUM_PERM = 288
+SIMILARITY_BANDS = 96  # 每段 SIMILARITY_NUM_PERM // SIMILARITY_BANDS 个哈希值
+SIMILARITY_SHORT_TEXT = 16  # 不超过这个长度的文本（标题 + 正文）同时按长度分桶
+SIMILARITY_INDEX_FORMAT = (f'k{SIMILARITY_SHINGLE_SIZE}-p{SIMILARITY_NUM_PERM}'
+                           f'-b{SIMILARITY_BANDS}-s{SIMILARITY_SHORT_TEXT}')
+_MINHASH_PRIME = np.uint64(4294967311)  # 大于 2^32 的最小素数
+_minhash_rng = np.random.RandomState(20250101)  # 固定种子，保证签名在多进程/重启间一致
+_MINHASH_A = _minhash_rng.randint(1, 1 << 31, size=SIMILARITY_NUM_PERM, dtype=np.uint64)
+_MINHASH_B = _minhash_rng.randint(0, 1 << 31, size=SIMILARITY_NUM_PERM, dtype=np.uint64)
+
+def post_similarity_text(title, content):
+    """相似度比较所用的文本（标题 + 正文）"""
+    return (title or '') + '\n' + (content or '')
+
+def text_shingles(text: str, k: int = SIMILARITY_SHINGLE_SIZE) -> set:
+    """去除空白并转小写后按字符切分 k-gram"""
+    normalized = ''.join((text or '').lower().split())
+    if len(normalized) <= k:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + k] for i in range(len(normalized) - k + 1)}
+
+def minhash_signature(text: str):
+    """计算文本的 MinHash 签名（长度 SIMILARITY_NUM_PERM 的 uint64 数组），空文本返回 None"""
+    shingles = text_shingles(text)
+    if not shingles:
+        return None
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+    signature = np.full(SIMILARITY_NUM_PERM, _MINHASH_PRIME, dtype=np.uint64)
+    # 分块计算，避免超长正文一次性生成过大的矩阵
+    for start in range(0, len(hashes), 4096):
+        chunk = hashes[start:start + 4096]
+        permuted = (np.outer(_MINHASH_A, chunk) + _MINHASH_B[:, None]) % _MINHASH_PRIME
+        np.minimum(signature, permuted.min(axis=1), out=signature)
+    return signature
+
+def lsh_bucket_keys(signature) -> List[int]:
+    """把签名切成 SIMILARITY_BANDS 段，每段哈希成一个 64 位有符号整数（可直接存入数据库）"""
+    rows = SIMILARITY_NUM_PERM // SIMILARITY_BANDS
+    keys = set()
+    for band in range(SIMILARITY_BANDS):
+        digest = hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(),
+                                 digest_size=8, salt=band.to_bytes(2, 'little')).digest()
+        keys.add(int.from_bytes(digest, 'little', signed=True))
+    return list(keys)
+
+def similarity_length_key(length: int) -> int:
+    """短文本的长度桶（与 LSH 分段哈希共用一张表，用不同的 person 参数区分）"""
+    digest = hashlib.blake2b(length.to_bytes(4, 'little'), digest_size=8, person=b'simlen').digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+def similarity_length_keys(length: int, threshold: float) -> List[int]:
+    """与长度为 length 的文本 ratio 可能达到 threshold 的短文本长度桶（由 real_quick_ratio 上界推出长度范围）"""
+    if threshold <= 0:
+        low, high = 1, SIMILARITY_SHORT_TEXT
+    else:
+        low = max(1, math.ceil(length * threshold / (2 - threshold)))
+        high = min(SIMILARITY_SHORT_TEXT, math.floor(length * (2 - threshold) / threshold))
+    return [similarity_length_key(n) for n in range(low, high + 1)]
+
+def post_similarity_rows(post_id, title, content):
+    text = post_similarity_text(title, content)
+    signature = minhash_signature(text)
+    if signature is None:
+        return []
+    keys = lsh_bucket_keys(signature)
+    if len(text) <= SIMILARITY_SHORT_TEXT:
+        keys.append(similarity_length_key(len(text)))
+    return [{'bucket': key, 'post_id': post_id} for key in keys]
+
+def index_post_similarity(post):
+    """写入/刷新单篇帖子的相似度索引（创建或编辑后调用，由调用方提交事务）"""
+    remove_post_similarity(post.id)
+    rows = post_similarity_rows(post.id, post.title, post.content)
+    if rows:
+        db.session.execute(PostSimilarityBucket.__table__.insert(), rows)
+
+def remove_post_similarity(post_id):
+    """删除单篇帖子的相似度索引（删除帖子前调用，由调用方提交事务）"""
+    PostSimilarityBucket.query.filter_by(post_id=post_id).delete(synchronize_session=False)
+
+def rebuild_similarity_index(batch_size: int = 1000) -> int:
+    """离线重建全部帖子的相似度索引，返回处理的帖子数"""
+    PostSimilarityBucket.query.delete(synchronize_session=False)
+    db.session.commit()
+    total = 0
+    last_id = 0
+    while True:
+        batch = db.session.query(Post.id, Post.title, Post.content).filter(
+            Post.id > last_id).order_by(Post.id.asc()).limit(batch_size).all()
+        if not batch:
+            break
+        rows = []
+        for p in batch:
+            rows.extend(post_similarity_rows(p.id, p.title, p.content))
+        if rows:
+            db.session.execute(PostSimilarityBucket.__table__.insert(), rows)
+        db.session.commit()
+        total += len(batch)
+        last_id = batch[-1].id
+    db.session.merge(PostSimilarityMeta(id=1, format=SIMILARITY_INDEX_FORMAT))
+    db.session.commit()
+    return total
+
+def ensure_similarity_index() -> bool:
+    """索引从未建过或签名格式与当前参数不一致时重建，返回是否重建"""
+    meta = db.session.get(PostSimilarityMeta, 1)
+    if meta is not None and meta.format == SIMILARITY_INDEX_FORMAT:
+        return False
+    rebuild_similarity_index()
+    return True
+
 def find_similar_posts(title: str, content: str, threshold: float = 0.75):
-    combined = (title or '') + '\n' + (content or '')
+    combined = post_similarity_text(title, content)
+    signature = minhash_signature(combined)
+    if signature is None:
+        return []
+    
+    # 只取与查询文本至少有一段签名相同的帖子、以及长度够得上阈值的短帖子作为候选（走 bucket 主键索引）
+    keys = lsh_bucket_keys(signature) + similarity_length_keys(len(combined), threshold)
+    candidate_ids = [pid for (pid,) in db.session.query(PostSimilarityBucket.post_id).filter(
+        PostSimilarityBucket.bucket.in_(keys)).distinct()]
+    
     candidates = []
-    for p in Post.query.all():
-        score = similar_ratio(combined, (p.title or '') + '\n' + (p.content or ''))
-        if score >= threshold:
-            candidates.append({'post': {
-                'id': p.id,
-                'title': p.title,
-                'category': p.category,
-                'created_at': p.created_at
-            }, 'score': score})
+    for start in range(0, len(candidate_ids), 500):
+        rows = db.session.query(Post.id, Post.title, Post.content, Post.category, Post.created_at).filter(
+            Post.id.in_(candidate_ids[start:start + 500]))
+        for p in rows:
+            matcher = SequenceMatcher(None, combined, post_similarity_text(p.title, p.content))
+            # real_quick_ratio / quick_ratio 是 ratio 的上界，先用它们剪枝
+            if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+                continue
+            score = matcher.ratio()
+            if score >= threshold:
+                candidates.append({'post': {
+                    'id': p.id,
+                    'title': p.title,
+                    'category': p.category,
+                    'created_at': p.created_at
+                }, 'score': score})
     candidates.sort(key=lambda x: x['score'], reverse=True)
     return candidates
 
 def is_teacher(user_id):
-    """检查是否为教师"""
-    user = find_user_by_id(user_id)
-    return user and user.role == 'teacher'
-
-def create_notification(user_id, type, title, content, related_id=''):
-    """创建通知"""
-    notification = Notification(
-        user_id=user_id,
-        type=type,
-        title=title,
-        content=content,
-        related_id=related_id
-    )
-    db.session.add(notification)
-    db.session.commit()
-    return notification
+    """检查是否为教师（读取用户快照）"""
+    snapshot = get_user_snapshot(user_id)
+    return snapshot is not None and snapshot.role == 'teacher'
+
+def create_notification(user_id, type, title, content, related_id='', actor=None):
+    """创建通知（交给后台批量分发，不在请求线程里提交）；传入 actor=(用户ID, 用户名) 时按合并规则写入，content 中的 {actors} 替换为触发者"""
+    notify_users([user_id], type, title, content, related_id, actor=actor)
+
+POST_NOTIFICATION_TEMPLATES = {
+    'comment': ('新评论通知', '{actors} 评论了你的帖子《{title}》'),
+    'like': ('新点赞通知', '{actors} 赞了你的帖子《{title}》'),
+    'favorite': ('新收藏通知', '{actors} 收藏了你的帖子《{title}》'),
+    'repost': ('新转发通知', '{actors} 转发了你的帖子《{title}》'),
+    'useful': ('新互动通知', '{actors} 觉得你的帖子《{title}》有用'),
+}
+
+def notify_post_author(post, actor_id, type):
+    """帖子被评论/点赞等时通知作者，同一帖子的同类互动在合并窗口内只占一条通知"""
+    if type not in POST_NOTIFICATION_TEMPLATES or post.author_id == actor_id:
+        return
+    actor = get_user_snapshot(actor_id)
+    if not actor:
+        return
+    title, template = POST_NOTIFICATION_TEMPLATES[type]
+    create_notification(post.author_id, type, title, template.replace('{title}', post.title or ''),
+                        related_id=str(post.id), actor=(actor.id, actor.username))
 
 def get_user_notifications(user_id, limit=20):
-    """获取用户的通知"""
-    return Notification.query.filter_by(user_id=user_id).order_by(Notification.created_at.desc()).limit(limit).all()
+    """获取用户的通知，返回 [(Notification, NotificationAggregate 或 None)]"""
+    return db.session.query(Notification, NotificationAggregate).outerjoin(
+        NotificationAggregate, NotificationAggregate.notification_id == Notification.id
+    ).filter(Notification.user_id == user_id).order_by(
+        Notification.created_at.desc(), Notification.id.desc()
+    ).limit(limit).all()
 
 def get_unread_notification_count(user_id):
-    """获取未读通知数量"""
-    return Notification.query.filter_by(user_id=user_id, is_read=False).count()
+    """获取未读通知数量（读取徽章计数）"""
+    return get_user_badges(user_id)[1]['unread_notifications']
+
+# ---------------------------- 帖子全文检索（SQLite FTS5） ----------------------------
+# FTS5 自带分词器按空白/标点切词，对中文无效。这里在写入和查询前统一用 fts_tokens 预切词：
+# 中文连续片段切成重叠的二元组（末尾再补一个单字，保证单字查询也能命中），英文/数字按单词切分，
+# 再用空格拼接交给 FTS5。查询时同一片段的二元组组成短语匹配，效果等价于原来的子串匹配，但走倒排索引并可按 BM25 排序。
+
+_CJK_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+_FTS_RUN_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+|[0-9a-z]+')
+
+def fts_runs(text):
+    """把文本切成中文片段和英文/数字单词（小写）"""
+    return _FTS_RUN_RE.findall((text or '').lower())
+
+def fts_tokens(text) -> str:
+    """写入 FTS5 前的预切词结果（空格分隔）"""
+    tokens = []
+    for run in fts_runs(text):
+        if _CJK_RE.fullmatch(run):
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            tokens.append(run[-1])
+        else:
+            tokens.append(run)
+    return ' '.join(tokens)
+
+def fts_match_expression(keyword):
+    """把用户输入转换成 FTS5 MATCH 表达式；没有可检索的词时返回 None"""
+    parts = []
+    for run in fts_runs(keyword):
+        if _CJK_RE.fullmatch(run):
+            if len(run) == 1:
+                parts.append(f'{run}*')
+            else:
+                parts.append('"' + ' '.join(run[i:i + 2] for i in range(len(run) - 1)) + '"')
+        else:
+            parts.append(f'"{run}"*')
+    return ' AND '.join(parts) if parts else None
+
+def post_search_enabled():
+    return app.config.get('POST_SEARCH_FTS', False)
+
+def init_post_search_index():
+    """启动时创建 FTS5 虚拟表；非 SQLite 或 SQLite 未编译 FTS5 时退回 LIKE 搜索"""
+    app.config['POST_SEARCH_FTS'] = False
+    if db.engine.dialect.name != 'sqlite':
+        return
+    try:
+        existed = db.inspect(db.engine).has_table('post_fts')
+        db.session.execute(db.text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5("
+            "title, content, review_status UNINDEXED, category UNINDEXED, tokenize='unicode61', prefix='1')"
+        ))
+        db.session.commit()
+        app.config['POST_SEARCH_FTS'] = True
+    except Exception as e:
+        db.session.rollback()
+        print(f"FTS5 不可用，帖子搜索退回 LIKE 查询：{str(e)}")
+        return
+    # 首次建表时为已有帖子补建索引
+    if not existed:
+        rebuild_post_search_index()
+
+def post_search_row(post_id, title, content, review_status, category):
+    return {
+        'rowid': post_id,
+        'title': fts_tokens(title),
+        'content': fts_tokens(content),
+        'review_status': review_status or 'pending',
+        'category': category
+    }
+
+def index_post_search(post):
+    """写入/刷新单篇帖子的全文索引（创建或编辑后调用，由调用方提交事务）"""
+    if not post_search_enabled():
+        return
+    remove_post_search(post.id)
+    db.session.execute(post_fts.insert(), [post_search_row(
+        post.id, post.title, post.content, post.review_status, post.category)])
+
+def remove_post_search(post_id):
+    """删除单篇帖子的全文索引（由调用方提交事务）"""
+    if post_search_enabled():
+        db.session.execute(post_fts.delete().where(post_fts.c.rowid == post_id))
+
+def update_post_search_status(post_ids, review_status):
+    """审核状态变化时同步全文索引中的过滤字段（由调用方提交事务）"""
+    if post_search_enabled() and post_ids:
+        db.session.execute(post_fts.update().where(post_fts.c.rowid.in_(post_ids)).values(review_status=review_status))
+
+def rebuild_post_search_index(batch_size: int = 1000) -> int:
+    """离线重建全部帖子的全文索引，返回处理的帖子数"""
+    if not post_search_enabled():
+        return 0
+    db.session.execute(post_fts.delete())
+    db.session.commit()
+    total = 0
+    last_id = 0
+    while True:
+        batch = db.session.query(Post.id, Post.title, Post.content, Post.review_status, Post.category).filter(
+            Post.id > last_id).order_by(Post.id.asc()).limit(batch_size).all()
+        if not batch:
+            break
+        db.session.execute(post_fts.insert(), [post_search_row(*p) for p in batch])
+        db.session.commit()
+        total += len(batch)
+        last_id = batch[-1].id
+    return total
+
+def search_posts_query(keyword, category='', review_status='approved'):
+    """返回按 BM25 相关度排序的帖子查询（标题权重高于正文）；FTS5 不可用或无可检索词时返回 None"""
+    expression = fts_match_expression(keyword)
+    if not post_search_enabled() or not expression:
+        return None
+    query = Post.query.join(post_fts, post_fts.c.rowid == Post.id).filter(
+        db.text('post_fts MATCH :expression').bindparams(expression=expression),
+        post_fts.c.review_status == review_status
+    )
+    if category:
+        query = query.filter(post_fts.c.category == category)
+    return query.order_by(db.func.bm25(db.literal_column('post_fts'), 10.0, 1.0), Post.id.desc())
+
+def search_snippet(content, keyword, width=80):
+    """截取正文中第一个命中位置附近的片段，并用 <mark> 高亮关键词"""
+    content = content or ''
+    terms = sorted({t for t in keyword.lower().split() if t}, key=len, reverse=True)
+    lowered = content.lower()
+    hits = [lowered.find(t) for t in terms]
+    hits = [h for h in hits if h >= 0]
+    start = max(0, min(hits) - width // 4) if hits else 0
+    piece = content[start:start + width]
+    html = str(escape(piece))
+    if terms:
+        pattern = re.compile('|'.join(re.escape(str(escape(t))) for t in terms), re.IGNORECASE)
+        html = pattern.sub(lambda m: f'<mark>{m.group(0)}</mark>', html)
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if start + width < len(content) else ''
+    return Markup(prefix + html + suffix)
+
+# ---------------------------- 用户搜索（SQLite FTS5 三元组索引） ----------------------------
+# 好友页输入框每输入一个字就搜一次。trigram 分词器把字段切成重叠的三字组，任意不少于 3 个字的子串都走倒排索引。
+# 写入时字段首尾各加两个定界符：前缀匹配变成“定界符+关键词”的子串，完全匹配变成“定界符+关键词+定界符”，
+# 这样 1~2 个字的输入也能凑满三个字，按前缀/结尾命中（夹在中间的一两个字不参与匹配）。
+# 排序：任一字段完全匹配 > 前缀匹配 > 子串匹配。
+
+USER_SEARCH_START = '\x02\x02'
+USER_SEARCH_END = '\x03\x03'
+
+def user_search_enabled():
+    return app.config.get('USER_SEARCH_FTS', False)
+
+def init_user_search_index():
+    """启动时创建 FTS5 trigram 虚拟表；非 SQLite 或 SQLite 不支持 trigram 分词器（3.34 以下）时退回 LIKE 搜索"""
+    app.config['USER_SEARCH_FTS'] = False
+    if db.engine.dialect.name != 'sqlite':
+        return
+    try:
+        existed = db.inspect(db.engine).has_table('user_search')
+        db.session.execute(db.text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5("
+            "user_id UNINDEXED, username, real_name, student_id, email_local, tokenize='trigram')"
+        ))
+        db.session.commit()
+        app.config['USER_SEARCH_FTS'] = True
+    except Exception as e:
+        db.session.rollback()
+        print(f"FTS5 trigram 不可用，用户搜索退回 LIKE 查询：{str(e)}")
+        return
+    # 首次建表时为已有用户补建索引
+    if not existed:
+        rebuild_user_search_index()
+
+def normalize_user_keyword(text) -> str:
+    """小写并去掉定界符字符"""
+    return (text or '').lower().replace('\x02', '').replace('\x03', '')
+
+def user_search_text(value) -> str:
+    value = normalize_user_keyword(value)
+    return f'{USER_SEARCH_START}{value}{USER_SEARCH_END}' if value else ''
+
+def user_search_rowid(user_id) -> int:
+    """用户 ID 换算成 FTS5 的整数 rowid：不超过 8 字节时按字节拼成 64 位整数（一一对应），更长时取哈希"""
+    raw = user_id.encode('utf-8')
+    if len(raw) > 8:
+        raw = hashlib.blake2b(raw, digest_size=8).digest()
+    return int.from_bytes(raw.ljust(8, b'\0'), 'big', signed=True)
+
+def user_search_row(user_id, username, real_name, student_id, email):
+    return {
+        'rowid': user_search_rowid(user_id),
+        'user_id': user_id,
+        'username': user_search_text(username),
+        'real_name': user_search_text(real_name),
+        'student_id': user_search_text(student_id),
+        'email_local': user_search_text((email or '').split('@')[0])
+    }
+
+def index_user_search(user):
+    """写入/刷新单个用户的搜索索引（注册或修改资料后调用，需已 flush 出用户 ID，由调用方提交事务）"""
+    if not user_search_enabled():
+        return
+    db.session.execute(user_search.delete().where(user_search.c.rowid == user_search_rowid(user.id)))
+    db.session.execute(user_search.insert(), [user_search_row(
+        user.id, user.username, user.real_name, user.student_id, user.email)])
+
+def rebuild_user_search_index(batch_size: int = 1000) -> int:
+    """离线重建全部用户的搜索索引，返回处理的用户数"""
+    if not user_search_enabled():
+        return 0
+    db.session.execute(user_search.delete())
+    db.session.commit()
+    total = 0
+    last_id = ''
+    while True:
+        batch = db.session.query(User.id, User.username, User.real_name, User.student_id, User.email).filter(
+            User.id > last_id).order_by(User.id.asc()).limit(batch_size).all()
+        if not batch:
+            break
+        db.session.execute(user_search.insert(), [user_search_row(*u) for u in batch])
+        db.session.commit()
+        total += len(batch)
+        last_id = batch[-1].id
+    return total
+
+def _fts_phrase(text) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+def ranked_user_matches(keyword, limit):
+    """返回 (user_id, tier) 子查询，tier 为 0 完全匹配 / 1 前缀匹配 / 2 子串匹配；无可检索内容时返回 None"""
+    keyword = normalize_user_keyword(keyword)
+    if not keyword:
+        return None
+    if not user_search_enabled():
+        fields = (User.username, User.real_name, User.student_id, User.email)
+        tier = db.case(
+            (db.or_(*(db.func.lower(f) == keyword for f in fields)), 0),
+            (db.or_(*(f.startswith(keyword, autoescape=True) for f in fields)), 1),
+            else_=2)
+        return db.select(User.id.label('user_id'), tier.label('tier')).where(
+            db.or_(*(f.contains(keyword, autoescape=True) for f in fields))).subquery()
+    # 少于 3 个字的关键词无法做任意子串匹配，第三档退化为“以关键词结尾”
+    phrases = [USER_SEARCH_START + keyword + USER_SEARCH_END,
+               USER_SEARCH_START + keyword,
+               keyword if len(keyword) >= 3 else keyword + USER_SEARCH_END]
+    # 每档都会重复命中前几档的人，第 n 档多取 n 倍，保证去重后仍能凑满一页；多取的 1 条留给当前用户自己。
+    # 每档按最终排序（用户名长度、用户名）截取，截断时留下的是排在前面的人，且每次结果一致
+    parts = [db.select(db.select(user_search.c.user_id, db.literal(tier).label('tier')).join(
+        User, User.id == user_search.c.user_id
+    ).where(
+        db.text(f'user_search MATCH :phrase{tier}').bindparams(**{f'phrase{tier}': _fts_phrase(phrase)})
+    ).order_by(db.func.length(User.username), User.username).limit(
+        (limit + 1) * (tier + 1)).subquery()) for tier, phrase in enumerate(phrases)]
+    matched = db.union_all(*parts).subquery()
+    return db.select(matched.c.user_id, db.func.min(matched.c.tier).label('tier')).group_by(
+        matched.c.user_id).subquery()
+
+def search_user_rows(keyword, current_user_id, limit):
+    """按用户名、真实姓名、学号、邮箱前缀检索并排序，同一条查询左连接出与当前用户的好友关系状态
+    返回 [(user_id, username, avatar, bio, friendship_status)]"""
+    matches = ranked_user_matches(keyword, limit)
+    if matches is None:
+        return []
+    return db.session.query(User.id, User.username, User.avatar, User.bio, Friendship.status).join(
+        matches, matches.c.user_id == User.id
+    ).outerjoin(
+        Friendship, db.or_(
+            db.and_(Friendship.user1_id == current_user_id, Friendship.user2_id == User.id),
+            db.and_(Friendship.user1_id == User.id, Friendship.user2_id == current_user_id)
+        )
+    ).filter(
+        User.id != current_user_id
+    ).order_by(matches.c.tier, db.func.length(User.username), User.username).limit(limit).all()
+
+# ---------------------------- 帖子标签索引 ----------------------------
+
+def parse_tags(tags) -> List[str]:
+    """把逗号分隔的标签字符串（帖子/活动标签、兴趣爱好）拆成去空白、去重后的列表（保持原顺序）"""
+    result = []
+    for tag in (tags or '').split(','):
+        tag = tag.strip()[:50]
+        if tag and tag not in result:
+            result.append(tag)
+    return result
+
+def index_post_tags(post):
+    """按 post.tags 重建单篇帖子的标签索引（由调用方提交事务）"""
+    PostTag.query.filter_by(post_id=post.id).delete(synchronize_session=False)
+    db.session.add_all([PostTag(tag=tag, post_id=post.id) for tag in parse_tags(post.tags)])
+
+def rebuild_post_tag_index(batch_size: int = 1000) -> int:
+    """离线重建全部帖子的标签索引，返回处理的帖子数"""
+    PostTag.query.delete(synchronize_session=False)
+    db.session.commit()
+    total = 0
+    last_id = 0
+    while True:
+        batch = db.session.query(Post.id, Post.tags).filter(Post.id > last_id).order_by(Post.id.asc()).limit(batch_size).all()
+        if not batch:
+            break
+        rows = [{'tag': tag, 'post_id': post_id} for post_id, tags in batch for tag in parse_tags(tags)]
+        if rows:
+            db.session.execute(PostTag.__table__.insert(), rows)
+        db.session.commit()
+        total += len(batch)
+        last_id = batch[-1].id
+    return total
+
+# ---------------------------- 热门标签（按小时分桶的 Space-Saving 摘要） ----------------------------
+# 发帖（审核通过时）、发起活动、帖子互动写回时把标签和分数喂给当前小时的摘要，只在内存里累加；
+# 后台线程每隔 TRENDING_FLUSH_INTERVAL 秒把各小时的增量与库里的摘要合并写回（摘要可合并，多进程各写各的增量）。
+# 查询时合并窗口内的小时桶取前 K 个，结果缓存 TRENDING_CACHE_SECONDS 秒。
+
+class SpaceSaving:
+    """Space-Saving 频繁项摘要：最多跟踪 capacity 个标签，满了以后新标签顶替计数最小的一个并继承其计数作为误差上界
+    每个标签的真实分数落在 [计数 - 误差, 计数] 之间；真实分数超过总分 / capacity 的标签一定在摘要里"""
+    
+    def __init__(self, capacity, counters=None):
+        self.capacity = capacity
+        self.counters = {tag: list(value) for tag, value in (counters or {}).items()}
+    
+    def add(self, tag, weight=1):
+        entry = self.counters.get(tag)
+        if entry is not None:
+            entry[0] += weight
+        elif len(self.counters) < self.capacity:
+            self.counters[tag] = [weight, 0]
+        else:
+            victim = min(self.counters, key=lambda t: self.counters[t][0])
+            floor = self.counters.pop(victim)[0]
+            self.counters[tag] = [floor + weight, floor]
+    
+    def floor(self):
+        """摘要已满时，未被跟踪的标签真实分数不超过最小计数；未满时为 0"""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(count for count, _ in self.counters.values())
+    
+    def merge(self, other):
+        """合并另一份摘要：一方缺少的标签按该方的下限补计数与误差，再截断到 capacity"""
+        mine, theirs = self.floor(), other.floor()
+        merged = {}
+        for tag in set(self.counters) | set(other.counters):
+            count, error = self.counters.get(tag, (mine, mine))
+            other_count, other_error = other.counters.get(tag, (theirs, theirs))
+            merged[tag] = [count + other_count, error + other_error]
+        self.counters = merged
+        if len(self.counters) > self.capacity:
+            self.counters = dict(self.top(self.capacity))
+        return self
+    
+    def top(self, k):
+        """按计数从大到小的前 k 个 [(标签, [计数, 误差])]"""
+        return sorted(self.counters.items(), key=lambda item: (-item[1][0], item[0]))[:k]
+    
+    def dumps(self):
+        return json.dumps(self.counters, ensure_ascii=False)
+    
+    @classmethod
+    def loads(cls, capacity, text):
+        try:
+            return cls(capacity, json.loads(text or '{}'))
+        except ValueError:
+            return cls(capacity)
+
+def trend_hour(when=None):
+    """时间（datetime 或 "YYYY-MM-DD HH:MM:SS" 字符串）所在的小时桶"""
+    if isinstance(when, str):
+        return when[:13]
+    return (when or datetime.now()).strftime("%Y-%m-%d %H")
+
+def record_tag_trend(tags, weight, when=None):
+    """记下一次标签热度（事务提交后才计入，回滚则丢弃；由调用方提交事务）"""
+    if tags and weight > 0:
+        db.session.info.setdefault('tag_trend', []).append((trend_hour(when), tuple(tags), weight))
+
+def record_post_tag_trend(post_weights):
+    """按帖子记热度：{post_id: 分数}，只计审核通过的帖子（由调用方提交事务）"""
+    post_weights = {post_id: weight for post_id, weight in post_weights.items() if weight > 0}
+    if not post_weights:
+        return
+    for post_id, tags in db.session.query(Post.id, Post.tags).filter(
+            Post.id.in_(list(post_weights)), Post.review_status == 'approved'):
+        record_tag_trend(parse_tags(tags), post_weights[post_id])
+
+@db.event.listens_for(db.session, 'after_commit')
+def record_tag_trend_after_commit(session):
+    trending_tags.observe(session.info.pop('tag_trend', ()))
+
+@db.event.listens_for(db.session, 'after_soft_rollback')
+def discard_tag_trend_after_rollback(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop('tag_trend', None)
+
+class TrendingTags:
+    """热门标签：内存里按小时累加增量摘要，定时合并写回 tag_trend_hour；查询合并窗口内的小时桶并缓存结果"""
+    
+    def __init__(self, capacity=200, interval=10.0, cache_seconds=30, retention_hours=720):
+        self.capacity = capacity
+        self.interval = interval
+        self.cache_seconds = cache_seconds
+        self.retention_hours = retention_hours
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}  # 小时 -> SpaceSaving（尚未写回的增量）
+        self._cache = {}  # 窗口小时数 -> (过期时间, 结果)
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def observe(self, events):
+        """events: [(小时, 标签元组, 分数)]"""
+        events = list(events)
+        if not events:
+            return
+        with self._lock:
+            for hour, tags, weight in events:
+                sketch = self._pending.get(hour)
+                if sketch is None:
+                    sketch = self._pending[hour] = SpaceSaving(self.capacity)
+                for tag in tags:
+                    sketch.add(tag, weight)
+        self._start()
+    
+    def trending(self, hours, limit):
+        """最近 hours 小时（含当前小时）的前 limit 个标签 [{tag, score, error}]"""
+        now = time.monotonic()
+        cached = self._cache.get(hours)
+        if cached and cached[0] > now:
+            return cached[1][:limit]
+        start = trend_hour(datetime.now() - timedelta(hours=hours - 1))
+        merged = SpaceSaving(self.capacity)
+        for (sketch,) in db.session.query(TagTrendHour.sketch).filter(TagTrendHour.hour >= start):
+            merged.merge(SpaceSaving.loads(self.capacity, sketch))
+        with self._lock:
+            pending = [sketch for hour, sketch in self._pending.items() if hour >= start]
+            pending = [SpaceSaving(self.capacity, sketch.counters) for sketch in pending]
+        for sketch in pending:
+            merged.merge(sketch)
+        result = [{'tag': tag, 'score': count, 'error': error} for tag, (count, error) in merged.top(self.capacity)]
+        self._cache[hours] = (now + self.cache_seconds, result)
+        return result[:limit]
+    
+    def invalidate(self):
+        self._cache = {}
+    
+    def flush(self):
+        """把内存中的增量合并写回数据库，返回写回的小时桶数"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                with app.app_context():
+                    self._write(batch)
+            except Exception:
+                with self._lock:
+                    for hour, sketch in batch.items():
+                        self._pending.setdefault(hour, SpaceSaving(self.capacity)).merge(sketch)
+                raise
+            self.invalidate()
+            return len(batch)
+    
+    def rebuild(self, hours=None):
+        """按原始表重算保留期内的全部小时桶（发帖/活动/组队按创建时间，帖子互动按互动时间），返回写入的小时桶数"""
+        hours = hours or self.retention_hours
+        start = trend_hour(datetime.now() - timedelta(hours=hours - 1))
+        create_weight = app.config['TRENDING_CREATE_WEIGHT']
+        weights = app.config['POST_ENGAGEMENT_WEIGHTS']
+        buckets = {}
+        
+        def add(created_at, tags, weight):
+            hour = trend_hour(created_at or '')
+            if weight > 0 and hour >= start:
+                sketch = buckets.setdefault(hour, SpaceSaving(self.capacity))
+                for tag in parse_tags(tags):
+                    sketch.add(tag, weight)
+        
+        for created_at, tags in db.session.query(Post.created_at, Post.tags).filter(
+                Post.review_status == 'approved', Post.created_at >= start, Post.tags != ''):
+            add(created_at, tags, create_weight)
+        for created_column, tags_column in ((Activity.created_at, Activity.tags), (TeamRecruit.created_at, TeamRecruit.skills)):
+            for created_at, tags in db.session.query(created_column, tags_column).filter(
+                    created_column >= start, tags_column != ''):
+                add(created_at, tags, create_weight)
+        for created_at, rtype, tags in db.session.query(PostReaction.created_at, PostReaction.type, Post.tags).join(
+                Post, Post.id == PostReaction.post_id).filter(
+                PostReaction.created_at >= start, Post.review_status == 'approved', Post.tags != ''):
+            add(created_at, tags, weights.get(REACTION_COUNTERS.get(rtype), 0))
+        
+        with self._flush_lock:
+            TagTrendHour.query.delete(synchronize_session=False)
+            if buckets:
+                db.session.execute(TagTrendHour.__table__.insert(), [
+                    {'hour': hour, 'sketch': sketch.dumps()} for hour, sketch in buckets.items()])
+            db.session.commit()
+            with self._lock:
+                self._pending = {}
+        self.invalidate()
+        return len(buckets)
+    
+    def shutdown(self, timeout=10):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"热门标签写回失败：{str(e)}")
+    
+    def _write(self, batch):
+        for hour, sketch in batch.items():
+            # 先空更新取得写锁再读出合并，多进程同时写回同一小时时不会互相覆盖
+            if not db.session.execute(db.update(TagTrendHour).where(TagTrendHour.hour == hour).values(
+                    sketch=TagTrendHour.sketch)).rowcount:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(TagTrendHour.__table__.insert(), {'hour': hour, 'sketch': sketch.dumps()})
+                    continue
+                except IntegrityError:
+                    pass
+            stored = db.session.query(TagTrendHour.sketch).filter(TagTrendHour.hour == hour).scalar()
+            merged = SpaceSaving.loads(self.capacity, stored).merge(sketch)
+            db.session.execute(db.update(TagTrendHour).where(TagTrendHour.hour == hour).values(sketch=merged.dumps()))
+        expired = trend_hour(datetime.now() - timedelta(hours=self.retention_hours))
+        TagTrendHour.query.filter(TagTrendHour.hour < expired).delete(synchronize_session=False)
+        db.session.commit()
+    
+    def _start(self):
+        if self._thread:
+            return
+        with self._lock:
+            if self._thread or self._stop.is_set():
+                return
+            self._thread = threading.Thread(target=self._worker, name='trending-tags', daemon=True)
+            self._thread.start()
+    
+    def _worker(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"热门标签写回失败：{str(e)}")
+
+trending_tags = TrendingTags(
+    capacity=app.config['TRENDING_TAG_CAPACITY'],
+    interval=app.config['TRENDING_FLUSH_INTERVAL'],
+    cache_seconds=app.config['TRENDING_CACHE_SECONDS'],
+    retention_hours=app.config['TRENDING_RETENTION_HOURS']
+)
+atexit.register(trending_tags.shutdown)
+
+# ---------------------------- 评论树（物化路径） ----------------------------
+COMMENT_PATH_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+def comment_path_segment(comment_id):
+    """评论 ID 转为 8 位定长 36 进制，字典序与数值序一致"""
+    digits = []
+    while comment_id:
+        comment_id, rem = divmod(comment_id, 36)
+        digits.append(COMMENT_PATH_DIGITS[rem])
+    return ''.join(reversed(digits)).rjust(8, '0') + '/'
+
+def comment_subtree_bounds(path):
+    """以 path 为前缀的子树区间 (path, upper)：'/' 的下一个字符是 '0'，区间内恰好是全部后代"""
+    return path, path[:-1] + '0'
+
+def comment_ancestor_ids(path):
+    return [int(segment, 36) for segment in path.split('/')[:-2]]
+
+def index_comment_path(comment, parent_path=None):
+    """为新评论写入路径行，并给全部祖先的回复数加一（comment 需已 flush 出 ID，由调用方提交事务）
+    parent_path 为父评论的 CommentPath，不传时按 comment.parent_id 查询"""
+    if comment.parent_id and parent_path is None:
+        parent_path = db.session.get(CommentPath, comment.parent_id)
+    path = (parent_path.path if parent_path else '') + comment_path_segment(comment.id)
+    db.session.add(CommentPath(comment_id=comment.id, post_id=comment.post_id, path=path,
+                               depth=parent_path.depth + 1 if parent_path else 0,
+                               pin_rank=0 if comment.is_pinned else 1))
+    ancestors = comment_ancestor_ids(path)
+    if ancestors:
+        CommentPath.query.filter(CommentPath.comment_id.in_(ancestors)).update(
+            {CommentPath.reply_count: CommentPath.reply_count + 1}, synchronize_session=False)
+
+def rebuild_comment_paths(batch_size: int = 5000) -> int:
+    """按 parent_id 重建全部评论的路径与回复数，返回处理的评论数；父评论缺失或属于其他帖子的按顶层评论处理"""
+    CommentPath.query.delete(synchronize_session=False)
+    paths, posts, reply_counts = {}, {}, {}
+    rows = db.session.query(Comment.id, Comment.post_id, Comment.parent_id, Comment.is_pinned).order_by(Comment.id.asc())
+    pinned = {}
+    for comment_id, post_id, parent_id, is_pinned in rows:
+        parent = paths.get(parent_id) if parent_id and posts.get(parent_id) == post_id else None
+        if parent and parent.count('/') > app.config['COMMENT_MAX_DEPTH']:
+            parent = None
+        paths[comment_id] = (parent or '') + comment_path_segment(comment_id)
+        posts[comment_id] = post_id
+        pinned[comment_id] = bool(is_pinned)
+        for ancestor_id in comment_ancestor_ids(paths[comment_id]):
+            reply_counts[ancestor_id] = reply_counts.get(ancestor_id, 0) + 1
+    
+    ids = list(paths)
+    for start in range(0, len(ids), batch_size):
+        db.session.execute(CommentPath.__table__.insert(), [{
+            'comment_id': comment_id, 'post_id': posts[comment_id], 'path': paths[comment_id],
+            'depth': paths[comment_id].count('/') - 1, 'pin_rank': 0 if pinned[comment_id] else 1,
+            'reply_count': reply_counts.get(comment_id, 0)
+        } for comment_id in ids[start:start + batch_size]])
+    db.session.commit()
+    return len(ids)
+
+def comment_page_query(post_id):
+    """评论与路径联表查询，作者用户名一并取出"""
+    return db.session.query(
+        Comment.id, Comment.post_id, Comment.author_id, Comment.content, Comment.parent_id, Comment.is_pinned,
+        Comment.created_at, User.username, User.avatar, CommentPath.path, CommentPath.depth, CommentPath.reply_count
+    ).join(CommentPath, CommentPath.comment_id == Comment.id).outerjoin(User, User.id == Comment.author_id).filter(
+        CommentPath.post_id == post_id)
+
+def comment_item(row):
+    return {
+        'id': row.id,
+        'post_id': row.post_id,
+        'author_id': row.author_id,
+        'author': row.username or '未知用户',
+        'avatar': row.avatar or '/static/images/default.jpg',
+        'content': row.content,
+        'parent_id': row.parent_id,
+        'is_pinned': bool(row.is_pinned),
+        'created_at': row.created_at,
+        'depth': row.depth,
+        'reply_count': row.reply_count,
+        'children': []
+    }
+
+def nest_comment_rows(rows):
+    """把按 path 排好序的一页评论组装成树；父评论不在本页的（续页）作为本页的根"""
+    items, roots = {}, []
+    for row in rows:
+        item = comment_item(row)
+        items[row.id] = item
+        parent = items.get(row.parent_id)
+        (parent['children'] if parent else roots).append(item)
+    return roots
+
+# ---------------------------- 帖子互动统计与热度 ----------------------------
+# Reaction.type -> PostStats 计数字段（unuseful/reward 等不参与计数）
+REACTION_COUNTERS = {'like': 'like_count', 'favorite': 'favorite_count', 'repost': 'repost_count', 'useful': 'useful_count'}
+POST_STAT_FIELDS = ('like_count', 'favorite_count', 'repost_count', 'useful_count', 'comment_count', 'view_count')
+
+def post_hot_score(counts, created_at) -> float:
+    """按互动加权分与发布时间计算热度，分数不随时间变化，新帖自然排在同等互动的旧帖之前"""
+    weights = app.config['POST_ENGAGEMENT_WEIGHTS']
+    engagement = sum(counts.get(field, 0) * weight for field, weight in weights.items())
+    try:
+        created_ts = datetime.strptime(created_at or '', "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        created_ts = 0.0
+    return round(math.log10(max(engagement, 1)) + created_ts / app.config['POST_HOT_GRAVITY_SECONDS'], 7)
+
+def create_post_stats(post):
+    """发帖时创建统计行（由调用方提交事务）"""
+    db.session.add(PostStats(post_id=post.id, hot_score=post_hot_score({}, post.created_at)))
+
+def bump_post_stats(post_id, **deltas):
+    """原子地增减计数（如 comment_count=1），涉及加权字段时顺带重算热度（由调用方提交事务）"""
+    values = {field: getattr(PostStats, field) + delta for field, delta in deltas.items()}
+    updated = db.session.execute(
+        db.update(PostStats).where(PostStats.post_id == post_id).values(**values)
+    ).rowcount
+    if not updated:
+        # 统计行缺失（升级前的旧帖子）：按原始表重算一行
+        reconcile_post_stats([post_id])
+        return
+    weights = app.config['POST_ENGAGEMENT_WEIGHTS']
+    if any(field in weights for field in deltas):
+        row = db.session.query(*[getattr(PostStats, f) for f in weights], Post.created_at).join(
+            Post, Post.id == PostStats.post_id).filter(PostStats.post_id == post_id).one()
+        hot_score = post_hot_score(dict(zip(weights, row[:-1])), row[-1])
+        db.session.execute(db.update(PostStats).where(PostStats.post_id == post_id).values(hot_score=hot_score))
+
+def count_post_engagement(post_ids=None):
+    """从 PostReaction 互动状态表 / Comment 原始表聚合出各帖子的计数"""
+    counts = {}
+    reaction_query = db.session.query(PostReaction.post_id, PostReaction.type, db.func.count()).filter(
+        PostReaction.type.in_(list(REACTION_COUNTERS)))
+    comment_query = db.session.query(Comment.post_id, db.func.count(Comment.id))
+    if post_ids is not None:
+        reaction_query = reaction_query.filter(PostReaction.post_id.in_(post_ids))
+        comment_query = comment_query.filter(Comment.post_id.in_(post_ids))
+    for post_id, rtype, n in reaction_query.group_by(PostReaction.post_id, PostReaction.type):
+        counts.setdefault(post_id, {})[REACTION_COUNTERS[rtype]] = n
+    for post_id, n in comment_query.group_by(Comment.post_id):
+        counts.setdefault(post_id, {})['comment_count'] = n
+    return counts
+
+def reconcile_post_stats(post_ids=None, fix=True, batch_size=1000):
+    """按原始表重算计数与热度，返回 (检查的帖子数, 有偏差的帖子列表)；view_count 没有原始表，保留现值
+    重算结果已包含尚未写回的互动增量，修正时一并删除这些帖子的增量日志"""
+    checked = 0
+    drifted = []
+    last_id = 0
+    while True:
+        query = db.session.query(Post.id, Post.created_at).filter(Post.id > last_id)
+        if post_ids is not None:
+            query = query.filter(Post.id.in_(post_ids))
+        batch = query.order_by(Post.id.asc()).limit(batch_size).all()
+        if not batch:
+            break
+        ids = [p.id for p in batch]
+        expected = count_post_engagement(ids)
+        existing = {s.post_id: s for s in PostStats.query.filter(PostStats.post_id.in_(ids))}
+        for post_id, created_at in batch:
+            counts = expected.get(post_id, {})
+            stats = existing.get(post_id)
+            if stats is None:
+                drift = {field: (None, counts.get(field, 0)) for field in POST_STAT_FIELDS if field != 'view_count'}
+                stats = PostStats(post_id=post_id, view_count=0)
+                if fix:
+                    db.session.add(stats)
+            else:
+                drift = {field: (getattr(stats, field), counts.get(field, 0))
+                         for field in POST_STAT_FIELDS
+                         if field != 'view_count' and getattr(stats, field) != counts.get(field, 0)}
+            if drift:
+                drifted.append((post_id, drift))
+            if fix:
+                for field in POST_STAT_FIELDS:
+                    if field != 'view_count':
+                        setattr(stats, field, counts.get(field, 0))
+                counts['view_count'] = stats.view_count or 0
+                stats.hot_score = post_hot_score(counts, created_at)
+        if fix:
+            PostReactionDelta.query.filter(PostReactionDelta.post_id.in_(ids)).delete(synchronize_session=False)
+            db.session.flush()
+        checked += len(batch)
+        last_id = batch[-1].id
+    return checked, drifted
+
+# ---------------------------- 帖子互动（幂等切换 + 计数攒批写回） ----------------------------
+# 点赞等互动只写状态表 post_reaction（主键去重）和增量日志 post_reaction_delta，不在请求里更新 post_stats 热点行；
+# 后台线程每隔 REACTION_FLUSH_INTERVAL 秒把日志按帖子汇总后一次写回。读取计数时叠加本进程已提交、尚未写回的增量，
+# 其他进程的增量最多延迟一个写回间隔可见。
+TOGGLE_REACTIONS = tuple(REACTION_COUNTERS) + ('unuseful',)
+
+def set_post_reaction(user_id, post_id, rtype, active=None):
+    """设置用户对帖子的互动状态（active 为 None 时切换），返回 (当前是否处于该状态, 是否有变化)（由调用方提交事务）
+    并发重复点击时主键冲突或删除 0 行即视为无变化，计数增量只记一次"""
+    key = (PostReaction.user_id == user_id, PostReaction.post_id == post_id, PostReaction.type == rtype)
+    if active is None:
+        active = not db.session.query(PostReaction.query.filter(*key).exists()).scalar()
+    if active:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(PostReaction.__table__.insert(), {
+                    'user_id': user_id, 'post_id': post_id, 'type': rtype,
+                    'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+        except IntegrityError:
+            return True, False
+    elif not PostReaction.query.filter(*key).delete(synchronize_session=False):
+        return False, False
+    if rtype in REACTION_COUNTERS:
+        delta = PostReactionDelta(post_id=post_id, type=rtype, delta=1 if active else -1)
+        db.session.add(delta)
+        db.session.flush()
+        db.session.info.setdefault('reaction_deltas', []).append((delta.id, post_id, rtype, delta.delta))
+    return active, True
+
+@db.event.listens_for(db.session, 'after_commit')
+def record_reaction_deltas_after_commit(session):
+    reaction_counter.record(session.info.pop('reaction_deltas', ()))
+
+@db.event.listens_for(db.session, 'after_soft_rollback')
+def discard_reaction_deltas_after_rollback(session, previous_transaction):
+    # 主键冲突只回滚保存点，外层事务里已记下的增量仍然有效
+    if not previous_transaction.nested:
+        session.info.pop('reaction_deltas', None)
+
+class ReactionCounter:
+    """互动计数写回器：内存里按帖子汇总已提交未写回的增量供读取，后台线程定时把增量日志批量回放到 post_stats"""
+    
+    def __init__(self, interval=2.0, batch_size=5000):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._pending = {}  # 增量日志 ID -> (post_id, type, delta)
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def record(self, entries):
+        entries = list(entries)
+        if not entries:
+            return
+        with self._lock:
+            for delta_id, post_id, rtype, delta in entries:
+                self._pending[delta_id] = (post_id, rtype, delta)
+        self._start()
+    
+    def pending_counts(self, post_ids):
+        """本进程尚未写回的增量，返回 {post_id: {type: delta}}"""
+        wanted = set(post_ids)
+        result = {}
+        with self._lock:
+            for post_id, rtype, delta in self._pending.values():
+                if post_id in wanted:
+                    counts = result.setdefault(post_id, {})
+                    counts[rtype] = counts.get(rtype, 0) + delta
+        return result
+    
+    def flush(self):
+        """把增量日志回放到 post_stats，直到日志为空，返回回放的条数"""
+        total = 0
+        with app.app_context():
+            while True:
+                replayed = self._replay_batch()
+                total += replayed
+                if replayed < self.batch_size:
+                    break
+            self._forget_applied()
+        return total
+    
+    def shutdown(self, timeout=10):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"互动计数写回失败：{str(e)}")
+    
+    def _replay_batch(self):
+        rows = db.session.query(PostReactionDelta.id, PostReactionDelta.post_id, PostReactionDelta.type,
+                                PostReactionDelta.delta).order_by(PostReactionDelta.id.asc()).limit(self.batch_size).all()
+        if not rows:
+            return 0
+        # 先删日志（取得写锁），删除条数与读到的不一致说明其他进程正在回放同一批，本轮放弃
+        deleted = PostReactionDelta.query.filter(PostReactionDelta.id <= rows[-1].id).delete(synchronize_session=False)
+        if deleted != len(rows):
+            db.session.rollback()
+            return 0
+        sums = {}
+        for _, post_id, rtype, delta in rows:
+            field = REACTION_COUNTERS[rtype]
+            sums.setdefault(post_id, {})[field] = sums.get(post_id, {}).get(field, 0) + delta
+        for post_id, deltas in sums.items():
+            deltas = {field: delta for field, delta in deltas.items() if delta}
+            if deltas:
+                bump_post_stats(post_id, **deltas)
+        # 净增的互动按热度权重计入帖子标签的热门度
+        weights = app.config['POST_ENGAGEMENT_WEIGHTS']
+        record_post_tag_trend({post_id: sum(weights.get(field, 0) * delta for field, delta in deltas.items() if delta > 0)
+                               for post_id, deltas in sums.items()})
+        db.session.commit()
+        return len(rows)
+    
+    def _forget_applied(self):
+        """丢弃已不在日志里的内存增量（已由本进程或其他进程写回）"""
+        with self._lock:
+            if not self._pending:
+                return
+            ids = sorted(self._pending)
+        remaining = {delta_id for (delta_id,) in db.session.query(PostReactionDelta.id).filter(
+            PostReactionDelta.id.between(ids[0], ids[-1]))}
+        with self._lock:
+            for delta_id in ids:
+                if delta_id not in remaining:
+                    self._pending.pop(delta_id, None)
+    
+    def _start(self):
+        if self._thread:
+            return
+        with self._lock:
+            if self._thread or self._stop.is_set():
+                return
+            self._thread = threading.Thread(target=self._worker, name='reaction-counter', daemon=True)
+            self._thread.start()
+    
+    def _worker(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"互动计数写回失败：{str(e)}")
+
+reaction_counter = ReactionCounter(
+    interval=app.config['REACTION_FLUSH_INTERVAL'],
+    batch_size=app.config['REACTION_FLUSH_BATCH']
+)
+atexit.register(reaction_counter.shutdown)
+
+def post_reaction_summary(post_ids, user_id=None):
+    """一页帖子的互动计数与当前用户已做的互动，返回 ({post_id: {type: 数量}}, {post_id: [type, ...]})
+    计数取 post_stats 并叠加本进程尚未写回的增量；整页共两条 SQL"""
+    post_ids = list(post_ids)
+    fields = [(rtype, getattr(PostStats, field)) for rtype, field in REACTION_COUNTERS.items()]
+    counts = {post_id: {rtype: 0 for rtype in REACTION_COUNTERS} for post_id in post_ids}
+    mine = {post_id: [] for post_id in post_ids}
+    if not post_ids:
+        return counts, mine
+    for row in db.session.query(PostStats.post_id, *[column for _, column in fields]).filter(PostStats.post_id.in_(post_ids)):
+        counts[row[0]].update({rtype: value or 0 for (rtype, _), value in zip(fields, row[1:])})
+    for post_id, deltas in reaction_counter.pending_counts(post_ids).items():
+        for rtype, delta in deltas.items():
+            counts[post_id][rtype] = max(0, counts[post_id][rtype] + delta)
+    if user_id:
+        for post_id, rtype in db.session.query(PostReaction.post_id, PostReaction.type).filter(
+                PostReaction.user_id == user_id, PostReaction.post_id.in_(post_ids)):
+            mine[post_id].append(rtype)
+    return counts, mine
+
+# ---------------------------- 浏览计数（分段内存计数 + HyperLogLog 独立访客） ----------------------------
+# 详情页每次浏览只在内存里加一，并把访客写进当天的 HyperLogLog；后台线程每隔 VIEW_FLUSH_INTERVAL 秒合并写回
+# content_view_daily 与 post_stats.view_count。进程崩溃会丢失最多一个写回间隔内的浏览，读取时叠加本进程未写回的部分。
+VIEW_TARGETS = ('post', 'activity')
+HLL_PRECISION = app.config['VIEW_HLL_PRECISION']
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+def hll_add(registers, visitor):
+    """把访客加入 HyperLogLog 寄存器（bytearray，原地修改）"""
+    h = int.from_bytes(hashlib.blake2b(str(visitor).encode('utf-8'), digest_size=8).digest(), 'big')
+    index = h >> (64 - HLL_PRECISION)
+    rest = h & ((1 << (64 - HLL_PRECISION)) - 1)
+    rank = (64 - HLL_PRECISION) - rest.bit_length() + 1
+    if rank > registers[index]:
+        registers[index] = rank
+
+def hll_merge(*sketches):
+    """合并多个寄存器（bytes/bytearray/None），返回 bytes；并集的估计即各寄存器逐位取最大"""
+    merged = np.zeros(HLL_REGISTERS, dtype=np.uint8)
+    for sketch in sketches:
+        if sketch and len(sketch) == HLL_REGISTERS:
+            np.maximum(merged, np.frombuffer(bytes(sketch), dtype=np.uint8), out=merged)
+    return merged.tobytes()
+
+def hll_estimate(sketch) -> int:
+    """估计寄存器中的不同访客数（小基数时用线性计数修正）"""
+    if not sketch:
+        return 0
+    registers = np.frombuffer(bytes(sketch), dtype=np.uint8)
+    m = float(HLL_REGISTERS)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.power(2.0, -registers.astype(np.float64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
+
+def view_visitor_key():
+    """独立访客标识：登录用户按用户 ID，未登录按 IP + User-Agent"""
+    user_id = session.get('user_id')
+    if user_id:
+        return f'u:{user_id}'
+    return f'a:{request.remote_addr}:{request.headers.get("User-Agent", "")}'
+
+class ViewCounter:
+    """浏览计数器：按 (类型, ID, 日期) 分段加锁累加次数与 HyperLogLog，后台线程定时合并写库"""
+    
+    def __init__(self, stripes=16, interval=5.0):
+        self.interval = interval
+        self._stripes = [(threading.Lock(), {}) for _ in range(max(1, stripes))]
+        self._inflight = {}  # 正在写回、尚未提交的部分，读取时同样要叠加
+        self._flush_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def record(self, target_type, target_id, visitor, day=None):
+        key = (target_type, target_id, day or datetime.now().strftime("%Y-%m-%d"))
+        lock, pending = self._stripes[hash(key) % len(self._stripes)]
+        with lock:
+            entry = pending.get(key)
+            if entry is None:
+                entry = pending[key] = [0, bytearray(HLL_REGISTERS)]
+            entry[0] += 1
+            hll_add(entry[1], visitor)
+        self._start()
+    
+    def pending(self, target_type, target_ids):
+        """本进程尚未写回的浏览，返回 {(target_id, day): (次数, 寄存器)}"""
+        wanted = set(target_ids)
+        result = {}
+        sources = [(lock, pending) for lock, pending in self._stripes] + [(self._lock, self._inflight)]
+        for lock, pending in sources:
+            with lock:
+                for (rtype, target_id, day), (count, registers) in pending.items():
+                    if rtype == target_type and target_id in wanted:
+                        previous = result.get((target_id, day), (0, None))
+                        result[(target_id, day)] = (previous[0] + count, hll_merge(previous[1], registers))
+        return result
+    
+    def flush(self):
+        """把内存中的浏览写回数据库，返回写回的 (类型, ID, 日期) 条数"""
+        with self._flush_lock:
+            batch = {}
+            for lock, pending in self._stripes:
+                with lock:
+                    batch.update(pending)
+                    pending.clear()
+            if not batch:
+                return 0
+            with self._lock:
+                self._inflight = batch
+            try:
+                with app.app_context():
+                    self._write(batch)
+            except Exception:
+                # 写库失败：放回内存，下一轮重试
+                for key, (count, registers) in batch.items():
+                    lock, pending = self._stripes[hash(key) % len(self._stripes)]
+                    with lock:
+                        entry = pending.setdefault(key, [0, bytearray(HLL_REGISTERS)])
+                        entry[0] += count
+                        entry[1] = bytearray(hll_merge(entry[1], registers))
+                raise
+            finally:
+                with self._lock:
+                    self._inflight = {}
+            return len(batch)
+    
+    def shutdown(self, timeout=10):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"浏览计数写回失败：{str(e)}")
+    
+    def _write(self, batch):
+        # 写回前已删除的帖子/活动，其浏览直接丢弃
+        alive = {}
+        for target_type, model in (('post', Post), ('activity', Activity)):
+            ids = {target_id for rtype, target_id, _ in batch if rtype == target_type}
+            alive[target_type] = {row[0] for row in db.session.query(model.id).filter(model.id.in_(ids))} if ids else set()
+        # 先做原子累加（SQLite 下同时拿到写锁），再读出寄存器合并，避免多进程同时写回时丢失对方的访客
+        merge_keys = []
+        post_views = {}
+        for (target_type, target_id, day), (count, registers) in batch.items():
+            if target_id not in alive.get(target_type, ()):
+                continue
+            key = (ContentViewDaily.target_type == target_type, ContentViewDaily.target_id == target_id,
+                   ContentViewDaily.day == day)
+            updated = db.session.execute(db.update(ContentViewDaily).where(*key).values(
+                view_count=ContentViewDaily.view_count + count)).rowcount
+            if not updated:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(ContentViewDaily.__table__.insert(), {
+                            'target_type': target_type, 'target_id': target_id, 'day': day,
+                            'view_count': count, 'visitors': bytes(registers)})
+                except IntegrityError:
+                    db.session.execute(db.update(ContentViewDaily).where(*key).values(
+                        view_count=ContentViewDaily.view_count + count))
+                    merge_keys.append((key, registers))
+            else:
+                merge_keys.append((key, registers))
+            if target_type == 'post':
+                post_views[target_id] = post_views.get(target_id, 0) + count
+        for key, registers in merge_keys:
+            stored = db.session.query(ContentViewDaily.visitors).filter(*key).scalar()
+            db.session.execute(db.update(ContentViewDaily).where(*key).values(visitors=hll_merge(stored, registers)))
+        for post_id, count in post_views.items():
+            bump_post_stats(post_id, view_count=count)
+        db.session.commit()
+    
+    def _start(self):
+        if self._thread:
+            return
+        with self._lock:
+            if self._thread or self._stop.is_set():
+                return
+            self._thread = threading.Thread(target=self._worker, name='view-counter', daemon=True)
+            self._thread.start()
+    
+    def _worker(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"浏览计数写回失败：{str(e)}")
+
+view_counter = ViewCounter(
+    stripes=app.config['VIEW_COUNTER_STRIPES'],
+    interval=app.config['VIEW_FLUSH_INTERVAL']
+)
+atexit.register(view_counter.shutdown)
+
+def record_view(target_type, target_id):
+    """记录一次详情页浏览（只写内存）"""
+    view_counter.record(target_type, target_id, view_visitor_key())
+
+def view_counts(target_type, target_ids):
+    """累计浏览数（含本进程未写回的部分），返回 {target_id: 次数}；帖子取 post_stats，活动按天汇总"""
+    target_ids = list(target_ids)
+    counts = {target_id: 0 for target_id in target_ids}
+    if not target_ids:
+        return counts
+    if target_type == 'post':
+        rows = db.session.query(PostStats.post_id, PostStats.view_count).filter(PostStats.post_id.in_(target_ids))
+    else:
+        rows = db.session.query(ContentViewDaily.target_id, db.func.sum(ContentViewDaily.view_count)).filter(
+            ContentViewDaily.target_type == target_type, ContentViewDaily.target_id.in_(target_ids)
+        ).group_by(ContentViewDaily.target_id)
+    for target_id, count in rows:
+        counts[target_id] = count or 0
+    for (target_id, _), (count, _) in view_counter.pending(target_type, target_ids).items():
+        counts[target_id] += count
+    return counts
+
+def view_report(target_type, target_id, days=7):
+    """最近 days 天（含今天）的逐日浏览次数、独立访客估计，以及整个区间的独立访客（各天寄存器取并集）"""
+    today = datetime.now().date()
+    first_day = (today - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    by_day = {}
+    for day, count, visitors in db.session.query(ContentViewDaily.day, ContentViewDaily.view_count, ContentViewDaily.visitors).filter(
+            ContentViewDaily.target_type == target_type, ContentViewDaily.target_id == target_id,
+            ContentViewDaily.day >= first_day):
+        by_day[day] = (count or 0, visitors)
+    for (_, day), (count, registers) in view_counter.pending(target_type, [target_id]).items():
+        if day >= first_day:
+            stored = by_day.get(day, (0, None))
+            by_day[day] = (stored[0] + count, hll_merge(stored[1], registers))
+    daily = []
+    for offset in range(days - 1, -1, -1):
+        day = (today - timedelta(days=offset)).strftime("%Y-%m-%d")
+        count, visitors = by_day.get(day, (0, None))
+        daily.append({'day': day, 'views': count, 'unique_viewers': hll_estimate(visitors)})
+    return {
+        'views': sum(item['views'] for item in daily),
+        'unique_viewers': hll_estimate(hll_merge(*[visitors for _, visitors in by_day.values()])),
+        'daily': daily
+    }
+
+# ---------------------------- 活动推荐（标签倒排索引 + 向量化打分） ----------------------------
+
+def index_activity_tags(activity):
+    """按 activity.tags 重建单个活动的标签倒排索引（由调用方提交事务）"""
+    ActivityTag.query.filter_by(activity_id=activity.id).delete(synchronize_session=False)
+    db.session.add_all([ActivityTag(tag=tag, activity_id=activity.id) for tag in parse_tags(activity.tags)])
+
+def rebuild_activity_tag_index(batch_size: int = 1000) -> int:
+    """离线重建全部活动的标签倒排索引，返回处理的活动数"""
+    ActivityTag.query.delete(synchronize_session=False)
+    db.session.commit()
+    total = 0
+    last_id = 0
+    while True:
+        batch = db.session.query(Activity.id, Activity.tags).filter(Activity.id > last_id).order_by(
+            Activity.id.asc()).limit(batch_size).all()
+        if not batch:
+            break
+        rows = [{'tag': tag, 'activity_id': activity_id} for activity_id, tags in batch for tag in parse_tags(tags)]
+        if rows:
+            db.session.execute(ActivityTag.__table__.insert(), rows)
+        db.session.commit()
+        total += len(batch)
+        last_id = batch[-1].id
+    activity_recommender.invalidate()
+    return total
+
+class ActivityRecommender:
+    """按用户缓存推荐结果（LRU + TTL）。活动增删时整体失效（版本号），兴趣/报名/收藏变化时按用户失效。
+
+    缓存在进程内，多 worker 部署时其他进程的失效最多延迟 ACTIVITY_RECOMMEND_CACHE_TTL 秒。
+    """
+
+    def __init__(self, max_size=2048, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._cache = OrderedDict()
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry is None:
+                return None
+            version, expires_at, result = entry
+            if version != self._version or expires_at < time.monotonic():
+                del self._cache[user_id]
+                return None
+            self._cache.move_to_end(user_id)
+            return result
+
+    def put(self, user_id, result, version):
+        with self._lock:
+            if version != self._version:
+                return  # 计算期间发生了整体失效，结果作废
+            self._cache[user_id] = (version, time.monotonic() + self.ttl, result)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def version(self):
+        return self._version
+
+    def invalidate(self, user_id=None):
+        """user_id 为空时清空全部缓存"""
+        with self._lock:
+            if user_id is None:
+                self._version += 1
+                self._cache.clear()
+            else:
+                self._cache.pop(user_id, None)
+
+activity_recommender = ActivityRecommender(app.config['ACTIVITY_RECOMMEND_CACHE_SIZE'],
+                                           app.config['ACTIVITY_RECOMMEND_CACHE_TTL'])
+
+def score_activities(user_id, hobbies, limit):
+    """从倒排索引取候选活动并向量化打分，返回 [(activity_id, score)]（按分数降序）
+
+    分数 = 兴趣标签命中比例、与历史报名/收藏活动的标签重合度、报名人数（对数归一化）、
+    发布新鲜度（指数衰减）的加权和；已报名的活动不再推荐。
+    """
+    weights = app.config['ACTIVITY_RECOMMEND_WEIGHTS']
+    joined_ids = {row[0] for row in db.session.query(activity_participants.c.activity_id).filter(
+        activity_participants.c.user_id == user_id)}
+    favorite_ids = {row[0] for row in db.session.query(activity_favorites.c.activity_id).filter(
+        activity_favorites.c.user_id == user_id)}
+    
+    # 历史偏好：报名过的活动标签权重 1，收藏过的 0.5
+    history = {}
+    history_ids = list(joined_ids | favorite_ids)
+    if history_ids:
+        for tag, activity_id in db.session.query(ActivityTag.tag, ActivityTag.activity_id).filter(
+                ActivityTag.activity_id.in_(history_ids)):
+            history[tag] = history.get(tag, 0.0) + (1.0 if activity_id in joined_ids else 0.5)
+    
+    hobby_set = set(hobbies)
+    query_tags = list(hobby_set | set(history))
+    if query_tags:
+        pairs = db.session.query(ActivityTag.activity_id, ActivityTag.tag).filter(ActivityTag.tag.in_(query_tags)).all()
+    else:
+        # 冷启动：没有兴趣也没有历史，按热度与新鲜度在最近的活动中挑选
+        pairs = [(row[0], None) for row in db.session.query(Activity.id).order_by(Activity.id.desc()).limit(500)]
+    pairs = [(activity_id, tag) for activity_id, tag in pairs if activity_id not in joined_ids]
+    if not pairs:
+        return []
+    
+    candidate_ids = sorted({activity_id for activity_id, _ in pairs})
+    position = {activity_id: i for i, activity_id in enumerate(candidate_ids)}
+    idx = np.fromiter((position[activity_id] for activity_id, _ in pairs), dtype=np.int64, count=len(pairs))
+    hobby_hits = np.fromiter((tag in hobby_set for _, tag in pairs), dtype=np.float64, count=len(pairs))
+    history_hits = np.fromiter((history.get(tag, 0.0) for _, tag in pairs), dtype=np.float64, count=len(pairs))
+    
+    hobby_score = np.zeros(len(candidate_ids))
+    history_score = np.zeros(len(candidate_ids))
+    np.add.at(hobby_score, idx, hobby_hits)
+    np.add.at(history_score, idx, history_hits)
+    hobby_score /= max(len(hobby_set), 1)
+    if history:
+        history_score /= max(history.values()) * len(history)
+    
+    counts = np.zeros(len(candidate_ids))
+    created = np.zeros(len(candidate_ids))
+    for activity_id, participant_count, created_at in db.session.query(
+            Activity.id, Activity.participant_count, Activity.created_at).filter(Activity.id.in_(candidate_ids)):
+        i = position[activity_id]
+        counts[i] = participant_count or 0
+        try:
+            created[i] = datetime.strptime(created_at or '', "%Y-%m-%d %H:%M:%S").timestamp()
+        except ValueError:
+            created[i] = 0.0
+    popularity = np.log1p(counts) / max(np.log1p(counts.max()), 1.0)
+    age_days = np.maximum(time.time() - created, 0.0) / 86400.0
+    recency = np.exp(-age_days / app.config['ACTIVITY_RECENCY_DAYS'])
+    
+    scores = (weights['hobby'] * hobby_score + weights['history'] * history_score
+              + weights['popularity'] * popularity + weights['recency'] * recency)
+    k = min(limit, len(candidate_ids))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.lexsort((-np.asarray(candidate_ids)[top], -scores[top]))]
+    return [(candidate_ids[i], round(float(scores[i]), 4)) for i in top]
+
+# ---------------------------- 好友推荐（可能认识的人） ----------------------------
+# 批量任务把每个用户表示成一行稀疏特征：兴趣标签（按稀有度加权）、专业、同专业同年级、好友、参加过的活动、所在小组。
+# 两个用户的匹配分就是加权特征向量的点积（好友列对应共同好友数），按 USER_SUGGESTION_BLOCK_SIZE 分批做
+# 稀疏矩阵乘法，每行取前 K 个写入 UserSuggestion。单独的年级不作为特征：它几乎把全体用户连成稠密矩阵，区分度也很低。
+
+def one_hot_matrix(row_keys, n):
+    """row_keys: [(行号, 键)] -> (n × 键数) 的 0/1 稀疏矩阵"""
+    vocab = {}
+    rows, cols = [], []
+    for i, key in row_keys:
+        rows.append(i)
+        cols.append(vocab.setdefault(key, len(vocab)))
+    matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n, max(len(vocab), 1)))
+    matrix.data[:] = 1.0  # 重复的 (行, 键) 只算一次
+    return matrix
+
+def build_user_match_features():
+    """从数据库构建匹配特征，返回 (用户 ID 列表, {信号名: 0/1 稀疏矩阵}, 排除矩阵)"""
+    users = db.session.query(User.id, User.hobbies, User.major, User.grade).order_by(User.id).all()
+    ids = [u.id for u in users]
+    position = {user_id: i for i, user_id in enumerate(ids)}
+    n = len(ids)
+    
+    hobbies, majors, classmates = [], [], []
+    for i, u in enumerate(users):
+        hobbies.extend((i, tag) for tag in parse_tags(u.hobbies))
+        major = (u.major or '').strip()
+        grade = (u.grade or '').strip()
+        if major:
+            majors.append((i, major))
+            if grade:
+                classmates.append((i, f'{major}|{grade}'))
+    
+    friend_pairs, exclude_pairs = [], [(i, i) for i in range(n)]
+    for user1_id, user2_id, status in db.session.query(Friendship.user1_id, Friendship.user2_id, Friendship.status):
+        if user1_id in position and user2_id in position:
+            a, b = position[user1_id], position[user2_id]
+            # 已是好友或有未处理的请求，都不再推荐
+            if status in ('accepted', 'pending'):
+                exclude_pairs.extend([(a, b), (b, a)])
+            if status == 'accepted':
+                friend_pairs.extend([(a, b), (b, a)])
+    
+    activities = [(position[user_id], activity_id) for user_id, activity_id in db.session.query(
+        activity_participants.c.user_id, activity_participants.c.activity_id) if user_id in position]
+    groups = [(position[user_id], group_id) for user_id, group_id in db.session.query(
+        group_members.c.user_id, group_members.c.group_id) if user_id in position]
+    
+    friends = sparse.csr_matrix((np.ones(len(friend_pairs)), tuple(zip(*friend_pairs)) or ([], [])), shape=(n, n))
+    friends.data[:] = 1.0
+    exclude = sparse.csr_matrix((np.ones(len(exclude_pairs)), tuple(zip(*exclude_pairs)) or ([], [])), shape=(n, n))
+    exclude.data[:] = 1.0
+    features = {
+        'hobby': one_hot_matrix(hobbies, n),
+        'major': one_hot_matrix(majors, n),
+        'classmate': one_hot_matrix(classmates, n),
+        'mutual_friend': friends,
+        'activity': one_hot_matrix(activities, n),
+        'group': one_hot_matrix(groups, n),
+    }
+    return ids, features, exclude
+
+def weighted_match_matrix(features):
+    """把各信号按权重拼成一个矩阵，使行向量点积等于加权匹配分（兴趣标签再按 1/log2(1+使用人数) 降低热门标签的权重）"""
+    weights = app.config['USER_MATCH_WEIGHTS']
+    blocks = []
+    for name, matrix in features.items():
+        column_weights = np.full(matrix.shape[1], weights[name])
+        if name == 'hobby':
+            df = np.asarray(matrix.sum(axis=0)).ravel()
+            column_weights = column_weights / np.log2(1 + np.maximum(df, 1))
+        blocks.append(matrix @ sparse.diags(np.sqrt(column_weights)))
+    return sparse.hstack(blocks, format='csr')
+
+def compute_user_suggestions(user_ids=None, top_k=None):
+    """批量计算好友推荐并写入 UserSuggestion；user_ids 为空时计算全部用户，返回写入的候选条数"""
+    top_k = top_k or app.config['USER_SUGGESTION_TOP_K']
+    ids, features, exclude = build_user_match_features()
+    if not ids:
+        return 0
+    position = {user_id: i for i, user_id in enumerate(ids)}
+    targets = np.arange(len(ids)) if user_ids is None else np.array(
+        sorted(position[u] for u in user_ids if u in position), dtype=np.int64)
+    matrix = weighted_match_matrix(features)
+    matrix_t = matrix.T.tocsc()
+    
+    sources, candidates, scores = [], [], []
+    block_size = app.config['USER_SUGGESTION_BLOCK_SIZE']
+    for start in range(0, len(targets), block_size):
+        block_rows = targets[start:start + block_size]
+        block = (matrix[block_rows] @ matrix_t).tocsr()
+        for r, row in enumerate(block_rows):
+            lo, hi = block.indptr[r], block.indptr[r + 1]
+            cols, vals = block.indices[lo:hi], block.data[lo:hi]
+            excluded = exclude.indices[exclude.indptr[row]:exclude.indptr[row + 1]]
+            # 先取前 K + 排除人数个，再去掉自己、好友和有未处理请求的人，避免对整行做集合运算
+            wanted = top_k + len(excluded)
+            if len(cols) > wanted:
+                keep = np.argpartition(-vals, wanted - 1)[:wanted]
+                cols, vals = cols[keep], vals[keep]
+            keep = ~np.isin(cols, excluded, assume_unique=True)
+            cols, vals = cols[keep], vals[keep]
+            if len(cols) > top_k:
+                keep = np.argpartition(-vals, top_k - 1)[:top_k]
+                cols, vals = cols[keep], vals[keep]
+            if not len(cols):
+                continue
+            sources.append(np.full(len(cols), row))
+            candidates.append(cols)
+            scores.append(vals)
+    
+    source_idx = np.concatenate(sources) if sources else np.array([], dtype=np.int64)
+    candidate_idx = np.concatenate(candidates) if candidates else np.array([], dtype=np.int64)
+    score_values = np.concatenate(scores) if scores else np.array([])
+    
+    # 只对入选的用户对计算展示用的各项重合数
+    def overlap(name):
+        if not len(source_idx):
+            return np.array([], dtype=np.int64)
+        matrix = features[name]
+        return np.asarray(matrix[source_idx].multiply(matrix[candidate_idx]).sum(axis=1)).ravel().astype(np.int64)
+    counts = {name: overlap(name) for name in features}
+    
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    target_ids = [ids[i] for i in targets]
+    for start in range(0, len(target_ids), 500):
+        UserSuggestion.query.filter(UserSuggestion.user_id.in_(target_ids[start:start + 500])).delete(
+            synchronize_session=False)
+    rows = zip(
+        (ids[u] for u in source_idx.tolist()),
+        (ids[c] for c in candidate_idx.tolist()),
+        np.round(score_values, 4).tolist(),
+        counts['mutual_friend'].tolist(),
+        counts['hobby'].tolist(),
+        counts['activity'].tolist(),
+        counts['group'].tolist(),
+        (counts['major'] > 0).tolist(),
+        (counts['classmate'] > 0).tolist(),
+        itertools.repeat(now)
+    )
+    columns = ['user_id', 'candidate_id', 'score', 'mutual_friends', 'shared_hobbies', 'shared_activities',
+               'shared_groups', 'same_major', 'same_grade', 'updated_at']
+    bulk_insert_tuples(UserSuggestion.__table__, columns, rows)
+    db.session.commit()
+    return len(source_idx)
+
+def bulk_insert_tuples(table, columns, rows, batch_size=10000):
+    """大批量插入：绕过 ORM 的逐行参数处理，直接用 DBAPI executemany（由调用方提交事务）"""
+    compiled = table.insert().values({c: db.bindparam(c) for c in columns}).compile(dialect=db.engine.dialect)
+    order = compiled.positiontup if compiled.positional else None
+    cursor = db.session.connection().connection.cursor()
+    try:
+        batch = list(itertools.islice(rows, batch_size))
+        while batch:
+            if order is None:
+                params = [dict(zip(columns, row)) for row in batch]
+            else:
+                params = [tuple(row[columns.index(name)] for name in order) for row in batch] if order != columns else batch
+            cursor.executemany(str(compiled), params)
+            batch = list(itertools.islice(rows, batch_size))
+    finally:
+        cursor.close()
+
+def remove_user_suggestion_pair(user_a, user_b):
+    """两人成为好友或有请求往来后互相不再推荐（由调用方提交事务）"""
+    UserSuggestion.query.filter(db.or_(
+        db.and_(UserSuggestion.user_id == user_a, UserSuggestion.candidate_id == user_b),
+        db.and_(UserSuggestion.user_id == user_b, UserSuggestion.candidate_id == user_a)
+    )).delete(synchronize_session=False)
+
+def connected_user_ids(user_id):
+    """已是好友或有未处理请求的用户"""
+    rows = db.session.query(Friendship.user1_id, Friendship.user2_id).filter(
+        db.or_(Friendship.user1_id == user_id, Friendship.user2_id == user_id),
+        Friendship.status.in_(['accepted', 'pending'])
+    )
+    return {b if a == user_id else a for a, b in rows}
+
+def adjust_user_suggestions(user_id, peer_ids, field, delta, weight_name):
+    """user_id 与 peer_ids 之间新增/减少一项共同点时增量修正双向的已存候选；
+    delta > 0 时把尚未入选的 peer 作为 user_id 的新候选补入，再裁剪回前 K 个（由调用方提交事务）
+    peer_ids 可以是 ID 列表，也可以是查询 peer ID 的 Select（人数很多时在库内展开，不取回 Python）"""
+    if isinstance(peer_ids, db.Select):
+        peers = peer_ids.where(peer_ids.selected_columns[0] != user_id)
+        chunks = [peers]
+    else:
+        peer_ids = [p for p in set(peer_ids) if p != user_id]
+        if not peer_ids:
+            return
+        peers = None
+        chunks = [peer_ids[start:start + 500] for start in range(0, len(peer_ids), 500)]
+    weight = app.config['USER_MATCH_WEIGHTS'][weight_name]
+    values = {field: getattr(UserSuggestion, field) + delta, 'score': UserSuggestion.score + weight * delta}
+    for chunk in chunks:
+        db.session.execute(db.update(UserSuggestion).where(
+            UserSuggestion.user_id == user_id, UserSuggestion.candidate_id.in_(chunk)).values(**values))
+        db.session.execute(db.update(UserSuggestion).where(
+            UserSuggestion.user_id.in_(chunk), UserSuggestion.candidate_id == user_id).values(**values))
+    if delta <= 0:
+        return
+    
+    top_k = app.config['USER_SUGGESTION_TOP_K']
+    existing = {row[0] for row in db.session.query(UserSuggestion.candidate_id).filter(
+        UserSuggestion.user_id == user_id)}
+    excluded = connected_user_ids(user_id) | existing
+    if peers is not None:
+        # 只需取够 top_k 个未排除的 peer
+        peer_ids = [row[0] for row in db.session.execute(peers.limit(top_k + len(excluded)))]
+    new_peers = [p for p in peer_ids if p not in excluded][:top_k]
+    if not new_peers:
+        return
+    db.session.add_all([UserSuggestion(user_id=user_id, candidate_id=p, score=weight * delta, **{field: delta})
+                        for p in new_peers])
+    db.session.flush()
+    overflow = [row[0] for row in db.session.query(UserSuggestion.candidate_id).filter(
+        UserSuggestion.user_id == user_id).order_by(UserSuggestion.score.desc()).offset(top_k)]
+    if overflow:
+        UserSuggestion.query.filter(UserSuggestion.user_id == user_id,
+                                    UserSuggestion.candidate_id.in_(overflow)).delete(synchronize_session=False)
+
+def accepted_friend_ids(user_id):
+    rows = db.session.query(Friendship.user1_id, Friendship.user2_id).filter(
+        db.or_(Friendship.user1_id == user_id, Friendship.user2_id == user_id), Friendship.status == 'accepted')
+    return {b if a == user_id else a for a, b in rows}
+
+def on_friendship_changed(user_a, user_b, delta):
+    """a、b 成为好友（delta=1）或解除好友（delta=-1）后，修正双方与对方好友之间的共同好友数（由调用方提交事务）"""
+    if delta > 0:
+        remove_user_suggestion_pair(user_a, user_b)
+    friends_a = accepted_friend_ids(user_a) - {user_b}
+    friends_b = accepted_friend_ids(user_b) - {user_a}
+    adjust_user_suggestions(user_a, friends_b, 'mutual_friends', delta, 'mutual_friend')
+    adjust_user_suggestions(user_b, friends_a, 'mutual_friends', delta, 'mutual_friend')
+
+def on_activity_membership_changed(user_id, activity_id, delta):
+    """报名（delta=1）/取消报名（delta=-1）后修正与其他参与者之间的共同活动数（由调用方提交事务）"""
+    peers = db.select(activity_participants.c.user_id).where(activity_participants.c.activity_id == activity_id)
+    adjust_user_suggestions(user_id, peers, 'shared_activities', delta, 'activity')
+
+# ---------------------------- 好友关系图（进程内邻接表） ----------------------------
+# 用户 ID 映射为连续整数，每个用户的好友保存为有序 int32 数组（全量加载时共享一块连续内存）。
+# 共同好友数、一页结果的批量共同好友数和二度好友枚举都在内存中完成，不再逐对查询 Friendship 表。
+
+def count_mutual_friends(user_id, others):
+    """按 Friendship 表统计 user_id 与一批用户各自的共同好友数，返回 {用户ID: 数量}（好友关系图加载完成前使用）"""
+    counts = dict.fromkeys(others, 0)
+    mine = accepted_friend_ids(user_id)
+    if not counts or not mine:
+        return counts
+    # 只取这一批用户的好友关系（两侧用户列各走索引），与自己的好友求交集
+    for user_a, user_b in db.session.query(Friendship.user1_id, Friendship.user2_id).filter(
+            Friendship.status == 'accepted', db.or_(Friendship.user1_id.in_(counts), Friendship.user2_id.in_(counts))):
+        if user_a in counts and user_b in mine:
+            counts[user_a] += 1
+        if user_b in counts and user_a in mine:
+            counts[user_b] += 1
+    return counts
+
+class SocialGraph:
+    """好友关系图：启动后在后台从 Friendship 表加载，本进程内接受/删除好友时实时更新；
+    加载完成前共同好友数按 SQL 统计、二度好友返回空，不阻塞请求"""
+
+    def __init__(self, reload_seconds=600):
+        self.reload_seconds = reload_seconds
+        self._index = {}  # 用户 ID -> 整数编号
+        self._ids = []    # 整数编号 -> 用户 ID
+        self._adj = []    # 整数编号 -> 有序 int32 好友编号数组
+        self._loaded_at = None
+        self._pending = None  # 重新加载期间发生的增删，加载完成后重放
+        self._loader = None   # 后台加载线程
+        self._lock = threading.Lock()
+
+    def load(self, batch_size=100000):
+        """从 Friendship 表全量加载已接受的好友关系（需要应用上下文），返回边数"""
+        # 用单独的 DBAPI 连接分批读取：不影响当前请求的会话事务，也省去逐行构造 Row 对象
+        compiled = db.select(Friendship.user1_id, Friendship.user2_id).where(
+            Friendship.status == 'accepted').compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+        conn = db.engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(str(compiled))
+            return self.build(iter(lambda: cursor.fetchmany(batch_size), []))
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        finally:
+            conn.close()
+
+    def build(self, batches):
+        """用分批的 (用户ID, 用户ID) 边列表整体替换当前的图，返回边数"""
+        with self._lock:
+            if self._pending is None:
+                self._pending = []
+        index, ids = {}, []
+        src, dst = [], []
+        first, second = operator.itemgetter(0), operator.itemgetter(1)
+        for rows in batches:
+            if not rows:
+                continue
+            col_a, col_b = list(map(first, rows)), list(map(second, rows))
+            for user_id in set(col_a).union(col_b).difference(index):
+                index[user_id] = len(ids)
+                ids.append(user_id)
+            src.append(np.fromiter(map(index.__getitem__, col_a), dtype=np.int32, count=len(col_a)))
+            dst.append(np.fromiter(map(index.__getitem__, col_b), dtype=np.int32, count=len(col_b)))
+        a = np.concatenate(src) if src else np.empty(0, dtype=np.int32)
+        b = np.concatenate(dst) if dst else np.empty(0, dtype=np.int32)
+        # 每条边双向各存一次，按 (起点, 终点) 组合成一个整数排序后切成每个用户的视图
+        heads = np.concatenate([a, b]).astype(np.int64)
+        keys = np.sort(heads * max(len(ids), 1) + np.concatenate([b, a]))
+        tails = (keys % max(len(ids), 1)).astype(np.int32)
+        bounds = np.cumsum(np.bincount(heads, minlength=len(ids)))[:-1]
+        adj = np.split(tails, bounds) if ids else []
+        with self._lock:
+            self._index, self._ids, self._adj = index, ids, adj
+            pending, self._pending = self._pending or [], None
+            for add, user_a, user_b in pending:
+                self._apply(add, user_a, user_b)
+            self._loaded_at = time.monotonic()
+        return len(a)
+
+    def add_friendship(self, user_a, user_b):
+        self._update(True, user_a, user_b)
+
+    def remove_friendship(self, user_a, user_b):
+        self._update(False, user_a, user_b)
+
+    def _update(self, add, user_a, user_b):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((add, user_a, user_b))
+            if self._loaded_at is not None:
+                self._apply(add, user_a, user_b)
+
+    def _apply(self, add, user_a, user_b):
+        a, b = self._node(user_a), self._node(user_b)
+        for u, v in ((a, b), (b, a)):
+            arr = self._adj[u]
+            pos = int(np.searchsorted(arr, v))
+            present = pos < len(arr) and arr[pos] == v
+            # 整体替换数组，读线程拿到的要么是旧数组要么是新数组
+            if add and not present:
+                self._adj[u] = np.insert(arr, pos, v)
+            elif not add and present:
+                self._adj[u] = np.delete(arr, pos)
+
+    def _node(self, user_id):
+        n = self._index.get(user_id)
+        if n is None:
+            n = self._index[user_id] = len(self._ids)
+            self._ids.append(user_id)
+            self._adj.append(np.empty(0, dtype=np.int32))
+        return n
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    def start_loading(self):
+        """在后台线程（重新）加载；已有加载线程在运行时不做任何事"""
+        with self._lock:
+            # 用线程是否存活判断：fork 出的子进程里继承来的线程对象不再存活，会重新发起加载
+            if self._loader is not None and self._loader.is_alive():
+                return
+            self._pending = []
+            self._loader = threading.Thread(target=self._load_in_background, name='social-graph-load', daemon=True)
+            self._loader.start()
+
+    def _ensure_loaded(self):
+        """返回图是否可用；尚未加载或已超过重新加载间隔时发起后台加载"""
+        if self._loaded_at is None:
+            self.start_loading()
+            return False
+        if self.reload_seconds and time.monotonic() - self._loaded_at > self.reload_seconds:
+            self.start_loading()
+        return True
+
+    def _load_in_background(self):
+        with app.app_context():
+            try:
+                self.load()
+            except Exception as e:
+                print(f"好友关系图加载失败：{str(e)}")
+
+    def _neighbors(self, user_id):
+        n = self._index.get(user_id)
+        return self._adj[n] if n is not None else np.empty(0, dtype=np.int32)
+
+    def friend_ids(self, user_id):
+        if not self._ensure_loaded():
+            return list(accepted_friend_ids(user_id))
+        return [self._ids[n] for n in self._neighbors(user_id)]
+
+    def friend_count(self, user_id):
+        if not self._ensure_loaded():
+            return len(accepted_friend_ids(user_id))
+        return len(self._neighbors(user_id))
+
+    def mutual_count(self, user_a, user_b):
+        """两人的共同好友数：把较短的有序数组在较长的数组里二分查找"""
+        if not self._ensure_loaded():
+            return count_mutual_friends(user_a, [user_b])[user_b]
+        small, large = sorted((self._neighbors(user_a), self._neighbors(user_b)), key=len)
+        if not len(small):
+            return 0
+        pos = np.minimum(np.searchsorted(large, small), len(large) - 1)
+        return int(np.count_nonzero(large[pos] == small))
+
+    def mutual_counts(self, user_id, others):
+        """user_id 与一批用户（如一页搜索结果）各自的共同好友数，返回 {用户ID: 数量}"""
+        if not self._ensure_loaded():
+            return count_mutual_friends(user_id, others)
+        mine = self._neighbors(user_id)
+        if not len(mine):
+            return {other: 0 for other in others}
+        mask = np.zeros(len(self._adj), dtype=bool)
+        mask[mine] = True
+        return {other: int(np.count_nonzero(mask[self._neighbors(other)])) for other in others}
+
+    def friends_of_friends(self, user_id, limit=20):
+        """二度好友候选：按共同好友数降序（同数按用户 ID），返回 [(用户ID, 共同好友数)]，不含本人和已有好友；
+        图尚未加载完成时返回空列表"""
+        if not self._ensure_loaded():
+            return []
+        mine = self._neighbors(user_id)
+        if not len(mine):
+            return []
+        adj = self._adj
+        hops = np.concatenate([adj[n] for n in mine])
+        candidates, counts = np.unique(hops, return_counts=True)
+        keep = ~np.isin(candidates, mine, assume_unique=True) & (candidates != self._index[user_id])
+        candidates, counts = candidates[keep], counts[keep]
+        if len(candidates) > limit:
+            top = np.argpartition(-counts, limit - 1)[:limit]
+            candidates, counts = candidates[top], counts[top]
+        ranked = sorted(zip(counts.tolist(), candidates.tolist()), key=lambda x: (-x[0], self._ids[x[1]]))
+        return [(self._ids[n], count) for count, n in ranked]
+
+    def memory_bytes(self):
+        """邻接数组本身占用的字节数（不含 Python 对象开销）"""
+        seen, total = set(), 0
+        for arr in self._adj:
+            base = arr.base if arr.base is not None else arr
+            if id(base) not in seen:
+                seen.add(id(base))
+                total += base.nbytes
+        return total
+
+social_graph = SocialGraph(app.config['SOCIAL_GRAPH_RELOAD_SECONDS'])
+
+# ---------------------------- 徽章计数 ----------------------------
+# 写路径通过 bump_user_badges 增量维护 UserBadge，事务提交后让相关用户的进程内缓存失效；
+# /api/me/badges 命中缓存时不访问数据库，客户端带上 If-None-Match 且计数未变时直接返回 304。
+
+BADGE_FIELDS = ('unread_messages', 'unread_notifications', 'friend_requests')
+
+badge_cache = LRUCache(app.config['BADGE_CACHE_SIZE'], app.config['BADGE_CACHE_TTL'])
+
+@db.event.listens_for(db.session, 'after_commit')
+def invalidate_badges_after_commit(session):
+    badge_cache.invalidate(session.info.pop('badge_users', ()))
+
+@db.event.listens_for(db.session, 'after_soft_rollback')
+def discard_badges_after_rollback(session, previous_transaction):
+    session.info.pop('badge_users', None)
+
+def count_user_badges(user_ids=None):
+    """从消息、通知、好友关系原始表统计徽章计数，返回 {user_id: {字段: 计数}}（只含非零用户）"""
+    receiver = db.case((Friendship.user1_id == Friendship.requester_id, Friendship.user2_id), else_=Friendship.user1_id)
+    queries = {
+        'unread_messages': db.session.query(Message.receiver_id, db.func.count(Message.id)).filter(
+            Message.is_read == False).group_by(Message.receiver_id),  # noqa: E712
+        'unread_notifications': db.session.query(Notification.user_id, db.func.count(Notification.id)).filter(
+            Notification.is_read == False).group_by(Notification.user_id),  # noqa: E712
+        'friend_requests': db.session.query(receiver, db.func.count(Friendship.id)).filter(
+            Friendship.status == 'pending').group_by(receiver),
+    }
+    filters = {'unread_messages': Message.receiver_id, 'unread_notifications': Notification.user_id,
+               'friend_requests': receiver}
+    counts = {}
+    for field, query in queries.items():
+        if user_ids is not None:
+            query = query.filter(filters[field].in_(user_ids))
+            if field == 'friend_requests':
+                # CASE 表达式用不上索引，先按两侧的用户列各走索引缩小范围
+                query = query.filter(db.or_(Friendship.user1_id.in_(user_ids), Friendship.user2_id.in_(user_ids)))
+        for user_id, count in query:
+            counts.setdefault(user_id, dict.fromkeys(BADGE_FIELDS, 0))[field] = count
+    return counts
+
+def reconcile_user_badges(user_ids=None):
+    """按原始表重算徽章计数（user_ids 为空时重建全部，之后需清空 badge_cache），返回写入的行数（由调用方提交事务）"""
+    counts = count_user_badges(user_ids)
+    query = UserBadge.query
+    if user_ids is not None:
+        query = query.filter(UserBadge.user_id.in_(user_ids))
+        # 计数全为 0 的用户也写一行，避免之后每次增减都回退到重算
+        for user_id in user_ids:
+            counts.setdefault(user_id, dict.fromkeys(BADGE_FIELDS, 0))
+    query.delete(synchronize_session=False)
+    rows = [dict(user_id=user_id, **fields) for user_id, fields in counts.items()]
+    if rows:
+        db.session.execute(UserBadge.__table__.insert(), rows)
+    if user_ids is not None:
+        db.session.info.setdefault('badge_users', set()).update(user_ids)
+    return len(rows)
+
+def bump_user_badges(user_ids, **deltas):
+    """在原始表变更之后调用，增减一批用户的徽章计数（不低于 0，由调用方提交事务）"""
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return
+    values = {field: db.case((getattr(UserBadge, field) + delta > 0, getattr(UserBadge, field) + delta), else_=0)
+              for field, delta in deltas.items()}
+    updated = db.session.execute(db.update(UserBadge).where(UserBadge.user_id.in_(user_ids)).values(**values)).rowcount
+    if updated < len(user_ids):
+        # 计数行缺失（升级前的用户或新用户）：按原始表重算，结果已包含本次变更
+        existing = {row[0] for row in db.session.query(UserBadge.user_id).filter(UserBadge.user_id.in_(user_ids))}
+        reconcile_user_badges([u for u in user_ids if u not in existing])
+    db.session.info.setdefault('badge_users', set()).update(user_ids)
+
+def get_user_badges(user_id):
+    """返回 (etag, counts)，优先读进程内缓存"""
+    cached = badge_cache.get(user_id)
+    if cached is not None:
+        return cached
+    row = db.session.get(UserBadge, user_id)
+    counts = {field: getattr(row, field) if row else 0 for field in BADGE_FIELDS}
+    value = ('-'.join(str(counts[field]) for field in BADGE_FIELDS), counts)
+    badge_cache.put(user_id, value)
+    return value
+
+# ---------------------------- 会话索引 ----------------------------
+
+def message_snippet(content):
+    """会话列表中展示的消息摘要"""
+    limit = app.config['CONVERSATION_SNIPPET_LENGTH']
+    return content if len(content) <= limit else content[:limit] + '…'
+
+def upsert_conversation(user_id, peer_id, message, unread_increment=0):
+    """更新（不存在则创建）user_id 与 peer_id 的会话索引行，由调用方提交事务"""
+    snippet = message_snippet(message.content)
+    # 并发发送时提交顺序可能与消息ID顺序不一致，只让更新的消息覆盖“最后一条”
+    is_newer = Conversation.last_message_id < message.id
+    values = {
+        'last_message_id': db.case((is_newer, message.id), else_=Conversation.last_message_id),
+        'last_message': db.case((is_newer, snippet), else_=Conversation.last_message),
+        'last_message_time': db.case((is_newer, message.created_at), else_=Conversation.last_message_time),
+        'last_sender_id': db.case((is_newer, message.sender_id), else_=Conversation.last_sender_id),
+        'unread_count': Conversation.unread_count + unread_increment
+    }
+    query = Conversation.query.filter_by(user_id=user_id, peer_id=peer_id)
+    if query.update(values, synchronize_session=False):
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(Conversation(
+                user_id=user_id,
+                peer_id=peer_id,
+                last_message_id=message.id,
+                last_message=snippet,
+                last_message_time=message.created_at,
+                last_sender_id=message.sender_id,
+                unread_count=unread_increment
+            ))
+    except IntegrityError:
+        # 另一个请求已抢先创建该会话，改为更新
+        query.update(values, synchronize_session=False)
+
+def record_message_in_conversations(message):
+    """新消息写入后同步双方的会话索引（接收方未读数 +1）"""
+    upsert_conversation(message.sender_id, message.receiver_id, message)
+    upsert_conversation(message.receiver_id, message.sender_id, message, unread_increment=1)
+
+def mark_conversation_read(user_id, peer_id, up_to_id):
+    """把 peer 发给 user 的、ID 不超过 up_to_id 的未读消息批量标记为已读，同步会话未读数，返回标记条数"""
+    marked = Message.query.filter(
+        Message.sender_id == peer_id,
+        Message.receiver_id == user_id,
+        Message.is_read == False,  # noqa: E712
+        Message.id <= up_to_id
+    ).update({'is_read': True}, synchronize_session=False)
+    if marked:
+        Conversation.query.filter_by(user_id=user_id, peer_id=peer_id).update({
+            'unread_count': db.case((Conversation.unread_count > marked, Conversation.unread_count - marked), else_=0)
+        }, synchronize_session=False)
+        bump_user_badges([user_id], unread_messages=-marked)
+    return marked
+
+def rebuild_conversations(batch_size: int = 5000) -> int:
+    """根据 Message 表重建全部会话索引，返回会话行数"""
+    summaries = {}
+    last_id = 0
+    while True:
+        batch = Message.query.filter(Message.id > last_id).order_by(Message.id.asc()).limit(batch_size).all()
+        if not batch:
+            break
+        for msg in batch:
+            for user_id, peer_id in ((msg.sender_id, msg.receiver_id), (msg.receiver_id, msg.sender_id)):
+                row = summaries.setdefault((user_id, peer_id), {
+                    'user_id': user_id, 'peer_id': peer_id, 'unread_count': 0
+                })
+                row.update({
+                    'last_message_id': msg.id,
+                    'last_message': message_snippet(msg.content),
+                    'last_message_time': msg.created_at,
+                    'last_sender_id': msg.sender_id
+                })
+            if not msg.is_read:
+                summaries[(msg.receiver_id, msg.sender_id)]['unread_count'] += 1
+        last_id = batch[-1].id
+        db.session.expunge_all()
+    
+    Conversation.query.delete(synchronize_session=False)
+    rows = list(summaries.values())
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(Conversation.__table__.insert(), rows[start:start + batch_size])
+    db.session.commit()
+    return len(rows)
 
 # 登录检查装饰器
 def login_required(f):
@@ -449,9 +2908,764 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# ---------------------------- 实时推送（SSE 事件总线） ----------------------------
+# 写操作调用 event_broker.publish(user_id, 事件名, 数据)，/api/stream 为每个连接订阅一个队列。
+# 后端只负责把事件送到各个 worker 进程，进程内再按 user_id 分发给本地连接。
+
+class MemoryEventBackend:
+    """单进程后端：发布即直接分发给本进程的订阅者"""
+    
+    def attach(self, dispatch):
+        self._dispatch = dispatch
+    
+    def start(self):
+        pass
+    
+    def publish(self, user_id, payload):
+        self._dispatch(user_id, payload)
+
+class SQLiteEventBackend:
+    """多 worker 后端：事件追加到共享的 SQLite 文件，每个进程用后台线程轮询新事件再本地分发"""
+    
+    def __init__(self, path, poll_interval=0.1, retention_seconds=60):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self._thread = None
+        self._lock = threading.Lock()
+        conn = self._connect()
+        try:
+            conn.execute('CREATE TABLE IF NOT EXISTS event (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                         'user_id TEXT NOT NULL, payload TEXT NOT NULL, created_at REAL NOT NULL)')
+        finally:
+            conn.close()
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+    
+    def attach(self, dispatch):
+        self._dispatch = dispatch
+    
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._poll_loop, name='sqlite-event-backend', daemon=True)
+                self._thread.start()
+    
+    def publish(self, user_id, payload):
+        conn = self._connect()
+        try:
+            conn.execute('INSERT INTO event (user_id, payload, created_at) VALUES (?, ?, ?)',
+                         (user_id, payload, time.time()))
+        finally:
+            conn.close()
+    
+    def _poll_loop(self):
+        conn = self._connect()
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM event').fetchone()[0]
+        last_trim = time.time()
+        while True:
+            try:
+                rows = conn.execute('SELECT id, user_id, payload FROM event WHERE id > ? ORDER BY id',
+                                    (last_id,)).fetchall()
+                for event_id, user_id, payload in rows:
+                    self._dispatch(user_id, payload)
+                    last_id = event_id
+                if time.time() - last_trim > self.retention_seconds:
+                    conn.execute('DELETE FROM event WHERE created_at < ?', (time.time() - self.retention_seconds,))
+                    last_trim = time.time()
+            except sqlite3.Error as e:
+                print(f"事件轮询失败：{str(e)}")
+            time.sleep(self.poll_interval)
+
+class EventBroker:
+    """进程内的发布/订阅中心，按 user_id 把事件分发给该用户的所有 SSE 连接"""
+    
+    def __init__(self, backend, queue_size=100):
+        self.backend = backend
+        self.queue_size = queue_size
+        self._subscribers = {}  # user_id -> set(queue.Queue)
+        self._lock = threading.Lock()
+        backend.attach(self._dispatch)
+    
+    def subscribe(self, user_id):
+        self.backend.start()
+        subscription = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+    
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(user_id)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscribers[user_id]
+    
+    def publish(self, user_id, event, data=None):
+        """发布事件；推送失败只记录日志，不影响已提交的业务操作"""
+        payload = json.dumps({'event': event, 'data': data or {}}, ensure_ascii=False)
+        try:
+            self.backend.publish(user_id, payload)
+        except Exception as e:
+            print(f"推送事件失败：{str(e)}")
+    
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+    
+    def _dispatch(self, user_id, payload):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.put_nowait(payload)
+            except queue.Full:
+                pass
+
+def create_event_broker():
+    if app.config['EVENT_BROKER_BACKEND'] == 'sqlite':
+        os.makedirs(os.path.dirname(app.config['EVENT_BROKER_SQLITE_PATH']) or '.', exist_ok=True)
+        backend = SQLiteEventBackend(app.config['EVENT_BROKER_SQLITE_PATH'])
+    else:
+        backend = MemoryEventBackend()
+    return EventBroker(backend, queue_size=app.config['SSE_QUEUE_SIZE'])
+
+event_broker = create_event_broker()
+
+# ---------------------------- 通知批量分发 ----------------------------
+# 请求处理函数只负责把“发给谁、发什么”放进有界队列，由后台 worker 解析目标用户并分批批量插入、提交和推送。
+# 目标可以是用户 ID 列表、某个活动的全部参与者或某个小组的全部成员（后两者在 worker 中按主键分批读取）。
+# 带触发者（actor）的通知可合并：同一用户、类型、对象在窗口期内的未读通知只保留一条，更新触发者人数和时间。
+
+class NotificationFanout:
+    """通知分发 worker 池：有界队列 + 调用方兜底执行（背压），进程退出时处理完队列中剩余任务"""
+    
+    def __init__(self, workers=2, queue_size=1000, chunk_size=500, enqueue_timeout=2.0, retries=3, retry_delay=0.05):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.enqueue_timeout = enqueue_timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._coalesce_lock = threading.Lock()  # 可合并通知“查找-更新/插入”须串行，否则并发的 worker 会各建一条
+        self._closed = False
+    
+    def enqueue(self, target, type, title, content, related_id='', exclude=(), actor=None):
+        """target: ('users', [user_id, ...]) / ('activity', activity_id) / ('group', group_id)；actor: (用户ID, 用户名) 或 None"""
+        job = (target, type, title, content, str(related_id or ''), frozenset(exclude), actor)
+        if self._closed:
+            self._run(job)
+            return
+        self._start()
+        try:
+            self._queue.put(job, timeout=self.enqueue_timeout)
+        except queue.Full:
+            # 背压：队列持续积压时由调用方线程自己完成分发，保证通知不丢
+            print("通知分发队列已满，在当前线程直接处理")
+            self._run(job)
+    
+    def flush(self):
+        """等待队列中已有的任务全部处理完"""
+        self._queue.join()
+    
+    def shutdown(self, timeout=30):
+        """停止接收新任务，处理完已排队的任务后退出 worker"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            threads = list(self._threads)
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(timeout)
+    
+    def pending(self):
+        return self._queue.qsize()
+    
+    def _start(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads or self._closed:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f'notification-fanout-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+    
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self._run(job)
+            finally:
+                self._queue.task_done()
+    
+    def _run(self, job):
+        target, type, title, content, related_id, exclude, actor = job
+        with app.app_context():
+            try:
+                for user_ids in iter_notification_targets(target, self.chunk_size):
+                    user_ids = [u for u in user_ids if u not in exclude]
+                    if user_ids:
+                        self._deliver(user_ids, type, title, content, related_id, actor)
+            except Exception as e:
+                db.session.rollback()
+                print(f"通知分发目标读取失败（{type} -> {target[0]}）：{str(e)}")
+    
+    def _deliver(self, user_ids, type, title, content, related_id, actor):
+        """写入一批通知并推送；写库失败时按倍增间隔重试这一批，重试仍失败才放弃这一批（后续批次照常分发）"""
+        for attempt in range(self.retries + 1):
+            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            try:
+                if actor:
+                    with self._coalesce_lock:
+                        coalesce_notifications(user_ids, type, title, content, related_id, actor, now)
+                        db.session.commit()
+                else:
+                    db.session.execute(Notification.__table__.insert(), [{
+                        'user_id': user_id, 'type': type, 'title': title, 'content': content,
+                        'related_id': related_id, 'is_read': False, 'created_at': now
+                    } for user_id in user_ids])
+                    bump_user_badges(user_ids, unread_notifications=1)
+                    db.session.commit()
+                break
+            except Exception as e:
+                db.session.rollback()
+                print(f"通知分发失败（{type}，{len(user_ids)} 人，第 {attempt + 1} 次）：{str(e)}")
+                if attempt == self.retries:
+                    return
+                time.sleep(self.retry_delay * 2 ** attempt)
+        for user_id in user_ids:
+            event_broker.publish(user_id, 'notification', {
+                'type': type, 'title': title, 'related_id': related_id
+            })
+
+def iter_notification_targets(target, chunk_size):
+    """把分发目标解析成分批的用户 ID 列表"""
+    kind, value = target
+    if kind == 'users':
+        user_ids = list(dict.fromkeys(value))
+        for start in range(0, len(user_ids), chunk_size):
+            yield user_ids[start:start + chunk_size]
+        return
+    if kind == 'activity':
+        table, key = activity_participants, activity_participants.c.activity_id
+    elif kind == 'group':
+        table, key = group_members, group_members.c.group_id
+    else:
+        raise ValueError(f'未知的通知目标类型：{kind}')
+    last_id = ''
+    while True:
+        batch = [row[0] for row in db.session.query(table.c.user_id).filter(
+            key == value, table.c.user_id > last_id).order_by(table.c.user_id.asc()).limit(chunk_size)]
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+def format_notification_actors(actors, actor_count):
+    """触发者展示文案：A / A 和 B / A、B 等 N 人"""
+    names = [a['name'] for a in actors[:2]]
+    if actor_count <= 1:
+        return names[0]
+    if len(names) < 2:
+        return f'{names[0]} 等 {actor_count} 人'
+    if actor_count == 2:
+        return f'{names[0]} 和 {names[1]}'
+    return f'{names[0]}、{names[1]} 等 {actor_count} 人'
+
+def coalesce_notifications(user_ids, type, title, template, related_id, actor, now):
+    """写入可合并的通知：窗口期内已有同类未读通知的用户更新那一条，其余用户新建通知和合并记录（调用方提交）"""
+    window_start = (datetime.now() - timedelta(seconds=app.config['NOTIFICATION_COALESCE_WINDOW'])).strftime("%Y-%m-%d %H:%M:%S")
+    rows = db.session.query(NotificationAggregate, Notification).join(
+        Notification, Notification.id == NotificationAggregate.notification_id
+    ).filter(
+        NotificationAggregate.user_id.in_(user_ids),
+        NotificationAggregate.type == type,
+        NotificationAggregate.related_id == related_id,
+        NotificationAggregate.window_start >= window_start,
+        Notification.is_read.is_(False)
+    ).order_by(NotificationAggregate.window_start.asc()).all()
+    open_rows = {agg.user_id: (agg, n) for agg, n in rows}
+    
+    actor_id, actor_name = actor
+    entry = {'id': actor_id, 'name': actor_name}
+    limit = app.config['NOTIFICATION_RECENT_ACTORS']
+    created = []
+    for user_id in user_ids:
+        if user_id in open_rows:
+            agg, n = open_rows[user_id]
+            actors = json.loads(agg.actors or '[]')
+            # 最近触发者里已有此人（如重复评论）时不重复计数
+            if all(a['id'] != actor_id for a in actors):
+                agg.actor_count += 1
+            actors = [entry] + [a for a in actors if a['id'] != actor_id]
+            agg.actors = json.dumps(actors[:limit], ensure_ascii=False)
+            n.content = template.replace('{actors}', format_notification_actors(actors, agg.actor_count))
+            n.created_at = now
+        else:
+            n = Notification(user_id=user_id, type=type, title=title, related_id=related_id, is_read=False,
+                             content=template.replace('{actors}', actor_name), created_at=now)
+            db.session.add(n)
+            created.append(n)
+    if created:
+        db.session.flush()
+        db.session.add_all([NotificationAggregate(
+            notification_id=n.id, user_id=n.user_id, type=type, related_id=related_id, actor_count=1,
+            actors=json.dumps([entry], ensure_ascii=False), window_start=now
+        ) for n in created])
+        bump_user_badges([n.user_id for n in created], unread_notifications=1)
+
+notification_fanout = NotificationFanout(
+    workers=app.config['NOTIFICATION_FANOUT_WORKERS'],
+    queue_size=app.config['NOTIFICATION_FANOUT_QUEUE_SIZE'],
+    chunk_size=app.config['NOTIFICATION_FANOUT_CHUNK_SIZE'],
+    enqueue_timeout=app.config['NOTIFICATION_ENQUEUE_TIMEOUT'],
+    retries=app.config['NOTIFICATION_FANOUT_RETRIES']
+)
+atexit.register(notification_fanout.shutdown)
+
+def notify_users(user_ids, type, title, content, related_id='', exclude=(), actor=None):
+    notification_fanout.enqueue(('users', list(user_ids)), type, title, content, related_id, exclude, actor)
+
+def notify_activity_participants(activity_id, type, title, content, related_id='', exclude=()):
+    notification_fanout.enqueue(('activity', activity_id), type, title, content, related_id, exclude)
+
+def notify_group_members(group_id, type, title, content, related_id='', exclude=()):
+    notification_fanout.enqueue(('group', group_id), type, title, content, related_id, exclude)
+
+NOTIFICATION_DIGEST_ID = 'digest'  # 归档摘要行的 related_id
+
+def compact_notifications(days=None, commit_every=500):
+    """把超过保留期的已读通知按（用户, 类型）折叠成一条已读的归档摘要，返回 (归档的通知数, 摘要条数)"""
+    days = app.config['NOTIFICATION_RETENTION_DAYS'] if days is None else days
+    cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    is_digest = Notification.related_id == NOTIFICATION_DIGEST_ID
+    # 已有的摘要行一起并入新的摘要，保证每个（用户, 类型）最多一条
+    stale = db.and_(Notification.is_read.is_(True), db.or_(Notification.created_at < cutoff, is_digest))
+    fresh = db.case((is_digest, 0), else_=1)
+    groups = db.session.query(
+        Notification.user_id, Notification.type,
+        db.func.sum(fresh),
+        db.func.sum(db.case((is_digest, db.func.coalesce(NotificationAggregate.actor_count, 0)), else_=1)),
+        db.func.max(Notification.created_at)
+    ).outerjoin(
+        NotificationAggregate, NotificationAggregate.notification_id == Notification.id
+    ).filter(stale).group_by(Notification.user_id, Notification.type).having(db.func.sum(fresh) > 0).all()
+    
+    folded = 0
+    for i, (user_id, type, fresh_count, total, latest) in enumerate(groups, 1):
+        criteria = (Notification.user_id == user_id, Notification.type == type, stale)
+        stale_ids = db.select(Notification.id).where(*criteria)
+        NotificationAggregate.query.filter(NotificationAggregate.notification_id.in_(stale_ids)).delete(synchronize_session=False)
+        Notification.query.filter(*criteria).delete(synchronize_session=False)
+        digest = Notification(user_id=user_id, type=type, title='通知归档', related_id=NOTIFICATION_DIGEST_ID,
+                              content=f'{total} 条较早的已读通知已归档', is_read=True, created_at=latest)
+        db.session.add(digest)
+        db.session.flush()
+        db.session.add(NotificationAggregate(notification_id=digest.id, user_id=user_id, type=type,
+                                             related_id=NOTIFICATION_DIGEST_ID, actor_count=total,
+                                             actors='[]', window_start=latest))
+        folded += fresh_count
+        if i % commit_every == 0:
+            db.session.commit()
+    db.session.commit()
+    return folded, len(groups)
+
+# ---------------------------- 帖子审核队列（分页 + 领取租约 + 批量审核） ----------------------------
+# 多位教师同时审核时，各自“领取”一批待审核帖子（租约表 post_review_lease，主键 post_id 保证一帖只归一人），
+# 领取的帖子在租约有效期内不会再分给别人；批量审核在一个事务里写审核记录，只处理仍为 pending 的帖子，
+# 即使租约过期后被别人重新领取，也不会出现重复审核。
+
+def review_lease_now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def review_queue_query(now):
+    """待审核帖子查询：作者用户名与当前有效租约一并联表取出，正文在 SQL 里截断"""
+    excerpt_length = app.config['POST_EXCERPT_LENGTH']
+    return db.session.query(
+        Post.id, Post.title, Post.category, Post.created_at, Post.author_id, User.username,
+        db.func.substr(Post.content, 1, excerpt_length + 1).label('excerpt'),
+        PostReviewLease.teacher_id.label('lease_teacher_id'), PostReviewLease.expires_at.label('lease_expires_at')
+    ).outerjoin(User, User.id == Post.author_id).outerjoin(
+        PostReviewLease, db.and_(PostReviewLease.post_id == Post.id, PostReviewLease.expires_at > now)
+    ).filter(Post.review_status == 'pending')
+
+def review_queue_item(row, teacher_id):
+    excerpt_length = app.config['POST_EXCERPT_LENGTH']
+    excerpt = row.excerpt or ''
+    return {
+        "id": row.id,
+        "title": row.title,
+        "content": excerpt[:excerpt_length] + ("..." if len(excerpt) > excerpt_length else ""),
+        "category": row.category,
+        "author": row.username or "未知用户",
+        "created_at": row.created_at,
+        "claimed_by_me": row.lease_teacher_id == teacher_id,
+        "claimed_by_other": row.lease_teacher_id is not None and row.lease_teacher_id != teacher_id,
+        "lease_expires_at": row.lease_expires_at
+    }
+
+def claim_review_batch(teacher_id, limit):
+    """为教师领取（并续期）最多 limit 篇待审核帖子，按提交先后排队，返回领到的帖子 ID（由调用方提交事务）
+    已领取未审完的先续期；不足时从未被领取（或租约已过期）的帖子里补足，主键冲突说明被别人抢先领走，跳过"""
+    now = review_lease_now()
+    expires_at = (datetime.now() + timedelta(seconds=app.config['REVIEW_LEASE_SECONDS'])).strftime("%Y-%m-%d %H:%M:%S")
+    PostReviewLease.query.filter(PostReviewLease.expires_at <= now).delete(synchronize_session=False)
+    mine = [post_id for (post_id,) in db.session.query(PostReviewLease.post_id).join(
+        Post, Post.id == PostReviewLease.post_id).filter(
+        PostReviewLease.teacher_id == teacher_id, Post.review_status == 'pending'
+    ).order_by(PostReviewLease.post_id.asc()).limit(limit)]
+    if mine:
+        PostReviewLease.query.filter(PostReviewLease.post_id.in_(mine)).update(
+            {PostReviewLease.expires_at: expires_at}, synchronize_session=False)
+    
+    while len(mine) < limit:
+        candidates = [post_id for (post_id,) in db.session.query(Post.id).outerjoin(
+            PostReviewLease, PostReviewLease.post_id == Post.id).filter(
+            Post.review_status == 'pending', PostReviewLease.post_id.is_(None)
+        ).order_by(Post.id.asc()).limit(limit - len(mine))]
+        if not candidates:
+            break
+        rows = [{'post_id': post_id, 'teacher_id': teacher_id, 'expires_at': expires_at} for post_id in candidates]
+        try:
+            with db.session.begin_nested():
+                db.session.execute(PostReviewLease.__table__.insert(), rows)
+            mine.extend(candidates)
+        except IntegrityError:
+            # 与其他教师同时领取：逐条重试，只保留抢到的
+            for row in rows:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(PostReviewLease.__table__.insert(), row)
+                    mine.append(row['post_id'])
+                except IntegrityError:
+                    pass
+    return mine
+
+def apply_review_decisions(teacher_id, decisions):
+    """批量写入审核结果：decisions 为 [(post_id, status, comment)]，返回 (已审核的帖子 ID, {帖子 ID: 跳过原因})（由调用方提交事务）
+    只处理仍为 pending、且不在其他教师有效租约内的帖子；每篇帖子按状态条件更新，并发时只有一位教师能改成功"""
+    post_ids = [post_id for post_id, _, _ in decisions]
+    leased = dict(db.session.query(PostReviewLease.post_id, PostReviewLease.teacher_id).filter(
+        PostReviewLease.post_id.in_(post_ids), PostReviewLease.expires_at > review_lease_now(),
+        PostReviewLease.teacher_id != teacher_id))
+    reviewed, skipped, by_status, now = [], {}, {}, review_lease_now()
+    for post_id, status, comment in decisions:
+        if post_id in leased:
+            skipped[post_id] = 'claimed_by_other'
+            continue
+        if not Post.query.filter(Post.id == post_id, Post.review_status == 'pending').update(
+                {Post.review_status: status}, synchronize_session=False):
+            skipped[post_id] = 'not_pending'
+            continue
+        reviewed.append({'post_id': post_id, 'teacher_id': teacher_id, 'status': status,
+                         'comment': comment, 'created_at': now})
+        by_status.setdefault(status, []).append(post_id)
+    if reviewed:
+        db.session.execute(PostReview.__table__.insert(), reviewed)
+        for status, ids in by_status.items():
+            update_post_search_status(ids, status)
+        record_post_tag_trend({post_id: app.config['TRENDING_CREATE_WEIGHT'] for post_id in by_status.get('approved', [])})
+        PostReviewLease.query.filter(PostReviewLease.post_id.in_([r['post_id'] for r in reviewed])).delete(
+            synchronize_session=False)
+    return [r['post_id'] for r in reviewed], skipped
+
+# ---------------------------- 抢报名（排队放号 + 候补） ----------------------------
+# 开启抢报名的活动，报名请求只在进程内队列登记并立即返回排队号，不争抢 Activity 行和报名关系表。
+# 单个后台 worker 每次取出一批请求按活动分组：先空更新活动行拿到写锁，读出剩余名额，按排队顺序放号
+# （批量写报名关系、人数一次加够），其余进入候补；有人取消报名时在同一事务里按候补顺序自动递补。
+# 队列在进程内存里：多 worker 部署时各进程各自排队，名额由数据库写锁保证不超发；进程重启会丢掉尚未处理的请求
+# （查询状态为 none，客户端可重新报名）。
+
+def lock_activity_row(activity_id):
+    """空更新活动行以取得写锁（SQLite 为整库写锁），本事务之后读到的人数在提交前不会被其他事务改动；活动不存在时返回 0"""
+    return Activity.query.filter(Activity.id == activity_id).update(
+        {Activity.participant_count: Activity.participant_count}, synchronize_session=False)
+
+def free_seats(activity_id):
+    """剩余名额，未设人数上限时返回 None（调用方应已持有活动行写锁）"""
+    count, limit = db.session.query(db.func.coalesce(Activity.participant_count, 0), Activity.participants_limit).filter(
+        Activity.id == activity_id).one()
+    return max(0, limit - count) if limit and limit > 0 else None
+
+def seat_participants(activity_id, user_ids):
+    """写入报名关系并把参与人数一次加够（调用方已按 free_seats 确认名额，由调用方提交事务）"""
+    if not user_ids:
+        return
+    db.session.execute(activity_participants.insert(), [
+        {'user_id': user_id, 'activity_id': activity_id} for user_id in user_ids])
+    count = db.func.coalesce(Activity.participant_count, 0)
+    Activity.query.filter(Activity.id == activity_id).update(
+        {Activity.participant_count: count + len(user_ids)}, synchronize_session=False)
+    for user_id in user_ids:
+        on_activity_membership_changed(user_id, activity_id, 1)
+
+def admit_signups(activity_id, user_ids):
+    """按先后顺序处理同一活动的一批报名请求，返回 {user_id: 'admitted' / 'waitlisted' / 'full' / 'closed'}（由调用方提交事务）
+    已放号或已在候补的用户保持原状态；名额满后进入候补，候补也满时为 full（记一行 rejected，再次报名时重新参与放号）；
+    活动已删除时为 closed"""
+    user_ids = list(dict.fromkeys(user_ids))
+    if not lock_activity_row(activity_id):
+        return {user_id: 'closed' for user_id in user_ids}
+    outcome = {}
+    rejected = []
+    for start in range(0, len(user_ids), 500):
+        chunk = user_ids[start:start + 500]
+        for user_id, status in db.session.query(ActivitySignup.user_id, ActivitySignup.status).filter(
+                ActivitySignup.activity_id == activity_id, ActivitySignup.user_id.in_(chunk)):
+            if status == 'rejected':
+                rejected.append(user_id)
+            else:
+                outcome[user_id] = status
+        for (user_id,) in db.session.query(activity_participants.c.user_id).filter(
+                activity_participants.c.activity_id == activity_id, activity_participants.c.user_id.in_(chunk)):
+            outcome.setdefault(user_id, 'admitted')
+    fresh = [user_id for user_id in user_ids if user_id not in outcome]
+    seats = free_seats(activity_id)
+    admitted = fresh if seats is None else fresh[:seats]
+    waitlisted = fresh[len(admitted):]
+    admission = db.session.get(ActivityAdmission, activity_id)
+    if waitlisted and admission and admission.waitlist_limit is not None:
+        queued = ActivitySignup.query.filter_by(activity_id=activity_id, status='waitlisted').count()
+        waitlisted = waitlisted[:max(0, admission.waitlist_limit - queued)]
+    
+    seat_participants(activity_id, admitted)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows = [(user_id, 'admitted') for user_id in admitted] + [(user_id, 'waitlisted') for user_id in waitlisted]
+    outcome.update(rows)
+    rows += [(user_id, 'rejected') for user_id in fresh if user_id not in outcome]
+    if rejected:
+        # 上次被拒的记录删掉重新插入，候补顺序按这次报名算
+        ActivitySignup.query.filter(ActivitySignup.activity_id == activity_id,
+                                    ActivitySignup.user_id.in_(rejected)).delete(synchronize_session=False)
+    if rows:
+        db.session.execute(ActivitySignup.__table__.insert(), [
+            {'activity_id': activity_id, 'user_id': user_id, 'status': status, 'created_at': now} for user_id, status in rows])
+    for user_id in fresh:
+        outcome.setdefault(user_id, 'full')
+    return outcome
+
+def promote_waitlist(activity_id):
+    """有空余名额时按候补顺序递补，返回递补上的用户 ID（调用方应已持有活动行写锁，由调用方提交事务）"""
+    seats = free_seats(activity_id)
+    if seats == 0:
+        return []
+    query = db.session.query(ActivitySignup.id, ActivitySignup.user_id).filter(
+        ActivitySignup.activity_id == activity_id, ActivitySignup.status == 'waitlisted').order_by(ActivitySignup.id.asc())
+    rows = query.limit(seats if seats is not None else app.config['ACTIVITY_ADMISSION_BATCH_SIZE']).all()
+    if not rows:
+        return []
+    promoted = [user_id for _, user_id in rows]
+    seat_participants(activity_id, promoted)
+    ActivitySignup.query.filter(ActivitySignup.id.in_([signup_id for signup_id, _ in rows])).update(
+        {ActivitySignup.status: 'admitted'}, synchronize_session=False)
+    return promoted
+
+def waitlist_position(activity_id, signup_id):
+    """候补中的第几位（从 1 开始）"""
+    return ActivitySignup.query.filter(ActivitySignup.activity_id == activity_id, ActivitySignup.status == 'waitlisted',
+                                       ActivitySignup.id <= signup_id).count()
+
+class SignupAdmission:
+    """抢报名放号 worker：有界队列 + 单个后台线程按批放号（保证同一进程内先到先得），队列持续满时拒绝新报名（背压）"""
+    
+    def __init__(self, queue_size=20000, batch_size=500, enqueue_timeout=0.5, retries=3, retry_delay=0.05):
+        self.batch_size = batch_size
+        self.enqueue_timeout = enqueue_timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._tickets = {}  # (activity_id, user_id) -> 尚未放号的排队号
+        self._issued = {}   # activity_id -> 已发出的最大排队号
+        self._done = {}     # activity_id -> 已处理到的排队号
+    
+    def enqueue(self, activity_id, user_id):
+        """登记一次报名，返回 (状态, 排队号, 前面还有几人)；正常情况下状态为 queued，
+        队列持续满 enqueue_timeout 秒或正在停止时为 busy（不发排队号，调用方提示稍后重试），排队号为 None"""
+        key = (activity_id, user_id)
+        self._start()
+        deadline = time.monotonic() + self.enqueue_timeout
+        while True:
+            with self._lock:
+                ticket = self._tickets.get(key)
+                if ticket is not None:
+                    # 重复点击：沿用原来的排队号
+                    return 'queued', ticket, ticket - self._done.get(activity_id, 0) - 1
+                if self._closed:
+                    return 'busy', None, None
+                # 持锁入队、入队成功才发号，保证队列里的顺序与排队号一致，不会有人插队
+                ticket = self._issued.get(activity_id, 0) + 1
+                try:
+                    self._queue.put_nowait((activity_id, user_id, ticket))
+                except queue.Full:
+                    pass
+                else:
+                    self._issued[activity_id] = ticket
+                    self._tickets[key] = ticket
+                    return 'queued', ticket, ticket - self._done.get(activity_id, 0) - 1
+            if time.monotonic() >= deadline:
+                print("抢报名队列已满，请用户稍后重试")
+                return 'busy', None, None
+            time.sleep(0.01)
+    
+    def position(self, activity_id, user_id):
+        """仍在排队时返回 (排队号, 前面还有几人)，否则返回 None"""
+        with self._lock:
+            ticket = self._tickets.get((activity_id, user_id))
+            if ticket is None:
+                return None
+            return ticket, ticket - self._done.get(activity_id, 0) - 1
+    
+    def flush(self):
+        """等待队列中已有的报名全部处理完"""
+        self._queue.join()
+    
+    def shutdown(self, timeout=30):
+        """停止接收新请求，处理完已排队的报名后退出 worker"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread:
+            self._queue.put(None)
+            thread.join(timeout)
+    
+    def pending(self):
+        return self._queue.qsize()
+    
+    def _start(self):
+        if self._thread:
+            return
+        with self._lock:
+            if self._thread or self._closed:
+                return
+            self._thread = threading.Thread(target=self._worker, name='signup-admission', daemon=True)
+            self._thread.start()
+    
+    def _worker(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size and batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                jobs = [job for job in batch if job is not None]
+                if jobs:
+                    self._admit(jobs)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if batch[-1] is None:
+                return
+    
+    def _admit(self, jobs):
+        """按活动分组放号并推送结果，返回 {(activity_id, user_id): 状态}；
+        写库失败时整批重试，重试仍失败的状态为 error（不留记录，用户可重新报名）"""
+        by_activity = {}
+        for activity_id, user_id, ticket in sorted(jobs, key=lambda job: job[2]):
+            by_activity.setdefault(activity_id, []).append((user_id, ticket))
+        results = {}
+        with app.app_context():
+            for activity_id, entries in by_activity.items():
+                outcome = {}
+                for attempt in range(self.retries + 1):
+                    try:
+                        outcome = admit_signups(activity_id, [user_id for user_id, _ in entries])
+                        db.session.commit()
+                        break
+                    except Exception as e:
+                        db.session.rollback()
+                        outcome = {}
+                        print(f"抢报名放号失败（活动 {activity_id}，第 {attempt + 1} 次）：{str(e)}")
+                        if attempt < self.retries:
+                            time.sleep(self.retry_delay * 2 ** attempt)
+                with self._lock:
+                    for user_id, ticket in entries:
+                        if self._tickets.get((activity_id, user_id)) == ticket:
+                            del self._tickets[(activity_id, user_id)]
+                    self._done[activity_id] = max(self._done.get(activity_id, 0), max(ticket for _, ticket in entries))
+                for user_id, _ in entries:
+                    status = outcome.get(user_id, 'error')
+                    results[(activity_id, user_id)] = status
+                    if status == 'admitted':
+                        activity_recommender.invalidate(user_id)
+                    event_broker.publish(user_id, 'signup', {'activity_id': activity_id, 'status': status})
+        return results
+
+signup_admission = SignupAdmission(
+    queue_size=app.config['ACTIVITY_ADMISSION_QUEUE_SIZE'],
+    batch_size=app.config['ACTIVITY_ADMISSION_BATCH_SIZE'],
+    enqueue_timeout=app.config['ACTIVITY_ADMISSION_ENQUEUE_TIMEOUT'],
+    retries=app.config['ACTIVITY_ADMISSION_RETRIES']
+)
+atexit.register(signup_admission.shutdown)
+
 # 创建数据库表（启动时自动执行）
 with app.app_context():
+    post_stats_existed = db.inspect(db.engine).has_table(PostStats.__tablename__)
+    post_tag_existed = db.inspect(db.engine).has_table(PostTag.__tablename__)
+    activity_tag_existed = db.inspect(db.engine).has_table(ActivityTag.__tablename__)
+    user_badge_existed = db.inspect(db.engine).has_table(UserBadge.__tablename__)
+    comment_path_existed = db.inspect(db.engine).has_table(CommentPath.__tablename__)
+    post_reaction_existed = db.inspect(db.engine).has_table(PostReaction.__tablename__)
+    tag_trend_existed = db.inspect(db.engine).has_table(TagTrendHour.__tablename__)
+    conversation_existed = db.inspect(db.engine).has_table(Conversation.__tablename__)
     db.create_all()
+    # create_all 不会给已有的表补建后来声明的索引，这里逐个检查补上
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    init_post_search_index()
+    init_user_search_index()
+    # 首次建统计表/标签索引表时为已有帖子补建
+    if not post_stats_existed:
+        reconcile_post_stats()
+        db.session.commit()
+    if not post_tag_existed:
+        rebuild_post_tag_index()
+    if not activity_tag_existed:
+        rebuild_activity_tag_index()
+    if not user_badge_existed:
+        reconcile_user_badges()
+        db.session.commit()
+    if not comment_path_existed:
+        rebuild_comment_paths()
+    # 首次建相似度索引或 SIMILARITY_* 参数变化后，按当前签名格式为已有帖子重建
+    ensure_similarity_index()
+    if not conversation_existed:
+        rebuild_conversations()
+    if not post_reaction_existed:
+        # 首次建互动状态表：按旧的逐次记录去重导入，再按去重后的状态重算计数
+        db.session.execute(PostReaction.__table__.insert().from_select(
+            ['user_id', 'post_id', 'type', 'created_at'],
+            db.select(Reaction.user_id, Reaction.post_id, Reaction.type, db.func.min(Reaction.created_at)).where(
+                Reaction.user_id.isnot(None), Reaction.post_id.isnot(None), Reaction.type.in_(TOGGLE_REACTIONS)
+            ).group_by(Reaction.user_id, Reaction.post_id, Reaction.type)))
+        reconcile_post_stats()
+        db.session.commit()
+    # 回放上次退出前未写回的互动计数
+    reaction_counter.flush()
+    if not tag_trend_existed:
+        trending_tags.rebuild()
+    # 好友关系图较大，在后台加载，加载完成前共同好友数按 SQL 统计
+    social_graph.start_loading()
     
     # 确保上传目录存在
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -478,6 +3692,8 @@ with app.app_context():
                     bio=f"官方认证教师-{username}"
                 )
                 db.session.add(teacher)
+                db.session.flush()
+                index_user_search(teacher)
                 db.session.commit()
 
 # ---------------------------- 页面路由 ----------------------------
@@ -505,8 +3721,7 @@ def register_page():
 @app.route('/profile')
 @login_required
 def profile_page():
-    user_id = session["user_id"]
-    user = find_user_by_id(user_id)
+    user = load_current_user()
     if not user:
         return redirect(url_for('login_page'))
     return render_template("profile.html", user=user)
@@ -534,9 +3749,11 @@ def create_activity_page():
 def activity_detail(activity_id):
     activity = Activity.query.get_or_404(activity_id)
     initiator = User.query.get(activity.initiator_id) if activity.initiator_id else None
+    record_view('activity', activity_id)
     return render_template('activity_detail.html',
                          activity=activity,
                          initiator=initiator,
+                         view_count=view_counts('activity', [activity_id])[activity_id],
                          username=session.get('username'))
 
 # 教师审核页面路由（仅教师可访问）
@@ -556,13 +3773,25 @@ def forum_page():
     sort_by = request.args.get('sort', 'newest')  # newest, hottest, most_replied
     search = request.args.get('search', '').strip()
     
+    # 有搜索词时优先走全文索引，按相关度排序
+    query = search_posts_query(search, category) if search else None
+    if query is not None:
+        posts = query.paginate(page=page, per_page=20, error_out=False)
+        return render_template('forum.html',
+                             posts=posts,
+                             snippets={p.id: search_snippet(p.content, search) for p in posts.items},
+                             current_category=category,
+                             sort_by=sort_by,
+                             search=search,
+                             categories=POST_CATEGORIES)
+    
     query = Post.query.filter_by(review_status='approved')
     
     if category:
         query = query.filter_by(category=category)
     
     if search:
-        # 搜索标题或内容
+        # 搜索标题或内容（全文索引不可用时的退路）
         query = query.filter(
             db_or(
                 Post.title.contains(search),
@@ -570,14 +3799,15 @@ def forum_page():
             )
         )
     
-    if sort_by == 'newest':
-        query = query.order_by(Post.created_at.desc())
-    elif sort_by == 'hottest':
-        # 简单的热度排序，可以根据点赞数等计算
-        query = query.order_by(Post.created_at.desc())  # 暂时用时间排序
+    if sort_by == 'hottest':
+        # 按冗余统计表的热度索引顺序分页
+        query = query.join(PostStats, PostStats.post_id == Post.id).order_by(
+            PostStats.hot_score.desc(), PostStats.post_id.desc())
     elif sort_by == 'most_replied':
-        # 根据评论数排序
-        query = query.order_by(Post.created_at.desc())  # 暂时用时间排序
+        query = query.join(PostStats, PostStats.post_id == Post.id).order_by(
+            PostStats.comment_count.desc(), PostStats.post_id.desc())
+    else:
+        query = query.order_by(Post.created_at.desc())
     
     posts = query.paginate(page=page, per_page=20, error_out=False)
     
@@ -613,6 +3843,13 @@ def create_post_page():
         )
         
         db.session.add(post)
+        db.session.flush()
+        index_post_similarity(post)
+        index_post_search(post)
+        index_post_tags(post)
+        create_post_stats(post)
+        if post.review_status == 'approved':
+            record_tag_trend(parse_tags(post.tags), app.config['TRENDING_CREATE_WEIGHT'])
         db.session.commit()
         
         flash('帖子发布成功！', 'success')
@@ -630,15 +3867,25 @@ def post_detail(post_id):
     if post.review_status != 'approved' and post.author_id != session['user_id'] and not is_teacher(session['user_id']):
         abort(403)
     
-    # 获取评论
-    comments = Comment.query.filter_by(post_id=post_id).order_by(Comment.created_at.asc()).all()
+    record_view('post', post_id)
+    
+    # 只渲染第一页顶层评论（置顶在前），其余和回复由页面按需加载
+    limit = app.config['COMMENT_PAGE_SIZE']
+    rows = comment_page_query(post_id).filter(CommentPath.depth == 0).order_by(
+        CommentPath.pin_rank.asc(), CommentPath.comment_id.asc()).limit(limit + 1).all()
+    comments = [comment_item(row) for row in rows[:limit]]
+    comment_total = db.session.query(PostStats.comment_count).filter(PostStats.post_id == post_id).scalar() or 0
+    next_cursor = comment_cursor(rows[limit - 1]) if len(rows) > limit else None
     
     # 获取作者信息
-    author = User.query.get(post.author_id)
+    author = get_user_snapshot(post.author_id)
     
     return render_template('post_detail.html', 
                          post=post, 
                          comments=comments, 
+                         comment_total=comment_total,
+                         view_count=view_counts('post', [post_id])[post_id],
+                         next_cursor=next_cursor,
                          author=author)
 
 # 添加评论
@@ -665,22 +3912,14 @@ def add_comment(post_id):
     )
     
     db.session.add(comment)
-    
-    # 如果评论者不是帖子作者，给帖子作者发送通知
-    if post.author_id != session['user_id']:
-        author = User.query.get(post.author_id)
-        commenter = User.query.get(session['user_id'])
-        if author and commenter:
-            create_notification(
-                user_id=post.author_id,
-                type='comment',
-                title='新评论通知',
-                content=f'{commenter.username} 评论了你的帖子《{post.title}》',
-                related_id=str(post_id)
-            )
-    
+    db.session.flush()
+    index_comment_path(comment)
+    bump_post_stats(post_id, comment_count=1)
     db.session.commit()
     
+    # 如果评论者不是帖子作者，给帖子作者发送通知（同一帖子的评论通知会合并）
+    notify_post_author(post, session['user_id'], 'comment')
+    
     flash('评论发表成功！', 'success')
     return redirect(url_for('post_detail', post_id=post_id))
 
@@ -736,6 +3975,8 @@ def register():
         )
         
         db.session.add(new_user)
+        db.session.flush()
+        index_user_search(new_user)
         db.session.commit()
         
         return jsonify({
@@ -804,8 +4045,7 @@ def get_current_user():
         if "user_id" not in session:
             return jsonify({"error": "未登录"}), 401
         
-        user_id = session["user_id"]
-        user = find_user_by_id(user_id)
+        user = load_current_user()
         
         if not user:
             session.pop("user_id", None)  # 清除无效user_id
@@ -851,7 +4091,7 @@ def upload_avatar():
     
     # 获取当前用户
     user_id = session["user_id"]
-    user = find_user_by_id(user_id)
+    user = load_current_user()
     if not user:
         return jsonify({"success": False, "error": "用户不存在"}), 404
     
@@ -873,6 +4113,7 @@ def upload_avatar():
         # 更新数据库中的头像路径（相对路径）
         avatar_url = f"/static/uploads/avatars/{new_filename}"
         user.avatar = avatar_url
+        invalidate_user_snapshot(user_id)
         db.session.commit()
         
         return jsonify({
@@ -890,8 +4131,7 @@ def upload_avatar():
 @login_required
 def get_avatar_info():
     """获取用户当前头像信息"""
-    user_id = session["user_id"]
-    user = find_user_by_id(user_id)
+    user = load_current_user()
     if not user:
         return jsonify({"success": False, "error": "用户不存在"}), 404
     
@@ -905,20 +4145,49 @@ def get_avatar_info():
 
 # ---------------------------- 活动API ----------------------------
 
-# 获取所有活动接口
+# 获取活动列表接口（按活动ID游标分页）
+# 参数：cursor=上一页最后一个活动ID，limit=每页条数，type=活动类型，include_participants=是否返回参与者预览
 @app.route('/api/activities', methods=['GET'])
 def get_activities():
-    activities = Activity.query.order_by(Activity.id.desc()).all()
-    current_user = find_user_by_id(session.get("user_id")) if session.get("user_id") else None
+    page_size = app.config['ACTIVITY_PAGE_SIZE']
+    limit = request.args.get('limit', page_size, type=int) or page_size
+    limit = max(1, min(limit, app.config['ACTIVITY_PAGE_SIZE_MAX']))
+    cursor = request.args.get('cursor', type=int)
+    activity_type = request.args.get('type', '').strip()
+    include_participants = request.args.get('include_participants', 'false').lower() in ('1', 'true', 'yes')
+    current_user_id = session.get("user_id")
+    
+    # 参与人数和收藏标记作为标量子查询，与活动行在同一条SQL中取回，避免逐条懒加载
+    count_col = db.select(db.func.count()).select_from(activity_participants).where(
+        activity_participants.c.activity_id == Activity.id
+    ).correlate(Activity).scalar_subquery()
+    if current_user_id:
+        favorited_col = db.exists().where(
+            activity_favorites.c.activity_id == Activity.id,
+            activity_favorites.c.user_id == current_user_id
+        ).correlate(Activity)
+    else:
+        favorited_col = db.literal(False)
+    
+    query = db.session.query(Activity, count_col, favorited_col)
+    if cursor:
+        query = query.filter(Activity.id < cursor)
+    if activity_type and activity_type != 'all':
+        query = query.filter(Activity.type == activity_type)
+    
+    # 多取一条用于判断是否还有下一页
+    rows = query.order_by(Activity.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    previews = {}
+    if include_participants and rows:
+        previews = get_participant_previews([act.id for act, _, _ in rows],
+                                            app.config['ACTIVITY_PARTICIPANT_PREVIEW'])
+    
     result = []
-    for act in activities:
-        is_favorited = False
-        if current_user:
-            try:
-                is_favorited = act in current_user.favorite_activities
-            except Exception:
-                is_favorited = False
-        result.append({
+    for act, participant_count, is_favorited in rows:
+        item = {
             "id": act.id,
             "title": act.title,
             "type": act.type,
@@ -927,12 +4196,21 @@ def get_activities():
             "tags": act.tags,
             "description": act.description,
             "initiator_id": act.initiator_id,
-            "participants": [{"id": p.id, "name": p.username} for p in act.participants],
-            "participant_count": len(act.participants),
-            "is_favorited": is_favorited,
+            "participant_count": participant_count or 0,
+            "is_favorited": bool(is_favorited),
             "created_at": act.created_at
-        })
-    return jsonify({"success": True, "data": result, "count": len(result)}), 200
+        }
+        if include_participants:
+            item["participants"] = previews.get(act.id, [])
+        result.append(item)
+    
+    return jsonify({
+        "success": True,
+        "data": result,
+        "count": len(result),
+        "has_more": has_more,
+        "next_cursor": rows[-1][0].id if has_more else None
+    }), 200
 
 # 获取单个活动详情
 @app.route("/api/activities/<int:activity_id>", methods=["GET"])
@@ -970,6 +4248,20 @@ def create_activity():
         if field not in data or not data[field]:
             return jsonify({"success": False, "error": f"缺少必要字段: {field}"}), 400
     
+    # 人数上限：可选的正整数，不填或为 0 表示不限
+    try:
+        participants_limit = int(data.get("participants_limit") or 0) or None
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "人数上限必须是整数"}), 400
+    if participants_limit is not None and participants_limit < 0:
+        return jsonify({"success": False, "error": "人数上限不能为负数"}), 400
+    # 抢报名模式（admission_mode=queue）的候补人数上限，不填表示不限
+    try:
+        waitlist_limit = data.get("waitlist_limit")
+        waitlist_limit = None if waitlist_limit in (None, '') else max(0, int(waitlist_limit))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "候补人数上限必须是整数"}), 400
+    
     # 生成新活动
     new_activity = Activity(
         title=data["title"],
@@ -980,11 +4272,18 @@ def create_activity():
         description=data.get("description", ""),
         initiator_id=session["user_id"],
         status=data.get("status", "upcoming") or "upcoming",
+        participants_limit=participants_limit,
         participant_count=0
     )
     
     db.session.add(new_activity)
+    db.session.flush()
+    index_activity_tags(new_activity)
+    record_tag_trend(parse_tags(new_activity.tags), app.config['TRENDING_CREATE_WEIGHT'])
+    if data.get("admission_mode") == "queue":
+        db.session.add(ActivityAdmission(activity_id=new_activity.id, waitlist_limit=waitlist_limit))
     db.session.commit()
+    activity_recommender.invalidate()
     
     return jsonify({
         "success": True,
@@ -1009,13 +4308,56 @@ def delete_activity(activity_id):
     if not activity:
         return jsonify({"success": False, "error": "活动不存在"}), 404
     
+    participant_ids = [row[0] for row in db.session.query(activity_participants.c.user_id).filter(
+        activity_participants.c.activity_id == activity_id)]
+    title = activity.title
+    
     try:
+        ActivitySignup.query.filter_by(activity_id=activity_id).delete(synchronize_session=False)
+        ActivityAdmission.query.filter_by(activity_id=activity_id).delete(synchronize_session=False)
+        ContentViewDaily.query.filter_by(target_type='activity', target_id=activity_id).delete(synchronize_session=False)
         db.session.delete(activity)
         db.session.commit()
+        activity_recommender.invalidate()
+        notify_users(participant_ids, 'system', '活动取消通知', f'你报名的活动《{title}》已被取消',
+                     related_id=activity_id)
         return jsonify({"success": True, "message": "活动已删除"})
     except Exception as e:
         return jsonify({"success": False, "error": f"删除失败：{str(e)}"}), 500
 
+# 给活动全部参与者发通知（发起人或教师，如时间地点变更）
+@app.route('/api/activities/<int:activity_id>/notify', methods=['POST'])
+@login_required
+def notify_activity(activity_id: int):
+    activity = find_activity(activity_id)
+    if not activity:
+        return jsonify({"success": False, "error": "活动不存在"}), 404
+    if activity.initiator_id != session["user_id"] and not is_teacher(session["user_id"]):
+        return jsonify({"success": False, "error": "仅活动发起人或教师可发送通知"}), 403
+    
+    data = request.get_json() or {}
+    content = (data.get('content') or '').strip()
+    if not content:
+        return jsonify({"success": False, "error": "通知内容不能为空"}), 400
+    
+    notify_activity_participants(activity_id, 'activity', data.get('title') or f'活动《{activity.title}》通知',
+                                 content, related_id=activity_id, exclude=[session["user_id"]])
+    return jsonify({"success": True, "message": "通知已提交发送"}), 202
+
+# 活动浏览统计（发起人或教师）：最近 days 天的逐日浏览次数与独立访客估计
+@app.route('/api/activities/<int:activity_id>/views', methods=['GET'])
+@login_required
+def activity_views(activity_id: int):
+    activity = find_activity(activity_id)
+    if not activity:
+        return jsonify({"success": False, "error": "活动不存在"}), 404
+    if activity.initiator_id != session["user_id"] and not is_teacher(session["user_id"]):
+        return jsonify({"success": False, "error": "仅活动发起人或教师可查看浏览统计"}), 403
+    days = max(1, min(request.args.get('days', 7, type=int), app.config['VIEW_REPORT_DAYS_MAX']))
+    report = view_report('activity', activity_id, days)
+    report['view_count'] = view_counts('activity', [activity_id])[activity_id]
+    return jsonify({"success": True, "data": report})
+
 # 活动报名接口
 @app.route('/api/activities/<int:activity_id>/join', methods=['POST'])
 @login_required
@@ -1024,23 +4366,43 @@ def join_activity(activity_id: int):
     if not activity:
         return jsonify({"success": False, "error": "活动不存在"}), 404
     
-    user = find_user_by_id(session["user_id"])
+    user_id = session["user_id"]
+    title = activity.title
+    
+    # 抢报名活动：只登记排队，由后台按批放号
+    if db.session.get(ActivityAdmission, activity_id):
+        status, ticket, ahead = signup_admission.enqueue(activity_id, user_id)
+        return signup_response(activity_id, title, status, ticket, ahead)
     
-    # 检查是否已报名
-    if user in activity.participants:
+    # 报名关系表的主键 (user_id, activity_id) 即“是否已报名”的判断，先写入，重复报名由主键冲突拦下
+    try:
+        db.session.execute(activity_participants.insert().values(user_id=user_id, activity_id=activity_id))
+    except IntegrityError:
+        db.session.rollback()
         return jsonify({"success": False, "error": "您已报名该活动"}), 400
     
-    activity.participants.append(user)
-    # 同步参与人数，供“热门活动”排序使用
-    activity.participant_count = len(activity.participants)
+    # 参与人数原子加一；设置了人数上限时只在未满时更新，并发报名不会超员
+    count = db.func.coalesce(Activity.participant_count, 0)
+    seated = Activity.query.filter(
+        Activity.id == activity_id,
+        db.or_(Activity.participants_limit == None, Activity.participants_limit <= 0,  # noqa: E711
+               count < Activity.participants_limit)
+    ).update({Activity.participant_count: count + 1}, synchronize_session=False)
+    if not seated:
+        db.session.rollback()
+        return jsonify({"success": False, "error": "活动报名人数已满"}), 409
+    
+    on_activity_membership_changed(user_id, activity_id, 1)
+    participants_count = db.session.query(Activity.participant_count).filter(Activity.id == activity_id).scalar()
     db.session.commit()
+    activity_recommender.invalidate(user_id)
     
     return jsonify({
         "success": True,
-        "message": f"成功报名活动: {activity.title}",
+        "message": f"成功报名活动: {title}",
         "data": {
             "activity_id": activity_id,
-            "participants_count": len(activity.participants)
+            "participants_count": participants_count
         }
     })
 
@@ -1052,24 +4414,127 @@ def leave_activity(activity_id: int):
     if not activity:
         return jsonify({"success": False, "error": "活动不存在"}), 404
     
-    user = find_user_by_id(session["user_id"])
-    if user not in activity.participants:
+    user_id = session["user_id"]
+    title = activity.title
+    
+    # 按主键删除报名关系，删到了才把参与人数原子减一
+    removed = db.session.execute(activity_participants.delete().where(
+        activity_participants.c.user_id == user_id, activity_participants.c.activity_id == activity_id
+    )).rowcount
+    signup = ActivitySignup.query.filter_by(activity_id=activity_id, user_id=user_id).first()
+    if not removed:
+        if signup and signup.status == 'waitlisted':
+            db.session.delete(signup)
+            db.session.commit()
+            return jsonify({"success": True, "message": f"已退出活动候补: {title}",
+                            "data": {"activity_id": activity_id, "status": "none"}})
+        db.session.rollback()
         return jsonify({"success": False, "error": "您未报名该活动"}), 400
     
-    activity.participants.remove(user)
-    # 同步参与人数，供“热门活动”排序使用
-    activity.participant_count = len(activity.participants)
+    Activity.query.filter(Activity.id == activity_id, Activity.participant_count > 0).update(
+        {Activity.participant_count: Activity.participant_count - 1}, synchronize_session=False)
+    on_activity_membership_changed(user_id, activity_id, -1)
+    if signup:
+        db.session.delete(signup)
+    # 空出的名额按候补顺序自动递补（上面的更新已持有活动行写锁）
+    promoted = promote_waitlist(activity_id)
+    participants_count = db.session.query(Activity.participant_count).filter(Activity.id == activity_id).scalar()
     db.session.commit()
+    activity_recommender.invalidate(user_id)
+    if promoted:
+        for promoted_id in promoted:
+            activity_recommender.invalidate(promoted_id)
+            event_broker.publish(promoted_id, 'signup', {'activity_id': activity_id, 'status': 'admitted'})
+        notify_users(promoted, 'activity', '候补成功', f'你候补的活动《{title}》有了空位，已自动为你报名',
+                     related_id=activity_id)
     
     return jsonify({
         "success": True,
-        "message": f"已取消报名活动: {activity.title}",
+        "message": f"已取消报名活动: {title}",
         "data": {
             "activity_id": activity_id,
-            "participants_count": len(activity.participants)
+            "participants_count": participants_count
         }
     })
 
+SIGNUP_MESSAGES = {
+    'queued': '已进入报名队列，前面还有 {ahead} 人',
+    'admitted': '报名成功: {title}',
+    'waitlisted': '名额已满，已进入候补第 {position} 位',
+}
+
+def signup_response(activity_id, title, status, ticket=None, ahead=None):
+    """抢报名接口的统一返回：queued 为 202，admitted/waitlisted 为 200，候补也满为 409，队列满为 503"""
+    data = {"activity_id": activity_id, "status": status, "ticket": ticket}
+    position = None
+    if status == 'waitlisted':
+        signup = ActivitySignup.query.filter_by(activity_id=activity_id, user_id=session["user_id"]).first()
+        position = waitlist_position(activity_id, signup.id) if signup else None
+    elif status == 'queued':
+        position = ahead + 1
+    data["position"] = position
+    if status == 'full':
+        return jsonify({"success": False, "error": "报名人数和候补名额均已满", "data": data}), 409
+    if status == 'busy':
+        return jsonify({"success": False, "error": "报名人数过多，请稍后重试", "data": data}), 503, {"Retry-After": "1"}
+    if status not in SIGNUP_MESSAGES:
+        return jsonify({"success": False, "error": "报名处理失败，请重试", "data": data}), 500
+    message = SIGNUP_MESSAGES[status].format(ahead=ahead, title=title, position=position)
+    return jsonify({"success": True, "message": message, "data": data}), 202 if status == 'queued' else 200
+
+# 查询当前用户在抢报名活动中的状态：queued（排队中）/ admitted / waitlisted / full（候补也满）/ none
+# none 表示没有报名记录：未报名、放号失败或服务重启时排队丢失，前端应提示重新报名
+@app.route("/api/activities/<int:activity_id>/signup", methods=["GET"])
+@login_required
+def get_signup_status(activity_id: int):
+    user_id = session["user_id"]
+    data = {"activity_id": activity_id, "status": "none", "ticket": None, "position": None}
+    queued = signup_admission.position(activity_id, user_id)
+    if queued:
+        data.update(status='queued', ticket=queued[0], position=queued[1] + 1)
+        return jsonify({"success": True, "data": data})
+    if db.session.execute(db.select(activity_participants.c.user_id).where(
+            activity_participants.c.user_id == user_id, activity_participants.c.activity_id == activity_id)).first():
+        data["status"] = 'admitted'
+        return jsonify({"success": True, "data": data})
+    signup = ActivitySignup.query.filter_by(activity_id=activity_id, user_id=user_id).first()
+    if signup:
+        data["status"] = 'full' if signup.status == 'rejected' else signup.status
+        if signup.status == 'waitlisted':
+            data["position"] = waitlist_position(activity_id, signup.id)
+    return jsonify({"success": True, "data": data})
+
+# 开启/关闭抢报名模式（发起人或教师）；关闭后已有的候补仍会在有人取消报名时递补
+@app.route("/api/activities/<int:activity_id>/admission", methods=["PUT"])
+@login_required
+def update_activity_admission(activity_id: int):
+    activity = find_activity(activity_id)
+    if not activity:
+        return jsonify({"success": False, "error": "活动不存在"}), 404
+    if activity.initiator_id != session["user_id"] and not is_teacher(session["user_id"]):
+        return jsonify({"success": False, "error": "仅发起人或教师可修改报名方式"}), 403
+    
+    data = request.get_json() or {}
+    try:
+        waitlist_limit = data.get("waitlist_limit")
+        waitlist_limit = None if waitlist_limit in (None, '') else max(0, int(waitlist_limit))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "候补人数上限必须是整数"}), 400
+    
+    admission = db.session.get(ActivityAdmission, activity_id)
+    enabled = bool(data.get("enabled", True))
+    if enabled:
+        if admission is None:
+            admission = ActivityAdmission(activity_id=activity_id)
+            db.session.add(admission)
+        admission.waitlist_limit = waitlist_limit
+    elif admission is not None:
+        db.session.delete(admission)
+    db.session.commit()
+    
+    return jsonify({"success": True, "data": {"activity_id": activity_id, "enabled": enabled,
+                                              "waitlist_limit": waitlist_limit if enabled else None}})
+
 # 活动收藏/取消收藏接口
 @app.route("/api/activities/<int:activity_id>/favorite", methods=["POST"])
 @login_required
@@ -1078,27 +4543,32 @@ def favorite_activity(activity_id: int):
     if not activity:
         return jsonify({"success": False, "error": "活动不存在"}), 404
     
-    user = find_user_by_id(session["user_id"])
-    is_favorited = activity in user.favorite_activities
+    user_id = session["user_id"]
     
+    # 按主键删除收藏关系：删到了说明原来已收藏（取消收藏），否则写入收藏
+    removed = db.session.execute(activity_favorites.delete().where(
+        activity_favorites.c.user_id == user_id, activity_favorites.c.activity_id == activity_id
+    )).rowcount
+    is_favorited = not removed
     if is_favorited:
-        # 取消收藏
-        user.favorite_activities.remove(activity)
-        message = "已取消收藏"
-    else:
-        # 添加收藏
-        user.favorite_activities.append(activity)
-        message = "活动已收藏"
-    
+        try:
+            db.session.execute(activity_favorites.insert().values(user_id=user_id, activity_id=activity_id))
+        except IntegrityError:
+            # 同一用户的并发点击已经写入了收藏，结果相同
+            db.session.rollback()
+    message = "活动已收藏" if is_favorited else "已取消收藏"
+    favorites_count = db.session.query(db.func.count()).select_from(activity_favorites).filter(
+        activity_favorites.c.user_id == user_id).scalar()
     db.session.commit()
+    activity_recommender.invalidate(user_id)
     
     return jsonify({
         "success": True,
         "message": message,
         "data": {
             "activity_id": activity_id,
-            "is_favorited": not is_favorited,
-            "favorites_count": len(user.favorite_activities)
+            "is_favorited": is_favorited,
+            "favorites_count": favorites_count
         }
     })
 
@@ -1130,7 +4600,7 @@ def search_activities():
             "type": act.type,
             "time": act.time,
             "location": act.location,
-            "participants_count": len(act.participants)
+            "participants_count": act.participant_count if act.participant_count is not None else len(act.participants)
         })
     
     return jsonify({
@@ -1140,35 +4610,41 @@ def search_activities():
         "search_info": {"keyword": keyword.strip('%') if keyword else '', "type": search_type}
     })
 
-# 活动推荐接口
+# 活动推荐接口（按兴趣、历史报名/收藏、热度与新鲜度排序的前 K 个活动）
 @app.route('/api/activities/recommend', methods=['GET'])
 @login_required
 def recommend_activities():
-    # 获取当前用户的兴趣标签
-    user = find_user_by_id(session['user_id'])
-    user_hobbies = user.hobbies.split(',') if user.hobbies else []
-    
-    if not user_hobbies:
-        return jsonify({'success': True, 'activities': [], 'message': '暂无兴趣标签，推荐热门活动'}), 200
-    
-    # 匹配活动标签（包含任意一个兴趣标签）
+    user_id = session['user_id']
+    top_k = app.config['ACTIVITY_RECOMMEND_TOP_K']
+    
+    ranked = activity_recommender.get(user_id)
+    if ranked is None:
+        version = activity_recommender.version()
+        user = load_current_user()
+        hobbies = parse_tags(user.hobbies if user else '')
+        ranked = score_activities(user_id, hobbies, top_k)
+        activity_recommender.put(user_id, ranked, version)
+    
+    limit = max(1, min(request.args.get('limit', top_k, type=int), top_k))
+    ranked = ranked[:limit]
+    activities = {act.id: act for act in Activity.query.filter(Activity.id.in_([a for a, _ in ranked]))}
     recommended = []
-    activities = Activity.query.order_by(Activity.id.desc()).all()
-    
-    for act in activities:
-        act_tags = act.tags.split(',') if act.tags else []
-        if any(tag in user_hobbies for tag in act_tags):
-            recommended.append({
-                'id': act.id,
-                'title': act.title,
-                'type': act.type,
-                'time': act.time,
-                'location': act.location,
-                'tags': act.tags,
-                'participant_count': len(act.participants)
-            })
+    for activity_id, score in ranked:
+        act = activities.get(activity_id)
+        if not act:
+            continue
+        recommended.append({
+            'id': act.id,
+            'title': act.title,
+            'type': act.type,
+            'time': act.time,
+            'location': act.location,
+            'tags': act.tags,
+            'participant_count': act.participant_count or 0,
+            'score': score
+        })
     
-    return jsonify({'success': True, 'activities': recommended}), 200
+    return jsonify({'success': True, 'activities': recommended, 'count': len(recommended)}), 200
 
 # ---------------------------- 帖子与结构化发布 API ----------------------------
 
@@ -1189,15 +4665,77 @@ def api_similar_posts():
     candidates = find_similar_posts(title, content, threshold)
     return jsonify({'success': True, 'data': candidates, 'count': len(candidates)})
 
+# 帖子全文搜索（按相关度排序，仅返回审核通过的帖子，带高亮摘要）
+@app.route('/api/posts/search', methods=['GET'])
+def api_search_posts():
+    keyword = request.args.get('q', '').strip()
+    category = request.args.get('category', '')
+    page = request.args.get('page', 1, type=int)
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), 50))
+    
+    if not keyword:
+        return jsonify({'success': False, 'error': '请提供搜索关键词'}), 400
+    
+    query = search_posts_query(keyword, category)
+    if query is None:
+        query = Post.query.filter(
+            Post.review_status == 'approved',
+            db_or(Post.title.contains(keyword), Post.content.contains(keyword))
+        )
+        if category:
+            query = query.filter(Post.category == category)
+        query = query.order_by(Post.id.desc())
+    
+    posts = query.paginate(page=page, per_page=per_page, error_out=False)
+    return jsonify({
+        'success': True,
+        'data': [{
+            'id': p.id,
+            'title': p.title,
+            'category': p.category,
+            'tags': p.tags.split(',') if p.tags else [],
+            'snippet': str(search_snippet(p.content, keyword)),
+            'author_id': p.author_id,
+            'created_at': p.created_at
+        } for p in posts.items],
+        'count': len(posts.items),
+        'total': posts.total,
+        'page': posts.page,
+        'pages': posts.pages
+    })
+
 # 获取帖子列表（仅显示审核通过或自己发布的帖子）
+# 参数：category / tag / author_id 过滤；cursor（上一页 next_cursor，即最后一条的 id）+ limit 分页；
+# view=summary 时不返回正文、媒体与模板字段，只返回 excerpt 摘要
 @app.route('/api/posts', methods=['GET'])
 def list_posts_api():
     category = request.args.get('category')
-    tag = request.args.get('tag')
-    query = Post.query.order_by(Post.id.desc())
+    tag = (request.args.get('tag') or '').strip()
+    author_id = request.args.get('author_id')
+    cursor = request.args.get('cursor', type=int)
+    limit = request.args.get('limit', app.config['POST_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, app.config['POST_PAGE_SIZE_MAX']))
+    summary = request.args.get('view') == 'summary'
+    
+    excerpt_length = app.config['POST_EXCERPT_LENGTH']
+    if summary:
+        # 摘要视图只取需要的列，正文在 SQL 里截断，不把整篇内容读进内存
+        query = db.session.query(
+            Post.id, Post.title, Post.category, Post.tags, Post.author_id, Post.is_official,
+            Post.org_name, Post.review_status, Post.created_at,
+            db.func.substr(Post.content, 1, excerpt_length + 1).label('excerpt')
+        )
+    else:
+        query = Post.query
     
+    if tag:
+        query = query.join(PostTag, db.and_(PostTag.post_id == Post.id, PostTag.tag == tag))
     if category:
         query = query.filter(Post.category == category)
+    if author_id:
+        query = query.filter(Post.author_id == author_id)
+    if cursor:
+        query = query.filter(Post.id < cursor)
     
     # 过滤条件：审核通过 或 自己发布的帖子
     current_user_id = session.get('user_id')
@@ -1211,41 +4749,60 @@ def list_posts_api():
     else:
         query = query.filter(Post.review_status == 'approved')
     
+    rows = query.order_by(Post.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    # 本页帖子的互动计数与当前用户的互动一次批量取出
+    reaction_counts, my_reactions = post_reaction_summary([p.id for p in rows], current_user_id)
+    
     results = []
-    for p in query.all():
-        tags = p.tags.split(',') if p.tags else []
-        if tag and tag not in tags:
+    for p in rows:
+        item = {
+            'id': p.id,
+            'title': p.title,
+            'category': p.category,
+            'tags': parse_tags(p.tags),
+            'author_id': p.author_id,
+            'is_official': p.is_official,
+            'org_name': p.org_name,
+            'review_status': p.review_status,
+            'created_at': p.created_at,
+            'reactions': reaction_counts[p.id],
+            'my_reactions': my_reactions[p.id]
+        }
+        if summary:
+            excerpt = p.excerpt or ''
+            item['excerpt'] = excerpt[:excerpt_length] + ('...' if len(excerpt) > excerpt_length else '')
+            results.append(item)
             continue
         
-        media = []
+        # 媒体与模板字段只对本页返回的帖子解析
         try:
             media = json.loads(p.media) if p.media else []
         except Exception:
             media = []
         
-        metadata = {}
         try:
             metadata = json.loads(p.metadata_json) if p.metadata_json else {}
         except Exception:
             metadata = {}
         
-        results.append({
-            'id': p.id,
-            'title': p.title,
-            'category': p.category,
+        item.update({
             'content': p.content,
             'is_markdown': p.is_markdown,
-            'tags': tags,
             'media': media,
-            'metadata': metadata,
-            'author_id': p.author_id,
-            'is_official': p.is_official,
-            'org_name': p.org_name,
-            'review_status': p.review_status,
-            'created_at': p.created_at
+            'metadata': metadata
         })
+        results.append(item)
     
-    return jsonify({'success': True, 'data': results, 'count': len(results)})
+    return jsonify({
+        'success': True,
+        'data': results,
+        'count': len(results),
+        'has_more': has_more,
+        'next_cursor': results[-1]['id'] if has_more else None
+    })
 
 @app.route('/api/posts/<int:post_id>', methods=['GET'])
 def get_post_api(post_id: int):
@@ -1258,6 +4815,8 @@ def get_post_api(post_id: int):
     if p.review_status != 'approved' and p.author_id != current_user_id and not is_teacher(current_user_id):
         return jsonify({'success': False, 'error': '该帖子未审核或无访问权限'}), 403
     
+    record_view('post', post_id)
+    
     try:
         media = json.loads(p.media) if p.media else []
     except Exception:
@@ -1268,6 +4827,8 @@ def get_post_api(post_id: int):
     except Exception:
         metadata = {}
     
+    reaction_counts, my_reactions = post_reaction_summary([p.id], current_user_id)
+    
     return jsonify({'success': True, 'data': {
         'id': p.id,
         'title': p.title,
@@ -1281,9 +4842,35 @@ def get_post_api(post_id: int):
         'is_official': p.is_official,
         'org_name': p.org_name,
         'review_status': p.review_status,
-        'created_at': p.created_at
+        'created_at': p.created_at,
+        'reactions': reaction_counts[p.id],
+        'my_reactions': my_reactions[p.id],
+        'view_count': view_counts('post', [p.id])[p.id]
     }})
 
+# 热门标签：最近 hours 小时（默认一周）发帖、活动与互动最多的标签
+@app.route('/api/tags/trending', methods=['GET'])
+def trending_tags_api():
+    hours = max(1, min(request.args.get('hours', app.config['TRENDING_WINDOW_HOURS'], type=int),
+                       app.config['TRENDING_RETENTION_HOURS']))
+    limit = max(1, min(request.args.get('limit', 20, type=int), app.config['TRENDING_TAG_CAPACITY']))
+    data = trending_tags.trending(hours, limit)
+    return jsonify({'success': True, 'data': data, 'count': len(data), 'hours': hours})
+
+# 帖子浏览统计（作者或教师）：最近 days 天的逐日浏览次数与独立访客估计
+@app.route('/api/posts/<int:post_id>/views', methods=['GET'])
+@login_required
+def post_views(post_id: int):
+    p = db.session.get(Post, post_id)
+    if not p:
+        return jsonify({'success': False, 'error': '帖子不存在'}), 404
+    if p.author_id != session['user_id'] and not is_teacher(session['user_id']):
+        return jsonify({'success': False, 'error': '仅作者或教师可查看浏览统计'}), 403
+    days = max(1, min(request.args.get('days', 7, type=int), app.config['VIEW_REPORT_DAYS_MAX']))
+    report = view_report('post', post_id, days)
+    report['view_count'] = view_counts('post', [post_id])[post_id]
+    return jsonify({'success': True, 'data': report})
+
 # 创建帖子接口（学生发布需审核，教师发布直接通过）
 @app.route('/api/posts', methods=['POST'])
 @login_required
@@ -1362,6 +4949,13 @@ def create_post_api():
     )
     
     db.session.add(p)
+    db.session.flush()
+    index_post_similarity(p)
+    index_post_search(p)
+    index_post_tags(p)
+    create_post_stats(p)
+    if review_status == 'approved':
+        record_tag_trend(parse_tags(p.tags), app.config['TRENDING_CREATE_WEIGHT'])
     db.session.commit()
     
     return jsonify({
@@ -1383,6 +4977,12 @@ def delete_post(post_id):
         return jsonify({'success': False, 'error': '无权限删除该帖子'}), 403
     
     try:
+        remove_post_similarity(post.id)
+        remove_post_search(post.id)
+        PostReviewLease.query.filter_by(post_id=post.id).delete(synchronize_session=False)
+        PostReaction.query.filter_by(post_id=post.id).delete(synchronize_session=False)
+        PostReactionDelta.query.filter_by(post_id=post.id).delete(synchronize_session=False)
+        ContentViewDaily.query.filter_by(target_type='post', target_id=post.id).delete(synchronize_session=False)
         db.session.delete(post)
         db.session.commit()
         return jsonify({"success": True, "message": "帖子已删除"})
@@ -1404,6 +5004,12 @@ def review_post(post_id):
     if "status" not in data or data["status"] not in ['approved', 'rejected']:
         return jsonify({"success": False, "error": "状态必须是approved或rejected"}), 400
     
+    lease = db.session.get(PostReviewLease, post_id)
+    if lease and lease.teacher_id != session["user_id"] and lease.expires_at > review_lease_now():
+        return jsonify({"success": False, "error": "该帖子已被其他教师领取审核"}), 409
+    if lease:
+        db.session.delete(lease)
+    
     # 记录审核结果
     review = PostReview(
         post_id=post_id,
@@ -1413,7 +5019,10 @@ def review_post(post_id):
     )
     
     # 更新帖子审核状态
+    if data["status"] == 'approved' and post.review_status != 'approved':
+        record_tag_trend(parse_tags(post.tags), app.config['TRENDING_CREATE_WEIGHT'])
     post.review_status = data["status"]
+    update_post_search_status([post_id], data["status"])
     
     try:
         db.session.add(review)
@@ -1433,21 +5042,115 @@ def get_pending_posts():
     if not is_teacher(session["user_id"]):
         return jsonify({"success": False, "error": "仅教师可查看待审核帖子"}), 403
     
-    posts = Post.query.filter_by(review_status='pending').order_by(Post.id.desc()).all()
-    result = []
+    teacher_id = session["user_id"]
+    cursor = request.args.get('cursor', type=int)
+    page_size = app.config['REVIEW_PAGE_SIZE']
+    limit = max(1, min(request.args.get('limit', page_size, type=int) or page_size, app.config['REVIEW_PAGE_SIZE_MAX']))
     
-    for p in posts:
-        author = find_user_by_id(p.author_id)
-        result.append({
-            "id": p.id,
-            "title": p.title,
-            "content": p.content[:100] + "..." if len(p.content) > 100 else p.content,
-            "category": p.category,
-            "author": author.username if author else "未知用户",
-            "created_at": p.created_at
-        })
+    query = review_queue_query(review_lease_now())
+    if cursor:
+        query = query.filter(Post.id < cursor)
+    rows = query.order_by(Post.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    result = [review_queue_item(row, teacher_id) for row in rows[:limit]]
+    total = db.session.query(db.func.count(Post.id)).filter(Post.review_status == 'pending').scalar()
     
-    return jsonify({"success": True, "data": result, "count": len(result)})
+    return jsonify({
+        "success": True,
+        "data": result,
+        "count": len(result),
+        "total": total,
+        "has_more": has_more,
+        "next_cursor": result[-1]["id"] if has_more else None
+    })
+
+# 领取一批待审核帖子（仅教师）：按提交先后分配，领到的帖子在租约期内不会分给其他教师；再次调用会续期并补足
+@app.route('/api/posts/review/claim', methods=['POST'])
+@login_required
+def claim_review_posts():
+    teacher_id = session["user_id"]
+    if not is_teacher(teacher_id):
+        return jsonify({"success": False, "error": "仅教师可审核帖子"}), 403
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        limit = max(1, min(int(data.get("limit") or app.config['REVIEW_PAGE_SIZE']), app.config['REVIEW_CLAIM_MAX']))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "limit 必须是整数"}), 400
+    
+    try:
+        claimed = claim_review_batch(teacher_id, limit)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": f"领取失败：{str(e)}"}), 500
+    
+    rows = review_queue_query(review_lease_now()).filter(Post.id.in_(claimed)).order_by(Post.id.asc()).all() if claimed else []
+    result = [review_queue_item(row, teacher_id) for row in rows]
+    total = db.session.query(db.func.count(Post.id)).filter(Post.review_status == 'pending').scalar()
+    return jsonify({
+        "success": True,
+        "data": result,
+        "count": len(result),
+        "total": total,
+        "lease_expires_at": result[0]["lease_expires_at"] if result else None
+    })
+
+# 放弃已领取的帖子（仅教师）：post_ids 为空时放弃自己领取的全部帖子
+@app.route('/api/posts/review/release', methods=['POST'])
+@login_required
+def release_review_posts():
+    teacher_id = session["user_id"]
+    if not is_teacher(teacher_id):
+        return jsonify({"success": False, "error": "仅教师可审核帖子"}), 403
+    
+    post_ids = (request.get_json(silent=True) or {}).get("post_ids")
+    query = PostReviewLease.query.filter(PostReviewLease.teacher_id == teacher_id)
+    if post_ids:
+        query = query.filter(PostReviewLease.post_id.in_(post_ids))
+    released = query.delete(synchronize_session=False)
+    db.session.commit()
+    return jsonify({"success": True, "data": {"released": released}})
+
+# 批量审核（仅教师）：decisions 为 [{post_id, status, comment}]，一个事务内写入全部审核记录
+# 已被审核过或正被其他教师领取的帖子跳过，在 skipped 中返回原因
+@app.route('/api/posts/review/bulk', methods=['POST'])
+@login_required
+def bulk_review_posts():
+    teacher_id = session["user_id"]
+    if not is_teacher(teacher_id):
+        return jsonify({"success": False, "error": "仅教师可审核帖子"}), 403
+    
+    data = request.get_json(silent=True) or {}
+    decisions = {}
+    for item in data.get("decisions") or []:
+        try:
+            post_id = int(item.get("post_id"))
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({"success": False, "error": "post_id 必须是整数"}), 400
+        if item.get("status") not in ['approved', 'rejected']:
+            return jsonify({"success": False, "error": "状态必须是approved或rejected"}), 400
+        decisions[post_id] = (post_id, item["status"], (item.get("comment") or "")[:200])
+    if not decisions:
+        return jsonify({"success": False, "error": "请提供要审核的帖子"}), 400
+    if len(decisions) > app.config['REVIEW_BULK_MAX']:
+        return jsonify({"success": False, "error": f"一次最多审核 {app.config['REVIEW_BULK_MAX']} 篇帖子"}), 400
+    
+    try:
+        reviewed, skipped = apply_review_decisions(teacher_id, list(decisions.values()))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"success": False, "error": f"审核失败：{str(e)}"}), 500
+    
+    return jsonify({
+        "success": True,
+        "message": f"已审核 {len(reviewed)} 篇帖子" + (f"，跳过 {len(skipped)} 篇" if skipped else ""),
+        "data": {
+            "reviewed": reviewed,
+            "skipped": [{"post_id": post_id, "reason": reason} for post_id, reason in skipped.items()]
+        }
+    })
 
 # 帖子互动：点赞/收藏/转发/有用/打赏等
 @app.route('/api/posts/<int:post_id>/react', methods=['POST'])
@@ -1462,7 +5165,23 @@ def post_react(post_id: int):
     if not rtype:
         return jsonify({'success': False, 'error': '缺少 type 字段'}), 400
     
-    # 记录反应
+    # 点赞/收藏/转发/有用/无用是开关状态：active 为 true/false 时设置为该状态（重复提交无副作用），不传则切换
+    if rtype in TOGGLE_REACTIONS:
+        user_id = session.get('user_id')
+        active = data.get('active')
+        try:
+            active, changed = set_post_reaction(user_id, post_id, rtype, None if active is None else bool(active))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'success': False, 'error': f'服务器错误：{str(e)}'}), 500
+        if changed and active:
+            notify_post_author(p, user_id, rtype)
+        counts, mine = post_reaction_summary([post_id], user_id)
+        return jsonify({'success': True, 'message': '已记录互动' if active else '已取消互动', 'data': {
+            'type': rtype, 'active': active, 'reactions': counts[post_id], 'my_reactions': mine[post_id]}}), 200
+    
+    # 打赏等其他互动按次记录
     try:
         react = Reaction(
             user_id=session.get('user_id'),
@@ -1472,45 +5191,117 @@ def post_react(post_id: int):
         )
         db.session.add(react)
         db.session.commit()
+        notify_post_author(p, session.get('user_id'), rtype)
         return jsonify({'success': True, 'message': '已记录互动'}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': f'服务器错误：{str(e)}'}), 500
 
-# 获取帖子评论（含嵌套）
+def comment_cursor(row):
+    """顶层评论的游标：置顶标记与评论 ID，如 "0-15"（置顶）、"1-42"（普通）"""
+    return f"{0 if row.is_pinned else 1}-{row.id}"
+
+def comment_access_error(p):
+    """帖子评论的访问权限：审核通过 或 自己发布的帖子 或 教师；无权限时返回错误响应"""
+    current_user_id = session.get('user_id')
+    if p.review_status != 'approved' and p.author_id != current_user_id and not is_teacher(current_user_id):
+        return jsonify({'success': False, 'error': '该帖子未审核或无访问权限'}), 403
+    return None
+
+# 获取帖子的顶层评论（分页，置顶在前、其余按发表先后），每条带回复总数，回复通过 /api/comments/<id>/replies 展开
+# 参数：cursor（上一页 next_cursor）+ limit
 @app.route('/api/posts/<int:post_id>/comments', methods=['GET'])
 def get_post_comments(post_id: int):
     p = Post.query.get(post_id)
     if not p:
         return jsonify({'success': False, 'error': '帖子不存在'}), 404
+    denied = comment_access_error(p)
+    if denied:
+        return denied
+    
+    page_size = app.config['COMMENT_PAGE_SIZE']
+    limit = max(1, min(request.args.get('limit', page_size, type=int) or page_size, app.config['COMMENT_PAGE_SIZE_MAX']))
+    query = comment_page_query(post_id).filter(CommentPath.depth == 0)
+    cursor = request.args.get('cursor', '')
+    if cursor:
+        try:
+            pin_rank, last_id = (int(part) for part in cursor.split('-', 1))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'cursor 格式错误'}), 400
+        query = query.filter(db.or_(
+            CommentPath.pin_rank > pin_rank,
+            db.and_(CommentPath.pin_rank == pin_rank, CommentPath.comment_id > last_id)
+        ))
+    rows = query.order_by(CommentPath.pin_rank.asc(), CommentPath.comment_id.asc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    total = db.session.query(PostStats.comment_count).filter(PostStats.post_id == post_id).scalar() or 0
     
-    # 权限验证：审核通过 或 自己发布的帖子 或 教师
-    current_user_id = session.get('user_id')
-    if p.review_status != 'approved' and p.author_id != current_user_id and not is_teacher(current_user_id):
-        return jsonify({'success': False, 'error': '该帖子未审核或无访问权限'}), 403
-    
-    # 获取所有评论并构建树形
-    all_comments = Comment.query.filter_by(post_id=post_id).order_by(Comment.created_at.asc()).all()
-    
-    comments_by_id = {c.id: {
-        'id': c.id,
-        'post_id': c.post_id,
-        'author_id': c.author_id,
-        'content': c.content,
-        'parent_id': c.parent_id,
-        'is_pinned': c.is_pinned,
-        'created_at': c.created_at,
-        'children': []
-    } for c in all_comments}
-    
-    roots = []
-    for c in comments_by_id.values():
-        if c['parent_id'] and c['parent_id'] in comments_by_id:
-            comments_by_id[c['parent_id']]['children'].append(c)
-        else:
-            roots.append(c)
+    return jsonify({
+        'success': True,
+        'data': [comment_item(row) for row in rows],
+        'count': len(rows),
+        'total': total,
+        'has_more': has_more,
+        'next_cursor': comment_cursor(rows[-1]) if has_more else None
+    }), 200
+
+# 展开某条评论的回复子树：按先序（即对话顺序）分页，最多向下 depth 层；
+# 更深的回复不返回，其上层评论的 reply_count > 0 且 children 为空时，客户端可以从该评论继续展开
+# 参数：depth / limit / cursor（上一页 next_cursor）
+@app.route('/api/comments/<int:comment_id>/replies', methods=['GET'])
+def get_comment_replies(comment_id: int):
+    root = db.session.query(CommentPath, Post).join(Post, Post.id == CommentPath.post_id).filter(
+        CommentPath.comment_id == comment_id).first()
+    if not root:
+        return jsonify({'success': False, 'error': '评论不存在'}), 404
+    root_path, p = root
+    denied = comment_access_error(p)
+    if denied:
+        return denied
+    
+    page_size = app.config['COMMENT_REPLY_PAGE_SIZE']
+    limit = max(1, min(request.args.get('limit', page_size, type=int) or page_size, app.config['COMMENT_PAGE_SIZE_MAX']))
+    depth = max(1, min(request.args.get('depth', app.config['COMMENT_REPLY_DEPTH'], type=int) or 1,
+                       app.config['COMMENT_MAX_DEPTH']))
+    lower, upper = comment_subtree_bounds(root_path.path)
+    cursor = request.args.get('cursor', '')
+    if cursor and cursor.startswith(lower):
+        lower = cursor
+    rows = comment_page_query(p.id).filter(
+        CommentPath.path > lower, CommentPath.path < upper, CommentPath.depth <= root_path.depth + depth
+    ).order_by(CommentPath.path.asc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
     
-    return jsonify({'success': True, 'data': roots, 'count': len(all_comments)}), 200
+    return jsonify({
+        'success': True,
+        'data': nest_comment_rows(rows),
+        'count': len(rows),
+        'total': root_path.reply_count,
+        'has_more': has_more,
+        'next_cursor': rows[-1].path if has_more else None
+    }), 200
+
+# 置顶/取消置顶顶层评论（帖子作者或教师）
+@app.route('/api/comments/<int:comment_id>/pin', methods=['POST'])
+@login_required
+def pin_comment(comment_id: int):
+    c = db.session.get(Comment, comment_id)
+    if not c:
+        return jsonify({'success': False, 'error': '评论不存在'}), 404
+    p = db.session.get(Post, c.post_id)
+    if p.author_id != session['user_id'] and not is_teacher(session['user_id']):
+        return jsonify({'success': False, 'error': '仅帖子作者或教师可置顶评论'}), 403
+    if c.parent_id:
+        return jsonify({'success': False, 'error': '只能置顶顶层评论'}), 400
+    
+    pinned = bool((request.get_json(silent=True) or {}).get('pinned', not c.is_pinned))
+    c.is_pinned = pinned
+    CommentPath.query.filter_by(comment_id=comment_id).update({CommentPath.pin_rank: 0 if pinned else 1},
+                                                              synchronize_session=False)
+    db.session.commit()
+    return jsonify({'success': True, 'data': {'id': comment_id, 'is_pinned': pinned}})
 
 # 提交评论或回复
 @app.route('/api/posts/<int:post_id>/comments', methods=['POST'])
@@ -1532,16 +5323,23 @@ def post_comment(post_id: int):
     if not content:
         return jsonify({'success': False, 'error': '评论内容不能为空'}), 400
     
-    # 如果 parent_id 提供，检查父评论是否存在
+    # 如果 parent_id 提供，检查父评论是否存在（路径行与评论同时写入，按路径行判断即可）
+    parent_path = None
     if parent_id:
-        parent = Comment.query.get(parent_id)
-        if not parent or parent.post_id != post_id:
+        parent_path = db.session.get(CommentPath, parent_id)
+        if not parent_path or parent_path.post_id != post_id:
             return jsonify({'success': False, 'error': '父评论不存在'}), 400
+        if parent_path.depth + 1 > app.config['COMMENT_MAX_DEPTH']:
+            return jsonify({'success': False, 'error': '回复层级过深，请回复上层评论'}), 400
     
     try:
         c = Comment(post_id=post_id, author_id=session.get('user_id'), content=content, parent_id=parent_id)
         db.session.add(c)
+        db.session.flush()
+        index_comment_path(c, parent_path)
+        bump_post_stats(post_id, comment_count=1)
         db.session.commit()
+        notify_post_author(p, current_user_id, 'comment')
         return jsonify({'success': True, 'message': '评论已发布', 'data': {'id': c.id}}), 201
     except Exception as e:
         db.session.rollback()
@@ -1575,14 +5373,32 @@ def api_groups():
     
     return jsonify({'success': True, 'message': '小组创建成功', 'data': {'id': g.id, 'name': g.name}}), 201
 
+# 小组公告：教师或小组创建者向全部成员发送通知
+@app.route('/api/groups/<int:group_id>/announce', methods=['POST'])
+@login_required
+def announce_to_group(group_id: int):
+    group = Group.query.get(group_id)
+    if not group:
+        return jsonify({'success': False, 'error': '小组不存在'}), 404
+    if group.creator_id != session['user_id'] and not is_teacher(session['user_id']):
+        return jsonify({'success': False, 'error': '仅小组创建者或教师可发布公告'}), 403
+    
+    data = request.get_json() or {}
+    content = (data.get('content') or '').strip()
+    if not content:
+        return jsonify({'success': False, 'error': '公告内容不能为空'}), 400
+    
+    notify_group_members(group_id, 'announcement', data.get('title') or f'{group.name} 小组公告', content,
+                         related_id=group_id, exclude=[session['user_id']])
+    return jsonify({'success': True, 'message': '公告已提交发送'}), 202
+
 # ---------------------------- 个人中心API ----------------------------
 
 # 获取用户基本资料
 @app.route("/api/user/profile", methods=["GET"])
 @login_required
 def get_user_profile():
-    user_id = session["user_id"]
-    user = find_user_by_id(user_id)
+    user = load_current_user()
     if not user:
         return jsonify({"success": False, "error": "用户不存在"}), 404
     
@@ -1617,7 +5433,7 @@ def update_user_profile():
     
     data = request.get_json()
     user_id = session["user_id"]
-    user = find_user_by_id(user_id)
+    user = load_current_user()
     if not user:
         return jsonify({"success": False, "error": "用户不存在"}), 404
     
@@ -1632,6 +5448,8 @@ def update_user_profile():
             return jsonify({"success": False, "error": "该邮箱已被其他用户使用"}), 409
         
         user.email = data["email"]
+        index_user_search(user)
+        invalidate_user_snapshot(user_id)
     
     db.session.commit()
     
@@ -1645,8 +5463,7 @@ def update_user_profile():
 @app.route("/api/user/profile/detailed", methods=["GET"])
 @login_required
 def get_detailed_profile():
-    user_id = session["user_id"]
-    user = find_user_by_id(user_id)
+    user = load_current_user()
     if not user:
         return jsonify({"success": False, "error": "用户不存在"}), 404
     
@@ -1678,12 +5495,12 @@ def update_detailed_profile():
     
     data = request.get_json()
     user_id = session["user_id"]
-    user = find_user_by_id(user_id)
+    user = load_current_user()
     if not user:
         return jsonify({"success": False, "error": "用户不存在"}), 404
     
     # 允许更新的字段列表
-    updatable_fields = ["real_name", "student_id", "major", "grade", "phone", "gender", "bio", "email"]
+    updatable_fields = ["real_name", "student_id", "major", "grade", "phone", "gender", "bio", "email", "hobbies"]
     updated_fields = []
     
     for field in updatable_fields:
@@ -1709,7 +5526,12 @@ def update_detailed_profile():
             setattr(user, field, data[field])
             updated_fields.append(field)
     
+    if {"real_name", "student_id", "email"} & set(updated_fields):
+        index_user_search(user)
+    invalidate_user_snapshot(user_id)
     db.session.commit()
+    if "hobbies" in updated_fields:
+        activity_recommender.invalidate(user_id)
     
     return jsonify({
         "success": True,
@@ -1721,8 +5543,7 @@ def update_detailed_profile():
 @app.route("/api/user/joined-activities", methods=["GET"])
 @login_required
 def get_joined_activities():
-    user_id = session["user_id"]
-    user = find_user_by_id(user_id)
+    user = load_current_user()
     if not user:
         return jsonify({"success": False, "error": "用户不存在"}), 404
     
@@ -1749,8 +5570,7 @@ def get_joined_activities():
 @app.route("/api/user/favorites", methods=["GET"])
 @login_required
 def get_user_favorites_api():
-    user_id = session["user_id"]
-    user = find_user_by_id(user_id)
+    user = load_current_user()
     if not user:
         return jsonify({"success": False, "error": "用户不存在"}), 404
     
@@ -1791,7 +5611,7 @@ def change_password():
     
     # 获取当前用户
     user_id = session["user_id"]
-    user = find_user_by_id(user_id)
+    user = load_current_user()
     if not user:
         return jsonify({"success": False, "error": "用户不存在"}), 404
     
@@ -1801,6 +5621,7 @@ def change_password():
     
     # 更新密码
     user.password = generate_password_hash(data.get('new_password'), method='pbkdf2:sha256')
+    invalidate_user_snapshot(user_id)
     db.session.commit()
     
     return jsonify({"success": True, "message": "密码修改成功，请重新登录"})
@@ -1857,7 +5678,13 @@ def send_friend_request():
     
     try:
         db.session.add(friendship)
+        remove_user_suggestion_pair(current_user_id, target_user_id)
+        bump_user_badges([target_user_id], friend_requests=1)
         db.session.commit()
+        event_broker.publish(target_user_id, 'friend_request', {
+            "friendship_id": friendship.id,
+            "requester_id": current_user_id
+        })
         return jsonify({
             "success": True,
             "message": "好友请求已发送",
@@ -1903,7 +5730,17 @@ def handle_friend_request(friendship_id):
     friendship.updated_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
     try:
+        if friendship.status == 'accepted':
+            on_friendship_changed(friendship.user1_id, friendship.user2_id, 1)
+        bump_user_badges([current_user_id], friend_requests=-1)
         db.session.commit()
+        if friendship.status == 'accepted':
+            social_graph.add_friendship(friendship.user1_id, friendship.user2_id)
+        event_broker.publish(friendship.requester_id, 'friend_request_handled', {
+            "friendship_id": friendship.id,
+            "user_id": current_user_id,
+            "status": friendship.status
+        })
         return jsonify({
             "success": True,
             "message": f"已{'接受' if action == 'accept' else '拒绝'}好友请求",
@@ -1913,76 +5750,80 @@ def handle_friend_request(friendship_id):
         db.session.rollback()
         return jsonify({"success": False, "error": f"处理失败：{str(e)}"}), 500
 
-# 获取好友列表
-@app.route('/api/friends', methods=['GET'])
-@login_required
-def get_friends():
-    current_user_id = session["user_id"]
+def friendship_page(current_user_id, status, incoming_only=False):
+    """当前用户某一状态的好友关系（按关系 ID 倒序游标分页），一次连表取出对方用户要展示的列
+
+    返回 (rows, has_more, next_cursor)，rows 为 (Friendship.id, Friendship.created_at, 对方 ID, 用户名, 头像, 简介)。
+    incoming_only=True 时只取对方发起的请求。
+    """
+    page_size = app.config['FRIEND_PAGE_SIZE']
+    limit = max(1, min(request.args.get('limit', page_size, type=int) or page_size, app.config['FRIEND_PAGE_SIZE_MAX']))
+    cursor = request.args.get('cursor', type=int)  # 上一页最后一条好友关系的 ID
     
-    # 获取所有已接受的好友关系
-    friendships = Friendship.query.filter(
+    other_id = db.case((Friendship.user1_id == current_user_id, Friendship.user2_id), else_=Friendship.user1_id)
+    query = db.session.query(
+        Friendship.id, Friendship.created_at, User.id, User.username, User.avatar, User.bio
+    ).join(User, User.id == other_id).filter(
         db.or_(
             Friendship.user1_id == current_user_id,
             Friendship.user2_id == current_user_id
         ),
-        Friendship.status == 'accepted'
-    ).all()
-    
-    friends = []
-    for friendship in friendships:
-        # 确定对方用户ID
-        friend_id = friendship.user2_id if friendship.user1_id == current_user_id else friendship.user1_id
-        friend_user = find_user_by_id(friend_id)
-        
-        if friend_user:
-            friends.append({
-                "user_id": friend_user.id,
-                "username": friend_user.username,
-                "avatar": friend_user.avatar,
-                "bio": friend_user.bio,
-                "created_at": friendship.created_at
-            })
+        Friendship.status == status
+    )
+    if incoming_only:
+        query = query.filter(Friendship.requester_id != current_user_id)
+    if cursor:
+        query = query.filter(Friendship.id < cursor)
+    rows = query.order_by(Friendship.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, has_more, rows[-1][0] if has_more else None
+
+# 获取好友列表（游标分页：limit、cursor）
+@app.route('/api/friends', methods=['GET'])
+@login_required
+def get_friends():
+    current_user_id = session["user_id"]
+    rows, has_more, next_cursor = friendship_page(current_user_id, 'accepted')
+    mutual = social_graph.mutual_counts(current_user_id, [row[2] for row in rows])
+    
+    friends = [{
+        "user_id": user_id,
+        "username": username,
+        "avatar": avatar,
+        "bio": bio,
+        "mutual_friends": mutual[user_id],
+        "created_at": created_at
+    } for _, created_at, user_id, username, avatar, bio in rows]
     
     return jsonify({
         "success": True,
         "data": friends,
-        "count": len(friends)
+        "count": len(friends),
+        "has_more": has_more,
+        "next_cursor": next_cursor
     })
 
-# 获取待处理的好友请求（收到的请求）
+# 获取待处理的好友请求（收到的请求，游标分页：limit、cursor）
 @app.route('/api/friends/requests', methods=['GET'])
 @login_required
 def get_friend_requests():
-    current_user_id = session["user_id"]
+    rows, has_more, next_cursor = friendship_page(session["user_id"], 'pending', incoming_only=True)
     
-    # 获取所有待处理的请求（对方发起的）
-    requests = Friendship.query.filter(
-        db.or_(
-            Friendship.user1_id == current_user_id,
-            Friendship.user2_id == current_user_id
-        ),
-        Friendship.status == 'pending',
-        Friendship.requester_id != current_user_id
-    ).all()
-    
-    result = []
-    for req in requests:
-        requester_id = req.requester_id
-        requester = find_user_by_id(requester_id)
-        
-        if requester:
-            result.append({
-                "friendship_id": req.id,
-                "requester_id": requester.id,
-                "requester_username": requester.username,
-                "requester_avatar": requester.avatar,
-                "created_at": req.created_at
-            })
+    result = [{
+        "friendship_id": friendship_id,
+        "requester_id": user_id,
+        "requester_username": username,
+        "requester_avatar": avatar,
+        "created_at": created_at
+    } for friendship_id, created_at, user_id, username, avatar, _ in rows]
     
     return jsonify({
         "success": True,
         "data": result,
-        "count": len(result)
+        "count": len(result),
+        "has_more": has_more,
+        "next_cursor": next_cursor
     })
 
 # 删除好友
@@ -2006,7 +5847,10 @@ def delete_friend(friend_id):
     
     try:
         db.session.delete(friendship)
+        db.session.flush()
+        on_friendship_changed(user1_id, user2_id, -1)
         db.session.commit()
+        social_graph.remove_friendship(user1_id, user2_id)
         return jsonify({"success": True, "message": "已删除好友"})
     except Exception as e:
         db.session.rollback()
@@ -2065,7 +5909,19 @@ def send_message():
     
     try:
         db.session.add(message)
+        db.session.flush()
+        record_message_in_conversations(message)
+        bump_user_badges([receiver_id], unread_messages=1)
         db.session.commit()
+        event_data = {
+            "message_id": message.id,
+            "sender_id": current_user_id,
+            "receiver_id": receiver_id,
+            "created_at": message.created_at
+        }
+        # 接收方收到新消息；发送方的其他标签页同步刷新
+        event_broker.publish(receiver_id, 'message', event_data)
+        event_broker.publish(current_user_id, 'message', event_data)
         return jsonify({
             "success": True,
             "message": "消息已发送",
@@ -2078,36 +5934,41 @@ def send_message():
         db.session.rollback()
         return jsonify({"success": False, "error": f"发送失败：{str(e)}"}), 500
 
-# 获取与某个用户的聊天记录
+# 获取与某个用户的聊天记录（按消息ID游标分页）
+# 参数：before_id=加载更早的消息，after_id=只取该ID之后的新消息（轮询用），limit=每页条数；都不传时返回最新一页
 @app.route('/api/messages/<string:user_id>', methods=['GET'])
 @login_required
 def get_messages(user_id):
     current_user_id = session["user_id"]
+    page_size = app.config['MESSAGE_PAGE_SIZE']
+    limit = max(1, min(request.args.get('limit', page_size, type=int) or page_size, page_size))
+    before_id = request.args.get('before_id', type=int)
+    after_id = request.args.get('after_id', type=int)
     
     # 检查目标用户是否存在
     target_user = find_user_by_id(user_id)
     if not target_user:
         return jsonify({"success": False, "error": "用户不存在"}), 404
     
-    # 获取双方的所有消息（按时间排序）
-    messages = Message.query.filter(
+    query = Message.query.filter(
         db.or_(
             db.and_(Message.sender_id == current_user_id, Message.receiver_id == user_id),
             db.and_(Message.sender_id == user_id, Message.receiver_id == current_user_id)
         )
-    ).order_by(Message.created_at.asc()).all()
-    
-    # 标记未读消息为已读
-    unread_messages = [m for m in messages if m.receiver_id == current_user_id and not m.is_read]
-    for msg in unread_messages:
-        msg.is_read = True
-    
-    try:
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
+    )
+    # 多取一条用于判断该方向上是否还有更多消息
+    if after_id is not None:
+        messages = query.filter(Message.id > after_id).order_by(Message.id.asc()).limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+    else:
+        if before_id is not None:
+            query = query.filter(Message.id < before_id)
+        messages = query.order_by(Message.id.desc()).limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit][::-1]
     
-    # 格式化消息数据
+    # 格式化消息数据（本页中发给自己的消息随后会被标记为已读）
     result = []
     for msg in messages:
         result.append({
@@ -2115,71 +5976,97 @@ def get_messages(user_id):
             "sender_id": msg.sender_id,
             "receiver_id": msg.receiver_id,
             "content": msg.content,
-            "is_read": msg.is_read,
+            "is_read": msg.is_read or msg.receiver_id == current_user_id,
             "created_at": msg.created_at,
             "is_own": msg.sender_id == current_user_id
         })
+    target = {
+        "user_id": target_user.id,
+        "username": target_user.username,
+        "avatar": target_user.avatar
+    }
+    
+    # 一条 UPDATE 把本页及之前的未读消息标记为已读
+    if messages:
+        try:
+            mark_conversation_read(current_user_id, user_id, messages[-1].id)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
     
     return jsonify({
         "success": True,
         "data": result,
         "count": len(result),
-        "target_user": {
-            "user_id": target_user.id,
-            "username": target_user.username,
-            "avatar": target_user.avatar
-        }
+        "has_more": has_more,
+        "first_id": result[0]["id"] if result else None,
+        "last_id": result[-1]["id"] if result else None,
+        "target_user": target
     })
 
-# 获取所有聊天会话列表（最近联系的人）
+# 获取聊天会话列表（最近联系的人，读取会话索引表，按最后一条消息倒序分页）
 @app.route('/api/messages/conversations', methods=['GET'])
 @login_required
 def get_conversations():
     current_user_id = session["user_id"]
-    
-    # 获取所有有消息往来的用户
-    # 获取所有与当前用户相关的消息
-    all_messages = Message.query.filter(
-        db.or_(
-            Message.sender_id == current_user_id,
-            Message.receiver_id == current_user_id
-        )
-    ).order_by(Message.created_at.desc()).all()
-    
-    conversations = []
-    seen_users = set()
-    
-    for msg in all_messages:
-        # 确定对方用户ID
-        other_user_id = msg.receiver_id if msg.sender_id == current_user_id else msg.sender_id
-        
-        if other_user_id not in seen_users:
-            seen_users.add(other_user_id)
-            other_user = find_user_by_id(other_user_id)
-            
-            if other_user:
-                # 获取未读消息数
-                unread_count = Message.query.filter_by(
-                    sender_id=other_user_id,
-                    receiver_id=current_user_id,
-                    is_read=False
-                ).count()
-                
-                # 获取最后一条消息（当前消息就是按时间倒序的，第一个就是最新的）
-                conversations.append({
-                    "user_id": other_user.id,
-                    "username": other_user.username,
-                    "avatar": other_user.avatar,
-                    "last_message": msg.content,
-                    "last_message_time": msg.created_at,
-                    "unread_count": unread_count,
-                    "is_own_last_message": msg.sender_id == current_user_id
-                })
+    page_size = app.config['CONVERSATION_PAGE_SIZE']
+    limit = max(1, min(request.args.get('limit', page_size, type=int) or page_size, page_size))
+    cursor = request.args.get('cursor', type=int)  # 上一页最后一个会话的 last_message_id
+    
+    query = db.session.query(Conversation, User.username, User.avatar).join(
+        User, User.id == Conversation.peer_id
+    ).filter(Conversation.user_id == current_user_id)
+    if cursor:
+        query = query.filter(Conversation.last_message_id < cursor)
+    rows = query.order_by(Conversation.last_message_id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    conversations = [{
+        "user_id": conv.peer_id,
+        "username": username,
+        "avatar": avatar,
+        "last_message": conv.last_message,
+        "last_message_time": conv.last_message_time,
+        "unread_count": conv.unread_count,
+        "is_own_last_message": conv.last_sender_id == current_user_id
+    } for conv, username, avatar in rows]
     
     return jsonify({
         "success": True,
         "data": conversations,
-        "count": len(conversations)
+        "count": len(conversations),
+        "has_more": has_more,
+        "next_cursor": rows[-1][0].last_message_id if has_more else None
+    })
+
+# 实时事件流（SSE）：新消息、通知、好友请求等事件推送，替代前端定时轮询
+@app.route('/api/stream', methods=['GET'])
+@login_required
+def event_stream():
+    user_id = session["user_id"]
+    subscription = event_broker.subscribe(user_id)
+    heartbeat = app.config['SSE_HEARTBEAT_SECONDS']
+    
+    def generate():
+        try:
+            # 断线后浏览器 3 秒重连
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    payload = subscription.get(timeout=heartbeat)
+                except queue.Empty:
+                    # 心跳，防止代理断开空闲连接
+                    yield ': keepalive\n\n'
+                    continue
+                message = json.loads(payload)
+                yield f"event: {message['event']}\ndata: {json.dumps(message['data'], ensure_ascii=False)}\n\n"
+        finally:
+            event_broker.unsubscribe(user_id, subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
 
 # 获取未读消息数
@@ -2188,16 +6075,27 @@ def get_conversations():
 def get_unread_count():
     current_user_id = session["user_id"]
     
-    unread_count = Message.query.filter_by(
-        receiver_id=current_user_id,
-        is_read=False
-    ).count()
+    _, badges = get_user_badges(current_user_id)
+    unread_count = badges['unread_messages']
     
     return jsonify({
         "success": True,
         "data": {"unread_count": unread_count}
     })
 
+# 未读消息、未读通知、好友请求的徽章计数（一次请求取齐；支持 ETag，计数未变时返回 304）
+@app.route('/api/me/badges', methods=['GET'])
+@login_required
+def my_badges():
+    etag, badges = get_user_badges(session["user_id"])
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify({"success": True, "data": badges})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 # 获取通知列表
 @app.route('/api/notifications', methods=['GET'])
 @login_required
@@ -2216,8 +6114,10 @@ def get_notifications():
             "content": n.content,
             "related_id": n.related_id,
             "is_read": n.is_read,
-            "created_at": n.created_at
-        } for n in notifications]
+            "created_at": n.created_at,
+            "actor_count": agg.actor_count if agg else 0,
+            "actors": json.loads(agg.actors) if agg else []
+        } for n, agg in notifications]
     })
 
 # 获取未读通知数
@@ -2243,7 +6143,9 @@ def mark_notification_read(notification_id):
     if not notification:
         return jsonify({"success": False, "error": "通知不存在"}), 404
     
-    notification.is_read = True
+    if not notification.is_read:
+        notification.is_read = True
+        bump_user_badges([current_user_id], unread_notifications=-1)
     db.session.commit()
     
     return jsonify({"success": True})
@@ -2254,11 +6156,63 @@ def mark_notification_read(notification_id):
 def mark_all_notifications_read():
     current_user_id = session["user_id"]
     
-    Notification.query.filter_by(user_id=current_user_id, is_read=False).update({"is_read": True})
+    marked = Notification.query.filter_by(user_id=current_user_id, is_read=False).update({"is_read": True})
+    if marked:
+        bump_user_badges([current_user_id], unread_notifications=-marked)
     db.session.commit()
     
     return jsonify({"success": True})
 
+# 可能认识的人：直接读取预计算的候选（flask compute-user-suggestions 批量生成，好友/报名变化时增量修正）
+@app.route('/api/users/suggestions', methods=['GET'])
+@login_required
+def user_suggestions():
+    current_user_id = session["user_id"]
+    top_k = app.config['USER_SUGGESTION_TOP_K']
+    limit = max(1, min(request.args.get('limit', top_k, type=int), top_k))
+    
+    rows = db.session.query(UserSuggestion, User.username, User.avatar, User.major, User.grade).join(
+        User, User.id == UserSuggestion.candidate_id
+    ).filter(UserSuggestion.user_id == current_user_id).order_by(
+        UserSuggestion.score.desc(), UserSuggestion.candidate_id.asc()
+    ).limit(limit).all()
+    
+    result = [{
+        "id": s.candidate_id,
+        "username": username,
+        "avatar": avatar,
+        "major": major,
+        "grade": grade,
+        "score": s.score,
+        "reasons": {
+            "mutual_friends": s.mutual_friends,
+            "shared_hobbies": s.shared_hobbies,
+            "shared_activities": s.shared_activities,
+            "shared_groups": s.shared_groups,
+            "same_major": s.same_major,
+            "same_grade": s.same_grade
+        }
+    } for s, username, avatar, major, grade in rows]
+    
+    # 还没有预计算结果（新用户、批量任务尚未运行）时，用好友关系图即时枚举二度好友
+    if not result:
+        connected = connected_user_ids(current_user_id)
+        candidates = [(user_id, count) for user_id, count in social_graph.friends_of_friends(
+            current_user_id, limit + len(connected)) if user_id not in connected][:limit]
+        users = {u.id: u for u in User.query.filter(User.id.in_([c for c, _ in candidates])).all()} if candidates else {}
+        weight = app.config['USER_MATCH_WEIGHTS']['mutual_friend']
+        result = [{
+            "id": user_id,
+            "username": users[user_id].username,
+            "avatar": users[user_id].avatar,
+            "major": users[user_id].major,
+            "grade": users[user_id].grade,
+            "score": count * weight,
+            "reasons": {"mutual_friends": count}
+        } for user_id, count in candidates if user_id in users]
+    
+    return jsonify({"success": True, "data": result, "count": len(result)})
+
 # 搜索用户（用于添加好友）
 @app.route('/api/users/search', methods=['GET'])
 @login_required
@@ -2270,36 +6224,17 @@ def search_users():
     
     current_user_id = session["user_id"]
     
-    # 搜索用户名或邮箱
-    users = User.query.filter(
-        db.or_(
-            User.username.like(f"%{keyword}%"),
-            User.email.like(f"%{keyword}%")
-        ),
-        User.id != current_user_id
-    ).limit(20).all()
+    rows = search_user_rows(keyword, current_user_id, app.config['USER_SEARCH_LIMIT'])
+    mutual = social_graph.mutual_counts(current_user_id, [row[0] for row in rows])
     
-    result = []
-    for user in users:
-        # 检查好友关系状态
-        user1_id = min(current_user_id, user.id)
-        user2_id = max(current_user_id, user.id)
-        friendship = Friendship.query.filter_by(
-            user1_id=user1_id,
-            user2_id=user2_id
-        ).first()
-        
-        friendship_status = None
-        if friendship:
-            friendship_status = friendship.status
-        
-        result.append({
-            "user_id": user.id,
-            "username": user.username,
-            "avatar": user.avatar,
-            "bio": user.bio,
-            "friendship_status": friendship_status  # None, 'pending', 'accepted', 'rejected'
-        })
+    result = [{
+        "user_id": user_id,
+        "username": username,
+        "avatar": avatar,
+        "bio": bio,
+        "mutual_friends": mutual[user_id],
+        "friendship_status": status  # None, 'pending', 'accepted', 'rejected'
+    } for user_id, username, avatar, bio, status in rows]
     
     return jsonify({
         "success": True,
@@ -2313,8 +6248,7 @@ def personal_home():
     """个性化首页，适配项目Activity模型的实际字段"""
     
     # 获取当前登录用户信息
-    current_user_id = session['user_id']
-    current_user = User.query.get(current_user_id)
+    current_user = load_current_user()
     if not current_user:
         return redirect(url_for('login_page'))
     
@@ -2472,6 +6406,7 @@ def reset_password():
         # 清空验证码（防止重复使用）
         user.verification_code = ''
         user.code_expire = ''
+        invalidate_user_snapshot(user.id)
         db.session.commit()
         
         return jsonify({"success": True, "message": "密码重置成功"}), 200
@@ -2488,6 +6423,102 @@ def forgot_password_page():
     return render_template('forgot_password.html')
 
 
+# ---------------------------- 运维命令（flask <命令名>） ----------------------------
+
+@app.cli.command('rebuild-similarity-index')
+def rebuild_similarity_index_command():
+    """重建帖子相似度索引（MinHash + LSH）"""
+    total = rebuild_similarity_index()
+    print(f"相似度索引重建完成，共处理 {total} 篇帖子")
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """重建帖子全文检索索引（FTS5）"""
+    if not post_search_enabled():
+        print("当前数据库不支持 FTS5，帖子搜索使用 LIKE 查询，无需建索引")
+        return
+    total = rebuild_post_search_index()
+    print(f"全文检索索引重建完成，共处理 {total} 篇帖子")
+
+@app.cli.command('rebuild-user-search-index')
+def rebuild_user_search_index_command():
+    """重建用户搜索索引（FTS5 trigram）"""
+    if not user_search_enabled():
+        print("当前数据库不支持 FTS5 trigram，用户搜索使用 LIKE 查询，无需建索引")
+        return
+    total = rebuild_user_search_index()
+    print(f"用户搜索索引重建完成，共处理 {total} 个用户")
+
+@app.cli.command('compute-user-suggestions')
+def compute_user_suggestions_command():
+    """批量重算全部用户的好友推荐（建议每天定时执行一次）"""
+    start = time.perf_counter()
+    total = compute_user_suggestions()
+    print(f"好友推荐计算完成，共写入 {total} 条候选，用时 {time.perf_counter() - start:.1f} 秒")
+
+@app.cli.command('rebuild-activity-tags')
+def rebuild_activity_tags_command():
+    """按 Activity.tags 重建活动标签倒排索引（推荐使用）"""
+    total = rebuild_activity_tag_index()
+    print(f"活动标签索引重建完成，共处理 {total} 个活动")
+
+@app.cli.command('rebuild-post-tags')
+def rebuild_post_tags_command():
+    """按 Post.tags 重建帖子标签索引表"""
+    total = rebuild_post_tag_index()
+    print(f"标签索引重建完成，共处理 {total} 篇帖子")
+
+@app.cli.command('rebuild-trending-tags')
+@click.option('--hours', type=int, default=None, help='重算最近多少小时，默认取 TRENDING_RETENTION_HOURS')
+def rebuild_trending_tags_command(hours):
+    """按帖子、活动、组队与帖子互动原始表重算热门标签小时桶"""
+    total = trending_tags.rebuild(hours)
+    print(f"热门标签重建完成，共写入 {total} 个小时桶")
+
+@app.cli.command('rebuild-comment-paths')
+def rebuild_comment_paths_command():
+    """按 Comment.parent_id 重建评论树物化路径与回复数"""
+    total = rebuild_comment_paths()
+    print(f"评论路径重建完成，共处理 {total} 条评论")
+
+@app.cli.command('reconcile-post-stats')
+@click.option('--dry-run', is_flag=True, help='只报告偏差，不写回')
+def reconcile_post_stats_command(dry_run):
+    """从 PostReaction / Comment 原始表重算帖子互动计数与热度，并报告偏差"""
+    checked, drifted = reconcile_post_stats(fix=not dry_run)
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    for post_id, drift in drifted[:50]:
+        detail = '，'.join(f'{field} {old}->{new}' for field, (old, new) in drift.items())
+        print(f"帖子 {post_id}：{detail}")
+    if len(drifted) > 50:
+        print(f"……其余 {len(drifted) - 50} 篇省略")
+    action = '（仅检查，未写回）' if dry_run else '（已修正）'
+    print(f"共检查 {checked} 篇帖子，{len(drifted)} 篇计数有偏差{action if drifted else ''}")
+
+@app.cli.command('compact-notifications')
+@click.option('--days', type=int, default=None, help='已读通知保留天数，默认取 NOTIFICATION_RETENTION_DAYS')
+def compact_notifications_command(days):
+    """把超过保留期的已读通知归档为每个用户每种类型一条摘要（建议每天定时执行）"""
+    folded, digests = compact_notifications(days)
+    print(f"通知归档完成，共归档 {folded} 条已读通知，生成/更新 {digests} 条摘要")
+
+@app.cli.command('rebuild-user-badges')
+def rebuild_user_badges_command():
+    """按消息、通知、好友请求原始表重建徽章计数"""
+    total = reconcile_user_badges()
+    db.session.commit()
+    badge_cache.invalidate()
+    print(f"徽章计数重建完成，共 {total} 个用户有未读或待处理项")
+
+@app.cli.command('rebuild-conversations')
+def rebuild_conversations_command():
+    """根据消息表重建会话索引"""
+    total = rebuild_conversations()
+    print(f"会话索引重建完成，共 {total} 个会话")
+
 # ---------------------------- 运行应用 ----------------------------
 
 if __name__ == '__main__':
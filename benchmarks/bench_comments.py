@@ -0,0 +1,121 @@
+"""
+评论树压测：单个热门帖子有大量评论时，原“整帖评论一次取出、内存建树”与物化路径分页的延迟和响应大小对比
+
+用法（在项目根目录执行，使用临时 SQLite 数据库，不会影响 instance/campus_social.db）：
+    python -m benchmarks.bench_comments                       # 默认 2000 / 20000 / 100000 条评论
+    python -m benchmarks.bench_comments 50000 --requests 50
+
+合成数据：约五分之一为顶层评论，其余回复随机挑选已有评论（偏向最近的评论，形成较深的对话链）。
+分页版统计“第一页顶层评论”和“展开一条顶层评论的回复（默认 3 层、50 条）”两个接口。
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix='bench_comments_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'bench.db')
+
+from app import app, db, User, Post, Comment, CommentPath, create_post_stats, rebuild_comment_paths  # noqa: E402
+
+USER_ID = 'bench001'
+
+
+def populate(n, seed=3):
+    rng = random.Random(seed)
+    db.drop_all()
+    db.create_all()
+    db.session.add(User(id=USER_ID, username='bench_user', password='x', email='bench@example.com'))
+    post = Post(title='热门帖子', category='校园资讯', content='正文', author_id=USER_ID, review_status='approved')
+    db.session.add(post)
+    db.session.flush()
+    create_post_stats(post)
+    rows = []
+    for i in range(1, n + 1):
+        parent_id = None
+        if i > 1 and rng.random() > 0.2:
+            parent_id = max(1, i - 1 - int(rng.expovariate(1 / 20.0)))
+        rows.append({'id': i, 'post_id': post.id, 'author_id': USER_ID, 'content': f'评论内容{i}' * 3,
+                     'parent_id': parent_id, 'is_pinned': i == 7, 'created_at': '2026-01-01 10:00:00'})
+    for start in range(0, n, 5000):
+        db.session.execute(Comment.__table__.insert(), rows[start:start + 5000])
+    db.session.commit()
+    t = time.perf_counter()
+    rebuild_comment_paths()
+    return post.id, time.perf_counter() - t
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def timed(client, url, requests):
+    ms, size = [], 0
+    for _ in range(requests):
+        t = time.perf_counter()
+        r = client.get(url)
+        ms.append((time.perf_counter() - t) * 1000)
+        assert r.status_code == 200
+        size = len(r.data)
+    return ms, size
+
+
+def old_tree(post_id):
+    """原实现：取出帖子全部评论，在内存里按 parent_id 组装整棵树"""
+    all_comments = Comment.query.filter_by(post_id=post_id).order_by(Comment.created_at.asc()).all()
+    comments_by_id = {c.id: {'id': c.id, 'post_id': c.post_id, 'author_id': c.author_id, 'content': c.content,
+                             'parent_id': c.parent_id, 'is_pinned': c.is_pinned, 'created_at': c.created_at,
+                             'children': []} for c in all_comments}
+    roots = []
+    for c in comments_by_id.values():
+        if c['parent_id'] and c['parent_id'] in comments_by_id:
+            comments_by_id[c['parent_id']]['children'].append(c)
+        else:
+            roots.append(c)
+    return app.json.response({'success': True, 'data': roots, 'count': len(all_comments)})
+
+
+def report(label, ms, size):
+    print(f"  {label:<14} p50 {statistics.median(ms):8.2f} ms   p99 {percentile(ms, 99):8.2f} ms   响应 {size / 1024:8.1f} KB")
+
+
+def run(n, requests):
+    post_id, backfill_s = populate(n)
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = USER_ID; sess['username'] = 'bench_user'
+    busiest = db.session.query(CommentPath.comment_id).filter(CommentPath.post_id == post_id, CommentPath.depth == 0).order_by(
+        CommentPath.reply_count.desc()).first()[0]
+
+    old_ms, old_size = [], 0
+    with app.test_request_context():
+        for _ in range(max(1, requests // 5)):
+            t = time.perf_counter()
+            old_size = len(old_tree(post_id).data)
+            old_ms.append((time.perf_counter() - t) * 1000)
+    page_ms, page_size = timed(client, f'/api/posts/{post_id}/comments', requests)
+    reply_ms, reply_size = timed(client, f'/api/comments/{busiest}/replies', requests)
+
+    print(f"\n== 单帖 {n:,} 条评论（回填路径 {backfill_s:.2f}s）==")
+    report('原整树加载', old_ms, old_size)
+    report('顶层评论一页', page_ms, page_size)
+    report('展开回复一页', reply_ms, reply_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sizes', nargs='*', type=int, default=[2000, 20000, 100000])
+    parser.add_argument('--requests', type=int, default=50)
+    args = parser.parse_args(argv)
+    with app.app_context():
+        for n in args.sizes:
+            run(n, args.requests)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+抢报名压测：5000 人同时报名一个 500 人的活动，排队放号模式 vs 直接报名（每个请求各自抢活动行）
+
+用法（在项目根目录执行，使用临时 SQLite 数据库，不会影响 instance/campus_social.db）：
+    python -m benchmarks.bench_flash_signup                        # 默认 5000 人抢 500 个名额，32 个并发线程
+    python -m benchmarks.bench_flash_signup --users 20000 --limit 1000 --threads 64
+
+每个线程用自己的测试客户端依次发报名请求，统计接口响应延迟 p50/p99、全部请求的墙钟时间；排队模式另计
+后台 worker 把队列放完的时间。最后校验：参与人数 == 报名关系行数 == 名额，无重复报名；排队模式下
+放号的恰好是排队号 1..名额 的用户，其余进入候补。
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_tmpdir = tempfile.mkdtemp(prefix='bench_flash_signup_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'bench.db')
+
+from app import app, db, User, Activity, ActivityAdmission, ActivitySignup, activity_participants  # noqa: E402
+from app import signup_admission  # noqa: E402
+
+
+def populate(n_users):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(User.__table__.insert(), [
+        {'id': f'f{i:07d}', 'username': f'flash{i}', 'password': 'x', 'email': f'flash{i}@example.com'}
+        for i in range(n_users)])
+    db.session.commit()
+
+
+def new_activity(title, limit, queue_mode):
+    act = Activity(title=title, type='体育', time='2026-06-01 10:00', location='操场', participants_limit=limit)
+    db.session.add(act)
+    db.session.flush()
+    if queue_mode:
+        db.session.add(ActivityAdmission(activity_id=act.id))
+    db.session.commit()
+    return act.id
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def storm(activity_id, user_ids, threads):
+    """按线程切分用户，每个线程一个测试客户端依次报名，返回 [(user_id, 状态码, 返回数据, 毫秒)]"""
+    def worker(chunk):
+        client = app.test_client()
+        out = []
+        for user_id in chunk:
+            with client.session_transaction() as sess:
+                sess['user_id'] = user_id; sess['username'] = user_id
+            t = time.perf_counter()
+            r = client.post(f'/api/activities/{activity_id}/join')
+            out.append((user_id, r.status_code, r.get_json(), (time.perf_counter() - t) * 1000))
+        return out
+    chunks = [user_ids[i::threads] for i in range(threads)]
+    with ThreadPoolExecutor(threads) as pool:
+        return [row for rows in pool.map(worker, chunks) for row in rows]
+
+
+def check(activity_id, limit):
+    count = db.session.get(Activity, activity_id).participant_count
+    rows = [row[0] for row in db.session.query(activity_participants.c.user_id).filter(
+        activity_participants.c.activity_id == activity_id)]
+    assert count == len(rows) == limit, (count, len(rows), limit)
+    assert len(set(rows)) == len(rows)
+    return set(rows)
+
+
+def run(mode, user_ids, limit, threads):
+    queue_mode = mode == 'queue'
+    activity_id = new_activity(f'抢报名压测-{mode}', limit, queue_mode)
+    t0 = time.perf_counter()
+    results = storm(activity_id, user_ids, threads)
+    wall = time.perf_counter() - t0
+    drain = 0.0
+    if queue_mode:
+        signup_admission.flush()
+        drain = time.perf_counter() - t0
+    db.session.expire_all()
+
+    ms = [row[3] for row in results]
+    codes = {}
+    for _, code, _, _ in results:
+        codes[code] = codes.get(code, 0) + 1
+    seated = check(activity_id, limit)
+    line = f'  {mode:<6} 响应 p50 {statistics.median(ms):7.2f} ms  p99 {percentile(ms, 99):8.2f} ms  ' \
+           f'全部请求 {wall:6.2f} s'
+    if queue_mode:
+        line += f'  放号完成 {drain:6.2f} s'
+        tickets = {user_id: data['data']['ticket'] for user_id, code, data, _ in results if code == 202}
+        assert len(tickets) == len(user_ids) and sorted(tickets.values()) == list(range(1, len(user_ids) + 1))
+        assert seated == {user_id for user_id, ticket in tickets.items() if ticket <= limit}
+        waitlisted = ActivitySignup.query.filter_by(activity_id=activity_id, status='waitlisted').count()
+        assert waitlisted == len(user_ids) - limit
+        line += f'\n         放号 = 排队号 1..{limit}，候补 {waitlisted} 人'
+    print(line + f'\n         状态码 {dict(sorted(codes.items()))}，人数 == 报名行数 == {limit}，无重复')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=32)
+    args = parser.parse_args(argv)
+    with app.app_context():
+        populate(args.users)
+        user_ids = [f'f{i:07d}' for i in range(args.users)]
+        print(f'\n== {args.users:,} 人同时报名，名额 {args.limit}，{args.threads} 个并发线程 ==')
+        run('direct', user_ids, args.limit, args.threads)
+        run('queue', user_ids, args.limit, args.threads)
+    signup_admission.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+帖子列表接口压测：GET /api/posts 游标分页 + 标签索引 + 摘要视图 vs 原“全量读出再在 Python 里过滤”
+
+用法（在项目根目录执行，使用临时 SQLite 数据库，不会影响 instance/campus_social.db）：
+    python -m benchmarks.bench_post_list                     # 默认 10k / 100k
+    python -m benchmarks.bench_post_list 50000 --requests 30
+
+对每种规模分别测首页、按标签过滤、翻到中间某页三种请求的延迟，以及单次请求的 Python 峰值内存（tracemalloc）。
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+_tmpdir = tempfile.mkdtemp(prefix='bench_post_list_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'bench.db')
+
+from app import app, db, Post  # noqa: E402
+from app import rebuild_post_tag_index  # noqa: E402
+from benchmarks.synthetic import build_vocabulary, make_text, zipf_cum_weights  # noqa: E402
+
+TAGS = [f'标签{i}' for i in range(200)]
+
+
+def populate(n, seed=3):
+    rng = random.Random(seed)
+    vocab = build_vocabulary(rng)
+    cum_weights = zipf_cum_weights(vocab)
+    db.drop_all()
+    db.create_all()
+    batch = []
+    for i in range(1, n + 1):
+        batch.append({'id': i, 'title': make_text(rng, vocab, cum_weights, 6, 20), 'category': '校园资讯',
+                      'content': make_text(rng, vocab, cum_weights, 200, 1500),
+                      'tags': ','.join(rng.sample(TAGS, 3)),
+                      'media': json.dumps([{'url': f'/static/uploads/{i}.png', 'filename': f'{i}.png'}]),
+                      'metadata_json': json.dumps({'contact': 'wx'}), 'review_status': 'approved',
+                      'created_at': '2026-01-01 00:00:00'})
+        if len(batch) >= 5000:
+            db.session.execute(Post.__table__.insert(), batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.execute(Post.__table__.insert(), batch)
+        db.session.commit()
+    rebuild_post_tag_index()
+
+
+def baseline_list(tag=None):
+    """原实现：读出全部可见帖子，逐条拆标签、解析 JSON"""
+    results = []
+    for p in Post.query.filter(Post.review_status == 'approved').order_by(Post.id.desc()).all():
+        tags = p.tags.split(',') if p.tags else []
+        if tag and tag not in tags:
+            continue
+        results.append({'id': p.id, 'title': p.title, 'content': p.content, 'tags': tags,
+                        'media': json.loads(p.media) if p.media else [],
+                        'metadata': json.loads(p.metadata_json) if p.metadata_json else {}})
+    db.session.expunge_all()
+    return results
+
+
+def measure(fn):
+    tracemalloc.start()
+    t = time.perf_counter()
+    fn()
+    elapsed = (time.perf_counter() - t) * 1000
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def run(n, requests):
+    populate(n)
+    client = app.test_client()
+    rng = random.Random(n)
+    cases = {
+        '首页': lambda: '/api/posts?view=summary',
+        '按标签': lambda: f'/api/posts?view=summary&tag={rng.choice(TAGS)}',
+        '中间页': lambda: f'/api/posts?view=summary&cursor={rng.randint(n // 4, n // 2)}',
+    }
+    print(f"\n== {n:,} 篇帖子（每页 {app.config['POST_PAGE_SIZE']} 条，每项 {requests} 次）==")
+    for name, make_url in cases.items():
+        samples = [measure(lambda: client.get(make_url())) for _ in range(requests)]
+        print(f"  新接口 {name:<4} p50 {statistics.median(s[0] for s in samples):9.2f} ms"
+              f"   峰值内存 {max(s[1] for s in samples):7.2f} MB")
+    for name, tag in (('全量', None), ('按标签', TAGS[0])):
+        samples = [measure(lambda: baseline_list(tag)) for _ in range(max(1, requests // 10))]
+        print(f"  原实现 {name:<4} p50 {statistics.median(s[0] for s in samples):9.2f} ms"
+              f"   峰值内存 {max(s[1] for s in samples):7.2f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sizes', nargs='*', type=int, default=[10000, 100000])
+    parser.add_argument('--requests', type=int, default=30)
+    args = parser.parse_args(argv)
+    with app.app_context():
+        for n in args.sizes:
+            run(n, args.requests)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
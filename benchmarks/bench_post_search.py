@@ -0,0 +1,112 @@
+"""
+帖子搜索压测：FTS5 全文索引（BM25 排序）vs 原 LIKE '%关键词%' 全表扫描
+
+用法（在项目根目录执行，使用临时 SQLite 数据库，不会影响 instance/campus_social.db）：
+    python -m benchmarks.bench_post_search                   # 默认 10k / 100k
+    python -m benchmarks.bench_post_search 50000 --queries 100
+
+查询词从帖子正文中随机截取 2~4 个字（模拟中文关键词）以及少量单字。
+“结果一致率”为两种方式返回的帖子集合（不分页）的 Jaccard 相似度，用来确认二元组切词没有漏召回。
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix='bench_search_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'bench.db')
+
+from app import app, db, Post, db_or  # noqa: E402
+from app import init_post_search_index, rebuild_post_search_index, search_posts_query  # noqa: E402
+from benchmarks.synthetic import build_vocabulary, make_text, zipf_cum_weights  # noqa: E402
+
+PAGE_SIZE = 20
+
+
+def populate(n, seed=7):
+    rng = random.Random(seed)
+    vocab = build_vocabulary(rng)
+    cum_weights = zipf_cum_weights(vocab)
+    db.drop_all()
+    db.session.execute(db.text('DROP TABLE IF EXISTS post_fts'))
+    db.create_all()
+    init_post_search_index()
+    texts = []
+    batch = []
+    for i in range(1, n + 1):
+        content = make_text(rng, vocab, cum_weights)
+        texts.append(content)
+        batch.append({'id': i, 'title': make_text(rng, vocab, cum_weights, 6, 20), 'category': '校园资讯',
+                      'content': content, 'review_status': 'approved', 'created_at': '2026-01-01 00:00:00'})
+        if len(batch) >= 5000:
+            db.session.execute(Post.__table__.insert(), batch)
+            db.session.commit()
+            batch = []
+    if batch:
+        db.session.execute(Post.__table__.insert(), batch)
+        db.session.commit()
+    t = time.perf_counter()
+    rebuild_post_search_index()
+    return rng, texts, time.perf_counter() - t
+
+
+def like_query(keyword):
+    """原实现：标题或正文 LIKE 匹配"""
+    return Post.query.filter(
+        Post.review_status == 'approved',
+        db_or(Post.title.contains(keyword), Post.content.contains(keyword))
+    ).order_by(Post.created_at.desc())
+
+
+def timed_page(query):
+    t = time.perf_counter()
+    query.paginate(page=1, per_page=PAGE_SIZE, error_out=False)
+    elapsed = (time.perf_counter() - t) * 1000
+    db.session.expunge_all()
+    return elapsed
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def run(n, queries):
+    rng, texts, index_s = populate(n)
+    keywords = []
+    for i in range(queries):
+        text = texts[rng.randrange(len(texts))]
+        size = 1 if i % 10 == 0 else rng.randint(2, 4)
+        pos = rng.randrange(len(text) - size)
+        keywords.append(text[pos:pos + size])
+
+    fts_ms, like_ms, overlaps = [], [], []
+    for keyword in keywords:
+        fts_ms.append(timed_page(search_posts_query(keyword)))
+        like_ms.append(timed_page(like_query(keyword)))
+        fts_ids = {row.id for row in search_posts_query(keyword).with_entities(Post.id)}
+        like_ids = {row.id for row in like_query(keyword).with_entities(Post.id)}
+        if fts_ids or like_ids:
+            overlaps.append(len(fts_ids & like_ids) / len(fts_ids | like_ids))
+
+    print(f"\n== {n:,} 篇帖子（建全文索引 {index_s:.1f}s，查询 {queries} 条，每页 {PAGE_SIZE} 条）==")
+    print(f"  FTS5 + BM25  p50 {statistics.median(fts_ms):8.2f} ms   p99 {percentile(fts_ms, 99):8.2f} ms")
+    print(f"  LIKE 扫描    p50 {statistics.median(like_ms):8.2f} ms   p99 {percentile(like_ms, 99):8.2f} ms")
+    print(f"  结果一致率   {statistics.mean(overlaps) * 100:6.2f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sizes', nargs='*', type=int, default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args(argv)
+    with app.app_context():
+        for n in args.sizes:
+            run(n, args.queries)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+点赞压测：大量用户同时给一个热门帖子点赞，原“逐次插入 Reaction 并在请求里更新 post_stats 热点行”与
+“幂等互动状态 + 增量日志攒批写回”的延迟与吞吐对比
+
+用法（在项目根目录执行，使用临时 SQLite 数据库，不会影响 instance/campus_social.db）：
+    python -m benchmarks.bench_reactions                      # 默认 5000 人、每人连点 2 次，16 个并发线程
+    python -m benchmarks.bench_reactions --users 20000 --clicks 3 --threads 32
+
+每次点击都带 active=true（客户端重试/连点），最后校验：写回后 like_count == 点赞人数，状态表无重复。
+原实现没有去重，连点会被重复计数，一并列出。
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_tmpdir = tempfile.mkdtemp(prefix='bench_reactions_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'bench.db')
+
+from app import app, db, User, Post, PostStats, PostReaction, Reaction  # noqa: E402
+from app import bump_post_stats, create_post_stats, reaction_counter, set_post_reaction  # noqa: E402
+
+
+def populate(n_users):
+    db.drop_all()
+    db.create_all()
+    db.session.execute(User.__table__.insert(), [
+        {'id': f'r{i:07d}', 'username': f'react{i}', 'password': 'x', 'email': f'react{i}@example.com'}
+        for i in range(n_users)])
+    db.session.commit()
+
+
+def new_post(title):
+    post = Post(title=title, category='校园资讯', content='正文', author_id='r0000000', review_status='approved')
+    db.session.add(post)
+    db.session.flush()
+    create_post_stats(post)
+    db.session.commit()
+    return post.id
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def old_like(user_id, post_id):
+    """原实现：每次点击插一条 Reaction，并在同一事务里更新 post_stats 计数与热度"""
+    db.session.add(Reaction(user_id=user_id, post_id=post_id, type='like'))
+    bump_post_stats(post_id, like_count=1)
+    db.session.commit()
+
+
+def new_like(user_id, post_id):
+    set_post_reaction(user_id, post_id, 'like', True)
+    db.session.commit()
+
+
+def storm(fn, post_id, clicks, threads):
+    def worker(chunk):
+        out = []
+        with app.app_context():
+            for user_id in chunk:
+                t = time.perf_counter()
+                fn(user_id, post_id)
+                out.append((time.perf_counter() - t) * 1000)
+        return out
+    chunks = [clicks[i::threads] for i in range(threads)]
+    with ThreadPoolExecutor(threads) as pool:
+        return [ms for rows in pool.map(worker, chunks) for ms in rows]
+
+
+def run(label, fn, user_ids, repeat, threads):
+    post_id = new_post(f'点赞压测-{label}')
+    clicks = [user_id for user_id in user_ids for _ in range(repeat)]
+    t0 = time.perf_counter()
+    ms = storm(fn, post_id, clicks, threads)
+    wall = time.perf_counter() - t0
+    flush = 0.0
+    if fn is new_like:
+        t = time.perf_counter()
+        reaction_counter.flush()
+        flush = time.perf_counter() - t
+        rows = PostReaction.query.filter_by(post_id=post_id).count()
+        assert rows == len(user_ids), rows
+    db.session.expire_all()
+    likes = db.session.get(PostStats, post_id).like_count
+    line = f'  {label:<6} p50 {statistics.median(ms):7.2f} ms  p99 {percentile(ms, 99):8.2f} ms  ' \
+           f'{len(clicks) / wall:8.0f} 次/秒  like_count {likes}'
+    if flush:
+        line += f'（写回 {flush * 1000:.1f} ms）'
+    print(line)
+    return likes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--clicks', type=int, default=2, help='每人连点次数')
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args(argv)
+    with app.app_context():
+        populate(args.users)
+        user_ids = [f'r{i:07d}' for i in range(args.users)]
+        print(f'\n== {args.users:,} 人各点 {args.clicks} 次同一帖子，{args.threads} 个并发线程 ==')
+        run('old', old_like, user_ids, args.clicks, args.threads)
+        likes = run('new', new_like, user_ids, args.clicks, args.threads)
+        assert likes == args.users
+    reaction_counter.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+相似帖子检测压测：MinHash + LSH 索引 vs 原全表 SequenceMatcher 扫描
+
+用法（在项目根目录执行，使用临时 SQLite 数据库，不会影响 instance/campus_social.db）：
+    python -m benchmarks.bench_similar_posts                 # 默认 10k / 100k / 500k
+    python -m benchmarks.bench_similar_posts 10000 --queries 50 --baseline-queries 5
+
+召回率以“精确扫描”为基准：对全部帖子计算 SequenceMatcher.ratio()（先用 quick_ratio 上界剪枝，
+结果与原实现完全一致）。原实现的延迟在 --baseline-queries 条查询上实测（大规模时较慢）。
+
+查询文本分三类改写：成段改写（约 12% 的字成段替换/插入/删除）、零散改字（逐字以 10%~25% 的概率替换，
+ratio 多落在 0.75~0.9 之间，是 MinHash 最难召回的情形）、短帖子（标题 + 一两句正文后零散改字）。
+另统计每条查询的候选帖子数，即需要取出正文用 SequenceMatcher 打分的条数。
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from difflib import SequenceMatcher
+
+_tmpdir = tempfile.mkdtemp(prefix='bench_similar_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'bench.db')
+
+from app import app, db, Post, PostSimilarityBucket  # noqa: E402
+from app import find_similar_posts, post_similarity_rows, post_similarity_text  # noqa: E402
+from app import lsh_bucket_keys, minhash_signature, similarity_length_keys  # noqa: E402
+from benchmarks.synthetic import CHARS, build_vocabulary, make_text, zipf_cum_weights  # noqa: E402
+
+THRESHOLD = 0.75
+
+
+def mutate(rng, text, vocab, ratio=0.12):
+    """对文本做若干段替换/插入/删除，总改动约 ratio 比例，模拟“改了几个字再发一遍”"""
+    chars = list(text)
+    budget = max(1, int(len(chars) * ratio))
+    while budget > 0 and chars:
+        span = min(budget, rng.randint(1, 6))
+        pos = rng.randrange(len(chars))
+        op = rng.random()
+        if op < 0.4:
+            chars[pos:pos + span] = list(rng.choice(vocab) * 2)[:span]
+        elif op < 0.7:
+            chars[pos:pos] = list(rng.choice(vocab))
+        else:
+            del chars[pos:pos + span]
+        budget -= span
+    return ''.join(chars)
+
+
+def scatter(rng, text, rate):
+    """逐字以 rate 的概率替换成任意汉字，模拟“零散改了很多字”"""
+    return ''.join(rng.choice(CHARS) if rng.random() < rate else ch for ch in text)
+
+
+MODES = ['成段改写', '零散改字', '短帖子']
+
+
+def make_query(rng, mode, texts, short_posts, vocab):
+    """按改写方式从已有帖子生成一条查询（标题, 正文）"""
+    if mode == '成段改写':
+        _, title, content = rng.choice(texts)
+        return title, mutate(rng, content, vocab)
+    if mode == '零散改字':
+        _, title, content = rng.choice(texts)
+        return scatter(rng, title, rng.uniform(0.1, 0.25)), scatter(rng, content, rng.uniform(0.1, 0.25))
+    _, title, content = rng.choice(short_posts)
+    return scatter(rng, title, 0.15), scatter(rng, content, 0.15)
+
+
+def populate(n, seed=42):
+    rng = random.Random(seed)
+    vocab = build_vocabulary(rng)
+    cum_weights = zipf_cum_weights(vocab)
+    db.drop_all()
+    db.create_all()
+    texts = []
+    batch_posts, batch_buckets = [], []
+    for i in range(1, n + 1):
+        title = make_text(rng, vocab, cum_weights, 6, 20)
+        # 约 2% 是只有一两句话的短帖子
+        content = make_text(rng, vocab, cum_weights, 2, 10) if i % 50 == 0 else make_text(rng, vocab, cum_weights)
+        texts.append((i, title, content))
+        batch_posts.append({'id': i, 'title': title, 'category': '校园资讯', 'content': content,
+                            'review_status': 'approved', 'created_at': '2026-01-01 00:00:00'})
+        batch_buckets.extend(post_similarity_rows(i, title, content))
+        if len(batch_posts) >= 5000:
+            db.session.execute(Post.__table__.insert(), batch_posts)
+            db.session.execute(PostSimilarityBucket.__table__.insert(), batch_buckets)
+            db.session.commit()
+            batch_posts, batch_buckets = [], []
+    if batch_posts:
+        db.session.execute(Post.__table__.insert(), batch_posts)
+        db.session.execute(PostSimilarityBucket.__table__.insert(), batch_buckets)
+        db.session.commit()
+    return rng, vocab, texts
+
+
+def baseline_find_similar_posts(title, content, threshold=THRESHOLD):
+    """原实现：加载全部帖子逐条 SequenceMatcher"""
+    combined = (title or '') + '\n' + (content or '')
+    candidates = []
+    for p in Post.query.all():
+        score = SequenceMatcher(None, combined, (p.title or '') + '\n' + (p.content or '')).ratio()
+        if score >= threshold:
+            candidates.append({'post': {'id': p.id, 'title': p.title, 'category': p.category,
+                                        'created_at': p.created_at}, 'score': score})
+    candidates.sort(key=lambda x: x['score'], reverse=True)
+    return candidates
+
+
+def exact_matches(query, texts, threshold=THRESHOLD):
+    """与原实现等价的精确结果（quick_ratio 上界剪枝不改变结果）"""
+    found = set()
+    for pid, title, content in texts:
+        m = SequenceMatcher(None, query, post_similarity_text(title, content))
+        if m.real_quick_ratio() >= threshold and m.quick_ratio() >= threshold and m.ratio() >= threshold:
+            found.add(pid)
+    return found
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def run(n, queries, baseline_queries):
+    t0 = time.perf_counter()
+    rng, vocab, texts = populate(n)
+    build_s = time.perf_counter() - t0
+
+    short_posts = [row for row in texts if row[0] % 50 == 0]
+    samples = [(mode, *make_query(rng, mode, texts, short_posts, vocab)) for mode in MODES for _ in range(queries)]
+
+    lsh_ms, recalls, candidates = [], {mode: [] for mode in MODES}, {mode: [] for mode in MODES}
+    for mode, title, content in samples:
+        query = post_similarity_text(title, content)
+        t = time.perf_counter()
+        got = {c['post']['id'] for c in find_similar_posts(title, content, THRESHOLD)}
+        lsh_ms.append((time.perf_counter() - t) * 1000)
+        keys = lsh_bucket_keys(minhash_signature(query)) + similarity_length_keys(len(query), THRESHOLD)
+        candidates[mode].append(db.session.query(PostSimilarityBucket.post_id).filter(
+            PostSimilarityBucket.bucket.in_(keys)).distinct().count())
+        truth = exact_matches(query, texts)
+        if truth:
+            recalls[mode].append(len(got & truth) / len(truth))
+
+    base_ms = []
+    for _, title, content in samples[:baseline_queries]:
+        t = time.perf_counter()
+        baseline_find_similar_posts(title, content)
+        base_ms.append((time.perf_counter() - t) * 1000)
+        db.session.expunge_all()
+
+    print(f"\n== {n:,} 篇帖子（建库+建索引 {build_s:.1f}s，查询 {len(samples)} 条）==")
+    print(f"  LSH 索引     p50 {statistics.median(lsh_ms):8.2f} ms   p99 {percentile(lsh_ms, 99):8.2f} ms")
+    if base_ms:
+        print(f"  原全表扫描   p50 {statistics.median(base_ms):8.2f} ms   （实测 {len(base_ms)} 条）")
+    for mode in MODES:
+        line = f"  {mode:<6} 候选 p50 {statistics.median(candidates[mode]):6.0f} / p99 {percentile(candidates[mode], 99):6d} 篇"
+        if recalls[mode]:
+            line += f"   召回率 {statistics.mean(recalls[mode]) * 100:7.2f}%（{len(recalls[mode])} 条查询有精确结果）"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sizes', nargs='*', type=int, default=[10000, 100000, 500000])
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--baseline-queries', type=int, default=3)
+    args = parser.parse_args(argv)
+    with app.app_context():
+        for n in args.sizes:
+            run(n, args.queries, args.baseline_queries)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+好友关系图压测：10 万用户 / 500 万条好友关系下的加载耗时、内存占用，以及共同好友与二度好友查询延迟
+
+用法（在项目根目录执行，使用临时 SQLite 数据库，不会影响 instance/campus_social.db）：
+    python -m benchmarks.bench_social_graph                          # 默认 100000 用户、5000000 条边
+    python -m benchmarks.bench_social_graph --users 20000 --edges 500000 --baseline-queries 3
+
+合成数据：每个用户属于 200 个“圈子”之一，六成好友关系在圈子内，其余随机，保证有足够多的共同好友。
+原实现的对比项为逐对 SQL（两人好友列表求交集），在 --baseline-queries 个用户对上实测。
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+_tmpdir = tempfile.mkdtemp(prefix='bench_graph_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'bench.db')
+
+from app import app, db, User, Friendship, SocialGraph, bulk_insert_tuples  # noqa: E402
+
+BASELINE_SQL = db.text("""
+    SELECT COUNT(*) FROM (
+        SELECT friend_id FROM (
+            SELECT user2_id AS friend_id FROM friendship WHERE user1_id = :a AND status = 'accepted'
+            UNION ALL SELECT user1_id FROM friendship WHERE user2_id = :a AND status = 'accepted')
+        INTERSECT
+        SELECT friend_id FROM (
+            SELECT user2_id AS friend_id FROM friendship WHERE user1_id = :b AND status = 'accepted'
+            UNION ALL SELECT user1_id FROM friendship WHERE user2_id = :b AND status = 'accepted')
+    )
+""")
+
+
+def user_id(n):
+    return f'u{n:07d}'
+
+
+def populate(n_users, n_edges, seed=5):
+    rng = np.random.default_rng(seed)
+    db.drop_all()
+    db.create_all()
+    db.session.execute(User.__table__.insert(), [
+        {'id': user_id(i), 'username': user_id(i), 'password': 'x', 'email': f'{user_id(i)}@example.com'}
+        for i in range(n_users)])
+    circles = rng.integers(0, 200, n_users)
+    members = [np.flatnonzero(circles == c) for c in range(200)]
+    pairs = np.empty(0, dtype=np.int64)
+    while len(pairs) < n_edges:
+        m = int((n_edges - len(pairs)) * 1.1) + 1000
+        a = rng.integers(0, n_users, m)
+        local = rng.random(m) < 0.6
+        b = rng.integers(0, n_users, m)
+        for c in range(200):
+            sel = local & (circles[a] == c)
+            b[sel] = rng.choice(members[c], int(sel.sum()))
+        lo, hi = np.minimum(a, b), np.maximum(a, b)
+        keep = lo != hi
+        pairs = np.unique(np.concatenate([pairs, lo[keep] * n_users + hi[keep]]))
+    pairs = rng.permutation(pairs)[:n_edges]
+    now = '2026-01-01 00:00:00'
+    bulk_insert_tuples(Friendship.__table__, ['user1_id', 'user2_id', 'status', 'requester_id', 'created_at', 'updated_at'],
+                       ((user_id(p // n_users), user_id(p % n_users), 'accepted', user_id(p // n_users), now, now)
+                        for p in pairs.tolist()))
+    db.session.commit()
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith('VmRSS:')) / 1024.0
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def timed(fn, samples):
+    ms = []
+    for args in samples:
+        t = time.perf_counter()
+        fn(*args)
+        ms.append((time.perf_counter() - t) * 1000)
+    return ms
+
+
+def report(label, ms):
+    print(f'  {label:<22} p50 {statistics.median(ms):8.3f} ms   p99 {percentile(ms, 99):8.3f} ms')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--edges', type=int, default=5000000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--baseline-queries', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        t0 = time.perf_counter()
+        populate(args.users, args.edges)
+        print(f'\n== {args.users:,} 个用户 / {args.edges:,} 条好友关系（建库 {time.perf_counter() - t0:.1f}s）==')
+
+        db.session.expunge_all()
+        graph = SocialGraph(reload_seconds=0)
+        rss0 = rss_mb()
+        t0 = time.perf_counter()
+        edges = graph.load()
+        load_s = time.perf_counter() - t0
+        print(f'  加载                   {load_s:.1f} s，{edges:,} 条边')
+        print(f'  内存                   进程 RSS 增加 {rss_mb() - rss0:.1f} MB（其中邻接数组 {graph.memory_bytes() / 2 ** 20:.1f} MB）')
+
+        rng = np.random.default_rng(1)
+        ids = [user_id(i) for i in range(args.users)]
+        pairs = [(ids[a], ids[b]) for a, b in rng.integers(0, args.users, (args.queries, 2))]
+        pages = [(ids[a], [ids[b] for b in rng.integers(0, args.users, 20)]) for a in rng.integers(0, args.users, args.queries)]
+        singles = [(ids[a],) for a in rng.integers(0, args.users, args.queries)]
+        report('共同好友数（单对）', timed(graph.mutual_count, pairs))
+        report('共同好友数（一页 20 人）', timed(graph.mutual_counts, pages))
+        report('二度好友前 20', timed(lambda u: graph.friends_of_friends(u, 20), singles))
+        # 与一个新用户建立再解除好友关系，不改变原有的边
+        report('接受/删除好友', timed(lambda a, b: (graph.add_friendship(a, b), graph.remove_friendship(a, b)),
+                                   [(a, f'n{i:07d}') for i, (a, _) in enumerate(pairs[:200])]))
+
+        if args.baseline_queries:
+            base = []
+            for a, b in pairs[:args.baseline_queries]:
+                t = time.perf_counter()
+                expected = db.session.execute(BASELINE_SQL, {'a': a, 'b': b}).scalar()
+                base.append((time.perf_counter() - t) * 1000)
+                assert expected == graph.mutual_count(a, b)
+            print(f'  原逐对 SQL             p50 {statistics.median(base):8.1f} ms   （实测 {len(base)} 对，'
+                  f'一页 20 人约 {statistics.median(base) * 20 / 1000:.1f} s）')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+"""
+SSE 空闲连接压测：每 1000 个在线客户端的服务端空闲 CPU / 内存开销，以及消息推送延迟
+
+用法（在项目根目录执行，使用临时数据库，不影响本地数据）：
+    python -m benchmarks.bench_sse_idle                    # 默认 1000 个连接，空闲观测 30 秒
+    python -m benchmarks.bench_sse_idle --clients 2000 --idle 60 --compare-polling
+
+服务端以子进程方式启动（Werkzeug 多线程模式，与 python app.py 相同），通过 /proc 读取其 CPU 时间与 RSS。
+--compare-polling 会额外模拟同样数量的客户端按原逻辑每 30 秒轮询会话列表 + 聊天记录，作为对比。
+"""
+import argparse
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix='bench_sse_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'bench.db')
+os.environ['EVENT_BROKER_SQLITE_PATH'] = os.path.join(_tmpdir, 'events.db')
+
+from app import app, db, User  # noqa: E402
+
+HOST = '127.0.0.1'
+SERVER_CODE = """
+import resource
+soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+from app import app
+app.run(host='127.0.0.1', port={port}, threaded=True, debug=False, use_reloader=False)
+"""
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def session_cookie(user_id):
+    serializer = app.session_interface.get_signing_serializer(app)
+    return serializer.dumps({'user_id': user_id, 'username': user_id})
+
+
+def proc_stats(pid):
+    """返回 (CPU 秒数, RSS MB)"""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    ticks = os.sysconf(os.sysconf_names['SC_CLK_TCK'])
+    cpu = (int(fields[11]) + int(fields[12])) / ticks
+    with open(f'/proc/{pid}/status') as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+    return cpu, rss_kb / 1024.0
+
+
+def http_request(port, method, path, cookie, body=None, keep_open=False):
+    sock = socket.create_connection((HOST, port), timeout=10)
+    data = body.encode('utf-8') if body else b''
+    headers = [f'{method} {path} HTTP/1.1', f'Host: {HOST}:{port}', f'Cookie: session={cookie}']
+    if body:
+        headers += ['Content-Type: application/json', f'Content-Length: {len(data)}']
+    if not keep_open:
+        headers.append('Connection: close')
+    sock.sendall(('\r\n'.join(headers) + '\r\n\r\n').encode('utf-8') + data)
+    if keep_open:
+        return sock
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    sock.close()
+    return b''.join(chunks)
+
+
+def open_stream(port, cookie):
+    sock = http_request(port, 'GET', '/api/stream', cookie, keep_open=True)
+    buf = b''
+    while b'retry:' not in buf:
+        chunk = sock.recv(4096)
+        if not chunk:
+            raise RuntimeError('SSE 连接被关闭：' + buf.decode('utf-8', 'replace'))
+        buf += chunk
+    return sock
+
+
+def wait_for_server(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('服务启动超时')
+
+
+def measure_push_latency(port, samples=20):
+    sender, receiver = session_cookie('benchsnd'), session_cookie('benchrcv')
+    sock = open_stream(port, receiver)
+    sock.settimeout(10)
+    latencies = []
+    for i in range(samples):
+        start = time.perf_counter()
+        http_request(port, 'POST', '/api/messages', sender, body=f'{{"receiver_id": "benchrcv", "content": "ping {i}"}}')
+        buf = b''
+        while b'event: message' not in buf:
+            buf += sock.recv(4096)
+        latencies.append((time.perf_counter() - start) * 1000)
+    sock.close()
+    return latencies
+
+
+def simulate_polling(port, cookies, duration, interval=30.0):
+    """按原 messages.js 逻辑：每个客户端每 interval 秒请求会话列表 + 当前聊天记录"""
+    stop = time.time() + duration
+    rng = random.Random(1)
+
+    def worker(cookie, offset):
+        next_at = time.time() + offset
+        while next_at < stop:
+            time.sleep(max(0.0, next_at - time.time()))
+            http_request(port, 'GET', '/api/messages/conversations', cookie)
+            http_request(port, 'GET', '/api/messages/benchsnd', cookie)
+            next_at += interval
+
+    threads = [threading.Thread(target=worker, args=(c, rng.uniform(0, interval)), daemon=True) for c in cookies]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--idle', type=float, default=30.0, help='空闲观测时长（秒）')
+    parser.add_argument('--backend', choices=['memory', 'sqlite'], default='memory')
+    parser.add_argument('--compare-polling', action='store_true')
+    args = parser.parse_args(argv)
+
+    limit = raise_fd_limit()
+    if limit < args.clients + 100:
+        print(f'文件描述符上限 {limit} 不足以打开 {args.clients} 个连接')
+        return 1
+
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([User(id='benchsnd', username='benchsnd', password='x', email='snd@example.com'),
+                            User(id='benchrcv', username='benchrcv', password='x', email='rcv@example.com')])
+        db.session.commit()
+
+    port = free_port()
+    env = dict(os.environ, EVENT_BROKER_BACKEND=args.backend)
+    server = subprocess.Popen([sys.executable, '-c', SERVER_CODE.format(port=port)], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_server(port)
+        time.sleep(1)
+        cpu0, rss0 = proc_stats(server.pid)
+
+        cookies = [session_cookie(f'c{i:07d}') for i in range(args.clients)]
+        t0 = time.perf_counter()
+        socks = [open_stream(port, cookie) for cookie in cookies]
+        connect_s = time.perf_counter() - t0
+
+        time.sleep(2)
+        cpu1, rss1 = proc_stats(server.pid)
+        time.sleep(args.idle)
+        cpu2, rss2 = proc_stats(server.pid)
+
+        latencies = sorted(measure_push_latency(port))
+        per_1000 = 1000.0 / args.clients
+        print(f'\n== SSE 空闲连接（{args.clients} 个客户端，后端 {args.backend}，观测 {args.idle:.0f}s）==')
+        print(f'  建立连接耗时       {connect_s:.2f} s')
+        print(f'  空闲 CPU           {(cpu2 - cpu1) / args.idle * 100 * per_1000:.2f}% 单核 / 1000 连接')
+        print(f'  内存增量           {(rss2 - rss0) * per_1000:.1f} MB / 1000 连接（服务进程 RSS {rss0:.1f} -> {rss2:.1f} MB）')
+        print(f'  推送延迟           p50 {latencies[len(latencies) // 2]:.1f} ms   max {latencies[-1]:.1f} ms')
+
+        for sock in socks:
+            sock.close()
+
+        if args.compare_polling:
+            time.sleep(2)
+            cpu3, _ = proc_stats(server.pid)
+            simulate_polling(port, cookies, args.idle)
+            cpu4, _ = proc_stats(server.pid)
+            print(f'  对比：30s 轮询     {(cpu4 - cpu3) / args.idle * 100 * per_1000:.2f}% 单核 / 1000 客户端'
+                  f'（{args.clients * 2 / 30.0:.0f} 请求/秒）')
+    finally:
+        server.terminate()
+        server.wait()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+好友页用户搜索压测：FTS5 trigram 索引 vs 原 username/email LIKE '%关键词%' 全表扫描
+
+用法（在项目根目录执行，使用临时 SQLite 数据库，不会影响 instance/campus_social.db）：
+    python -m benchmarks.bench_user_search                   # 默认 10k / 100k
+    python -m benchmarks.bench_user_search 100000 --queries 100
+
+模拟逐字输入：随机挑选用户，把其用户名、姓名、学号的前 1~N 个字依次作为关键词各查一次（每次取一页 20 人，
+连同与当前用户的好友状态）。“LIKE 排序版”是没有 trigram 分词器时的退回实现，同样按完全/前缀/子串排序。
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix='bench_user_search_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'bench.db')
+
+from app import app, db, User, Friendship  # noqa: E402
+from app import init_user_search_index, rebuild_user_search_index, search_user_rows  # noqa: E402
+
+PAGE_SIZE = 20
+SYLLABLES = ['zhang', 'wang', 'li', 'zhao', 'chen', 'liu', 'yang', 'huang', 'wu', 'zhou', 'xu', 'sun', 'ma', 'zhu',
+             'hu', 'guo', 'he', 'lin', 'luo', 'gao', 'xiao', 'ming', 'hua', 'jun', 'wei', 'fang', 'ting', 'yu']
+SURNAMES = '张王李赵陈刘杨黄吴周徐孙马朱胡郭何林罗高'
+GIVEN = '明华军伟芳婷宇杰静丽强磊洋勇艳敏涛超秀兰霞平刚桂英'
+
+
+def populate(n, seed=11):
+    rng = random.Random(seed)
+    db.drop_all()
+    db.session.execute(db.text('DROP TABLE IF EXISTS user_search'))
+    db.create_all()
+    init_user_search_index()
+    users, seen = [], set()
+    while len(users) < n:
+        username = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) + str(rng.randint(0, 9999))
+        if username in seen:
+            continue
+        seen.add(username)
+        i = len(users)
+        users.append({'id': f'u{i:07d}', 'username': username, 'password': 'x',
+                      'email': f'{username}@stu.example.edu', 'student_id': f'2026{i:06d}',
+                      'real_name': rng.choice(SURNAMES) + ''.join(rng.choice(GIVEN) for _ in range(rng.randint(1, 2)))})
+    for start in range(0, n, 5000):
+        db.session.execute(User.__table__.insert(), users[start:start + 5000])
+    db.session.commit()
+    t = time.perf_counter()
+    rebuild_user_search_index()
+    return rng, users, time.perf_counter() - t
+
+
+def like_rows(keyword, current_user_id, limit):
+    """原实现：用户名或邮箱 LIKE 匹配，不排序"""
+    return db.session.query(User.id, User.username, User.avatar, User.bio, Friendship.status).outerjoin(
+        Friendship, db.or_(
+            db.and_(Friendship.user1_id == current_user_id, Friendship.user2_id == User.id),
+            db.and_(Friendship.user1_id == User.id, Friendship.user2_id == current_user_id)
+        )
+    ).filter(
+        db.or_(User.username.like(f"%{keyword}%"), User.email.like(f"%{keyword}%")),
+        User.id != current_user_id
+    ).limit(limit).all()
+
+
+def timed(fn, keywords, me):
+    ms = []
+    for keyword in keywords:
+        t = time.perf_counter()
+        fn(keyword, me, PAGE_SIZE)
+        ms.append((time.perf_counter() - t) * 1000)
+    return ms
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def report(label, ms):
+    print(f"  {label:<12} p50 {statistics.median(ms):8.2f} ms   p99 {percentile(ms, 99):8.2f} ms")
+
+
+def run(n, queries):
+    rng, users, index_s = populate(n)
+    me = users[0]['id']
+    keywords = []
+    for _ in range(queries):
+        user = users[rng.randrange(n)]
+        text = rng.choice([user['username'], user['real_name'], user['student_id']])
+        keywords.extend(text[:size] for size in range(1, len(text) + 1))
+
+    hits = sum(1 for keyword in keywords[:200] if search_user_rows(keyword, me, PAGE_SIZE))
+    fts_ms = timed(search_user_rows, keywords, me)
+    app.config['USER_SEARCH_FTS'] = False
+    fallback_ms = timed(search_user_rows, keywords, me)
+    app.config['USER_SEARCH_FTS'] = True
+    like_ms = timed(like_rows, keywords, me)
+
+    print(f"\n== {n:,} 个用户（建索引 {index_s:.1f}s，逐字输入 {len(keywords)} 次，每页 {PAGE_SIZE} 人）==")
+    report('trigram 索引', fts_ms)
+    report('LIKE 排序版', fallback_ms)
+    report('原 LIKE 扫描', like_ms)
+    print(f"  前 200 次输入中有结果的比例 {hits / min(200, len(keywords)) * 100:.0f}%（原实现搜不到姓名和学号）")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('sizes', nargs='*', type=int, default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args(argv)
+    with app.app_context():
+        for n in args.sizes:
+            run(n, args.queries)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+好友推荐压测：5 万合成用户上的批量计算耗时、/api/users/suggestions 读取延迟与增量修正耗时
+
+用法（在项目根目录执行，使用临时 SQLite 数据库，不会影响 instance/campus_social.db）：
+    python -m benchmarks.bench_user_suggestions               # 默认 50000 个用户
+    python -m benchmarks.bench_user_suggestions --users 10000 --friends 8
+
+合成数据：80 个专业 × 4 个年级；60 个兴趣标签按 Zipf 分布每人取 1~4 个；好友关系七成在同专业内；
+活动规模 5~200 人、小组规模 5~100 人，偏向同专业成员。
+"""
+import argparse
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+_tmpdir = tempfile.mkdtemp(prefix='bench_suggest_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'bench.db')
+
+from app import app, db, User, Friendship, Activity, Group, UserSuggestion  # noqa: E402
+from app import activity_participants, group_members, compute_user_suggestions  # noqa: E402
+
+MAJORS = [f'专业{i}' for i in range(80)]
+GRADES = ['大一', '大二', '大三', '大四']
+HOBBIES = [f'爱好{i}' for i in range(60)]
+
+
+def populate(n, friends_per_user, seed=11):
+    rng = random.Random(seed)
+    db.drop_all()
+    db.create_all()
+    hobby_weights = list(itertools.accumulate(1.0 / (i + 1) for i in range(len(HOBBIES))))
+    users, by_major = [], {}
+    for i in range(n):
+        user_id = f'u{i:07d}'
+        major = rng.choice(MAJORS)
+        by_major.setdefault(major, []).append(user_id)
+        hobbies = set(rng.choices(HOBBIES, cum_weights=hobby_weights, k=rng.randint(1, 4)))
+        users.append({'id': user_id, 'username': user_id, 'password': 'x', 'email': f'{user_id}@example.com',
+                      'hobbies': ','.join(hobbies), 'major': major, 'grade': rng.choice(GRADES)})
+    db.session.execute(User.__table__.insert(), users)
+    ids = [u['id'] for u in users]
+    major_of = {u['id']: u['major'] for u in users}
+
+    def pick_peer(user_id):
+        pool = by_major[major_of[user_id]] if rng.random() < 0.7 else ids
+        return rng.choice(pool)
+
+    pairs = set()
+    for user_id in ids:
+        for _ in range(friends_per_user // 2):
+            other = pick_peer(user_id)
+            if other != user_id:
+                pairs.add((min(user_id, other), max(user_id, other)))
+    db.session.execute(Friendship.__table__.insert(), [
+        {'user1_id': a, 'user2_id': b, 'status': 'accepted', 'requester_id': a} for a, b in pairs])
+
+    activities, participants = [], set()
+    for activity_id in range(1, n // 25 + 1):
+        activities.append({'id': activity_id, 'title': f'活动{activity_id}', 'type': '其他', 'time': '2026-05-01',
+                           'location': '操场', 'participant_count': 0})
+        seed_user = rng.choice(ids)
+        for _ in range(rng.randint(5, 200)):
+            participants.add((pick_peer(seed_user), activity_id))
+    db.session.execute(Activity.__table__.insert(), activities)
+    db.session.execute(activity_participants.insert(), [{'user_id': u, 'activity_id': a} for u, a in participants])
+
+    groups, members = [], set()
+    for group_id in range(1, n // 100 + 1):
+        groups.append({'id': group_id, 'name': f'小组{group_id}'})
+        seed_user = rng.choice(ids)
+        for _ in range(rng.randint(5, 100)):
+            members.add((pick_peer(seed_user), group_id))
+    db.session.execute(Group.__table__.insert(), groups)
+    db.session.execute(group_members.insert(), [{'user_id': u, 'group_id': g} for u, g in members])
+    db.session.commit()
+    return rng, ids, len(pairs), len(participants), len(members)
+
+
+def session_client(user_id):
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id; sess['username'] = user_id
+    return client
+
+
+def timed(fn):
+    t = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--friends', type=int, default=10, help='平均好友数')
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        t = time.perf_counter()
+        rng, ids, n_friend, n_part, n_member = populate(args.users, args.friends)
+        print(f"\n== {args.users:,} 个用户：{n_friend:,} 对好友，{n_part:,} 条报名，{n_member:,} 条小组成员"
+              f"（造数 {time.perf_counter() - t:.1f}s）==")
+
+        t = time.perf_counter()
+        total = compute_user_suggestions()
+        print(f"  批量计算       {time.perf_counter() - t:8.1f} s   写入 {total:,} 条候选")
+
+        read_ms = [timed(lambda: session_client(rng.choice(ids)).get('/api/users/suggestions'))
+                   for _ in range(args.requests)]
+        print(f"  读取推荐       p50 {statistics.median(read_ms):7.2f} ms   max {max(read_ms):7.2f} ms")
+
+        join_ms = []
+        for _ in range(20):
+            activity_id = rng.randint(1, args.users // 25)
+            user_id = rng.choice(ids)
+            if db.session.query(activity_participants).filter_by(user_id=user_id, activity_id=activity_id).first():
+                continue
+            join_ms.append(timed(lambda: session_client(user_id).post(f'/api/activities/{activity_id}/join')))
+        print(f"  报名（含增量） p50 {statistics.median(join_ms):7.2f} ms")
+
+        accept_ms = []
+        for _ in range(20):
+            a, b = rng.sample(ids, 2)
+            if Friendship.query.filter_by(user1_id=min(a, b), user2_id=max(a, b)).first():
+                continue
+            friendship_id = session_client(a).post('/api/friends/request', json={'user_id': b}).get_json()['data']['friendship_id']
+            accept_ms.append(timed(lambda: session_client(b).post(f'/api/friends/request/{friendship_id}',
+                                                                  json={'action': 'accept'})))
+        print(f"  接受好友（含增量） p50 {statistics.median(accept_ms):7.2f} ms")
+        print(f"  结果表行数     {UserSuggestion.query.count():,}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
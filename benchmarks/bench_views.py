@@ -0,0 +1,112 @@
+"""
+浏览计数压测：多线程同时打开少量热门帖子详情，原“每次浏览在请求里 UPDATE post_stats 并提交”与
+“分段内存计数 + 定时写回”的接口延迟与吞吐对比，并校验写回后的计数与 HyperLogLog 独立访客估计误差
+
+用法（在项目根目录执行，使用临时 SQLite 数据库，不会影响 instance/campus_social.db）：
+    python -m benchmarks.bench_views                          # 默认 20000 次浏览、5 个热门帖子、16 个并发线程
+    python -m benchmarks.bench_views --views 100000 --posts 20 --threads 32
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_tmpdir = tempfile.mkdtemp(prefix='bench_views_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'bench.db')
+
+from app import app, db, User, Post, PostStats, bump_post_stats, create_post_stats, view_counter, view_report  # noqa: E402
+
+
+def populate(n_posts):
+    db.drop_all()
+    db.create_all()
+    db.session.add(User(id='v0000000', username='view_author', password='x', email='view@example.com'))
+    posts = [Post(title=f'热门帖子{i}', category='校园资讯', content='正文', author_id='v0000000', review_status='approved')
+             for i in range(n_posts)]
+    db.session.add_all(posts)
+    db.session.flush()
+    for post in posts:
+        create_post_stats(post)
+    db.session.commit()
+    return [p.id for p in posts]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def old_view(post_id, visitor):
+    """原实现：每次浏览都在请求里更新 post_stats 并提交"""
+    bump_post_stats(post_id, view_count=1)
+    db.session.commit()
+
+
+def new_view(post_id, visitor):
+    view_counter.record('post', post_id, visitor)
+
+
+def storm(fn, views, threads):
+    def worker(chunk):
+        out = []
+        with app.app_context():
+            for post_id, visitor in chunk:
+                t = time.perf_counter()
+                fn(post_id, visitor)
+                out.append((time.perf_counter() - t) * 1000)
+        return out
+    chunks = [views[i::threads] for i in range(threads)]
+    with ThreadPoolExecutor(threads) as pool:
+        return [ms for rows in pool.map(worker, chunks) for ms in rows]
+
+
+def run(label, fn, views, threads):
+    before = {post_id: db.session.get(PostStats, post_id).view_count for post_id in {p for p, _ in views}}
+    t0 = time.perf_counter()
+    ms = storm(fn, views, threads)
+    wall = time.perf_counter() - t0
+    flush = 0.0
+    if fn is new_view:
+        t = time.perf_counter()
+        view_counter.flush()
+        flush = time.perf_counter() - t
+    db.session.expire_all()
+    added = sum(db.session.get(PostStats, post_id).view_count - count for post_id, count in before.items())
+    assert added == len(views), (added, len(views))
+    line = f'  {label:<4} p50 {statistics.median(ms) * 1000:8.1f} µs  p99 {percentile(ms, 99) * 1000:10.1f} µs  ' \
+           f'{len(views) / wall:9.0f} 次/秒  计数 {added}'
+    if flush:
+        line += f'（写回 {flush * 1000:.1f} ms）'
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--views', type=int, default=20000)
+    parser.add_argument('--posts', type=int, default=5)
+    parser.add_argument('--visitors', type=int, default=8000, help='访客总数（每次浏览随机挑一个）')
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args(argv)
+    rng = random.Random(7)
+    with app.app_context():
+        post_ids = populate(args.posts)
+        views = [(rng.choice(post_ids), f'u:{rng.randrange(args.visitors)}') for _ in range(args.views)]
+        print(f'\n== {args.views:,} 次浏览、{args.posts} 个热门帖子、{args.threads} 个并发线程 ==')
+        run('old', old_view, views, args.threads)
+        run('new', new_view, views, args.threads)
+        errors = []
+        for post_id in post_ids:
+            exact = len({visitor for p, visitor in views if p == post_id})
+            estimate = view_report('post', post_id, 1)['unique_viewers']
+            errors.append(abs(estimate - exact) / exact)
+        print(f'  独立访客估计误差：平均 {statistics.mean(errors) * 100:.2f}%，最大 {max(errors) * 100:.2f}%')
+    view_counter.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
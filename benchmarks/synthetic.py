@@ -0,0 +1,24 @@
+"""压测脚本共用的合成中文文本生成工具"""
+import itertools
+
+# 常用汉字区间中的 3000 个字，组成 2 万个“词”，按 Zipf 分布取词拼成帖子
+CHARS = [chr(c) for c in range(0x4e00, 0x4e00 + 3000)]
+
+
+def build_vocabulary(rng, size=20000):
+    return [''.join(rng.choice(CHARS) for _ in range(rng.randint(1, 4))) for _ in range(size)]
+
+
+def zipf_cum_weights(vocab):
+    return list(itertools.accumulate(1.0 / (i + 1) for i in range(len(vocab))))
+
+
+def make_text(rng, vocab, cum_weights, min_len=80, max_len=300):
+    target = rng.randint(min_len, max_len)
+    words = []
+    length = 0
+    while length < target:
+        batch = rng.choices(vocab, cum_weights=cum_weights, k=16)
+        words.extend(batch)
+        length += sum(len(w) for w in batch)
+    return ''.join(words)[:target]
@@ -0,0 +1,44 @@
+"""precomputed people-you-may-know suggestions
+
+Revision ID: 24f3d9030fcb
+Revises: 780abb24bdc6
+Create Date: 2026-10-18 09:12:16.574201
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '24f3d9030fcb'
+down_revision = '780abb24bdc6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 启动时 db.create_all() 可能已经建好新表，这里都按“不存在才创建”处理；
+    # 迁移后执行 flask compute-user-suggestions 生成推荐（之后建议每天定时执行）
+    op.create_table('user_suggestion',
+        sa.Column('user_id', sa.String(length=8), nullable=False),
+        sa.Column('candidate_id', sa.String(length=8), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.Column('mutual_friends', sa.Integer(), nullable=False),
+        sa.Column('shared_hobbies', sa.Integer(), nullable=False),
+        sa.Column('shared_activities', sa.Integer(), nullable=False),
+        sa.Column('shared_groups', sa.Integer(), nullable=False),
+        sa.Column('same_major', sa.Boolean(), nullable=False),
+        sa.Column('same_grade', sa.Boolean(), nullable=False),
+        sa.Column('updated_at', sa.String(length=50), nullable=True),
+        sa.ForeignKeyConstraint(['candidate_id'], ['user.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'candidate_id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_user_suggestion_user_score', 'user_suggestion', ['user_id', 'score'],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_user_suggestion_user_score', table_name='user_suggestion')
+    op.drop_table('user_suggestion')
@@ -0,0 +1,31 @@
+"""hourly space-saving sketches for trending tags
+
+Revision ID: 2d6e8f0a4c73
+Revises: 7b2f9c1e8d40
+Create Date: 2026-10-17 21:48:19.502337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2d6e8f0a4c73'
+down_revision = '7b2f9c1e8d40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 启动时 db.create_all() 可能已经建好新表（并按原始表回填），这里都按“不存在才创建”处理；
+    # 迁移后执行 flask rebuild-trending-tags 回填最近 30 天的热门标签
+    op.create_table('tag_trend_hour',
+        sa.Column('hour', sa.String(length=13), nullable=False),
+        sa.Column('sketch', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('hour'),
+        if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('tag_trend_hour')
@@ -0,0 +1,48 @@
+"""activity flash signup: admission settings and signup/waitlist table
+
+Revision ID: 3f6b1c9d0e27
+Revises: 8c41d2e7a9b3
+Create Date: 2026-10-17 15:02:11.204771
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6b1c9d0e27'
+down_revision = '8c41d2e7a9b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 启动时 db.create_all() 可能已经建好新表，这里都按“不存在才创建”处理
+    op.create_table('activity_admission',
+        sa.Column('activity_id', sa.Integer(), nullable=False),
+        sa.Column('waitlist_limit', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.String(length=50), nullable=True),
+        sa.ForeignKeyConstraint(['activity_id'], ['activity.id'], ),
+        sa.PrimaryKeyConstraint('activity_id'),
+        if_not_exists=True
+    )
+    op.create_table('activity_signup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('activity_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.String(length=8), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.String(length=50), nullable=True),
+        sa.ForeignKeyConstraint(['activity_id'], ['activity.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('activity_id', 'user_id', name='uq_activity_signup_user'),
+        if_not_exists=True
+    )
+    op.create_index('ix_activity_signup_queue', 'activity_signup', ['activity_id', 'status', 'id'],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_activity_signup_queue', table_name='activity_signup')
+    op.drop_table('activity_signup')
+    op.drop_table('activity_admission')
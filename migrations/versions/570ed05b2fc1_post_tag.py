@@ -0,0 +1,34 @@
+"""post tag index
+
+Revision ID: 570ed05b2fc1
+Revises: a6107a31cd86
+Create Date: 2026-10-18 09:09:27.680392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '570ed05b2fc1'
+down_revision = 'a6107a31cd86'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 启动时 db.create_all() 可能已经建好新表，这里都按“不存在才创建”处理；
+    # 迁移后执行 flask rebuild-post-tags 按已有帖子回填标签索引
+    op.create_table('post_tag',
+        sa.Column('tag', sa.String(length=50), nullable=False),
+        sa.Column('post_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.ForeignKeyConstraint(['post_id'], ['post.id'], ),
+        sa.PrimaryKeyConstraint('tag', 'post_id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_post_tag_post_id', 'post_tag', ['post_id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_post_tag_post_id', table_name='post_tag')
+    op.drop_table('post_tag')
@@ -0,0 +1,34 @@
+"""activity tag inverted index
+
+Revision ID: 780abb24bdc6
+Revises: 570ed05b2fc1
+Create Date: 2026-10-18 09:10:51.132870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '780abb24bdc6'
+down_revision = '570ed05b2fc1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 启动时 db.create_all() 可能已经建好新表，这里都按“不存在才创建”处理；
+    # 迁移后执行 flask rebuild-activity-tags 按已有活动回填标签倒排索引
+    op.create_table('activity_tag',
+        sa.Column('tag', sa.String(length=50), nullable=False),
+        sa.Column('activity_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.ForeignKeyConstraint(['activity_id'], ['activity.id'], ),
+        sa.PrimaryKeyConstraint('tag', 'activity_id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_activity_tag_activity_id', 'activity_tag', ['activity_id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_activity_tag_activity_id', table_name='activity_tag')
+    op.drop_table('activity_tag')
@@ -0,0 +1,33 @@
+"""daily view counts with hyperloglog unique visitors
+
+Revision ID: 7b2f9c1e8d40
+Revises: e58a2d7c4b19
+Create Date: 2026-10-17 20:31:08.771205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b2f9c1e8d40'
+down_revision = 'e58a2d7c4b19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 启动时 db.create_all() 可能已经建好新表，这里都按“不存在才创建”处理
+    op.create_table('content_view_daily',
+        sa.Column('target_type', sa.String(length=20), nullable=False),
+        sa.Column('target_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.String(length=10), nullable=False),
+        sa.Column('view_count', sa.Integer(), nullable=False),
+        sa.Column('visitors', sa.LargeBinary(), nullable=True),
+        sa.PrimaryKeyConstraint('target_type', 'target_id', 'day'),
+        if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('content_view_daily')
@@ -0,0 +1,42 @@
+"""coalesce notifications: aggregate table and per-user index
+
+Revision ID: 8c41d2e7a9b3
+Revises: 5229b53dfad4
+Create Date: 2026-10-17 10:12:40.318552
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41d2e7a9b3'
+down_revision = '5229b53dfad4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 启动时 db.create_all() 可能已经建好新表，这里都按“不存在才创建”处理
+    op.create_table('notification_aggregate',
+        sa.Column('notification_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.String(length=8), nullable=False),
+        sa.Column('type', sa.String(length=50), nullable=False),
+        sa.Column('related_id', sa.String(length=50), nullable=False),
+        sa.Column('actor_count', sa.Integer(), nullable=False),
+        sa.Column('actors', sa.Text(), nullable=False),
+        sa.Column('window_start', sa.String(length=50), nullable=False),
+        sa.ForeignKeyConstraint(['notification_id'], ['notification.id'], ),
+        sa.PrimaryKeyConstraint('notification_id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_notification_aggregate_key', 'notification_aggregate',
+                    ['user_id', 'type', 'related_id', 'window_start'], unique=False, if_not_exists=True)
+    op.create_index('ix_notification_user_created', 'notification', ['user_id', 'created_at'],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_notification_user_created', table_name='notification')
+    op.drop_index('ix_notification_aggregate_key', table_name='notification_aggregate')
+    op.drop_table('notification_aggregate')
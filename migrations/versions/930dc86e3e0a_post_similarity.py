@@ -0,0 +1,42 @@
+"""minhash lsh buckets for near-duplicate post detection
+
+Revision ID: 930dc86e3e0a
+Revises: 9a4c1e7f3b28
+Create Date: 2026-10-18 09:05:12.408113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '930dc86e3e0a'
+down_revision = '9a4c1e7f3b28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 启动时 db.create_all() 可能已经建好新表，这里都按“不存在才创建”处理；
+    # 签名格式表为空时，下次启动会按当前参数为已有帖子重建相似度索引
+    op.create_table('post_similarity_bucket',
+        sa.Column('bucket', sa.BigInteger(), autoincrement=False, nullable=False),
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['post_id'], ['post.id'], ),
+        sa.PrimaryKeyConstraint('bucket', 'post_id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_post_similarity_bucket_post_id', 'post_similarity_bucket', ['post_id'],
+                    unique=False, if_not_exists=True)
+    op.create_table('post_similarity_meta',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('format', sa.String(length=50), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('post_similarity_meta')
+    op.drop_index('ix_post_similarity_bucket_post_id', table_name='post_similarity_bucket')
+    op.drop_table('post_similarity_bucket')
@@ -0,0 +1,39 @@
+"""composite indexes for hot list, inbox and lookup queries
+
+Revision ID: 9a4c1e7f3b28
+Revises: 2d6e8f0a4c73
+Create Date: 2026-10-17 23:12:40.118264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4c1e7f3b28'
+down_revision = '2d6e8f0a4c73'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_activity_participants_activity', 'activity_participants', ['activity_id', 'user_id']),
+    ('ix_friendship_user2', 'friendship', ['user2_id', 'status']),
+    ('ix_message_receiver_read', 'message', ['receiver_id', 'is_read']),
+    ('ix_message_conversation', 'message', ['sender_id', 'receiver_id', 'id']),
+    ('ix_post_review_category', 'post', ['review_status', 'category', 'id']),
+    ('ix_post_author', 'post', ['author_id', 'id']),
+    ('ix_comment_post', 'comment', ['post_id', 'id']),
+    ('ix_reaction_post_type', 'reaction', ['post_id', 'type']),
+    ('ix_notification_user_read', 'notification', ['user_id', 'is_read', 'id']),
+]
+
+
+def upgrade():
+    # 启动时也会补建模型里声明的索引，这里都按“不存在才创建”处理
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
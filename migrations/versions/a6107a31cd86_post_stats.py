@@ -0,0 +1,43 @@
+"""per-post engagement counters and hot score
+
+Revision ID: a6107a31cd86
+Revises: cef70b62381d
+Create Date: 2026-10-18 09:08:03.915046
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6107a31cd86'
+down_revision = 'cef70b62381d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 启动时 db.create_all() 可能已经建好新表，这里都按“不存在才创建”处理；
+    # 迁移后执行 flask reconcile-post-stats 为已有帖子补建计数
+    op.create_table('post_stats',
+        sa.Column('post_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('like_count', sa.Integer(), nullable=False),
+        sa.Column('favorite_count', sa.Integer(), nullable=False),
+        sa.Column('repost_count', sa.Integer(), nullable=False),
+        sa.Column('useful_count', sa.Integer(), nullable=False),
+        sa.Column('comment_count', sa.Integer(), nullable=False),
+        sa.Column('view_count', sa.Integer(), nullable=False),
+        sa.Column('hot_score', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['post_id'], ['post.id'], ),
+        sa.PrimaryKeyConstraint('post_id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_post_stats_hot', 'post_stats', ['hot_score', 'post_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_post_stats_comments', 'post_stats', ['comment_count', 'post_id'],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_post_stats_comments', table_name='post_stats')
+    op.drop_index('ix_post_stats_hot', table_name='post_stats')
+    op.drop_table('post_stats')
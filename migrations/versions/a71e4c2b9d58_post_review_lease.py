@@ -0,0 +1,36 @@
+"""post review lease table for concurrent reviewers
+
+Revision ID: a71e4c2b9d58
+Revises: 3f6b1c9d0e27
+Create Date: 2026-10-17 16:20:37.918044
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a71e4c2b9d58'
+down_revision = '3f6b1c9d0e27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 启动时 db.create_all() 可能已经建好新表，这里都按“不存在才创建”处理
+    op.create_table('post_review_lease',
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('teacher_id', sa.String(length=8), nullable=False),
+        sa.Column('expires_at', sa.String(length=50), nullable=False),
+        sa.ForeignKeyConstraint(['post_id'], ['post.id'], ),
+        sa.ForeignKeyConstraint(['teacher_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('post_id'),
+        if_not_exists=True
+    )
+    op.create_index(op.f('ix_post_review_lease_teacher_id'), 'post_review_lease', ['teacher_id'],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_post_review_lease_teacher_id'), table_name='post_review_lease')
+    op.drop_table('post_review_lease')
@@ -0,0 +1,42 @@
+"""comment materialized paths for paginated comment trees
+
+Revision ID: c4d93a7e1f62
+Revises: a71e4c2b9d58
+Create Date: 2026-10-17 17:05:52.640113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d93a7e1f62'
+down_revision = 'a71e4c2b9d58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 启动时 db.create_all() 可能已经建好新表（并按 parent_id 回填），这里都按“不存在才创建”处理；
+    # 迁移后执行 flask rebuild-comment-paths 回填已有评论
+    op.create_table('comment_path',
+        sa.Column('comment_id', sa.Integer(), nullable=False),
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('path', sa.String(length=500), nullable=False),
+        sa.Column('depth', sa.Integer(), nullable=False),
+        sa.Column('pin_rank', sa.Integer(), nullable=False),
+        sa.Column('reply_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['comment_id'], ['comment.id'], ),
+        sa.ForeignKeyConstraint(['post_id'], ['post.id'], ),
+        sa.PrimaryKeyConstraint('comment_id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_comment_path_roots', 'comment_path', ['post_id', 'depth', 'pin_rank', 'comment_id'],
+                    unique=False, if_not_exists=True)
+    op.create_index('ix_comment_path_tree', 'comment_path', ['post_id', 'path'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_comment_path_tree', table_name='comment_path')
+    op.drop_index('ix_comment_path_roots', table_name='comment_path')
+    op.drop_table('comment_path')
@@ -0,0 +1,43 @@
+"""per-user conversation summaries
+
+Revision ID: cef70b62381d
+Revises: 930dc86e3e0a
+Create Date: 2026-10-18 09:06:40.227519
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'cef70b62381d'
+down_revision = '930dc86e3e0a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 启动时 db.create_all() 可能已经建好新表，这里都按“不存在才创建”处理；
+    # 迁移后执行 flask rebuild-conversations 按已有消息回填会话列表
+    op.create_table('conversation',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.String(length=8), nullable=False),
+        sa.Column('peer_id', sa.String(length=8), nullable=False),
+        sa.Column('last_message_id', sa.Integer(), nullable=False),
+        sa.Column('last_message', sa.String(length=200), nullable=True),
+        sa.Column('last_message_time', sa.String(length=50), nullable=True),
+        sa.Column('last_sender_id', sa.String(length=8), nullable=True),
+        sa.Column('unread_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['peer_id'], ['user.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'peer_id', name='_conversation_user_peer_uc'),
+        if_not_exists=True
+    )
+    op.create_index('ix_conversation_user_last_message', 'conversation', ['user_id', 'last_message_id'],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_conversation_user_last_message', table_name='conversation')
+    op.drop_table('conversation')
@@ -0,0 +1,53 @@
+"""idempotent post reaction state and write-behind counter journal
+
+Revision ID: e58a2d7c4b19
+Revises: c4d93a7e1f62
+Create Date: 2026-10-17 19:12:40.318562
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e58a2d7c4b19'
+down_revision = 'c4d93a7e1f62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 启动时 db.create_all() 可能已经建好新表（并按 reaction 去重回填），这里都按“不存在才创建”处理；
+    # 迁移后执行 flask reconcile-post-stats 按去重后的互动状态重算计数
+    op.create_table('post_reaction',
+        sa.Column('user_id', sa.String(length=8), nullable=False),
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(length=30), nullable=False),
+        sa.Column('created_at', sa.String(length=50), nullable=True),
+        sa.ForeignKeyConstraint(['post_id'], ['post.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'post_id', 'type'),
+        if_not_exists=True
+    )
+    op.create_index('ix_post_reaction_post', 'post_reaction', ['post_id', 'type'], unique=False, if_not_exists=True)
+    op.create_table('post_reaction_delta',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('type', sa.String(length=30), nullable=False),
+        sa.Column('delta', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['post_id'], ['post.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+    op.execute(
+        "INSERT OR IGNORE INTO post_reaction (user_id, post_id, type, created_at) "
+        "SELECT user_id, post_id, type, MIN(created_at) FROM reaction "
+        "WHERE user_id IS NOT NULL AND post_id IS NOT NULL AND type IN ('like', 'favorite', 'repost', 'useful', 'unuseful') "
+        "GROUP BY user_id, post_id, type"
+    )
+
+
+def downgrade():
+    op.drop_table('post_reaction_delta')
+    op.drop_index('ix_post_reaction_post', table_name='post_reaction')
+    op.drop_table('post_reaction')
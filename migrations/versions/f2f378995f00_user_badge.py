@@ -0,0 +1,34 @@
+"""per-user unread and pending badge counters
+
+Revision ID: f2f378995f00
+Revises: 24f3d9030fcb
+Create Date: 2026-10-18 09:13:38.041775
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2f378995f00'
+down_revision = '24f3d9030fcb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 启动时 db.create_all() 可能已经建好新表，这里都按“不存在才创建”处理；
+    # 迁移后执行 flask rebuild-user-badges 按消息、通知、好友请求回填徽章计数
+    op.create_table('user_badge',
+        sa.Column('user_id', sa.String(length=8), nullable=False),
+        sa.Column('unread_messages', sa.Integer(), nullable=False),
+        sa.Column('unread_notifications', sa.Integer(), nullable=False),
+        sa.Column('friend_requests', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('user_id'),
+        if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('user_badge')
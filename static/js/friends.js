@@ -1,6 +1,8 @@
 // 好友管理页面JavaScript
 
 let currentUser = null;
+let friendsCursor = null;
+let requestsCursor = null;
 
 // 页面加载时初始化
 document.addEventListener('DOMContentLoaded', function() {
@@ -11,17 +13,26 @@ document.addEventListener('DOMContentLoaded', function() {
         handleUrlTabParam();
     }, 100);
     
-    // 支持回车键搜索
+    // 支持回车键搜索；输入时停顿片刻自动搜索
     const searchInput = document.getElementById('searchInput');
     if (searchInput) {
         searchInput.addEventListener('keypress', function(e) {
             if (e.key === 'Enter') {
+                clearTimeout(searchTimer);
                 searchUsers();
             }
         });
+        searchInput.addEventListener('input', function() {
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(() => searchUsers(true), SEARCH_DEBOUNCE_MS);
+        });
     }
 });
 
+const SEARCH_DEBOUNCE_MS = 250;
+let searchTimer = null;
+let searchSeq = 0;  // 只渲染最后一次请求的结果，避免先发后到的旧结果覆盖
+
 // 检查登录状态
 function checkLoginStatus() {
     fetch('/api/current-user')
@@ -83,13 +94,32 @@ function setupTabListeners() {
     });
 }
 
-// 加载好友列表
-function loadFriends() {
-    fetch('/api/friends')
+// 共同好友数提示
+function mutualFriendsLabel(count) {
+    return count > 0 ? `<small class="text-muted ms-2">${count} 位共同好友</small>` : '';
+}
+
+// 在列表末尾放置“加载更多”按钮（没有更多时移除）
+function renderLoadMore(container, hasMore, onClick) {
+    const old = container.querySelector('.load-more');
+    if (old) old.remove();
+    if (!hasMore) return;
+    const button = document.createElement('button');
+    button.className = 'btn btn-outline-secondary w-100 mt-2 load-more';
+    button.textContent = '加载更多';
+    button.onclick = onClick;
+    container.appendChild(button);
+}
+
+// 加载好友列表（cursor 为空时从第一页开始，否则追加下一页）
+function loadFriends(cursor) {
+    fetch('/api/friends' + (cursor ? `?cursor=${cursor}` : ''))
         .then(response => response.json())
         .then(result => {
             if (result.success) {
-                displayFriends(result.data);
+                displayFriends(result.data, !!cursor);
+                friendsCursor = result.next_cursor;
+                renderLoadMore(document.getElementById('friendsList'), result.has_more, () => loadFriends(friendsCursor));
             } else {
                 showError('加载好友列表失败: ' + result.error);
             }
@@ -101,10 +131,10 @@ function loadFriends() {
 }
 
 // 显示好友列表
-function displayFriends(friends) {
+function displayFriends(friends, append) {
     const container = document.getElementById('friendsList');
     
-    if (friends.length === 0) {
+    if (friends.length === 0 && !append) {
         container.innerHTML = `
             <div class="empty-state">
                 <i class="fas fa-user-friends"></i>
@@ -114,14 +144,14 @@ function displayFriends(friends) {
         return;
     }
     
-    container.innerHTML = friends.map(friend => `
+    const html = friends.map(friend => `
         <div class="friend-card d-flex align-items-center">
             <img src="${friend.avatar || '/static/images/default.jpg'}" 
                  alt="${friend.username}" 
                  class="friend-avatar me-3"
                  onerror="this.src='/static/images/default.jpg'">
             <div class="flex-grow-1">
-                <h5 class="mb-1">${friend.username}</h5>
+                <h5 class="mb-1">${friend.username}${mutualFriendsLabel(friend.mutual_friends)}</h5>
                 <p class="text-muted mb-0 small">${friend.bio || '暂无简介'}</p>
             </div>
             <div>
@@ -134,16 +164,23 @@ function displayFriends(friends) {
             </div>
         </div>
     `).join('');
+    if (append) {
+        container.insertAdjacentHTML('beforeend', html);
+    } else {
+        container.innerHTML = html;
+    }
 }
 
-// 加载好友请求
-function loadFriendRequests() {
-    fetch('/api/friends/requests')
+// 加载好友请求（cursor 为空时从第一页开始，否则追加下一页）
+function loadFriendRequests(cursor) {
+    if (!cursor) loadRequestBadge();
+    fetch('/api/friends/requests' + (cursor ? `?cursor=${cursor}` : ''))
         .then(response => response.json())
         .then(result => {
             if (result.success) {
-                displayFriendRequests(result.data);
-                updateRequestBadge(result.count);
+                displayFriendRequests(result.data, !!cursor);
+                requestsCursor = result.next_cursor;
+                renderLoadMore(document.getElementById('requestsList'), result.has_more, () => loadFriendRequests(requestsCursor));
             } else {
                 showError('加载好友请求失败: ' + result.error);
             }
@@ -155,10 +192,10 @@ function loadFriendRequests() {
 }
 
 // 显示好友请求
-function displayFriendRequests(requests) {
+function displayFriendRequests(requests, append) {
     const container = document.getElementById('requestsList');
     
-    if (requests.length === 0) {
+    if (requests.length === 0 && !append) {
         container.innerHTML = `
             <div class="empty-state">
                 <i class="fas fa-inbox"></i>
@@ -168,7 +205,7 @@ function displayFriendRequests(requests) {
         return;
     }
     
-    container.innerHTML = requests.map(req => `
+    const html = requests.map(req => `
         <div class="friend-card d-flex align-items-center">
             <img src="${req.requester_avatar || '/static/images/default.jpg'}" 
                  alt="${req.requester_username}" 
@@ -188,6 +225,23 @@ function displayFriendRequests(requests) {
             </div>
         </div>
     `).join('');
+    if (append) {
+        container.insertAdjacentHTML('beforeend', html);
+    } else {
+        container.innerHTML = html;
+    }
+}
+
+// 读取待处理好友请求总数（列表分页后不能再用本页条数）
+function loadRequestBadge() {
+    fetch('/api/me/badges')
+        .then(response => response.json())
+        .then(result => {
+            if (result.success) {
+                updateRequestBadge(result.data.friend_requests);
+            }
+        })
+        .catch(error => console.error('加载徽章计数失败:', error));
 }
 
 // 更新请求徽章
@@ -226,12 +280,14 @@ function handleFriendRequest(friendshipId, action) {
     });
 }
 
-// 搜索用户
-function searchUsers() {
+// 搜索用户（typeahead 为 true 时是输入过程中的自动搜索，关键词为空不提示）
+function searchUsers(typeahead = false) {
     const keyword = document.getElementById('searchInput').value.trim();
     
     if (!keyword) {
-        showError('请输入搜索关键词');
+        if (!typeahead) {
+            showError('请输入搜索关键词');
+        }
         return;
     }
     
@@ -240,9 +296,13 @@ function searchUsers() {
     const bsTab = new bootstrap.Tab(searchTab);
     bsTab.show();
     
+    const seq = ++searchSeq;
     fetch(`/api/users/search?keyword=${encodeURIComponent(keyword)}`)
         .then(response => response.json())
         .then(result => {
+            if (seq !== searchSeq) {
+                return;
+            }
             if (result.success) {
                 displaySearchResults(result.data);
             } else {
@@ -294,7 +354,7 @@ function displaySearchResults(users) {
                      class="friend-avatar me-3"
                      onerror="this.src='/static/images/default.jpg'">
                 <div class="flex-grow-1">
-                    <h5 class="mb-1">${user.username}</h5>
+                    <h5 class="mb-1">${user.username}${mutualFriendsLabel(user.mutual_friends)}</h5>
                     <p class="text-muted mb-0 small">${user.bio || '暂无简介'}</p>
                 </div>
                 <div>
@@ -8,6 +8,9 @@ document.addEventListener('DOMContentLoaded', function() {
 
 // 全局变量
 let currentSearchType = 'all';
+// 活动列表分页：当前列表的筛选类型与下一页游标
+let activityListType = 'all';
+let activityCursor = null;
 
 // 检查登录状态
 function checkLoginStatus() {
@@ -44,7 +47,16 @@ function logout() {
 
 // 加载所有活动数据
 function loadActivities() {
-    fetch('/api/activities')
+    fetchActivities('all');
+}
+
+// 按类型加载一页活动（type 为 'all' 时不筛选；cursor 为空时从第一页开始，否则追加到列表末尾）
+function fetchActivities(type, cursor) {
+    const params = new URLSearchParams();
+    if (type && type !== 'all') params.set('type', type);
+    if (cursor) params.set('cursor', cursor);
+    const query = params.toString();
+    fetch('/api/activities' + (query ? `?${query}` : ''))
         .then(response => {
             if (!response.ok) {
                 throw new Error('网络请求失败');
@@ -53,7 +65,10 @@ function loadActivities() {
         })
         .then(data => {
             const activities = data.success ? data.data : [];
-            displayActivities(activities);
+            activityListType = type;
+            activityCursor = data.next_cursor;
+            displayActivities(activities, !!cursor);
+            renderMoreActivities(data.success && data.has_more);
         })
         .catch(error => {
             console.error('获取活动数据失败:', error);
@@ -66,12 +81,35 @@ function loadActivities() {
         });
 }
 
-// 渲染活动列表
-function displayActivities(activities) {
+// 加载下一页活动
+function loadMoreActivities() {
+    fetchActivities(activityListType, activityCursor);
+}
+
+// 在活动列表末尾放置“加载更多”按钮（没有更多时移除）
+function renderMoreActivities(hasMore) {
     const container = document.getElementById('activity-list');
-    container.innerHTML = '';
+    const old = container.querySelector('.activity-load-more');
+    if (old) old.remove();
+    if (!hasMore) return;
+    container.insertAdjacentHTML('beforeend', `
+        <div class="col-12 text-center my-3 activity-load-more">
+            <button class="btn btn-outline-secondary" onclick="this.disabled = true; loadMoreActivities()">加载更多活动</button>
+        </div>
+    `);
+}
 
-    if (activities.length === 0) {
+// 渲染活动列表（append 为真时追加到已有列表之后）
+function displayActivities(activities, append) {
+    const container = document.getElementById('activity-list');
+    if (append) {
+        const old = container.querySelector('.activity-load-more');
+        if (old) old.remove();
+    } else {
+        container.innerHTML = '';
+    }
+
+    if (activities.length === 0 && !append) {
         container.innerHTML = `
             <div class="col-12">
                 <div class="alert alert-warning text-center p-3">
@@ -108,7 +146,7 @@ function displayActivities(activities) {
                         </div>
                     </div>
                     <div class="card-footer text-muted">
-                        参与人数：${activity.participants_count || 0}人
+                        参与人数：${(activity.participant_count ?? activity.participants_count) || 0}人
                     </div>
                 </div>
             </div>
@@ -120,18 +158,8 @@ function displayActivities(activities) {
 // 按类型筛选活动
 function filterActivities(type) {
     currentSearchType = type;
-    fetch('/api/activities')
-        .then(response => response.json())
-        .then(data => {
-            const allActivities = data.success ? data.data : [];
-            let filtered = allActivities;
-
-            if (type !== 'all') {
-                filtered = allActivities.filter(activity => activity.type === type);
-            }
-
-            displayActivities(filtered);
-        });
+    // 类型筛选交给服务端，避免拉取全部活动后在前端过滤
+    fetchActivities(type);
 }
 
 // 搜索活动
@@ -231,7 +259,11 @@ function joinActivity(activityId) {
     .then(data => {
         if (data.success) {
             alert(data.message);
-            loadActivities();
+            if (data.data && data.data.status === 'queued') {
+                waitForSignup(activityId);
+            } else {
+                loadActivities();
+            }
         } else {
             alert(data.error);
         }
@@ -242,6 +274,31 @@ function joinActivity(activityId) {
     });
 }
 
+// 抢报名活动排队中：轮询报名结果，出结果后提示并刷新列表
+function waitForSignup(activityId, attempts = 0) {
+    fetch(`/api/activities/${activityId}/signup`, {credentials: 'include'})
+    .then(response => response.json())
+    .then(data => {
+        const status = data.success ? data.data.status : 'none';
+        if (status === 'queued' && attempts < 30) {
+            setTimeout(() => waitForSignup(activityId, attempts + 1), 1000);
+            return;
+        }
+        if (status === 'admitted') {
+            alert('报名成功');
+        } else if (status === 'waitlisted') {
+            alert(`名额已满，已进入候补第 ${data.data.position} 位`);
+        } else if (status === 'full') {
+            alert('报名人数和候补名额均已满');
+        } else if (status === 'none') {
+            // 没有报名记录：放号失败或服务重启时排队丢失
+            alert('报名未能处理，请重新报名');
+        }
+        loadActivities();
+    })
+    .catch(error => console.error('查询报名结果失败:', error));
+}
+
 // 收藏活动
 function favoriteActivity(activityId) {
     fetch(`/api/activities/${activityId}/favorite`, {
@@ -1039,24 +1096,35 @@ function submitPost(){
     });
 }
 
-function loadPostsList(category){
-    let url = '/api/posts';
-    if(category) url += `?category=${encodeURIComponent(category)}`;
+// 加载帖子列表（cursor 为空时从第一页开始，否则把下一页追加到列表末尾）
+function loadPostsList(category, cursor){
+    let url = '/api/posts?view=summary';
+    if(category) url += `&category=${encodeURIComponent(category)}`;
+    if(cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
     fetch(url)
         .then(r=>r.json())
         .then(res=>{
             const list = document.getElementById('postsList');
-            list.innerHTML = '';
-            if(!res.success || res.count===0){ list.innerHTML = '<div class="text-muted p-3">暂无信息</div>'; return; }
+            const more = list.querySelector('.posts-load-more');
+            if(more) more.remove();
+            if(!cursor) list.innerHTML = '';
+            if(!res.success || (res.count===0 && !cursor)){ list.innerHTML = '<div class="text-muted p-3">暂无信息</div>'; return; }
             res.data.forEach(p=>{
                 const item = document.createElement('a');
                 item.className = 'list-group-item list-group-item-action';
                 item.href = 'javascript:void(0);';
                 const badge = p.is_official ? '<span class="badge bg-danger ms-2">官方</span>' : '';
-                item.innerHTML = `<div class="d-flex justify-content-between"><div><strong>${escapeHtml(p.title)}</strong> ${badge}<div class="small text-muted">${escapeHtml(p.category)} · ${escapeHtml(p.created_at)}</div></div></div><div class="mt-2">${escapeHtml(p.content || '')}</div>`;
+                item.innerHTML = `<div class="d-flex justify-content-between"><div><strong>${escapeHtml(p.title)}</strong> ${badge}<div class="small text-muted">${escapeHtml(p.category)} · ${escapeHtml(p.created_at)}</div></div></div><div class="mt-2">${escapeHtml(p.excerpt || '')}</div>`;
                 item.addEventListener('click', function(){ showPost(p.id); });
                 list.appendChild(item);
             });
+            if(res.has_more){
+                const button = document.createElement('button');
+                button.className = 'list-group-item list-group-item-action text-center text-primary posts-load-more';
+                button.textContent = '加载更多';
+                button.addEventListener('click', function(){ button.disabled = true; loadPostsList(category, res.next_cursor); });
+                list.appendChild(button);
+            }
         }).catch(err=>{ console.error('加载帖子失败', err); });
 }
 
@@ -1075,7 +1143,7 @@ function showPost(postId){
                 p.media.forEach(m=>{ html += `<div><a href="${m.url}" target="_blank">${escapeHtml(m.filename)}</a></div>`; });
                 html += '</div>';
             }
-            html += `<div id="postInteractions_${p.id}" class="mt-3"><button class="btn btn-sm btn-outline-primary me-2" onclick="reactPost(${p.id}, 'like')">点赞</button><button class="btn btn-sm btn-outline-secondary me-2" onclick="reactPost(${p.id}, 'favorite')">收藏</button></div>`;
+            html += `<div id="postInteractions_${p.id}" class="mt-3">${renderReactionButtons(p.id, p.reactions, p.my_reactions)}</div>`;
             html += `<div class="mt-3"><h6>评论</h6><div id="commentsContainer_${p.id}">加载中...</div><div class="mt-2"><textarea id="newComment_${p.id}" class="form-control" rows="3" placeholder="写评论..."></textarea><div class="d-flex gap-2 mt-2"><button class="btn btn-sm btn-primary" onclick="submitComment(${p.id}, null)">发表评论</button></div></div></div>`;
             body.innerHTML = html;
             const modalEl = document.getElementById('postDetailModal');
@@ -1086,37 +1154,85 @@ function showPost(postId){
         }).catch(err=>{ console.error('获取帖子详情失败', err); alert('获取帖子详情失败'); });
 }
 
-function reactPost(postId, type){
-    fetch(`/api/posts/${postId}/react`, { method: 'POST', headers: {'Content-Type':'application/json'}, body: JSON.stringify({type}) })
+const REACTION_LABELS = { like: '点赞', favorite: '收藏' };
+
+function renderReactionButtons(postId, counts, mine){
+    counts = counts || {}; mine = mine || [];
+    return Object.keys(REACTION_LABELS).map(type=>{
+        const active = mine.includes(type);
+        return `<button class="btn btn-sm ${active ? 'btn-primary' : 'btn-outline-primary'} me-2" data-active="${active ? 1 : 0}" onclick="reactPost(${postId}, '${type}', this)">${REACTION_LABELS[type]} ${counts[type] || 0}</button>`;
+    }).join('');
+}
+
+// 互动按钮提交目标状态（active），连点或重试不会来回切换
+function reactPost(postId, type, btn){
+    const active = !(btn && btn.dataset.active === '1');
+    if(btn) btn.disabled = true;
+    fetch(`/api/posts/${postId}/react`, { method: 'POST', headers: {'Content-Type':'application/json'}, body: JSON.stringify({type, active}) })
         .then(r=>r.json().then(j=>({status:r.status, body:j}))).then(res=>{
             if(res.status===401){ alert('请先登录后再互动'); window.location.href='/login'; return; }
-            if(res.status===200){ alert('操作成功'); } else { alert(res.body.error || '互动失败'); }
-        }).catch(err=>{ console.error('互动失败', err); alert('互动失败'); });
+            if(res.status!==200){ alert(res.body.error || '互动失败'); return; }
+            const box = document.getElementById(`postInteractions_${postId}`);
+            if(box) box.innerHTML = renderReactionButtons(postId, res.body.data.reactions, res.body.data.my_reactions);
+        }).catch(err=>{ console.error('互动失败', err); alert('互动失败'); })
+        .finally(()=>{ if(btn) btn.disabled = false; });
 }
 
-function loadComments(postId){
-    fetch(`/api/posts/${postId}/comments`)
+// 评论分页加载：不带 cursor 时重新加载第一页，带 cursor 时追加下一页顶层评论
+function loadComments(postId, cursor){
+    const url = `/api/posts/${postId}/comments` + (cursor ? `?cursor=${encodeURIComponent(cursor)}` : '');
+    fetch(url)
         .then(r=>r.json())
         .then(res=>{
             const container = document.getElementById(`commentsContainer_${postId}`);
             if(!container) return;
-            if(!res.success || res.count===0){ container.innerHTML = '<div class="text-muted">暂无评论</div>'; return; }
-            function renderList(list, depth){
-                let html = '';
-                list.forEach(c=>{
-                    html += `<div class="mb-2" style="margin-left:${(depth||0)*18}px; padding:6px; border-left:1px solid #eee;">`;
-                    html += `<div class="small text-muted">用户:${escapeHtml(c.author_id)} · ${escapeHtml(c.created_at)}</div>`;
-                    html += `<div class="mt-1">${escapeHtml(c.content)}</div>`;
-                    html += `<div class="mt-1"><button class="btn btn-sm btn-link" onclick="promptReply(${postId}, ${c.id})">回复</button></div>`;
-                    if(c.children && c.children.length){ html += renderList(c.children, (depth||0)+1); }
-                    html += `</div>`;
-                });
-                return html;
+            const more = document.getElementById(`moreComments_${postId}`);
+            if(more) more.remove();
+            if(!cursor && (!res.success || res.count===0)){ container.innerHTML = '<div class="text-muted">暂无评论</div>'; return; }
+            if(!res.success){ container.insertAdjacentHTML('beforeend', `<div class="text-danger">${escapeHtml(res.error || '加载评论失败')}</div>`); return; }
+            if(!cursor) container.innerHTML = '';
+            container.insertAdjacentHTML('beforeend', renderCommentList(postId, res.data));
+            if(res.has_more){
+                container.insertAdjacentHTML('beforeend', `<button id="moreComments_${postId}" class="btn btn-sm btn-outline-secondary" onclick="loadComments(${postId}, '${res.next_cursor}')">加载更多评论</button>`);
             }
-            container.innerHTML = renderList(res.data, 0);
         }).catch(err=>{ console.error('加载评论失败', err); const container = document.getElementById(`commentsContainer_${postId}`); if(container) container.innerHTML = '<div class="text-danger">加载评论失败</div>'; });
 }
 
+function renderCommentList(postId, list){
+    let html = '';
+    list.forEach(c=>{
+        html += `<div class="mb-2" style="padding:6px; border-left:1px solid #eee; margin-left:${c.depth ? 18 : 0}px;">`;
+        html += `<div class="small text-muted">${c.is_pinned ? '<span class="badge bg-warning text-dark me-1">置顶</span>' : ''}${escapeHtml(c.author || c.author_id)} · ${escapeHtml(c.created_at)}</div>`;
+        html += `<div class="mt-1">${escapeHtml(c.content)}</div>`;
+        html += `<div class="mt-1"><button class="btn btn-sm btn-link" onclick="promptReply(${postId}, ${c.id})">回复</button>`;
+        // 子树没有随本次返回（顶层评论或超出展开层数）时，提供按需展开
+        if(c.reply_count && !(c.children && c.children.length)){
+            html += `<button class="btn btn-sm btn-link" id="showReplies_${c.id}" onclick="loadReplies(${postId}, ${c.id})">查看 ${c.reply_count} 条回复</button>`;
+        }
+        html += `</div><div id="replies_${c.id}">`;
+        if(c.children && c.children.length){ html += renderCommentList(postId, c.children); }
+        html += `</div></div>`;
+    });
+    return html;
+}
+
+// 展开某条评论的回复子树（分页）
+function loadReplies(postId, commentId, cursor){
+    const url = `/api/comments/${commentId}/replies` + (cursor ? `?cursor=${encodeURIComponent(cursor)}` : '');
+    fetch(url)
+        .then(r=>r.json())
+        .then(res=>{
+            const container = document.getElementById(`replies_${commentId}`);
+            if(!container || !res.success) return;
+            const button = document.getElementById(`showReplies_${commentId}`);
+            if(button) button.remove();
+            container.insertAdjacentHTML('beforeend', renderCommentList(postId, res.data));
+            if(res.has_more){
+                container.insertAdjacentHTML('beforeend', `<button class="btn btn-sm btn-link" id="showReplies_${commentId}" onclick="loadReplies(${postId}, ${commentId}, '${res.next_cursor}')">查看更多回复</button>`);
+            }
+        }).catch(err=>{ console.error('加载回复失败', err); });
+}
+
 function submitComment(postId, parentId){
     const ta = document.getElementById(`newComment_${postId}`);
     if(!ta) return;
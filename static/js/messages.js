@@ -3,7 +3,14 @@
 let currentUser = null;
 let currentChatUserId = null;
 let conversations = [];
+// 会话列表分页：下一页游标与已展开的页数（刷新时按同样页数重新加载）
+let conversationsCursor = null;
+let conversationPages = 1;
 let messagePollingInterval = null;
+let eventSource = null;
+// 当前聊天已加载消息的ID范围（用于增量拉取新消息 / 加载更早的消息）
+let firstMessageId = null;
+let lastMessageId = null;
 
 // 页面加载时初始化
 document.addEventListener('DOMContentLoaded', function() {
@@ -28,11 +35,11 @@ function checkLoginStatus() {
             return response.json();
         })
         .then(result => {
-            if (result.success) {
-                currentUser = result.data;
+            if (result && result.id) {
+                currentUser = result;
                 loadConversations();
-                // 开始轮询未读消息
-                startMessagePolling();
+                // 订阅实时事件（不支持 SSE 的浏览器退回轮询）
+                startEventStream();
             }
         })
         .catch(error => {
@@ -41,20 +48,41 @@ function checkLoginStatus() {
         });
 }
 
-// 加载会话列表
+// 加载会话列表（从第一页起重新加载已展开的页数）
 function loadConversations() {
-    fetch('/api/messages/conversations')
+    fetchConversations(null, conversationPages, [])
+        .catch(error => {
+            console.error('加载会话列表失败:', error);
+        });
+}
+
+// 加载下一页会话，追加到列表末尾
+function loadMoreConversations() {
+    conversationPages += 1;
+    fetchConversations(conversationsCursor, 1, conversations)
+        .catch(error => {
+            console.error('加载会话列表失败:', error);
+        });
+}
+
+// 从 cursor 起连续加载 pages 页会话，接在 loaded 之后渲染
+function fetchConversations(cursor, pages, loaded) {
+    return fetch('/api/messages/conversations' + (cursor ? `?cursor=${cursor}` : ''))
         .then(response => response.json())
         .then(result => {
-            if (result.success) {
-                conversations = result.data;
-                displayConversations(result.data);
-            } else {
+            if (!result.success) {
                 console.error('加载会话列表失败:', result.error);
+                return;
             }
-        })
-        .catch(error => {
-            console.error('加载会话列表失败:', error);
+            // 翻页期间会话可能因新消息移到前面，按对方ID去重
+            const seen = new Set(loaded.map(conv => conv.user_id));
+            loaded = loaded.concat(result.data.filter(conv => !seen.has(conv.user_id)));
+            if (result.has_more && pages > 1) {
+                return fetchConversations(result.next_cursor, pages - 1, loaded);
+            }
+            conversations = loaded;
+            conversationsCursor = result.has_more ? result.next_cursor : null;
+            displayConversations(conversations);
         });
 }
 
@@ -92,12 +120,18 @@ function displayConversations(conversationsList) {
                 </div>
             </div>
         </div>
-    `).join('');
+    `).join('') + (conversationsCursor ? `
+        <div class="text-center p-2">
+            <button class="btn btn-sm btn-outline-secondary" onclick="this.disabled = true; loadMoreConversations()">加载更早的会话</button>
+        </div>
+    ` : '');
 }
 
 // 打开聊天
 function openChat(userId) {
     currentChatUserId = userId;
+    firstMessageId = null;
+    lastMessageId = null;
     
     // 更新会话列表的active状态
     document.querySelectorAll('.conversation-item').forEach(item => {
@@ -118,13 +152,15 @@ function openChat(userId) {
     }
 }
 
-// 加载消息
+// 加载消息（最新一页）
 function loadMessages(userId) {
     fetch(`/api/messages/${userId}`)
         .then(response => response.json())
         .then(result => {
             if (result.success) {
-                displayMessages(result.data, result.target_user);
+                firstMessageId = result.first_id;
+                lastMessageId = result.last_id;
+                displayMessages(result.data, result.target_user, result.has_more);
                 // 滚动到底部
                 setTimeout(() => scrollToBottom(), 100);
             } else {
@@ -137,8 +173,82 @@ function loadMessages(userId) {
         });
 }
 
+// 只拉取上次之后的新消息并追加到末尾
+function loadNewMessages(userId) {
+    if (lastMessageId === null) {
+        loadMessages(userId);
+        return;
+    }
+    fetch(`/api/messages/${userId}?after_id=${lastMessageId}`)
+        .then(response => response.json())
+        .then(result => {
+            if (!result.success || userId !== currentChatUserId) {
+                return;
+            }
+            // 推送与发送回调可能同时触发拉取，跳过已经渲染过的消息
+            const fresh = result.data.filter(msg => msg.id > lastMessageId);
+            if (fresh.length === 0) {
+                return;
+            }
+            const chatMessages = document.getElementById('chatMessages');
+            chatMessages.querySelector('.empty-chat')?.remove();
+            chatMessages.insertAdjacentHTML('beforeend', fresh.map(renderMessage).join(''));
+            lastMessageId = result.last_id;
+            if (result.has_more) {
+                loadNewMessages(userId);
+            } else {
+                scrollToBottom();
+            }
+        })
+        .catch(error => console.error('拉取新消息失败:', error));
+}
+
+// 加载更早的消息并插入到顶部
+function loadEarlierMessages() {
+    if (!currentChatUserId || firstMessageId === null) {
+        return;
+    }
+    fetch(`/api/messages/${currentChatUserId}?before_id=${firstMessageId}`)
+        .then(response => response.json())
+        .then(result => {
+            if (!result.success) {
+                return;
+            }
+            const chatMessages = document.getElementById('chatMessages');
+            const previousHeight = chatMessages.scrollHeight;
+            document.getElementById('loadEarlier')?.remove();
+            chatMessages.insertAdjacentHTML('afterbegin',
+                (result.has_more ? renderLoadEarlier() : '') + result.data.map(renderMessage).join(''));
+            if (result.first_id !== null) {
+                firstMessageId = result.first_id;
+            }
+            // 保持当前阅读位置不跳动
+            chatMessages.scrollTop += chatMessages.scrollHeight - previousHeight;
+        })
+        .catch(error => console.error('加载更早的消息失败:', error));
+}
+
+function renderLoadEarlier() {
+    return `
+        <div class="text-center my-2" id="loadEarlier">
+            <button class="btn btn-sm btn-link" onclick="loadEarlierMessages()">加载更早的消息</button>
+        </div>
+    `;
+}
+
+function renderMessage(msg) {
+    return `
+        <div class="message-item ${msg.is_own ? 'own' : 'other'}">
+            <div class="message-bubble">
+                <div>${escapeHtml(msg.content)}</div>
+                <div class="message-time">${formatTime(msg.created_at)}</div>
+            </div>
+        </div>
+    `;
+}
+
 // 显示消息
-function displayMessages(messages, targetUser) {
+function displayMessages(messages, targetUser, hasMore) {
     const chatArea = document.getElementById('chatArea');
     
     if (!targetUser) {
@@ -169,14 +279,7 @@ function displayMessages(messages, targetUser) {
                     <i class="fas fa-comments"></i>
                     <p>还没有消息，开始聊天吧！</p>
                 </div>
-            ` : messages.map(msg => `
-                <div class="message-item ${msg.is_own ? 'own' : 'other'}">
-                    <div class="message-bubble">
-                        <div>${escapeHtml(msg.content)}</div>
-                        <div class="message-time">${formatTime(msg.created_at)}</div>
-                    </div>
-                </div>
-            `).join('')}
+            ` : (hasMore ? renderLoadEarlier() : '') + messages.map(renderMessage).join('')}
         </div>
         <div class="chat-input-area">
             <div class="input-group">
@@ -218,8 +321,8 @@ function sendMessage() {
     .then(result => {
         if (result.success) {
             input.value = '';
-            // 重新加载消息
-            loadMessages(currentChatUserId);
+            // 只拉取新消息
+            loadNewMessages(currentChatUserId);
             // 重新加载会话列表
             loadConversations();
         } else {
@@ -276,13 +379,43 @@ function escapeHtml(text) {
     return div.innerHTML;
 }
 
+// 订阅服务端推送：有新消息时刷新会话列表并增量拉取当前聊天
+function startEventStream() {
+    if (!window.EventSource) {
+        startMessagePolling();
+        return;
+    }
+    eventSource = new EventSource('/api/stream');
+    eventSource.addEventListener('message', event => {
+        const data = JSON.parse(event.data);
+        loadConversations();
+        if (currentChatUserId && (data.sender_id === currentChatUserId || data.receiver_id === currentChatUserId)) {
+            loadNewMessages(currentChatUserId);
+        }
+    });
+    // 连接断开期间可能漏掉事件，重连成功后补拉一次
+    eventSource.addEventListener('open', () => {
+        loadConversations();
+        if (currentChatUserId) {
+            loadNewMessages(currentChatUserId);
+        }
+    });
+}
+
+function stopEventStream() {
+    if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+    }
+}
+
 // 开始消息轮询
 function startMessagePolling() {
     // 每30秒轮询一次未读消息
     messagePollingInterval = setInterval(() => {
         loadConversations();
         if (currentChatUserId) {
-            loadMessages(currentChatUserId);
+            loadNewMessages(currentChatUserId);
         }
     }, 30000);
 }
@@ -297,6 +430,7 @@ function stopMessagePolling() {
 
 // 页面卸载时停止轮询
 window.addEventListener('beforeunload', stopMessagePolling);
+window.addEventListener('beforeunload', stopEventStream);
 
 // 显示错误消息
 function showError(message) {
@@ -0,0 +1,31 @@
+"""测试共用工具：登录测试客户端、记录请求期间发出的 SQL"""
+from app import app, db
+
+
+def login(user_id, username=None):
+    """返回以 user_id 登录的测试客户端（username 缺省与 user_id 相同）"""
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id; sess['username'] = username or user_id
+    return client
+
+
+def record_statements(action):
+    """执行 action，返回 ([(SQL, 参数, 是否 executemany)], action 的返回值)"""
+    statements = []
+    listener = lambda conn, cursor, statement, parameters, context, executemany: \
+        statements.append((statement, parameters, executemany))
+    with app.app_context():
+        db.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            result = action()
+        finally:
+            db.event.remove(db.engine, 'before_cursor_execute', listener)
+    return statements, result
+
+
+def count_statements(client, url):
+    """GET url，返回 (发出的 SQL 条数, 响应 JSON)"""
+    statements, r = record_statements(lambda: client.get(url))
+    assert r.status_code == 200
+    return len(statements), r.get_json()
@@ -0,0 +1,309 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import app as app_module
+from app import app, db
+from app import User, Activity, UserSuggestion, activity_participants, activity_favorites
+from app import ActivityAdmission, ActivitySignup, SignupAdmission, signup_admission
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    # 清理本文件创建的测试数据（在 app.app_context 下执行）
+    with app.app_context():
+        Activity.query.filter(Activity.title.like('分页测试%')).delete(synchronize_session=False)
+        User.query.filter(User.username.in_(['act_tester'])).delete(synchronize_session=False)
+        db.session.commit()
+    cleanup_crowd()
+    yield
+    cleanup_crowd()
+    with app.app_context():
+        for act in Activity.query.filter(db.or_(Activity.title.like('分页测试%'), Activity.title.like('推荐测试%'))).all():
+            act.participants = []
+            act.favorited_by = []
+            db.session.delete(act)
+        User.query.filter(User.username.in_(['act_tester'])).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def create_user(username, user_id):
+    with app.app_context():
+        u = User(id=user_id, username=username, password='x', email=f'{username}@example.com')
+        db.session.add(u)
+        db.session.commit()
+        return u
+
+
+def create_activities(n, initiator_id):
+    with app.app_context():
+        ids = []
+        for i in range(n):
+            act = Activity(title=f'分页测试{i}', type='学术', time='2026-01-01 10:00',
+                           location='图书馆', initiator_id=initiator_id)
+            db.session.add(act)
+            db.session.flush()
+            ids.append(act.id)
+        db.session.commit()
+        return ids
+
+
+def test_activities_keyset_pagination():
+    client = app.test_client()
+    create_user('act_tester', 'act00001')
+    ids = create_activities(5, 'act00001')
+
+    with client.session_transaction() as sess:
+        sess['user_id'] = 'act00001'; sess['username'] = 'act_tester'
+
+    # 报名并收藏最新的活动
+    assert client.post(f'/api/activities/{ids[-1]}/join').status_code == 200
+    assert client.post(f'/api/activities/{ids[-1]}/favorite').status_code == 200
+
+    seen = []
+    cursor = None
+    while True:
+        url = '/api/activities?limit=2&type=学术'
+        if cursor:
+            url += f'&cursor={cursor}'
+        data = client.get(url).get_json()
+        assert data['success'] and data['count'] == len(data['data']) <= 2
+        seen.extend(item for item in data['data'] if item['title'].startswith('分页测试'))
+        if not data['has_more']:
+            break
+        cursor = data['next_cursor']
+
+    assert [item['id'] for item in seen] == sorted(ids, reverse=True)
+    newest = seen[0]
+    assert newest['participant_count'] == 1 and newest['is_favorited'] is True
+    # 默认不返回参与者明细
+    assert 'participants' not in newest
+
+    data = client.get(f'/api/activities?limit=1&include_participants=1&cursor={ids[-1] + 1}').get_json()
+    assert data['data'][0]['participants'] == [{'id': 'act00001', 'name': 'act_tester'}]
+
+
+def test_recommend_ranks_by_hobbies_history_and_invalidates():
+    client = app.test_client()
+    with app.app_context():
+        db.session.add(User(id='act00001', username='act_tester', password='x', email='act_tester@example.com',
+                            hobbies='推荐篮球,推荐编程'))
+        db.session.commit()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 'act00001'; sess['username'] = 'act_tester'
+
+    def create(title, tags):
+        r = client.post('/api/activities', json={'title': title, 'type': '体育', 'time': '2026-05-01 10:00',
+                                                 'location': '体育馆', 'tags': tags})
+        return r.get_json()['data']['id']
+
+    both = create('推荐测试两项', '推荐篮球,推荐编程')
+    one = create('推荐测试一项', '推荐篮球')
+    create('推荐测试无关', '推荐围棋')
+
+    ranked = [a['id'] for a in client.get('/api/activities/recommend').get_json()['activities']]
+    assert ranked[:2] == [both, one]
+
+    # 新活动创建后缓存整体失效；报名后该活动不再推荐，同标签的活动因历史偏好排得更靠前
+    newer = create('推荐测试新', '推荐编程,推荐跑步')
+    assert newer in [a['id'] for a in client.get('/api/activities/recommend').get_json()['activities']]
+    assert client.post(f'/api/activities/{both}/join').status_code == 200
+    ranked = [a['id'] for a in client.get('/api/activities/recommend').get_json()['activities']]
+    assert both not in ranked and ranked[0] in (one, newer)
+
+    # 修改兴趣后按新兴趣推荐
+    assert client.put('/api/user/profile/detailed', json={'hobbies': '推荐围棋'}).status_code == 200
+    ranked = client.get('/api/activities/recommend').get_json()['activities']
+    assert ranked[0]['title'] == '推荐测试无关'
+
+
+CROWD = [f'actc{i:04d}' for i in range(40)]
+
+
+def cleanup_crowd():
+    with app.app_context():
+        signup_admission.flush()
+        ActivitySignup.query.filter(ActivitySignup.user_id.in_(CROWD)).delete(synchronize_session=False)
+        ActivityAdmission.query.filter(ActivityAdmission.activity_id.in_(
+            db.select(Activity.id).filter(Activity.title == '抢报名测试'))).delete(synchronize_session=False)
+        db.session.execute(activity_participants.delete().where(activity_participants.c.user_id.in_(CROWD)))
+        db.session.execute(activity_favorites.delete().where(activity_favorites.c.user_id.in_(CROWD)))
+        UserSuggestion.query.filter(db.or_(UserSuggestion.user_id.in_(CROWD), UserSuggestion.candidate_id.in_(CROWD))).delete(synchronize_session=False)
+        Activity.query.filter(Activity.title.in_(['并发报名测试', '抢报名测试'])).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(CROWD)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def test_concurrent_join_leave_favorite_keep_exact_counts():
+    with app.app_context():
+        for user_id in CROWD:
+            db.session.add(User(id=user_id, username=f'act_crowd_{user_id}', password='x', email=f'{user_id}@example.com'))
+        act = Activity(title='并发报名测试', type='体育', time='2026-06-01 10:00', location='操场', participants_limit=25)
+        db.session.add(act)
+        db.session.commit()
+        activity_id = act.id
+
+    def call(user_id, action):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id; sess['username'] = user_id
+        r = client.post(f'/api/activities/{activity_id}/{action}')
+        return r.status_code, r.get_json()
+
+    def state():
+        with app.app_context():
+            rows = db.session.query(db.func.count()).select_from(activity_participants).filter(
+                activity_participants.c.activity_id == activity_id).scalar()
+            return db.session.get(Activity, activity_id).participant_count, rows
+
+    # 40 人各点两次报名，上限 25：恰好 25 人报上，其余满员或重复报名被拒
+    with ThreadPoolExecutor(16) as pool:
+        results = list(pool.map(lambda args: call(*args), [(u, 'join') for u in CROWD * 2]))
+    statuses = [code for code, _ in results]
+    assert statuses.count(200) == 25 and set(statuses) == {200, 400, 409}
+    assert state() == (25, 25)
+
+    # 报上的人并发取消（各点两次），未报上的人同时抢空出的名额
+    with app.app_context():
+        seated = {row[0] for row in db.session.query(activity_participants.c.user_id).filter(
+            activity_participants.c.activity_id == activity_id)}
+    jobs = [(u, 'leave') for u in sorted(seated) * 2] + [(u, 'join') for u in CROWD if u not in seated]
+    with ThreadPoolExecutor(16) as pool:
+        results = list(pool.map(lambda args: call(*args), jobs))
+    left = sum(1 for (_, action), (code, _) in zip(jobs, results) if action == 'leave' and code == 200)
+    joined = sum(1 for (_, action), (code, _) in zip(jobs, results) if action == 'join' and code == 200)
+    assert left == 25 and joined <= 15
+    assert state() == (joined, joined)
+
+    # 同一用户并发点 21 次收藏：每次切换都是原子的，最终为已收藏
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: call(CROWD[0], 'favorite'), range(21)))
+    flags = [data['data']['is_favorited'] for _, data in results]
+    assert flags.count(True) - flags.count(False) == 1
+    with app.app_context():
+        assert db.session.query(db.func.count()).select_from(activity_favorites).filter(
+            activity_favorites.c.user_id == CROWD[0]).scalar() == 1
+
+
+def test_flash_signup_queue_admits_in_order_and_promotes_waitlist():
+    users = CROWD[:7]
+    with app.app_context():
+        for user_id in users:
+            db.session.add(User(id=user_id, username=f'act_crowd_{user_id}', password='x', email=f'{user_id}@example.com'))
+        db.session.commit()
+    clients = {}
+    for user_id in users:
+        clients[user_id] = app.test_client()
+        with clients[user_id].session_transaction() as sess:
+            sess['user_id'] = user_id; sess['username'] = user_id
+
+    # 发起人开启抢报名：3 个名额、最多 2 人候补
+    r = clients[users[0]].post('/api/activities', json={
+        'title': '抢报名测试', 'type': '体育', 'time': '2026-06-01 10:00', 'location': '操场',
+        'participants_limit': 3, 'admission_mode': 'queue', 'waitlist_limit': 2})
+    assert r.status_code == 201
+    activity_id = r.get_json()['data']['id']
+
+    def signup(user_id):
+        return clients[user_id].get(f'/api/activities/{activity_id}/signup').get_json()['data']
+
+    # 报名请求只排队：返回 202 与排队号
+    tickets = []
+    for user_id in users:
+        r = clients[user_id].post(f'/api/activities/{activity_id}/join')
+        assert r.status_code == 202 and r.get_json()['data']['status'] == 'queued'
+        tickets.append(r.get_json()['data']['ticket'])
+    assert tickets == list(range(1, 8))
+    signup_admission.flush()
+
+    # 按排队顺序：前 3 人放号，接着 2 人候补，其余候补也满
+    assert [signup(u)['status'] for u in users] == ['admitted'] * 3 + ['waitlisted'] * 2 + ['full'] * 2
+    assert [signup(u)['position'] for u in users[3:5]] == [1, 2]
+    with app.app_context():
+        assert db.session.get(Activity, activity_id).participant_count == 3
+
+    # 放号后再报名：已报上的保持原状态，候补也满时直接 409
+    signup_admission.enqueue(activity_id, users[6])
+    signup_admission.flush()
+    assert signup(users[6])['status'] == 'full'
+
+    # 有人取消报名，第一位候补自动递补；候补的人也可以退出候补
+    assert clients[users[1]].post(f'/api/activities/{activity_id}/leave').status_code == 200
+    assert signup(users[1])['status'] == 'none'
+    assert signup(users[3])['status'] == 'admitted' and signup(users[4]) == {
+        'activity_id': activity_id, 'status': 'waitlisted', 'ticket': None, 'position': 1}
+    r = clients[users[4]].post(f'/api/activities/{activity_id}/leave')
+    assert r.status_code == 200 and signup(users[4])['status'] == 'none'
+    # 候补有了空位，之前被拒的人再次报名可以排上候补
+    assert clients[users[6]].post(f'/api/activities/{activity_id}/join').status_code == 202
+    signup_admission.flush()
+    assert signup(users[6])['status'] == 'waitlisted' and signup(users[6])['position'] == 1
+    assert signup(users[5])['status'] == 'full'
+    with app.app_context():
+        seated = {row[0] for row in db.session.query(activity_participants.c.user_id).filter(
+            activity_participants.c.activity_id == activity_id)}
+        assert seated == {users[0], users[2], users[3]}
+        assert db.session.get(Activity, activity_id).participant_count == 3
+
+    # 关闭抢报名后恢复直接报名
+    assert clients[users[0]].put(f'/api/activities/{activity_id}/admission', json={'enabled': False}).status_code == 200
+    assert clients[users[5]].post(f'/api/activities/{activity_id}/join').status_code == 409
+
+
+def test_flash_signup_retries_failed_batches(monkeypatch):
+    users = CROWD[:2]
+    with app.app_context():
+        for user_id in users:
+            db.session.add(User(id=user_id, username=f'act_crowd_{user_id}', password='x', email=f'{user_id}@example.com'))
+        act = Activity(title='抢报名测试', type='体育', time='2026-06-01 10:00', location='操场', participants_limit=5)
+        db.session.add(act)
+        db.session.flush()
+        db.session.add(ActivityAdmission(activity_id=act.id))
+        db.session.commit()
+        activity_id = act.id
+    clients = {}
+    for user_id in users:
+        clients[user_id] = app.test_client()
+        with clients[user_id].session_transaction() as sess:
+            sess['user_id'] = user_id; sess['username'] = user_id
+
+    admit_signups, failures = app_module.admit_signups, []
+
+    def flaky(activity_id, user_ids, fail_times):
+        if len(failures) < fail_times:
+            failures.append(user_ids)
+            raise RuntimeError('database is locked')
+        return admit_signups(activity_id, user_ids)
+    monkeypatch.setattr(signup_admission, 'retry_delay', 0)
+
+    # 前两次写库失败：整批重试后照常放号
+    monkeypatch.setattr(app_module, 'admit_signups', lambda *args: flaky(*args, fail_times=2))
+    assert clients[users[0]].post(f'/api/activities/{activity_id}/join').status_code == 202
+    signup_admission.flush()
+    assert len(failures) == 2
+    assert clients[users[0]].get(f'/api/activities/{activity_id}/signup').get_json()['data']['status'] == 'admitted'
+
+    # 重试也失败：不留记录，状态为 none（前端提示重新报名），再次报名可以成功
+    failures.clear()
+    monkeypatch.setattr(app_module, 'admit_signups', lambda *args: flaky(*args, fail_times=signup_admission.retries + 1))
+    assert clients[users[1]].post(f'/api/activities/{activity_id}/join').status_code == 202
+    signup_admission.flush()
+    assert clients[users[1]].get(f'/api/activities/{activity_id}/signup').get_json()['data']['status'] == 'none'
+    assert clients[users[1]].post(f'/api/activities/{activity_id}/join').status_code == 202
+    signup_admission.flush()
+    assert clients[users[1]].get(f'/api/activities/{activity_id}/signup').get_json()['data']['status'] == 'admitted'
+
+
+def test_flash_signup_full_queue_answers_busy_without_jumping_the_line(monkeypatch):
+    # 不启动 worker，队列只放得下 1 个：后来的人拿不到排队号，也不会被当场放号
+    admission = SignupAdmission(queue_size=1, enqueue_timeout=0.05)
+    monkeypatch.setattr(admission, '_start', lambda: None)
+    assert admission.enqueue(1, 'first') == ('queued', 1, 0)
+    assert admission.enqueue(1, 'second') == ('busy', None, None)
+    assert admission.position(1, 'second') is None and admission.enqueue(1, 'first') == ('queued', 1, 0)
+
+    # 腾出位置后按到达顺序接着发号
+    assert admission._queue.get_nowait() == (1, 'first', 1)
+    assert admission.enqueue(1, 'second') == ('queued', 2, 1)
+    admission._closed = True
+    assert admission.enqueue(1, 'third') == ('busy', None, None)
+
@@ -0,0 +1,87 @@
+import pytest
+from app import app, db
+from app import User, Message, Conversation, Friendship, Notification, NotificationAggregate, UserBadge, UserSuggestion
+from app import notify_users, notification_fanout, reconcile_user_badges, count_user_badges
+from helpers import login
+
+USERS = {'bdg_alice': 'bdga0001', 'bdg_bob': 'bdgb0001'}
+IDS = list(USERS.values())
+
+
+def cleanup():
+    with app.app_context():
+        Message.query.filter(db.or_(Message.sender_id.in_(IDS), Message.receiver_id.in_(IDS))).delete(synchronize_session=False)
+        Conversation.query.filter(Conversation.user_id.in_(IDS)).delete(synchronize_session=False)
+        Friendship.query.filter(db.or_(Friendship.user1_id.in_(IDS), Friendship.user2_id.in_(IDS))).delete(synchronize_session=False)
+        UserSuggestion.query.filter(db.or_(UserSuggestion.user_id.in_(IDS), UserSuggestion.candidate_id.in_(IDS))).delete(synchronize_session=False)
+        NotificationAggregate.query.filter(NotificationAggregate.user_id.in_(IDS)).delete(synchronize_session=False)
+        Notification.query.filter(Notification.user_id.in_(IDS)).delete(synchronize_session=False)
+        UserBadge.query.filter(UserBadge.user_id.in_(IDS)).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(IDS)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        for username, user_id in USERS.items():
+            db.session.add(User(id=user_id, username=username, password='x', email=f'{username}@example.com'))
+        db.session.commit()
+    yield
+    notification_fanout.flush()
+    cleanup()
+
+
+def test_badges_follow_write_paths_and_revalidate_with_etag():
+    alice, bob = login(USERS['bdg_alice'], 'bdg_alice'), login(USERS['bdg_bob'], 'bdg_bob')
+
+    def badges():
+        r = alice.get('/api/me/badges')
+        assert r.status_code == 200
+        return r.get_json()['data'], r.headers['ETag']
+
+    assert badges()[0] == {'unread_messages': 0, 'unread_notifications': 0, 'friend_requests': 0}
+
+    bob.post('/api/messages', json={'receiver_id': 'bdga0001', 'content': '在吗'})
+    bob.post('/api/messages', json={'receiver_id': 'bdga0001', 'content': '周末打球'})
+    r = bob.post('/api/friends/request', json={'user_id': 'bdga0001'})
+    friendship_id = r.get_json()['data']['friendship_id']
+    with app.app_context():
+        notify_users(['bdga0001'], 'system', '系统通知', '欢迎')
+    notification_fanout.flush()
+
+    data, etag = badges()
+    assert data == {'unread_messages': 2, 'unread_notifications': 1, 'friend_requests': 1}
+
+    # 计数未变：304，且不访问数据库
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    with app.app_context():
+        db.event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            r = alice.get('/api/me/badges', headers={'If-None-Match': etag})
+        finally:
+            db.event.remove(db.engine, 'before_cursor_execute', listener)
+    assert r.status_code == 304 and r.headers['ETag'] == etag and statements == []
+
+    # 读消息、读通知、处理好友请求后计数归零，ETag 随之变化
+    alice.get('/api/messages/bdgb0001')
+    alice.post('/api/notifications/mark-all-read')
+    alice.post(f'/api/friends/request/{friendship_id}', json={'action': 'accept'})
+    data, new_etag = badges()
+    assert data == {'unread_messages': 0, 'unread_notifications': 0, 'friend_requests': 0} and new_etag != etag
+    assert alice.get('/api/me/badges', headers={'If-None-Match': etag}).status_code == 200
+
+    # 增量维护的结果与从原始表重算一致
+    bob.post('/api/messages', json={'receiver_id': 'bdga0001', 'content': '到了'})
+    with app.app_context():
+        before = {u.user_id: (u.unread_messages, u.unread_notifications, u.friend_requests)
+                  for u in UserBadge.query.filter(UserBadge.user_id.in_(IDS))}
+        assert before['bdga0001'] == (1, 0, 0)
+        reconcile_user_badges(IDS)
+        db.session.commit()
+        after = {u.user_id: (u.unread_messages, u.unread_notifications, u.friend_requests)
+                 for u in UserBadge.query.filter(UserBadge.user_id.in_(IDS))}
+        assert after['bdga0001'] == before['bdga0001'] and after['bdgb0001'] == (0, 0, 0)
+        assert count_user_badges(IDS) == {'bdga0001': {'unread_messages': 1, 'unread_notifications': 0, 'friend_requests': 0}}
@@ -0,0 +1,115 @@
+import pytest
+from app import app, db
+from app import User, Post, PostStats, ContentViewDaily, Comment, CommentPath, Notification, NotificationAggregate, UserBadge
+from app import notification_fanout, view_counter, create_post_stats, rebuild_comment_paths
+from helpers import count_statements, login
+
+AUTHOR, READER = 'cmt00001', 'cmt00002'
+IDS = [AUTHOR, READER]
+
+
+def cleanup():
+    view_counter.flush()
+    with app.app_context():
+        post_ids = [p.id for p in Post.query.filter(Post.author_id.in_(IDS))]
+        ContentViewDaily.query.filter(ContentViewDaily.target_type == 'post',
+                                      ContentViewDaily.target_id.in_(post_ids)).delete(synchronize_session=False)
+        CommentPath.query.filter(CommentPath.post_id.in_(post_ids)).delete(synchronize_session=False)
+        Comment.query.filter(Comment.post_id.in_(post_ids)).delete(synchronize_session=False)
+        PostStats.query.filter(PostStats.post_id.in_(post_ids)).delete(synchronize_session=False)
+        Post.query.filter(Post.id.in_(post_ids)).delete(synchronize_session=False)
+        NotificationAggregate.query.filter(NotificationAggregate.user_id.in_(IDS)).delete(synchronize_session=False)
+        Notification.query.filter(Notification.user_id.in_(IDS)).delete(synchronize_session=False)
+        UserBadge.query.filter(UserBadge.user_id.in_(IDS)).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(IDS)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        db.session.add(User(id=AUTHOR, username='cmt_author', password='x', email='cmt_a@example.com'))
+        db.session.add(User(id=READER, username='cmt_reader', password='x', email='cmt_r@example.com'))
+        db.session.commit()
+    yield
+    notification_fanout.flush()
+    cleanup()
+
+
+def test_comment_tree_pages_roots_and_lazy_subtrees():
+    with app.app_context():
+        post = Post(title='评论树测试', category='校园资讯', content='正文', author_id=AUTHOR, review_status='approved')
+        db.session.add(post)
+        db.session.flush()
+        create_post_stats(post)
+        db.session.commit()
+        post_id = post.id
+    author, reader = login(AUTHOR), login(READER)
+
+    def comment(content, parent_id=None, client=reader):
+        r = client.post(f'/api/posts/{post_id}/comments', json={'content': content, 'parent_id': parent_id})
+        assert r.status_code == 201, r.get_json()
+        return r.get_json()['data']['id']
+
+    roots = [comment(f'顶层{i}') for i in range(25)]
+    # roots[0] 下：a -> b -> c -> d 一条长链，另有一条直接回复 e
+    a = comment('a', roots[0]); b = comment('b', a); c = comment('c', b); d = comment('d', c)
+    e = comment('e', roots[0])
+    assert author.post(f'/api/comments/{roots[7]}/pin').get_json()['data']['is_pinned'] is True
+    assert reader.post(f'/api/comments/{roots[8]}/pin').status_code == 403
+    assert author.post(f'/api/comments/{a}/pin').status_code == 400
+
+    # 顶层评论分页：置顶在前，其余按发表先后；每页语句数固定，回复不随页返回
+    page_statements, first = count_statements(reader, f'/api/posts/{post_id}/comments?limit=10')
+    assert first['total'] == 30 and first['count'] == 10 and first['has_more']
+    assert [c['id'] for c in first['data'][:2]] == [roots[7], roots[0]]
+    assert first['data'][1]['reply_count'] == 5 and first['data'][1]['children'] == []
+    assert first['data'][1]['author'] == 'cmt_reader'
+    seen, cursor = [], None
+    while True:
+        n, page = count_statements(reader, f'/api/posts/{post_id}/comments?limit=10' + (f'&cursor={cursor}' if cursor else ''))
+        assert n == page_statements
+        seen.extend(c['id'] for c in page['data'])
+        if not page['has_more']:
+            break
+        cursor = page['next_cursor']
+    assert seen == [roots[7]] + [r for r in roots if r != roots[7]]
+
+    # 展开回复：默认 3 层，更深的只给出回复数，由客户端继续展开
+    _, replies = count_statements(reader, f'/api/comments/{roots[0]}/replies?depth=2')
+    assert replies['total'] == 5
+    assert [(r['id'], [c['id'] for c in r['children']]) for r in replies['data']] == [(a, [b]), (e, [])]
+    assert replies['data'][0]['children'][0]['reply_count'] == 2 and replies['data'][0]['children'][0]['children'] == []
+    deeper = reader.get(f'/api/comments/{b}/replies').get_json()['data']
+    assert [(r['id'], [x['id'] for x in r['children']]) for r in deeper] == [(c, [d])]
+    # 子树分页：按对话顺序接着上一页取，续页中父评论不在本页的作为根
+    ids, cursor = [], None
+    while True:
+        page = reader.get(f'/api/comments/{roots[0]}/replies?depth=10&limit=2' + (f'&cursor={cursor}' if cursor else '')).get_json()
+        ids.append([r['id'] for r in page['data']])
+        if not page['has_more']:
+            break
+        cursor = page['next_cursor']
+    assert ids == [[a], [c], [e]]
+
+    # 回复层级上限
+    app.config['COMMENT_MAX_DEPTH'], max_depth = 4, app.config['COMMENT_MAX_DEPTH']
+    try:
+        assert reader.post(f'/api/posts/{post_id}/comments', json={'content': 'f', 'parent_id': d}).status_code == 400
+    finally:
+        app.config['COMMENT_MAX_DEPTH'] = max_depth
+
+    # 详情页只渲染第一页顶层评论
+    html = reader.get(f'/post/{post_id}').get_data(as_text=True)
+    assert '查看 5 条回复' in html and '加载更多评论' in html and '顶层19' in html and '顶层20' not in html
+
+    # 按 parent_id 重建与增量维护的结果一致
+    with app.app_context():
+        def snapshot():
+            return sorted(db.session.query(CommentPath.comment_id, CommentPath.path, CommentPath.depth,
+                                           CommentPath.pin_rank, CommentPath.reply_count).filter(
+                CommentPath.post_id == post_id).all())
+        before = snapshot()
+        rebuild_comment_paths()
+        assert snapshot() == before
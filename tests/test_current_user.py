@@ -0,0 +1,77 @@
+import re
+
+import pytest
+from app import app, db
+from app import User, Post, PostStats, ContentViewDaily, Comment, CommentPath, Notification, NotificationAggregate, UserBadge
+from app import notification_fanout, view_counter, user_cache, get_user_snapshot
+from helpers import login, record_statements
+
+TEACHER, STUDENT = 'idt00001', 'idt00002'
+IDS = [TEACHER, STUDENT]
+USER_SELECT = re.compile(r'\bFROM "?user"?(\s|$)')
+
+
+def cleanup():
+    view_counter.flush()
+    with app.app_context():
+        post_ids = [p.id for p in Post.query.filter(Post.author_id.in_(IDS))]
+        ContentViewDaily.query.filter(ContentViewDaily.target_type == 'post',
+                                      ContentViewDaily.target_id.in_(post_ids)).delete(synchronize_session=False)
+        CommentPath.query.filter(CommentPath.post_id.in_(post_ids)).delete(synchronize_session=False)
+        Comment.query.filter(Comment.post_id.in_(post_ids)).delete(synchronize_session=False)
+        PostStats.query.filter(PostStats.post_id.in_(post_ids)).delete(synchronize_session=False)
+        Post.query.filter(Post.id.in_(post_ids)).delete(synchronize_session=False)
+        NotificationAggregate.query.filter(NotificationAggregate.user_id.in_(IDS)).delete(synchronize_session=False)
+        Notification.query.filter(Notification.user_id.in_(IDS)).delete(synchronize_session=False)
+        UserBadge.query.filter(UserBadge.user_id.in_(IDS)).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(IDS)).delete(synchronize_session=False)
+        db.session.commit()
+    user_cache.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        db.session.add(User(id=TEACHER, username='idt_teacher', password='x', email='idt_t@example.com', role='teacher'))
+        db.session.add(User(id=STUDENT, username='idt_student', password='x', email='idt_s@example.com', real_name='学生甲'))
+        db.session.commit()
+    yield
+    notification_fanout.flush()
+    cleanup()
+
+
+def user_selects(send):
+    statements, r = record_statements(send)
+    assert r.status_code < 400, r.status_code
+    return sum(1 for sql, _, _ in statements if USER_SELECT.search(sql))
+
+
+def test_user_lookups_once_per_request_and_snapshot_invalidation():
+    with app.app_context():
+        post = Post(title='待审核帖子', category='校园资讯', content='正文', author_id=STUDENT)
+        db.session.add(post)
+        db.session.commit()
+        post_id = post.id
+
+    teacher, student = login(TEACHER, 'idt_teacher'), login(STUDENT, 'idt_student')
+
+    # 详情页：教师身份与作者信息各查一次，之后命中进程内快照
+    assert user_selects(lambda: teacher.get(f'/post/{post_id}')) <= 2
+    assert user_selects(lambda: teacher.get(f'/post/{post_id}')) == 0
+    assert user_selects(lambda: teacher.get(f'/api/posts/{post_id}')) == 0
+    # 评论时的权限判断和通知作者都复用快照
+    assert user_selects(lambda: teacher.post(f'/api/posts/{post_id}/comments', json={'content': '请补充说明'})) == 0
+    # 需要完整用户对象的接口，一个请求内最多查一次
+    assert user_selects(lambda: student.get('/api/user/profile/detailed')) <= 1
+
+    # 修改资料、密码后快照失效，下次读取到新值
+    with app.app_context():
+        assert get_user_snapshot(STUDENT).real_name == '学生甲'
+    assert student.put('/api/user/profile/detailed', json={'real_name': '学生乙'}).status_code == 200
+    with app.app_context():
+        assert get_user_snapshot(STUDENT).real_name == '学生乙'
+        db.session.get(User, STUDENT).avatar = '/static/uploads/avatars/x.png'
+        db.session.commit()
+        # 绕过接口直接改库不会触发失效，仍读到缓存（最多 USER_CACHE_TTL 秒）
+        assert get_user_snapshot(STUDENT).avatar == '/static/images/default.jpg'
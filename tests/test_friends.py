@@ -0,0 +1,194 @@
+import threading
+
+import pytest
+from app import app, db
+from app import User, Friendship, UserBadge, UserSuggestion
+from app import SocialGraph, social_graph
+from app import user_search, index_user_search, search_user_rows
+from helpers import count_statements, login
+
+ME = 'frd00000'
+PREFIX = 'frdtest'
+
+
+def cleanup():
+    with app.app_context():
+        ids = [u.id for u in User.query.filter(User.username.like(f'{PREFIX}%')).all()]
+        Friendship.query.filter(db.or_(Friendship.user1_id.in_(ids), Friendship.user2_id.in_(ids))).delete(synchronize_session=False)
+        UserSuggestion.query.filter(db.or_(UserSuggestion.user_id.in_(ids), UserSuggestion.candidate_id.in_(ids))).delete(synchronize_session=False)
+        UserBadge.query.filter(UserBadge.user_id.in_(ids)).delete(synchronize_session=False)
+        if app.config['USER_SEARCH_FTS']:
+            db.session.execute(user_search.delete().where(user_search.c.user_id.in_(ids)))
+        User.query.filter(User.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        db.session.add(User(id=ME, username=f'{PREFIX}_me', password='x', email='frd_me@example.com'))
+        db.session.commit()
+    yield
+    cleanup()
+
+
+def add_people(start, n, status):
+    """创建 n 个用户，与 ME 建立 status 状态的关系（pending 时由对方发起）"""
+    with app.app_context():
+        for i in range(start, start + n):
+            user_id = f'frd{i:05d}'
+            user = User(id=user_id, username=f'{PREFIX}_{i}', password='x', email=f'frd{i}@example.com', bio=f'简介{i}')
+            db.session.add(user)
+            db.session.add(Friendship(user1_id=min(ME, user_id), user2_id=max(ME, user_id), status=status,
+                                      requester_id=user_id))
+            db.session.flush()
+            index_user_search(user)
+        db.session.commit()
+
+
+def test_friend_lists_use_constant_queries_and_paginate():
+    client = login(ME, f'{PREFIX}_me')
+
+    urls = ('/api/friends?limit=200', '/api/friends/requests?limit=200', f'/api/users/search?keyword={PREFIX}_')
+    add_people(1, 3, 'accepted')
+    add_people(101, 2, 'pending')
+    # 好友关系图在首次使用时加载一次，这里先加载好，之后的请求不再查 Friendship
+    with app.app_context():
+        social_graph.load()
+    small = [count_statements(client, url) for url in urls]
+    add_people(4, 60, 'accepted')
+    add_people(103, 30, 'pending')
+    large = [count_statements(client, url) for url in urls]
+
+    # 语句数与好友数量无关
+    assert [n for n, _ in small] == [n for n, _ in large]
+    assert [data['count'] for _, data in large] == [63, 32, 20]
+    # 搜索结果带出与当前用户的关系状态（这里搜到的都是好友或发来请求的人）
+    assert {u['friendship_status'] for u in large[2][1]['data']} <= {'accepted', 'pending'}
+
+    # 游标分页：按关系建立的先后倒序，逐页取完且不重复
+    seen, cursor = [], None
+    while True:
+        data = client.get('/api/friends?limit=25' + (f'&cursor={cursor}' if cursor else '')).get_json()
+        seen.extend(f['user_id'] for f in data['data'])
+        if not data['has_more']:
+            break
+        cursor = data['next_cursor']
+    assert len(seen) == len(set(seen)) == 63
+    assert seen[0] == 'frd00063' and seen[-1] == 'frd00001'
+    first = client.get('/api/friends?limit=1').get_json()['data'][0]
+    assert first == {'user_id': 'frd00063', 'username': f'{PREFIX}_63', 'avatar': first['avatar'],
+                     'bio': '简介63', 'mutual_friends': 0, 'created_at': first['created_at']}
+
+
+def test_social_graph_counts_and_follows_friend_changes():
+    # a - b, a - c, b - c, c - d, b - d：a 与 d 有共同好友 b、c
+    edges = [('sg_a', 'sg_b'), ('sg_a', 'sg_c'), ('sg_b', 'sg_c'), ('sg_c', 'sg_d'), ('sg_b', 'sg_d')]
+    graph = SocialGraph(reload_seconds=0)
+    graph.build([edges[:3]])
+    for a, b in edges[3:]:
+        graph.add_friendship(a, b)
+    assert graph.mutual_count('sg_a', 'sg_d') == 2 and graph.mutual_count('sg_a', 'sg_x') == 0
+    assert graph.mutual_counts('sg_a', ['sg_b', 'sg_d', 'sg_x']) == {'sg_b': 1, 'sg_d': 2, 'sg_x': 0}
+    assert graph.friends_of_friends('sg_a') == [('sg_d', 2)]
+    graph.remove_friendship('sg_b', 'sg_d')
+    assert graph.friends_of_friends('sg_a') == [('sg_d', 1)] and sorted(graph.friend_ids('sg_d')) == ['sg_c']
+
+    # 通过接口接受/删除好友后，进程内的图同步更新
+    add_people(1, 2, 'accepted')
+    add_people(3, 1, 'pending')
+    with app.app_context():
+        db.session.add(Friendship(user1_id='frd00001', user2_id='frd00003', status='accepted', requester_id='frd00001'))
+        db.session.commit()
+        social_graph.load()
+    client = login(ME, f'{PREFIX}_me')
+    with app.app_context():
+        friendship_id = Friendship.query.filter_by(user1_id=ME, user2_id='frd00003').one().id
+    assert client.post(f'/api/friends/request/{friendship_id}', json={'action': 'accept'}).status_code == 200
+    friends = {f['user_id']: f['mutual_friends'] for f in client.get('/api/friends').get_json()['data']}
+    assert friends == {'frd00001': 1, 'frd00002': 0, 'frd00003': 1}
+    assert client.delete('/api/friends/frd00003').status_code == 200
+    assert social_graph.mutual_count(ME, 'frd00003') == 1 and 'frd00003' not in social_graph.friend_ids(ME)
+    # 没有预计算推荐时按二度好友即时给出候选
+    data = client.get('/api/users/suggestions').get_json()['data']
+    assert [(u['id'], u['reasons']['mutual_friends']) for u in data] == [('frd00003', 1)]
+
+
+def test_social_graph_loads_in_background_and_falls_back_to_sql():
+    # 我 - 1、我 - 2、1 - 3、2 - 3：我与 3 有两位共同好友
+    add_people(1, 2, 'accepted')
+    with app.app_context():
+        db.session.add(User(id='frd00003', username=f'{PREFIX}_3', password='x', email='frd3@example.com'))
+        for friend in ('frd00001', 'frd00002'):
+            db.session.add(Friendship(user1_id=friend, user2_id='frd00003', status='accepted', requester_id=friend))
+        db.session.commit()
+
+    release = threading.Event()
+    graph = SocialGraph()
+    load = graph.load
+    graph.load = lambda: release.wait(5) and load()
+    with app.app_context():
+        # 加载还没完成：不阻塞，按 SQL 统计共同好友，二度好友暂不给出
+        assert graph.mutual_counts(ME, ['frd00003', 'frd00001']) == {'frd00003': 2, 'frd00001': 0}
+        assert graph.mutual_count(ME, 'frd00003') == 2 and graph.friends_of_friends(ME) == []
+        assert not graph.loaded and graph._loader.is_alive()
+    release.set()
+    graph._loader.join(5)
+    assert graph.loaded and graph.friends_of_friends(ME) == [('frd00003', 2)]
+
+
+@pytest.mark.parametrize('use_index', [True, False])
+def test_user_search_ranks_exact_prefix_substring(use_index):
+    people = [('frd00201', 'frdtest_c', '测试甲', '99frd', 'frdc@example.com'),
+              ('frd00202', 'frdtest_b', '', '99frd01', 'frdb@example.com'),
+              ('frd00203', 'frdtest_a', '', '', 'x99frd@example.com'),
+              ('frd00204', 'frdtest_d', '', '', 'frdd@99frd.com')]
+    with app.app_context():
+        for user_id, username, real_name, student_id, email in people:
+            user = User(id=user_id, username=username, password='x', email=email, real_name=real_name, student_id=student_id)
+            db.session.add(user)
+            db.session.flush()
+            index_user_search(user)
+        db.session.add(Friendship(user1_id='frd00000', user2_id='frd00202', status='pending', requester_id=ME))
+        db.session.commit()
+    enabled = app.config['USER_SEARCH_FTS']
+    app.config['USER_SEARCH_FTS'] = enabled and use_index
+    try:
+        client = login(ME, f'{PREFIX}_me')
+
+        def search(keyword):
+            return [(u['user_id'], u['friendship_status'])
+                    for u in client.get('/api/users/search', query_string={'keyword': keyword}).get_json()['data']]
+
+        # 学号完全匹配 > 学号前缀 > 邮箱子串；好友状态随结果一并返回
+        assert search('99FRD')[:3] == [('frd00201', None), ('frd00202', 'pending'), ('frd00203', None)]
+        # 姓名按前缀和结尾都能命中
+        assert search('测试')[0][0] == 'frd00201' and search('甲')[0][0] == 'frd00201'
+        assert search('"') == []
+
+        # 注册和修改资料后立即可搜
+        r = client.post('/api/register', json={'username': 'frdtest_new', 'password': 'pw123456',
+                                               'email': 'frdnew@example.com', 'real_name': '搜索新人'})
+        assert r.status_code == 201
+        assert [u for u, _ in search('搜索新人')] != []
+        other = login('frd00204', 'frdtest_d')
+        assert search('测试乙') == []
+        assert other.put('/api/user/profile/detailed', json={'real_name': '测试乙'}).status_code == 200
+        assert search('测试乙') == [('frd00204', None)]
+    finally:
+        app.config['USER_SEARCH_FTS'] = enabled
+
+
+def test_user_search_keeps_shortest_names_when_a_tier_is_truncated():
+    # 编号越小用户名越长：按 rowid 截断会留下最长的几个
+    names = {f'frd{300 + i:05d}': f'{PREFIX}_q' + 'x' * (30 - i) for i in range(30)}
+    with app.app_context():
+        for user_id, username in names.items():
+            user = User(id=user_id, username=username, password='x', email=f'{user_id}@example.com')
+            db.session.add(user)
+            db.session.flush()
+            index_user_search(user)
+        db.session.commit()
+        rows = search_user_rows(f'{PREFIX}_q', ME, 3)
+    assert [row[1] for row in rows] == sorted(names.values(), key=len)[:3]
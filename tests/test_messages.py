@@ -0,0 +1,85 @@
+import pytest
+from app import app, db
+from app import User, Message, Conversation
+from app import rebuild_conversations
+from helpers import login
+
+USERS = {'msg_alice': 'msga0001', 'msg_bob': 'msgb0001'}
+
+
+def cleanup():
+    with app.app_context():
+        ids = list(USERS.values())
+        Message.query.filter(db.or_(Message.sender_id.in_(ids), Message.receiver_id.in_(ids))).delete(synchronize_session=False)
+        Conversation.query.filter(db.or_(Conversation.user_id.in_(ids), Conversation.peer_id.in_(ids))).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        for username, user_id in USERS.items():
+            db.session.add(User(id=user_id, username=username, password='x', email=f'{username}@example.com'))
+        db.session.commit()
+    yield
+    cleanup()
+
+
+def conversation_rows(user_id):
+    return sorted((c.user_id, c.peer_id, c.last_message_id, c.last_message, c.last_sender_id, c.unread_count)
+                  for c in Conversation.query.filter_by(user_id=user_id).all())
+
+
+def test_conversation_index_follows_send_and_read():
+    alice, bob = login(USERS['msg_alice'], 'msg_alice'), login(USERS['msg_bob'], 'msg_bob')
+
+    for text in ('你好', '在吗', '明天一起去图书馆？'):
+        assert alice.post('/api/messages', json={'receiver_id': 'msgb0001', 'content': text}).status_code == 201
+    assert bob.post('/api/messages', json={'receiver_id': 'msga0001', 'content': '好的'}).status_code == 201
+
+    conv = alice.get('/api/messages/conversations').get_json()['data']
+    mine = [c for c in conv if c['user_id'] == 'msgb0001'][0]
+    assert mine['last_message'] == '好的' and mine['unread_count'] == 1 and not mine['is_own_last_message']
+
+    conv = bob.get('/api/messages/conversations').get_json()['data']
+    theirs = [c for c in conv if c['user_id'] == 'msga0001'][0]
+    assert theirs['unread_count'] == 3 and theirs['is_own_last_message']
+
+    # 打开聊天后未读清零
+    bob.get('/api/messages/msga0001')
+    conv = bob.get('/api/messages/conversations').get_json()['data']
+    assert [c for c in conv if c['user_id'] == 'msga0001'][0]['unread_count'] == 0
+
+    # 从消息表重建的结果与增量维护一致
+    with app.app_context():
+        before = conversation_rows('msga0001') + conversation_rows('msgb0001')
+        rebuild_conversations()
+        assert conversation_rows('msga0001') + conversation_rows('msgb0001') == before
+
+
+def test_message_history_cursors_and_bulk_read():
+    alice, bob = login(USERS['msg_alice'], 'msg_alice'), login(USERS['msg_bob'], 'msg_bob')
+
+    ids = []
+    for i in range(7):
+        r = alice.post('/api/messages', json={'receiver_id': 'msgb0001', 'content': f'消息{i}'})
+        ids.append(r.get_json()['data']['message_id'])
+
+    # 最新一页按时间正序返回，并且只标记本页及之前的消息为已读
+    page = bob.get('/api/messages/msga0001?limit=3').get_json()
+    assert [m['id'] for m in page['data']] == ids[-3:]
+    assert page['has_more'] and all(m['is_read'] for m in page['data'])
+    with app.app_context():
+        assert Message.query.filter_by(receiver_id='msgb0001', is_read=False).count() == 0
+        assert Conversation.query.filter_by(user_id='msgb0001', peer_id='msga0001').one().unread_count == 0
+
+    older = bob.get(f'/api/messages/msga0001?limit=3&before_id={page["first_id"]}').get_json()
+    assert [m['id'] for m in older['data']] == ids[1:4] and older['has_more']
+
+    # 增量拉取：只返回 after_id 之后的新消息
+    assert bob.get(f'/api/messages/msga0001?after_id={page["last_id"]}').get_json()['count'] == 0
+    new_id = alice.post('/api/messages', json={'receiver_id': 'msgb0001', 'content': '新消息'}).get_json()['data']['message_id']
+    newer = bob.get(f'/api/messages/msga0001?after_id={page["last_id"]}').get_json()
+    assert [m['id'] for m in newer['data']] == [new_id] and not newer['has_more']
@@ -0,0 +1,153 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+from app import app, db
+from app import User, Group, Notification, NotificationAggregate, group_members
+from app import Post, PostStats, Reaction, PostReaction, PostReactionDelta, Comment, CommentPath
+from app import NotificationFanout, notification_fanout, compact_notifications
+from helpers import login
+
+USERS = {'ntf_teacher': 'ntft0001', 'ntf_a': 'ntfa0001', 'ntf_b': 'ntfb0001', 'ntf_c': 'ntfc0001'}
+IDS = list(USERS.values())
+
+
+def cleanup():
+    with app.app_context():
+        post_ids = [p.id for p in Post.query.filter_by(author_id='ntft0001').all()]
+        if post_ids:
+            Reaction.query.filter(Reaction.post_id.in_(post_ids)).delete(synchronize_session=False)
+            PostReaction.query.filter(PostReaction.post_id.in_(post_ids)).delete(synchronize_session=False)
+            PostReactionDelta.query.filter(PostReactionDelta.post_id.in_(post_ids)).delete(synchronize_session=False)
+            CommentPath.query.filter(CommentPath.post_id.in_(post_ids)).delete(synchronize_session=False)
+            Comment.query.filter(Comment.post_id.in_(post_ids)).delete(synchronize_session=False)
+            PostStats.query.filter(PostStats.post_id.in_(post_ids)).delete(synchronize_session=False)
+            Post.query.filter(Post.id.in_(post_ids)).delete(synchronize_session=False)
+        NotificationAggregate.query.filter(NotificationAggregate.user_id.in_(IDS)).delete(synchronize_session=False)
+        Notification.query.filter(Notification.user_id.in_(IDS)).delete(synchronize_session=False)
+        db.session.execute(group_members.delete().where(group_members.c.user_id.in_(IDS)))
+        Group.query.filter(Group.name == '通知测试小组').delete(synchronize_session=False)
+        User.query.filter(User.id.in_(IDS)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        for username, user_id in USERS.items():
+            db.session.add(User(id=user_id, username=username, password='x', email=f'{username}@example.com',
+                                role='teacher' if username == 'ntf_teacher' else 'student'))
+        group = Group(name='通知测试小组', creator_id='ntft0001')
+        db.session.add(group)
+        db.session.flush()
+        db.session.execute(group_members.insert(), [{'user_id': u, 'group_id': group.id} for u in IDS])
+        db.session.commit()
+    yield
+    notification_fanout.flush()
+    cleanup()
+
+
+def test_group_announcement_is_fanned_out_in_background():
+    client = login('ntft0001', 'ntf_teacher')
+    with app.app_context():
+        group_id = Group.query.filter_by(name='通知测试小组').one().id
+
+    r = client.post(f'/api/groups/{group_id}/announce', json={'content': '周五停课'})
+    assert r.status_code == 202
+    notification_fanout.flush()
+
+    with app.app_context():
+        rows = Notification.query.filter(Notification.user_id.in_(IDS)).all()
+        # 发布者自己不会收到
+        assert sorted(n.user_id for n in rows) == sorted(IDS[1:])
+        assert {n.type for n in rows} == {'announcement'} and rows[0].content == '周五停课'
+
+
+def test_shutdown_flushes_queue_under_backpressure():
+    # 单 worker + 容量为 1 的队列：放不进去的任务由调用方线程直接处理，关闭时处理完剩余任务
+    fanout = NotificationFanout(workers=1, queue_size=1, chunk_size=2, enqueue_timeout=0.01)
+    for i in range(5):
+        fanout.enqueue(('users', IDS[1:]), 'system', f'批量{i}', '内容')
+    fanout.shutdown()
+    assert fanout.pending() == 0
+
+    with app.app_context():
+        assert Notification.query.filter(Notification.user_id.in_(IDS), Notification.title.like('批量%')).count() == 15
+    # 关闭后再提交的任务同步执行
+    fanout.enqueue(('users', ['ntfa0001']), 'system', '关闭后', '内容')
+    with app.app_context():
+        assert Notification.query.filter_by(user_id='ntfa0001', title='关闭后').count() == 1
+
+
+def test_failed_commit_is_retried_and_remaining_chunks_still_delivered(monkeypatch):
+    # 关闭后同步执行，便于在当前线程注入一次提交失败；每批 1 人，失败落在第二批
+    fanout = NotificationFanout(chunk_size=1, retry_delay=0)
+    fanout.shutdown()
+    with app.app_context():
+        group_id = Group.query.filter_by(name='通知测试小组').one().id
+        session_cls = type(db.session())
+    commit = session_cls.commit
+    calls = []
+
+    def flaky_commit(session):
+        calls.append(1)
+        if len(calls) == 2:
+            raise OperationalError('COMMIT', {}, Exception('database is locked'))
+        commit(session)
+
+    monkeypatch.setattr(session_cls, 'commit', flaky_commit)
+    fanout.enqueue(('group', group_id), 'announcement', '重试', '内容')
+    monkeypatch.undo()
+
+    assert len(calls) == len(IDS) + 1
+    with app.app_context():
+        rows = Notification.query.filter(Notification.user_id.in_(IDS), Notification.title == '重试').all()
+        assert sorted(n.user_id for n in rows) == sorted(IDS)
+
+
+def test_reactions_coalesce_into_one_notification_and_compact():
+    with app.app_context():
+        post = Post(title='合并测试', category='兴趣社群', content='内容', author_id='ntft0001', review_status='approved')
+        db.session.add(post)
+        db.session.commit()
+        post_id = post.id
+
+    author = login(USERS['ntf_teacher'], 'ntf_teacher')
+    # ntf_a 取消后再次点赞；取消和重复提交都不产生通知
+    for username, active in (('ntf_a', True), ('ntf_b', True), ('ntf_c', True), ('ntf_c', True), ('ntf_a', False), ('ntf_a', True)):
+        client = login(USERS[username], username)
+        assert client.post(f'/api/posts/{post_id}/react', json={'type': 'like', 'active': active}).status_code == 200
+    notification_fanout.flush()
+
+    # 四次点赞（三个人）只产生一条通知，最新的触发者排在最前
+    data = author.get('/api/notifications').get_json()['data']
+    assert len(data) == 1
+    assert data[0]['actor_count'] == 3 and [a['name'] for a in data[0]['actors']] == ['ntf_a', 'ntf_c', 'ntf_b']
+    assert data[0]['content'] == 'ntf_a、ntf_c 等 3 人 赞了你的帖子《合并测试》'
+
+    # 已读之后的新互动另起一条
+    assert author.post('/api/notifications/mark-all-read').status_code == 200
+    client = login(USERS['ntf_b'], 'ntf_b')
+    client.post(f'/api/posts/{post_id}/comments', json={'content': '好'})
+    client.post(f'/api/posts/{post_id}/react', json={'type': 'like', 'active': False})
+    client.post(f'/api/posts/{post_id}/react', json={'type': 'like'})
+    notification_fanout.flush()
+    data = author.get('/api/notifications').get_json()['data']
+    assert [(n['type'], n['is_read'], n['content']) for n in data[:2]] == [
+        ('like', False, 'ntf_b 赞了你的帖子《合并测试》'), ('comment', False, 'ntf_b 评论了你的帖子《合并测试》')]
+
+    # 过期的已读通知按类型归档成一条摘要，再次归档时并入原摘要
+    with app.app_context():
+        Notification.query.filter_by(user_id='ntft0001').update({'is_read': True, 'created_at': '2020-01-01 00:00:00'})
+        db.session.add(Notification(user_id='ntft0001', type='like', title='t', content='c', is_read=True,
+                                    created_at='2020-02-01 00:00:00'))
+        db.session.commit()
+        assert compact_notifications(days=30) == (4, 2)
+        Notification.query.filter_by(user_id='ntft0001', type='like').update({'created_at': '2020-03-01 00:00:00'})
+        db.session.add(Notification(user_id='ntft0001', type='like', title='t', content='c', is_read=True,
+                                    created_at='2020-02-01 00:00:00'))
+        db.session.commit()
+        assert compact_notifications(days=30) == (1, 1)
+        rows = Notification.query.filter_by(user_id='ntft0001').order_by(Notification.type).all()
+        assert [(n.type, n.content) for n in rows] == [('comment', '1 条较早的已读通知已归档'),
+                                                       ('like', '4 条较早的已读通知已归档')]
+        assert compact_notifications(days=30) == (0, 0)
@@ -0,0 +1,64 @@
+import pytest
+from app import app, db
+from app import User, Post, PostStats, PostTag, PostSimilarityBucket
+from app import post_fts
+
+USER_ID = 'plst0001'
+
+
+def cleanup():
+    with app.app_context():
+        ids = [p.id for p in Post.query.filter_by(author_id=USER_ID).all()]
+        if ids:
+            PostTag.query.filter(PostTag.post_id.in_(ids)).delete(synchronize_session=False)
+            PostStats.query.filter(PostStats.post_id.in_(ids)).delete(synchronize_session=False)
+            PostSimilarityBucket.query.filter(PostSimilarityBucket.post_id.in_(ids)).delete(synchronize_session=False)
+            db.session.execute(post_fts.delete().where(post_fts.c.rowid.in_(ids)))
+            Post.query.filter(Post.id.in_(ids)).delete(synchronize_session=False)
+        User.query.filter_by(id=USER_ID).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        db.session.add(User(id=USER_ID, username='list_tester', password='x', email='list@example.com'))
+        db.session.commit()
+    yield
+    cleanup()
+
+
+def test_tag_index_keyset_pages_and_summary_view():
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = USER_ID; sess['username'] = 'list_tester'
+
+    ids = []
+    for i in range(5):
+        tags = ' 分页标签 ,其他' if i % 2 == 0 else '其他'
+        r = client.post('/api/posts', json={'title': f'列表测试{i}', 'content': f'第{i}篇' + '正文' * 80,
+                                            'category': '校园资讯', 'tags': tags.split(','), 'force': True})
+        ids.append(r.get_json()['data']['id'])
+
+    # 按标签过滤 + 游标分页，自己发布的待审核帖子可见
+    seen, cursor = [], None
+    while True:
+        url = f'/api/posts?tag=分页标签&author_id={USER_ID}&limit=2' + (f'&cursor={cursor}' if cursor else '')
+        data = client.get(url).get_json()
+        seen.extend(data['data'])
+        if not data['has_more']:
+            break
+        cursor = data['next_cursor']
+    assert [p['id'] for p in seen] == [ids[4], ids[2], ids[0]]
+    assert seen[0]['tags'] == ['分页标签', '其他'] and 'media' in seen[0]
+
+    data = client.get(f'/api/posts?view=summary&author_id={USER_ID}&limit=1').get_json()
+    item = data['data'][0]
+    assert item['id'] == ids[4] and 'content' not in item and 'media' not in item
+    assert item['excerpt'].startswith('第4篇') and item['excerpt'].endswith('...')
+
+    # 删除帖子时标签索引随之删除
+    assert client.delete(f'/api/posts/{ids[4]}').status_code == 200
+    with app.app_context():
+        assert PostTag.query.filter_by(post_id=ids[4]).count() == 0
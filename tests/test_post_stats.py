@@ -0,0 +1,82 @@
+import re
+import pytest
+from app import app, db
+from app import User, Post, PostStats, PostSimilarityBucket, Reaction, PostReaction, PostReactionDelta, Comment, CommentPath
+from app import post_fts, reconcile_post_stats, reaction_counter
+
+USER_ID = 'stat0001'
+
+
+def cleanup():
+    with app.app_context():
+        ids = [p.id for p in Post.query.filter_by(author_id=USER_ID).all()]
+        if ids:
+            Reaction.query.filter(Reaction.post_id.in_(ids)).delete(synchronize_session=False)
+            PostReaction.query.filter(PostReaction.post_id.in_(ids)).delete(synchronize_session=False)
+            PostReactionDelta.query.filter(PostReactionDelta.post_id.in_(ids)).delete(synchronize_session=False)
+            CommentPath.query.filter(CommentPath.post_id.in_(ids)).delete(synchronize_session=False)
+            Comment.query.filter(Comment.post_id.in_(ids)).delete(synchronize_session=False)
+            PostStats.query.filter(PostStats.post_id.in_(ids)).delete(synchronize_session=False)
+            PostSimilarityBucket.query.filter(PostSimilarityBucket.post_id.in_(ids)).delete(synchronize_session=False)
+            db.session.execute(post_fts.delete().where(post_fts.c.rowid.in_(ids)))
+            Post.query.filter(Post.id.in_(ids)).delete(synchronize_session=False)
+        User.query.filter_by(id=USER_ID).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        db.session.add(User(id=USER_ID, username='stats_tester', password='x', email='stats@example.com'))
+        db.session.commit()
+    yield
+    cleanup()
+
+
+def forum_titles(client, sort):
+    html = client.get(f'/forum?category=兴趣社群&sort={sort}').get_data(as_text=True)
+    return [t for t in re.findall(r'统计测试\w', html)]
+
+
+def test_counters_drive_forum_sorts_and_reconcile():
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = USER_ID; sess['username'] = 'stats_tester'
+
+    ids = {}
+    for name in 'ABC':
+        r = client.post('/api/posts', json={'title': f'统计测试{name}', 'content': f'内容{name}' * 10,
+                                            'category': '兴趣社群', 'force': True})
+        ids[name] = r.get_json()['data']['id']
+    with app.app_context():
+        Post.query.filter(Post.id.in_(ids.values())).update({'review_status': 'approved'}, synchronize_session=False)
+        db.session.commit()
+
+    # A 收到转发（重复提交只算一次）、收藏和点赞，B 收到多条评论，C 没有互动
+    for _ in range(3):
+        client.post(f'/api/posts/{ids["A"]}/react', json={'type': 'repost', 'active': True})
+    for rtype in ('favorite', 'like'):
+        client.post(f'/api/posts/{ids["A"]}/react', json={'type': rtype})
+    for i in range(2):
+        client.post(f'/api/posts/{ids["B"]}/comments', json={'content': f'评论{i}'})
+    client.post(f'/api/posts/{ids["B"]}/react', json={'type': 'unuseful'})
+
+    reaction_counter.flush()
+    with app.app_context():
+        stats = {name: db.session.get(PostStats, pid) for name, pid in ids.items()}
+        assert stats['A'].repost_count == 1 and stats['A'].like_count == 1 and stats['B'].comment_count == 2
+        assert stats['A'].hot_score > stats['B'].hot_score > stats['C'].hot_score
+
+    assert forum_titles(client, 'hottest') == ['统计测试A', '统计测试B', '统计测试C']
+    assert forum_titles(client, 'most_replied')[0] == '统计测试B'
+
+    # 人为制造偏差后，重算能发现并修正
+    with app.app_context():
+        PostStats.query.filter_by(post_id=ids['A']).update({'repost_count': 99})
+        db.session.commit()
+        checked, drifted = reconcile_post_stats(list(ids.values()))
+        db.session.commit()
+        assert checked == 3
+        assert drifted == [(ids['A'], {'repost_count': (99, 1)})]
+        assert db.session.get(PostStats, ids['A']).repost_count == 1
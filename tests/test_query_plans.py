@@ -0,0 +1,104 @@
+import re
+
+import pytest
+from app import app, db
+from app import User, Friendship, Message, Notification, Post, PostStats, Comment, CommentPath, Reaction, Activity
+from app import activity_participants, count_post_engagement, create_post_stats, reaction_counter, view_counter
+from helpers import login, record_statements
+
+USER_A, USER_B = 'qpl00001', 'qpl00002'
+IDS = [USER_A, USER_B]
+# 随数据增长的表：这些表上的查询不允许全表扫描
+HOT_TABLES = {'message', 'notification', 'post', 'comment', 'reaction', 'friendship', 'activity_participants'}
+SCAN = re.compile(r'^SCAN (\w+)')
+
+
+def cleanup():
+    reaction_counter.flush()
+    view_counter.flush()
+    with app.app_context():
+        post_ids = [p.id for p in Post.query.filter(Post.author_id.in_(IDS))]
+        Reaction.query.filter(Reaction.post_id.in_(post_ids)).delete(synchronize_session=False)
+        CommentPath.query.filter(CommentPath.post_id.in_(post_ids)).delete(synchronize_session=False)
+        Comment.query.filter(Comment.post_id.in_(post_ids)).delete(synchronize_session=False)
+        PostStats.query.filter(PostStats.post_id.in_(post_ids)).delete(synchronize_session=False)
+        Post.query.filter(Post.id.in_(post_ids)).delete(synchronize_session=False)
+        activity_ids = [a.id for a in Activity.query.filter(Activity.initiator_id.in_(IDS))]
+        db.session.execute(activity_participants.delete().where(activity_participants.c.activity_id.in_(activity_ids)))
+        Activity.query.filter(Activity.id.in_(activity_ids)).delete(synchronize_session=False)
+        Message.query.filter(db.or_(Message.sender_id.in_(IDS), Message.receiver_id.in_(IDS))).delete(synchronize_session=False)
+        Notification.query.filter(Notification.user_id.in_(IDS)).delete(synchronize_session=False)
+        Friendship.query.filter(Friendship.user1_id.in_(IDS)).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(IDS)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        db.session.add(User(id=USER_A, username='qpl_a', password='x', email='qpl_a@example.com'))
+        db.session.add(User(id=USER_B, username='qpl_b', password='x', email='qpl_b@example.com'))
+        db.session.add(Friendship(user1_id=USER_A, user2_id=USER_B, requester_id=USER_A, status='accepted'))
+        db.session.add_all([Message(sender_id=USER_B, receiver_id=USER_A, content=f'消息{i}') for i in range(3)])
+        db.session.add_all([Notification(user_id=USER_A, type='system', title='t', content='c') for _ in range(3)])
+        post = Post(title='执行计划', category='校园资讯', content='正文', author_id=USER_A, review_status='approved')
+        activity = Activity(title='执行计划活动', type='学术', time='2026-06-01 10:00', location='图书馆', initiator_id=USER_A)
+        db.session.add_all([post, activity])
+        db.session.flush()
+        create_post_stats(post)
+        db.session.add(Comment(post_id=post.id, author_id=USER_B, content='评论'))
+        db.session.add(Reaction(user_id=USER_B, post_id=post.id, type='reward'))
+        db.session.execute(activity_participants.insert().values(user_id=USER_B, activity_id=activity.id))
+        db.session.commit()
+    yield
+    cleanup()
+
+
+def full_scans(action):
+    """执行 action 并对其间发出的每条查询跑 EXPLAIN QUERY PLAN，返回热点表上的全表扫描 [(计划, SQL)]"""
+    statements, _ = record_statements(action)
+    with app.app_context():
+        scans = []
+        with db.engine.connect() as conn:
+            for statement, parameters, executemany in statements:
+                if executemany or not statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters):
+                    match = SCAN.match(row[-1])
+                    if match and match.group(1) in HOT_TABLES:
+                        scans.append((row[-1], statement))
+    assert statements
+    return scans
+
+
+@pytest.mark.parametrize('method, url', [
+    ('get', f'/api/messages/{USER_B}'),
+    ('get', '/api/notifications'),
+    ('post', '/api/notifications/mark-all-read'),
+    ('get', '/api/posts?category=校园资讯'),
+    ('get', f'/api/posts?author_id={USER_A}'),
+    ('get', '/forum?category=校园资讯'),
+    ('get', '/api/friends'),
+    ('get', '/api/friends/requests'),
+    ('get', '/api/activities'),
+])
+def test_hot_endpoints_do_not_scan_growing_tables(method, url):
+    client = login(USER_A)
+
+    def request():
+        assert getattr(client, method)(url).status_code == 200
+    assert full_scans(request) == []
+
+
+def test_post_keyed_queries_use_indexes():
+    with app.app_context():
+        post_id = Post.query.filter_by(author_id=USER_A).first().id
+
+    def queries():
+        count_post_engagement([post_id])
+        Comment.query.filter_by(post_id=post_id).order_by(Comment.id.desc()).first()
+        Reaction.query.filter_by(post_id=post_id, type='reward').count()
+        db.session.query(activity_participants.c.user_id).filter(
+            activity_participants.c.activity_id == Activity.query.filter_by(initiator_id=USER_A).first().id).all()
+    assert full_scans(queries) == []
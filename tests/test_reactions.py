@@ -0,0 +1,126 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from app import app, db
+from app import User, Post, PostStats, ContentViewDaily, PostReaction, PostReactionDelta, Notification, NotificationAggregate, UserBadge
+from app import notification_fanout, reaction_counter, view_counter, create_post_stats
+from helpers import count_statements, login
+
+AUTHOR, READER = 'rct00001', 'rct00002'
+IDS = [AUTHOR, READER]
+
+
+def cleanup():
+    view_counter.flush()
+    with app.app_context():
+        post_ids = [p.id for p in Post.query.filter(Post.author_id.in_(IDS))]
+        ContentViewDaily.query.filter(ContentViewDaily.target_type == 'post',
+                                      ContentViewDaily.target_id.in_(post_ids)).delete(synchronize_session=False)
+        PostReaction.query.filter(PostReaction.post_id.in_(post_ids)).delete(synchronize_session=False)
+        PostReactionDelta.query.filter(PostReactionDelta.post_id.in_(post_ids)).delete(synchronize_session=False)
+        PostStats.query.filter(PostStats.post_id.in_(post_ids)).delete(synchronize_session=False)
+        Post.query.filter(Post.id.in_(post_ids)).delete(synchronize_session=False)
+        NotificationAggregate.query.filter(NotificationAggregate.user_id.in_(IDS)).delete(synchronize_session=False)
+        Notification.query.filter(Notification.user_id.in_(IDS)).delete(synchronize_session=False)
+        UserBadge.query.filter(UserBadge.user_id.in_(IDS)).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(IDS)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        db.session.add(User(id=AUTHOR, username='rct_author', password='x', email='rct_a@example.com'))
+        db.session.add(User(id=READER, username='rct_reader', password='x', email='rct_r@example.com'))
+        db.session.commit()
+    yield
+    notification_fanout.flush()
+    reaction_counter.flush()
+    cleanup()
+
+
+def add_posts(n):
+    with app.app_context():
+        posts = [Post(title=f'互动测试{i}', category='校园资讯', content='正文', author_id=AUTHOR, review_status='approved')
+                 for i in range(n)]
+        db.session.add_all(posts)
+        db.session.flush()
+        for post in posts:
+            create_post_stats(post)
+        db.session.commit()
+        return [p.id for p in posts]
+
+
+def stored_likes(post_id):
+    with app.app_context():
+        return db.session.get(PostStats, post_id).like_count
+
+
+def test_reactions_are_idempotent_and_counters_write_behind():
+    post_id, = add_posts(1)
+    reader = login(READER)
+    react = lambda body: reader.post(f'/api/posts/{post_id}/react', json=body).get_json()['data']
+
+    # 不带 active 时切换；计数先写日志，读接口叠加未写回的增量
+    data = react({'type': 'like'})
+    assert data['active'] is True and data['reactions']['like'] == 1 and data['my_reactions'] == ['like']
+    assert stored_likes(post_id) == 0
+    assert react({'type': 'like'})['active'] is False
+    # 带 active 时重复提交无副作用
+    for _ in range(3):
+        data = react({'type': 'like', 'active': True})
+    assert data['reactions']['like'] == 1
+    assert react({'type': 'useful', 'active': False})['reactions']['useful'] == 0
+
+    # 并发连点：只有一条状态、一条增量
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: login(READER).post(f'/api/posts/{post_id}/react',
+                                                               json={'type': 'favorite', 'active': True}).status_code, range(8)))
+    assert results == [200] * 8
+    with app.app_context():
+        assert PostReaction.query.filter_by(post_id=post_id, user_id=READER).count() == 2
+        assert PostReactionDelta.query.filter_by(post_id=post_id, type='favorite').count() == 1
+
+    reaction_counter.flush()
+    with app.app_context():
+        stats = db.session.get(PostStats, post_id)
+        assert (stats.like_count, stats.favorite_count) == (1, 1) and stats.hot_score > 0
+        assert PostReactionDelta.query.filter_by(post_id=post_id).count() == 0
+    notification_fanout.flush()
+    with app.app_context():
+        # 点赞→取消→再点赞 一共两次生效的点赞，合并成一条通知；重复提交不再通知
+        assert Notification.query.filter_by(user_id=AUTHOR, type='like').count() == 1
+
+
+def test_unflushed_journal_is_replayed_after_crash():
+    post_id, = add_posts(1)
+    # 模拟进程在写回前崩溃：只有状态和增量日志落库，内存里没有这些增量
+    with app.app_context():
+        db.session.add(PostReaction(user_id=READER, post_id=post_id, type='like'))
+        db.session.add(PostReactionDelta(post_id=post_id, type='like', delta=1))
+        db.session.commit()
+    assert stored_likes(post_id) == 0
+    assert reaction_counter.flush() >= 1
+    assert stored_likes(post_id) == 1
+    # 已回放的日志被删除，再次回放不会重复计数
+    reaction_counter.flush()
+    assert stored_likes(post_id) == 1
+
+
+def test_post_list_includes_reactions_with_constant_queries():
+    ids = add_posts(3)
+    reader = login(READER)
+    reader.post(f'/api/posts/{ids[0]}/react', json={'type': 'like'})
+    reader.post(f'/api/posts/{ids[1]}/react', json={'type': 'favorite'})
+    notification_fanout.flush()  # 点赞通知在后台线程落库，等它写完再计数
+    reader.get('/api/posts')  # 预热用户快照
+    small, _ = count_statements(reader, f'/api/posts?author_id={AUTHOR}&limit=50')
+    ids += add_posts(20)
+    large, data = count_statements(reader, f'/api/posts?author_id={AUTHOR}&limit=50')
+    assert small == large
+    items = {p['id']: p for p in data['data']}
+    assert items[ids[0]]['reactions']['like'] == 1 and items[ids[0]]['my_reactions'] == ['like']
+    assert items[ids[1]]['my_reactions'] == ['favorite'] and items[ids[2]]['my_reactions'] == []
+    detail = login(AUTHOR).get(f'/api/posts/{ids[1]}').get_json()['data']
+    assert detail['reactions']['favorite'] == 1 and detail['my_reactions'] == []
@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from app import app, db
+from app import User, Post, PostReview, PostReviewLease, user_cache
+from helpers import count_statements, login
+
+TEACHERS = ['rvt00001', 'rvt00002', 'rvt00003']
+AUTHOR = 'rvs00001'
+IDS = TEACHERS + [AUTHOR]
+
+
+def cleanup():
+    with app.app_context():
+        post_ids = [p.id for p in Post.query.filter(Post.author_id == AUTHOR)]
+        PostReviewLease.query.filter(db.or_(PostReviewLease.post_id.in_(post_ids),
+                                            PostReviewLease.teacher_id.in_(TEACHERS))).delete(synchronize_session=False)
+        PostReview.query.filter(PostReview.post_id.in_(post_ids)).delete(synchronize_session=False)
+        Post.query.filter(Post.id.in_(post_ids)).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(IDS)).delete(synchronize_session=False)
+        db.session.commit()
+    user_cache.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        for user_id in TEACHERS:
+            db.session.add(User(id=user_id, username=f'rv_{user_id}', password='x', email=f'{user_id}@example.com', role='teacher'))
+        db.session.add(User(id=AUTHOR, username='rv_author', password='x', email='rv_author@example.com'))
+        db.session.commit()
+    yield
+    cleanup()
+
+
+def add_pending(n):
+    with app.app_context():
+        posts = [Post(title=f'审核队列{i}', category='校园资讯', content='正文' * 80, author_id=AUTHOR) for i in range(n)]
+        db.session.add_all(posts)
+        db.session.commit()
+        return [p.id for p in posts]
+
+
+def test_pending_queue_paginates_with_constant_queries():
+    teacher = login(TEACHERS[0])
+    add_pending(3)
+    teacher.get('/api/posts/pending')  # 预热教师身份快照
+    small, _ = count_statements(teacher, '/api/posts/pending?limit=50')
+    ids = add_pending(40)
+    large, data = count_statements(teacher, '/api/posts/pending?limit=50')
+    assert small == large
+    assert data['data'][0]['author'] == 'rv_author' and data['data'][0]['content'].endswith('...')
+
+    seen, cursor = [], None
+    while True:
+        data = teacher.get('/api/posts/pending?limit=15' + (f'&cursor={cursor}' if cursor else '')).get_json()
+        seen.extend(p['id'] for p in data['data'] if p['title'].startswith('审核队列'))
+        if not data['has_more']:
+            break
+        cursor = data['next_cursor']
+    assert seen[:40] == ids[::-1] and len(seen) == len(set(seen)) == 43
+    assert login(AUTHOR).get('/api/posts/pending').status_code == 403
+
+
+def test_claims_are_disjoint_and_bulk_review_is_exactly_once():
+    ids = add_pending(30)
+    clients = {user_id: login(user_id) for user_id in TEACHERS}
+
+    # 三位教师同时领取，各自拿到互不重叠的一批
+    with ThreadPoolExecutor(3) as pool:
+        batches = list(pool.map(lambda t: clients[t].post('/api/posts/review/claim', json={'limit': 8}).get_json(), TEACHERS))
+    everything = [[p['id'] for p in batch['data']] for batch in batches]
+    assert all(len(batch) == 8 for batch in everything) and len(set(sum(everything, []))) == 24
+    assert all(p['claimed_by_me'] for batch in batches for p in batch['data'])
+    # 库里可能有其他测试留下的待审核帖子，下面只审核本测试创建的
+    claimed = [[post_id for post_id in batch if post_id in ids] for batch in everything]
+    # 再次领取只续期，不会多拿
+    again = clients[TEACHERS[0]].post('/api/posts/review/claim', json={'limit': 8}).get_json()
+    assert [p['id'] for p in again['data']] == everything[0]
+
+    # 批量审核：自己领取的 8 篇一次写完；别人领取的跳过
+    decisions = [{'post_id': post_id, 'status': 'approved'} for post_id in claimed[0][:-1]]
+    decisions += [{'post_id': claimed[0][-1], 'status': 'rejected', 'comment': '内容不完整'},
+                  {'post_id': claimed[1][0], 'status': 'approved'}]
+    r = clients[TEACHERS[0]].post('/api/posts/review/bulk', json={'decisions': decisions})
+    assert r.status_code == 200
+    data = r.get_json()['data']
+    assert data['reviewed'] == claimed[0] and data['skipped'] == [{'post_id': claimed[1][0], 'reason': 'claimed_by_other'}]
+    assert clients[TEACHERS[0]].post(f'/api/posts/{claimed[1][0]}/review', json={'status': 'approved'}).status_code == 409
+
+    # 两位教师同时提交同一批：每篇帖子只会被审核一次
+    clients[TEACHERS[1]].post('/api/posts/review/release')
+    shared = [{'post_id': post_id, 'status': 'approved'} for post_id in claimed[1]]
+    with ThreadPoolExecutor(2) as pool:
+        results = list(pool.map(lambda t: clients[t].post('/api/posts/review/bulk', json={'decisions': shared}).get_json(),
+                                TEACHERS[1:]))
+    assert sorted(sum((r['data']['reviewed'] for r in results), [])) == sorted(claimed[1])
+
+    with app.app_context():
+        reviews = db.session.query(PostReview.post_id, PostReview.status).filter(PostReview.post_id.in_(ids)).all()
+        assert len(reviews) == len({post_id for post_id, _ in reviews}) == len(claimed[0]) + len(claimed[1])
+        assert dict(reviews)[claimed[0][-1]] == 'rejected'
+        assert db.session.get(Post, claimed[0][-1]).review_status == 'rejected'
+        # 审核过的帖子释放租约；第三位教师的领取仍在
+        assert {lease.post_id for lease in PostReviewLease.query.filter(PostReviewLease.post_id.in_(ids))} == set(claimed[2])
+    # 领取剩下的：跳过仍在别人租约内的帖子
+    rest = clients[TEACHERS[0]].post('/api/posts/review/claim', json={'limit': 100}).get_json()
+    assert set(ids) & {p['id'] for p in rest['data']} == set(ids) - set(sum(claimed, []))
@@ -0,0 +1,77 @@
+import pytest
+from app import app, db
+from app import User, Post, PostStats, PostSimilarityBucket, PostReview, PostReviewLease, user_cache
+from app import fts_tokens, fts_match_expression, post_fts
+from helpers import login
+
+USER_ID = 'srch0001'
+TEACHER_ID = 'srcht001'
+
+
+def cleanup():
+    with app.app_context():
+        ids = [p.id for p in Post.query.filter_by(author_id=USER_ID).all()]
+        if ids:
+            PostStats.query.filter(PostStats.post_id.in_(ids)).delete(synchronize_session=False)
+            PostSimilarityBucket.query.filter(PostSimilarityBucket.post_id.in_(ids)).delete(synchronize_session=False)
+            PostReviewLease.query.filter(PostReviewLease.post_id.in_(ids)).delete(synchronize_session=False)
+            PostReview.query.filter(PostReview.post_id.in_(ids)).delete(synchronize_session=False)
+            db.session.execute(post_fts.delete().where(post_fts.c.rowid.in_(ids)))
+            Post.query.filter(Post.id.in_(ids)).delete(synchronize_session=False)
+        User.query.filter(User.id.in_([USER_ID, TEACHER_ID])).delete(synchronize_session=False)
+        db.session.commit()
+    user_cache.invalidate()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        db.session.add(User(id=USER_ID, username='search_tester', password='x', email='search@example.com'))
+        db.session.add(User(id=TEACHER_ID, username='search_teacher', password='x', email='search_t@example.com',
+                            role='teacher'))
+        db.session.commit()
+    yield
+    cleanup()
+
+
+def test_cjk_bigram_tokens():
+    assert fts_tokens('周末图书馆 Study') == '周末 末图 图书 书馆 馆 study'
+    assert fts_match_expression('图书馆 py') == '"图书 书馆" AND "py"*'
+    assert fts_match_expression('馆') == '馆*'
+    assert fts_match_expression('！？') is None
+
+
+def test_search_ranks_filters_and_follows_review_status():
+    client = login(USER_ID, 'search_tester')
+
+    ids = {}
+    for key, title, content in [('title', '量子纠缠读书会', '每周三晚上在二楼活动室'),
+                                ('body', '周末活动', '想找人一起讨论量子纠缠的入门书'),
+                                ('other', '二手自行车', '九成新，价格可议')]:
+        r = client.post('/api/posts', json={'title': title, 'content': content, 'category': '校园资讯'})
+        assert r.status_code == 201
+        ids[key] = r.get_json()['data']['id']
+
+    # 待审核的帖子不会被搜到
+    assert client.get('/api/posts/search?q=量子纠缠').get_json()['data'] == []
+
+    # 教师逐篇审核和批量审核都会同步索引中的审核状态
+    teacher = login(TEACHER_ID, 'search_teacher')
+    r = teacher.post(f'/api/posts/{ids["title"]}/review', json={'status': 'approved'})
+    assert r.status_code == 200
+    assert [p['id'] for p in client.get('/api/posts/search?q=量子纠缠').get_json()['data']] == [ids['title']]
+    r = teacher.post('/api/posts/review/bulk', json={'decisions': [
+        {'post_id': ids['body'], 'status': 'approved'}, {'post_id': ids['other'], 'status': 'rejected'}]})
+    assert r.status_code == 200 and len(r.get_json()['data']['reviewed']) == 2
+    assert client.get('/api/posts/search?q=自行车').get_json()['data'] == []
+
+    data = client.get('/api/posts/search?q=量子纠缠').get_json()
+    # 标题命中的排在正文命中之前，且摘要带高亮
+    assert [p['id'] for p in data['data']] == [ids['title'], ids['body']]
+    assert '<mark>量子纠缠</mark>' in data['data'][1]['snippet']
+
+    # 删除后从索引中移除
+    assert client.delete(f'/api/posts/{ids["body"]}').status_code == 200
+    data = client.get('/api/posts/search?q=量子纠缠').get_json()
+    assert [p['id'] for p in data['data']] == [ids['title']]
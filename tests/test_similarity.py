@@ -0,0 +1,101 @@
+import random
+from difflib import SequenceMatcher
+
+import pytest
+from app import app, db
+from app import User, Post, PostStats, PostSimilarityBucket, PostSimilarityMeta, post_fts
+from app import SIMILARITY_INDEX_FORMAT, ensure_similarity_index, post_similarity_text, rebuild_similarity_index
+from helpers import login
+
+USER_ID = 'sim00001'
+
+
+def cleanup():
+    with app.app_context():
+        ids = [p.id for p in Post.query.filter_by(author_id=USER_ID).all()]
+        if ids:
+            PostStats.query.filter(PostStats.post_id.in_(ids)).delete(synchronize_session=False)
+            PostSimilarityBucket.query.filter(PostSimilarityBucket.post_id.in_(ids)).delete(synchronize_session=False)
+            db.session.execute(post_fts.delete().where(post_fts.c.rowid.in_(ids)))
+            Post.query.filter(Post.id.in_(ids)).delete(synchronize_session=False)
+        User.query.filter_by(id=USER_ID).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        db.session.add(User(id=USER_ID, username='similar_tester', password='x', email='similar@example.com'))
+        db.session.commit()
+    yield
+    cleanup()
+
+
+def scattered_edit(text, every):
+    """每隔 every 个字换掉一个字：改动零散分布，是 MinHash 最难召回的情形"""
+    return ''.join(chr(ord(ch) + 1) if i % every == every - 1 else ch for i, ch in enumerate(text))
+
+
+def similar_ids(client, title, content):
+    r = client.get('/api/posts/similar', query_string={'title': title, 'content': content})
+    assert r.status_code == 200
+    return {c['post']['id']: c['score'] for c in r.get_json()['data']}
+
+
+def test_near_duplicates_are_found_until_deleted_and_rebuild_restores_buckets():
+    client = login(USER_ID, 'similar_tester')
+    rng = random.Random(7)
+    title = '期末复习资料整理与分享'
+    content = ''.join(chr(rng.randrange(0x4e00, 0x4e00 + 3000)) for _ in range(150))
+    posts = {}
+    for key, t, c in [('long', title, content), ('short', '出二手台灯', '九成新')]:
+        r = client.post('/api/posts', json={'title': t, 'content': c, 'category': '校园资讯'})
+        assert r.status_code == 201
+        posts[key] = r.get_json()['data']['id']
+
+    # 五个字改一个，ratio 落在 0.75~0.85 之间
+    near_title, near_content = scattered_edit(title, 5), scattered_edit(content, 5)
+    ratio = SequenceMatcher(None, post_similarity_text(title, content),
+                            post_similarity_text(near_title, near_content)).ratio()
+    assert 0.75 <= ratio < 0.85
+    found = similar_ids(client, near_title, near_content)
+    assert found[posts['long']] == pytest.approx(ratio)
+    # 短帖子按长度分桶兜底
+    assert posts['short'] in similar_ids(client, '出二手台灯', '八成新')
+    # 低于阈值的不返回
+    assert posts['long'] not in similar_ids(client, scattered_edit(title, 2), scattered_edit(content, 2))
+
+    with app.app_context():
+        PostSimilarityBucket.query.filter(PostSimilarityBucket.post_id.in_(posts.values())).delete(synchronize_session=False)
+        db.session.commit()
+    assert posts['long'] not in similar_ids(client, near_title, near_content)
+    with app.app_context():
+        assert rebuild_similarity_index() >= 2
+        assert PostSimilarityBucket.query.filter_by(post_id=posts['long']).count() > 0
+    assert posts['long'] in similar_ids(client, near_title, near_content)
+    assert posts['short'] in similar_ids(client, '出二手台灯', '八成新')
+
+    assert client.delete(f"/api/posts/{posts['long']}").status_code == 200
+    assert posts['long'] not in similar_ids(client, near_title, near_content)
+    with app.app_context():
+        assert PostSimilarityBucket.query.filter_by(post_id=posts['long']).count() == 0
+
+
+def test_index_built_with_other_parameters_is_rebuilt_on_startup():
+    client = login(USER_ID, 'similar_tester')
+    r = client.post('/api/posts', json={'title': '出二手自行车', 'content': '骑了一年，刹车灵敏', 'category': '校园资讯'})
+    post_id = r.get_json()['data']['id']
+    with app.app_context():
+        assert ensure_similarity_index() is False
+        # 模拟旧版本参数写入的索引：桶对不上，格式也不同
+        PostSimilarityBucket.query.filter_by(post_id=post_id).delete(synchronize_session=False)
+        db.session.add(PostSimilarityBucket(bucket=1, post_id=post_id))
+        db.session.get(PostSimilarityMeta, 1).format = 'k3-p128-b32'
+        db.session.commit()
+    assert post_id not in similar_ids(client, '出二手自行车', '骑了一年，刹车很灵敏')
+
+    with app.app_context():
+        assert ensure_similarity_index() is True
+        assert db.session.get(PostSimilarityMeta, 1).format == SIMILARITY_INDEX_FORMAT
+    assert post_id in similar_ids(client, '出二手自行车', '骑了一年，刹车很灵敏')
@@ -0,0 +1,79 @@
+import json
+import pytest
+from app import app, db
+from app import User, Message, Conversation
+from app import EventBroker, SQLiteEventBackend, event_broker
+
+USERS = {'sse_alice': 'ssea0001', 'sse_bob': 'sseb0001'}
+
+
+def cleanup():
+    with app.app_context():
+        ids = list(USERS.values())
+        Message.query.filter(db.or_(Message.sender_id.in_(ids), Message.receiver_id.in_(ids))).delete(synchronize_session=False)
+        Conversation.query.filter(db.or_(Conversation.user_id.in_(ids), Conversation.peer_id.in_(ids))).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        for username, user_id in USERS.items():
+            db.session.add(User(id=user_id, username=username, password='x', email=f'{username}@example.com'))
+        db.session.commit()
+    yield
+    cleanup()
+
+
+def test_sqlite_backend_delivers_across_workers(tmp_path):
+    # 两个 broker 共享同一个事件文件，模拟两个 worker 进程
+    path = str(tmp_path / 'events.db')
+    worker_a = EventBroker(SQLiteEventBackend(path, poll_interval=0.02))
+    worker_b = EventBroker(SQLiteEventBackend(path, poll_interval=0.02))
+
+    sub = worker_b.subscribe('u1')
+    other = worker_b.subscribe('u2')
+    worker_a.publish('u1', 'message', {'message_id': 7})
+
+    payload = json.loads(sub.get(timeout=2))
+    assert payload == {'event': 'message', 'data': {'message_id': 7}}
+    assert other.empty()
+
+    worker_b.unsubscribe('u1', sub)
+    worker_b.unsubscribe('u2', other)
+    assert worker_b.connection_count() == 0
+
+
+def test_send_message_publishes_to_receiver():
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 'ssea0001'; sess['username'] = 'sse_alice'
+
+    sub = event_broker.subscribe('sseb0001')
+    try:
+        r = client.post('/api/messages', json={'receiver_id': 'sseb0001', 'content': '在吗'})
+        assert r.status_code == 201
+        payload = json.loads(sub.get(timeout=1))
+        assert payload['event'] == 'message'
+        assert payload['data']['message_id'] == r.get_json()['data']['message_id']
+        assert payload['data']['sender_id'] == 'ssea0001'
+    finally:
+        event_broker.unsubscribe('sseb0001', sub)
+
+
+def test_stream_endpoint_emits_events():
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = 'sseb0001'; sess['username'] = 'sse_bob'
+
+    response = client.get('/api/stream', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'retry:')
+
+    event_broker.publish('sseb0001', 'notification', {'id': 1})
+    assert next(chunks) == b'event: notification\ndata: {"id": 1}\n\n'
+    response.close()
+    assert event_broker.connection_count() == 0
@@ -0,0 +1,84 @@
+import pytest
+from app import app, db
+from app import User, Friendship, Activity, UserSuggestion
+from app import compute_user_suggestions
+from helpers import login
+
+USERS = {
+    'sug_alice': ('sug00001', '篮球,摄影', '计算机', '大二'),
+    'sug_bob': ('sug00002', '篮球', '计算机', '大二'),
+    'sug_carol': ('sug00003', '围棋', '数学', '大三'),
+    'sug_dave': ('sug00004', '摄影', '物理', '大一'),
+    'sug_erin': ('sug00005', '', '', ''),
+}
+IDS = [v[0] for v in USERS.values()]
+
+
+def cleanup():
+    with app.app_context():
+        for act in Activity.query.filter(Activity.title.like('推荐好友测试%')).all():
+            act.participants = []
+            db.session.delete(act)
+        UserSuggestion.query.filter(db.or_(UserSuggestion.user_id.in_(IDS),
+                                           UserSuggestion.candidate_id.in_(IDS))).delete(synchronize_session=False)
+        Friendship.query.filter(db.or_(Friendship.user1_id.in_(IDS), Friendship.user2_id.in_(IDS))).delete(
+            synchronize_session=False)
+        User.query.filter(User.id.in_(IDS)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        for username, (user_id, hobbies, major, grade) in USERS.items():
+            db.session.add(User(id=user_id, username=username, password='x', email=f'{username}@example.com',
+                                hobbies=hobbies, major=major, grade=grade))
+        # carol 与 alice、dave 都是好友
+        for a, b in (('sug00001', 'sug00003'), ('sug00003', 'sug00004')):
+            db.session.add(Friendship(user1_id=a, user2_id=b, status='accepted', requester_id=a))
+        db.session.commit()
+    yield
+    cleanup()
+
+
+def suggestions(client):
+    return {s['id']: s for s in client.get('/api/users/suggestions').get_json()['data']}
+
+
+def test_batch_scores_and_incremental_updates():
+    with app.app_context():
+        compute_user_suggestions(IDS)
+
+    alice = login(USERS['sug_alice'][0], 'sug_alice')
+    got = suggestions(alice)
+    # 已是好友的 carol 不会出现；bob 同专业同年级且同爱好，排第一；dave 有共同好友和共同爱好
+    assert 'sug00003' not in got
+    assert list(got)[0] == 'sug00002'
+    assert got['sug00002']['reasons']['same_grade'] and got['sug00002']['reasons']['shared_hobbies'] == 1
+    assert got['sug00004']['reasons']['mutual_friends'] == 1
+    assert 'sug00005' not in got
+
+    # 一起报名活动后，erin 作为新候选被补入
+    with app.app_context():
+        act = Activity(title='推荐好友测试', type='体育', time='2026-05-01', location='操场')
+        db.session.add(act)
+        db.session.commit()
+        activity_id = act.id
+    erin = login(USERS['sug_erin'][0], 'sug_erin')
+    assert erin.post(f'/api/activities/{activity_id}/join').status_code == 200
+    assert alice.post(f'/api/activities/{activity_id}/join').status_code == 200
+    assert suggestions(alice)['sug00005']['reasons']['shared_activities'] == 1
+
+    # carol 与 bob 成为好友后，alice 与 bob 的共同好友数 +1
+    carol, bob = login(USERS['sug_carol'][0], 'sug_carol'), login(USERS['sug_bob'][0], 'sug_bob')
+    before = suggestions(alice)['sug00002']['score']
+    friendship_id = carol.post('/api/friends/request', json={'user_id': 'sug00002'}).get_json()['data']['friendship_id']
+    assert bob.post(f'/api/friends/request/{friendship_id}', json={'action': 'accept'}).status_code == 200
+    after = suggestions(alice)['sug00002']
+    assert after['reasons']['mutual_friends'] == 1 and after['score'] > before
+
+    # 发出好友请求后不再互相推荐
+    assert 'sug00002' in suggestions(alice)
+    alice.post('/api/friends/request', json={'user_id': 'sug00002'})
+    assert 'sug00002' not in suggestions(alice)
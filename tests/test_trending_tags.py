@@ -0,0 +1,99 @@
+import random
+
+import pytest
+from app import app, db
+from app import User, Post, PostStats, PostTag, PostReaction, PostReactionDelta, PostReview, Activity, ActivityTag, TagTrendHour
+from app import SpaceSaving, trending_tags, reaction_counter, post_fts
+from helpers import login
+
+TEACHER, STUDENT = 'trd00001', 'trd00002'
+IDS = [TEACHER, STUDENT]
+
+
+def cleanup():
+    reaction_counter.flush()
+    with app.app_context():
+        post_ids = [p.id for p in Post.query.filter(Post.author_id.in_(IDS))]
+        PostReaction.query.filter(PostReaction.post_id.in_(post_ids)).delete(synchronize_session=False)
+        PostReactionDelta.query.filter(PostReactionDelta.post_id.in_(post_ids)).delete(synchronize_session=False)
+        PostReview.query.filter(PostReview.post_id.in_(post_ids)).delete(synchronize_session=False)
+        PostTag.query.filter(PostTag.post_id.in_(post_ids)).delete(synchronize_session=False)
+        PostStats.query.filter(PostStats.post_id.in_(post_ids)).delete(synchronize_session=False)
+        db.session.execute(post_fts.delete().where(post_fts.c.rowid.in_(post_ids)))
+        Post.query.filter(Post.id.in_(post_ids)).delete(synchronize_session=False)
+        activity_ids = [a.id for a in Activity.query.filter(Activity.initiator_id.in_(IDS))]
+        ActivityTag.query.filter(ActivityTag.activity_id.in_(activity_ids)).delete(synchronize_session=False)
+        Activity.query.filter(Activity.id.in_(activity_ids)).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(IDS)).delete(synchronize_session=False)
+        db.session.commit()
+        # 热门标签是由原始表派生的数据，按清理后的原始表重算
+        trending_tags.rebuild()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        db.session.add(User(id=TEACHER, username='trd_teacher', password='x', email='trd_t@example.com', role='teacher'))
+        db.session.add(User(id=STUDENT, username='trd_student', password='x', email='trd_s@example.com'))
+        db.session.commit()
+    yield
+    cleanup()
+
+
+def scores(client):
+    data = client.get('/api/tags/trending?limit=200').get_json()['data']
+    return {item['tag']: item['score'] for item in data if item['tag'].startswith('trd')}
+
+
+def test_trending_tags_follow_posts_activities_and_reactions():
+    teacher, student = login(TEACHER), login(STUDENT)
+    r = teacher.post('/api/posts', json={'title': '热门标签一', 'content': '正文内容' * 5, 'category': '兴趣社群',
+                                         'tags': ['trd篮球', 'trd摄影'], 'force': True})
+    post_id = r.get_json()['data']['id']
+    pending = student.post('/api/posts', json={'title': '热门标签二', 'content': '另一段正文' * 5, 'category': '兴趣社群',
+                                               'tags': ['trd摄影'], 'force': True}).get_json()['data']['id']
+    teacher.post('/api/activities', json={'title': '热门标签活动', 'type': '体育', 'time': '2026-06-01 10:00',
+                                          'location': '操场', 'tags': 'trd篮球'})
+    trending_tags.invalidate()
+    # 待审核的帖子不计入
+    assert scores(teacher) == {'trd篮球': 10, 'trd摄影': 5}
+
+    # 审核通过、点赞收藏（互动写回时按热度权重计入）
+    teacher.post(f'/api/posts/{pending}/review', json={'status': 'approved'})
+    student.post(f'/api/posts/{post_id}/react', json={'type': 'like'})
+    student.post(f'/api/posts/{post_id}/react', json={'type': 'favorite'})
+    reaction_counter.flush()
+    trending_tags.invalidate()
+    assert scores(teacher) == {'trd篮球': 13, 'trd摄影': 13}
+
+    # 结果有缓存；写回后清掉内存，从小时桶读出的结果一致；按原始表重算也一致
+    teacher.post(f'/api/posts/{post_id}/react', json={'type': 'repost'})
+    reaction_counter.flush()
+    assert scores(teacher) == {'trd篮球': 13, 'trd摄影': 13}
+    assert trending_tags.flush() >= 1
+    expected = {'trd篮球': 16, 'trd摄影': 16}
+    assert scores(teacher) == expected
+    with app.app_context():
+        assert TagTrendHour.query.count() >= 1
+        trending_tags.rebuild()
+    assert scores(teacher) == expected
+    assert teacher.get('/api/tags/trending?hours=0&limit=1').get_json()['hours'] == 1
+
+
+def test_space_saving_keeps_heavy_hitters_with_error_bounds():
+    rng = random.Random(5)
+    stream = [f't{int(rng.paretovariate(1.2))}' for _ in range(20000)]
+    truth = {}
+    for tag in stream:
+        truth[tag] = truth.get(tag, 0) + 1
+    halves = [SpaceSaving(50), SpaceSaving(50)]
+    for i, tag in enumerate(stream):
+        halves[i % 2].add(tag)
+    merged = SpaceSaving(50).merge(halves[0]).merge(halves[1])
+    assert len(merged.counters) <= 50
+    exact_top = sorted(truth, key=truth.get, reverse=True)[:10]
+    assert [tag for tag, _ in merged.top(10)] == exact_top
+    for tag, (count, error) in merged.counters.items():
+        assert count - error <= truth[tag] <= count
+    assert SpaceSaving.loads(50, merged.dumps()).counters == merged.counters
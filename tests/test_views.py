@@ -0,0 +1,97 @@
+import pytest
+from app import app, db
+from app import User, Post, PostStats, Activity, ContentViewDaily
+from app import view_counter, create_post_stats, hll_add, hll_merge, hll_estimate, HLL_REGISTERS
+from helpers import login, record_statements
+
+AUTHOR, READER = 'vw000001', 'vw000002'
+IDS = [AUTHOR, READER]
+
+
+def cleanup():
+    view_counter.flush()
+    with app.app_context():
+        post_ids = [p.id for p in Post.query.filter(Post.author_id.in_(IDS))]
+        activity_ids = [a.id for a in Activity.query.filter(Activity.initiator_id.in_(IDS))]
+        ContentViewDaily.query.filter(db.or_(
+            db.and_(ContentViewDaily.target_type == 'post', ContentViewDaily.target_id.in_(post_ids)),
+            db.and_(ContentViewDaily.target_type == 'activity', ContentViewDaily.target_id.in_(activity_ids))
+        )).delete(synchronize_session=False)
+        PostStats.query.filter(PostStats.post_id.in_(post_ids)).delete(synchronize_session=False)
+        Post.query.filter(Post.id.in_(post_ids)).delete(synchronize_session=False)
+        Activity.query.filter(Activity.id.in_(activity_ids)).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(IDS)).delete(synchronize_session=False)
+        db.session.commit()
+
+
+@pytest.fixture(autouse=True)
+def setup_env():
+    cleanup()
+    with app.app_context():
+        db.session.add(User(id=AUTHOR, username='vw_author', password='x', email='vw_a@example.com'))
+        db.session.add(User(id=READER, username='vw_reader', password='x', email='vw_r@example.com'))
+        db.session.commit()
+    yield
+    cleanup()
+
+
+def write_statements(client, url):
+    statements, r = record_statements(lambda: client.get(url))
+    assert r.status_code == 200
+    return [sql for sql, _, _ in statements if not sql.lstrip().upper().startswith('SELECT')], r
+
+
+def test_views_are_buffered_and_flushed_with_unique_viewers():
+    with app.app_context():
+        post = Post(title='浏览测试', category='校园资讯', content='正文', author_id=AUTHOR, review_status='approved')
+        activity = Activity(title='浏览测试活动', type='学术', time='2026-06-01 10:00', location='图书馆', initiator_id=AUTHOR)
+        db.session.add_all([post, activity])
+        db.session.flush()
+        create_post_stats(post)
+        db.session.commit()
+        post_id, activity_id = post.id, activity.id
+    author, reader, anonymous = login(AUTHOR), login(READER), app.test_client()
+
+    # 浏览只写内存：请求里没有任何写语句，接口返回的浏览数叠加了未写回的部分
+    writes, r = write_statements(reader, f'/api/posts/{post_id}')
+    assert writes == [] and r.get_json()['data']['view_count'] == 1
+    for client in (reader, reader, author, anonymous):
+        client.get(f'/api/posts/{post_id}')
+    reader.get(f'/post/{post_id}')
+    writes, _ = write_statements(anonymous, f'/activity/{activity_id}')
+    assert writes == []
+    with app.app_context():
+        assert db.session.get(PostStats, post_id).view_count == 0
+
+    report = author.get(f'/api/posts/{post_id}/views').get_json()['data']
+    assert report['view_count'] == 6 and report['views'] == 6 and report['unique_viewers'] == 3
+    assert len(report['daily']) == 7 and report['daily'][-1]['views'] == 6
+
+    assert view_counter.flush() == 2
+    with app.app_context():
+        assert db.session.get(PostStats, post_id).view_count == 6
+        row = db.session.get(ContentViewDaily, ('post', post_id, report['daily'][-1]['day']))
+        assert row.view_count == 6 and len(row.visitors) == HLL_REGISTERS
+    # 写回后继续浏览：同一天的寄存器合并，重复访客不重复计数
+    reader.get(f'/api/posts/{post_id}')
+    view_counter.flush()
+    report = author.get(f'/api/posts/{post_id}/views?days=1').get_json()['data']
+    assert (report['view_count'], report['views'], report['unique_viewers']) == (7, 7, 3)
+
+    assert reader.get(f'/api/posts/{post_id}/views').status_code == 403
+    assert reader.get(f'/api/activities/{activity_id}/views').status_code == 403
+    activity_report = author.get(f'/api/activities/{activity_id}/views').get_json()['data']
+    assert activity_report['view_count'] == 1 and activity_report['unique_viewers'] == 1
+    assert '<strong>浏览：</strong>2' in author.get(f'/activity/{activity_id}').get_data(as_text=True)
+
+
+def test_hyperloglog_estimates_and_unions():
+    a, b = bytearray(HLL_REGISTERS), bytearray(HLL_REGISTERS)
+    for i in range(20000):
+        hll_add(a, f'u:{i}')
+    for i in range(10000, 40000):
+        hll_add(b, f'u:{i}')
+    assert len(hll_merge(a)) == HLL_REGISTERS
+    assert abs(hll_estimate(a) - 20000) / 20000 < 0.1
+    assert abs(hll_estimate(hll_merge(a, b)) - 40000) / 40000 < 0.1
+    assert hll_estimate(None) == 0 and hll_estimate(hll_merge()) == 0